@@ -4,6 +4,8 @@ import torch
 import dgl
 import time
 from jade2.rosetta_jade import get_dataframe_from_json, get_dataframe_from_json_or_csv
+from jade2.rosetta_jade.score_cache import clear_cache, get_column_names, load_cached_dataframe
+from jade2.basic.dataframe.compact import print_memory_report
 from jade2.deep_learning.torch import create_2D_tensor_from_score_data, get_onehot_encoded_sequence_tensor
 from jade2.basic import *
 from jade2.deep_learning.graphs import *
@@ -14,7 +16,7 @@ if __name__ == "__main__":
     parser = ArgumentParser("Creates and saves a list of DGL graphs using metrics for use in DGL GCNs", formatter_class=ArgumentDefaultsHelpFormatter)
 
     parser.add_argument("--csv", "-c",
-                        help="Input CSV file. Will read if pickled data is not present. ",
+                        help="Input CSV file. Columns are cached in a binary sidecar next to the file on first read. ",
                         default = "data/scores_w_stability_2D_3D.csv")
 
     parser.add_argument("--pt", "-p",
@@ -26,7 +28,7 @@ if __name__ == "__main__":
                         default = "data/dgl_graph.pkl")
 
     parser.add_argument("--force_rewrite", "-f",
-                        help = "Force load and rewrite of pickle data. ",
+                        help = "Force load and rewrite of cached data. ",
                         default = False,
                         action = "store_true")
 
@@ -35,6 +37,11 @@ if __name__ == "__main__":
                         default = False,
                         action = "store_true")
 
+    parser.add_argument("--compact",
+                        help = "Load the 1D data memory-compact (float32 scores, categorical strings).",
+                        default = False,
+                        action = "store_true")
+
     parser.add_argument("--out_dir", "-d",
                         help = "Output directory for temp files.",
                         default = "data")
@@ -127,29 +134,20 @@ if __name__ == "__main__":
     if not os.path.exists(outdir):
         os.mkdir(outdir)
 
-    pk1 = outdir+"/1D_data_pickle.pkl"
-    pk2 = outdir+"/2D_data_pickle.pkl"
-    pk3 = outdir+"/3D_data_pickle.pkl"
+    #1D, 2D and 3D column sets are read separately through the score cache, so the *_3D pair columns
+    # are only loaded when edge data is created.
+    if options.force_rewrite:
+        clear_cache(options.csv)
 
-    if not os.path.exists(pk1) or options.force_rewrite:
-        df = get_dataframe_from_json_or_csv(options.csv)
-
-        columns_2d = sorted([x for x in df.columns if x.split("_")[-1] == "2D" or x == options.seq_column])
-        columns_3d = sorted([x for x in df.columns if x.split('_')[-1] == "3D" ])
-        columns_1d = sorted([x for x in df.columns if x not in columns_2d+columns_3d or x == options.seq_column])
-
-        print("Writing pickles.")
-        df[columns_3d].to_pickle(pk3)
-        df[columns_2d].to_pickle(pk2)
-        df[columns_1d].to_pickle(pk1)
-        df = df[columns_1d]
-    else:
-        print("Reading pickle")
-        df = pandas.read_pickle(pk1)
-        #df2 = pandas.read_pickle(pk2)
-        #df3 = pandas.read_pickle(pk3)
+    all_columns = get_column_names(options.csv)
+    columns_2d = sorted([x for x in all_columns if x.split("_")[-1] == "2D" or x == options.seq_column])
+    columns_3d = sorted([x for x in all_columns if x.split('_')[-1] == "3D" ])
+    columns_1d = sorted([x for x in all_columns if x not in columns_2d+columns_3d or x == options.seq_column])
 
-        print("done")
+    print("Reading 1D data")
+    df = get_dataframe_from_json_or_csv(options.csv, columns=columns_1d, compact=options.compact)
+    print_memory_report(df)
+    print("done")
 
     if not options.seq_column in df.columns:
         sys.exit("Sequence column " +options.seq_column+" not found in csv data!")
@@ -158,7 +156,7 @@ if __name__ == "__main__":
 
 
     if not os.path.exists(outdir+"/edge_data.pl") or options.force_rewrite:
-        df3 = pandas.read_pickle(pk3)
+        df3 = load_cached_dataframe(options.csv, columns_3d)
         if not edge_features:
 
             energy_metrics = sorted([c for c in df3.columns if c.endswith('pair_energy_3D')])
@@ -179,7 +177,7 @@ if __name__ == "__main__":
 
     if use_one_body_metrics:
         print("Creating 2D tensor")
-        df2 = load_pickle(pk2)
+        df2 = load_cached_dataframe(options.csv, columns_2d)
         data_t= create_2D_tensor_from_score_data(df2, one_body_metrics_all, padxy=False, scale=False, standardize=False)
         print(data_t.shape)
         print("Created 2D tensor")
@@ -11,6 +11,8 @@ from jade2.basic.structure import util
 from jade2.basic import general
 from jade2.basic.structure.Structure import AntibodyStructure
 from jade2.basic.structure.BioPose import BioPose
+from jade2.basic.structure.StructureCache import get_default_cache
+from jade2.basic.structure.BatchLoader import BatchLoader
 
 
 gfp = """
@@ -95,6 +97,16 @@ def get_parser():
                         default = False,
                         action = "store_true",
                         help = "Skip outputting the chain in the fasta.  Useful for designs.")
+
+    parser.add_argument("--use_cache",
+                        default = False,
+                        action = "store_true",
+                        help = "Read structures and sequences of unchanged files from the structure cache "
+                               "($JADE_STRUCTURE_CACHE or ~/.cache/jade2/structures), parsing only new files.")
+
+    parser.add_argument("--processes", "-j",
+                        type = int,
+                        help = "Number of processes to read structures with.  Default is every core for large PDB lists.")
     return parser
 
 if __name__ == "__main__":
@@ -143,23 +155,26 @@ if __name__ == "__main__":
             pdbs.append(pdb_path)
         INFILE.close()
 
-    for pdb in pdbs:
+    cache = get_default_cache(force=True) if options.use_cache else None
+
+    if options.cdr:
+        loaded = ((pdb, BioPose(pdb, cache=cache)) for pdb in pdbs)
+    else:
+        #Sequences are read in parallel, and from the structure cache without building structures if --use_cache.
+        loaded = BatchLoader(pdbs, 'sequences', processes=options.processes, cache=True if options.use_cache else None)
+
+    for pdb, pose_or_sequences in loaded:
         #print "Reading "+pdb
-        biopose = BioPose(pdb)
-        biostructure = biopose.structure()
         ab_info = AntibodyStructure()
         if options.cdr:
-            seq = ab_info.get_cdr_seq(biopose, options.cdr.upper())
+            seq = ab_info.get_cdr_seq(pose_or_sequences, options.cdr.upper())
 
             sequences[path.get_decoy_name(pdb)+"_"+options.cdr] = seq
             ordered_ids.append(path.get_decoy_name(pdb)+"_"+options.cdr)
         else:
-            for biochain in biostructure[0]:
-                if options.chain and biochain.id != options.chain:
-                    continue
-                if util.get_chain_length(biochain) == 0:
+            for chain_id, seq in pose_or_sequences.items():
+                if options.chain and chain_id != options.chain:
                     continue
-                seq = util.get_seq_from_biochain(biochain)
                 if not seq:
                     print("Sequence not found for: ", path.get_decoy_name(pdb))
                     continue
@@ -172,7 +187,7 @@ if __name__ == "__main__":
                 if options.skip_chain_output:
                     out_id = path.get_decoy_name(pdb)
                 else:
-                    out_id = path.get_decoy_name(pdb)+"_"+biochain.id
+                    out_id = path.get_decoy_name(pdb)+"_"+chain_id
                 sequences[out_id] = seq
                 ordered_ids.append(out_id)
 
@@ -3,6 +3,7 @@
 import os,sys
 from jade2.basic.path import *
 import jade2.rosetta_jade.ScoreFiles as score_utils
+from jade2.rosetta_jade.score_selection import get_top_n
 import pandas as pd
 import seaborn.apionly as seaborn
 import matplotlib as mpl
@@ -88,14 +89,8 @@ if __name__ == "__main__":
     if options.get_top:
 
         ## Post-Sequon Total Energy
-        df.reset_index().set_index(['position', 'post-sequon_total_energy'], inplace=True)
-        df.sort_index().reset_index(inplace=True)
-
-        top_scoring = df.groupby('position').head(1)
-        top_scoring.reset_index(inplace=True)
-        top_scoring.set_index('post-sequon_total_energy', inplace=True)
-        top_scoring.sort_index(inplace=True)
-        top_scoring.reset_index(inplace=True)
+        top_scoring = get_top_n(df, 'post-sequon_total_energy', 1, groupby='position')
+        top_scoring = top_scoring.sort_values('post-sequon_total_energy')
 
         paths_top = top_scoring['decoy']
         scores_top = top_scoring['post-sequon_total_energy']
@@ -119,14 +114,8 @@ if __name__ == "__main__":
             shutil.copy(get_decoy_path(str(tup[1])), outdir+'/'+name)
 
         ## Post-Glycan Total Energy
-        df.reset_index().set_index(['position', 'post-model_total_energy'], inplace=True)
-        df.sort_index().reset_index(inplace=True)
-
-        top_scoring = df.groupby('position').head(1)
-        top_scoring.reset_index(inplace=True)
-        top_scoring.set_index('post-model_total_energy', inplace=True)
-        top_scoring.sort_index(inplace=True)
-        top_scoring.reset_index(inplace=True)
+        top_scoring = get_top_n(df, 'post-model_total_energy', 1, groupby='position')
+        top_scoring = top_scoring.sort_values('post-model_total_energy')
 
         paths_top = top_scoring['decoy']
         scores_top = top_scoring['post-model_total_energy']
@@ -153,11 +142,8 @@ if __name__ == "__main__":
 
 
         ## Top 15 Scoring Per-position
-        top_scoring = df.groupby('position').head(15)
-        top_scoring.reset_index(inplace=True)
-        top_scoring.set_index('post-model_total_energy', inplace=True)
-        top_scoring.sort_index(inplace=True)
-        top_scoring.reset_index(inplace=True)
+        top_scoring = get_top_n(df, 'post-model_total_energy', 15, groupby='position')
+        top_scoring = top_scoring.sort_values('post-model_total_energy')
 
         paths = top_scoring['decoy']
         scores = top_scoring['post-model_total_energy']
@@ -393,8 +379,7 @@ if __name__ == "__main__":
         stats2['post_glycan_min_rank'] = stats2.index
 
         # Post - Glycan Total Energy (Top 1% Means)
-        top = df.reset_index().set_index(['selection', 'post-model_total_energy']).sort_index().groupby(
-            'selection').head(25).reset_index()
+        top = get_top_n(df.reset_index(), 'post-model_total_energy', 25, groupby='selection')
         test2 = top.groupby('selection').describe()
 
         stats2 = stats2.set_index('selection').sort_index()
@@ -3,7 +3,7 @@
 
 import os,json,re,glob,sys
 from argparse import ArgumentParser
-from jade2.rosetta_jade.score_util import parse_decoy_scores
+from jade2.rosetta_jade.decoy_scores import read_all_decoy_scores, write_json_scorefile
 
 def get_pdbs(argu):
     if os.path.isdir(argu):
@@ -29,6 +29,15 @@ def get_parser():
                         help = "A directory, a PDBLIST, and/or a list of filenames",
                         default = [],
                         nargs="*")
+
+    parser.add_argument("-j", "--processes",
+                        help = "Number of processes to read decoys with.  Default is all cores for large sets of decoys.",
+                        type = int)
+
+    parser.add_argument("--metrics",
+                        help = "Also read the metric lines written after the pose energies table.",
+                        default = False,
+                        action = "store_true")
     return parser
 
 if __name__ == "__main__":
@@ -50,26 +59,10 @@ if __name__ == "__main__":
 
     #print("\n".join(decoys))
 
-    if options.prefix:
-        OUTFILE = open(options.prefix+"score.json", 'w')
-    else:
-        OUTFILE = open(options.prefix + "score.json", 'w')
-
-    scores = []
-    decoy_num = 1
-    print("Reading",len(decoys), "decoys")
-    for decoy in decoys:
-        if decoy_num % 50 == 0:
-            print("Decoy",decoy_num)
-        score_dict = parse_decoy_scores(decoy)
+    scores = read_all_decoy_scores(decoys, options.processes, metrics=options.metrics)
+    for decoy, score_dict in zip(decoys, scores):
         if not score_dict:
             print("decoy", decoy, "has no score")
-        if score_dict:
-            OUTFILE.write(json.dumps(score_dict, sort_keys=True)+"\n")
-
-        decoy_num+=1
-
-    #OUTFILE.write("\n".join(json.dumps(scores)))
 
-    OUTFILE.close()
+    write_json_scorefile(options.prefix+"score.json", scores, sort_keys=True)
     print("Done")
\ No newline at end of file
@@ -12,6 +12,12 @@ import dash_core_components as dcc
 from dash.dependencies import Input, Output
 import jade2.rosetta_jade.ScoreFiles as scores
 import jade2.rosetta_jade.score_util as score_util
+from jade2.rosetta_jade.score_warehouse import ScoreWarehouse
+from jade2.basic.dataframe.compact import compact_dataframe, print_memory_report, default_path_columns
+from jade2.basic.figure.reduction import *
+from jade2.basic.ComputationCache import ComputationCache, DEFAULT_MAX_BYTES
+from jade2.basic.threading.CopyQueue import CopyQueue
+from jade2.rosetta_jade.score_selection import is_ascending, get_top_n_indices
 from jade2.pymol_jade import PyMolScriptWriter
 import jade2.basic.path as jp
 from jade2.basic.sequence import calculate_mw
@@ -19,7 +25,7 @@ from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
 from typing import *
 import numpy as np
 import pandas
-import os,sys, pathlib, re
+import os,sys, pathlib, re, subprocess
 from collections import defaultdict
 
 def get_directories(inpath):
@@ -91,6 +97,15 @@ def fix_facetting(fig, x, y, facet_row, facet_col):
 
 
 
+def launch_pymol(args):
+    """
+    Launch PyMOL with the given arguments without waiting for it.
+    """
+    try:
+        subprocess.Popen(['pymol'] + args)
+    except OSError as e:
+        print("Could not launch PyMOL: "+str(e))
+
 def change_font_dec(func):
     def font_up(*args, **kwargs):
         fig = func(*args, **kwargs)
@@ -173,9 +188,14 @@ class DashPlot:
 
     outdir = "analysis_cache"
 
-    def __init__(self, data, hover_name="decoy_path", outdir="analysis_cache", pymol_cutoff=100, skip_box_copy = False, combined_copy=False):
+    def __init__(self, data, hover_name="decoy_path", outdir="analysis_cache", pymol_cutoff=100, skip_box_copy = False, combined_copy=False,
+                 max_points=MAX_POINTS, keep_top_n=100, cache_bytes=DEFAULT_MAX_BYTES, link_copies=True):
         self.data = data
+        self.data_version = 0
+        self.cache = ComputationCache(cache_bytes)
         self.hover_name = hover_name
+        self.max_points = max_points
+        self.keep_top_n = keep_top_n
         self.outdir = outdir
         self.box_selection_pymol_cutoff = pymol_cutoff
         self.skip_box_copy = skip_box_copy
@@ -190,10 +210,111 @@ class DashPlot:
         }
 
         self.combined_copy = combined_copy
+        self.copy_queue = CopyQueue(link=link_copies)
 
     def get_all_plot_inputs(self, type):
         return self.dropbox_dict[type] + [d for d in self.extra_columns[type]]
 
+    ### Cached computations.  Keys include the data version, so setting new data never returns stale results. ###
+    def set_data(self, data):
+        self.data = data
+        self.data_version += 1
+        self.cache.clear()
+
+    def cached(self, kind, spec, compute):
+        return self.cache.get((self.data_version, kind, spec), compute)
+
+    def get_numeric(self, column):
+        return self.cached('numeric', column, lambda: get_numeric_values(self.data[column]))
+
+    def get_category_orders(self, categories):
+        """
+        Cached order_categories of the data.
+        """
+        return {c: self.cached('categories', c, lambda: order_categories(self.data, [c])[c]) for c in categories if c}
+
+    ### Data reduction.  Data larger than max_points are reduced before being sent to the browser. ###
+    def is_large(self):
+        return len(self.data) > self.max_points
+
+    def get_top_rows(self, columns):
+        """
+        Get the positions of the top decoys by total_score and by each plotted column.
+        These are never dropped from scatter plots, so they can always be clicked and copied.
+        """
+        rows = [np.array([], dtype=np.int64)]
+        for column in ['total_score'] + [c for c in columns if c]:
+            if column in self.data.columns and pandas.api.types.is_numeric_dtype(self.data[column]):
+                rows.append(self.cached('top', column, lambda: get_top_n_indices(self.get_numeric(column), self.keep_top_n, is_ascending(column))))
+        return np.unique(np.concatenate(rows))
+
+    def get_viewport(self, x, y, relayout):
+        """
+        Get the zoomed ranges of a 2D plot as a tuple of (column, low, high), empty if it is not zoomed.
+        """
+        viewport = []
+        if not relayout:
+            return tuple(viewport)
+        for axis, column in [('xaxis', x), ('yaxis', y)]:
+            if not column or column not in self.data.columns or not pandas.api.types.is_numeric_dtype(self.data[column]): continue
+            if axis+'.range[0]' in relayout:
+                low, high = relayout[axis+'.range[0]'], relayout[axis+'.range[1]']
+            elif axis+'.range' in relayout:
+                low, high = relayout[axis+'.range']
+            else:
+                continue
+            viewport.append((column, min(low, high), max(low, high)))
+        return tuple(viewport)
+
+    def get_viewport_rows(self, viewport):
+        """
+        Get the positions of the rows inside a viewport (see get_viewport).
+        """
+        def compute():
+            mask = np.ones(len(self.data), dtype=bool)
+            for column, low, high in viewport:
+                values = self.get_numeric(column)
+                mask &= (values >= low) & (values <= high)
+            return np.flatnonzero(mask)
+        return self.cached('viewport', viewport, compute)
+
+    def get_scatter_rows(self, columns, viewport=()):
+        """
+        Get the positions of the rows of a scatter plot, downsampled to keep sparse regions, extremes and the top decoys.
+        """
+        columns = tuple(c for c in columns if c)
+        def compute():
+            rows = self.get_viewport_rows(viewport) if viewport else np.arange(len(self.data))
+            if len(rows) <= self.max_points:
+                return rows
+            keep = np.flatnonzero(np.isin(rows, self.get_top_rows(columns)))
+            return rows[downsample_indices([self.get_numeric(c)[rows] for c in columns], self.max_points, keep=keep)]
+        return self.cached('scatter', (columns, viewport), compute)
+
+    def get_scatter_data(self, columns, viewport=()):
+        if not self.is_large() and not viewport:
+            return self.data
+        return self.data.iloc[self.get_scatter_rows(columns, viewport)]
+
+    def get_distribution_data(self, value_column, group_columns):
+        """
+        Get the order statistics of each group of a column for box, violin and KDE plots.
+        """
+        if not self.is_large() or not value_column:
+            return self.data
+        group_columns = tuple(c for c in group_columns if c and c != value_column)
+        def compute():
+            codes = self.data.groupby(list(group_columns), sort=False, observed=True, dropna=False).ngroup().to_numpy() if group_columns else None
+            return get_quantile_indices(self.get_numeric(value_column), codes)
+        return self.data.iloc[self.cached('quantiles', (value_column, group_columns), compute)]
+
+    def get_binned_histogram(self, x, y, color, histfunc, histnorm):
+        return self.cached('histogram', (x, y, color, histfunc, histnorm), lambda: aggregate_histogram(self.data, x, y, color, histfunc, histnorm))
+
+    def add_reduction_title(self, fig, data, description="shown"):
+        if len(data) < len(self.data):
+            fig.update_layout(title="{:,} of {:,} decoys {}".format(len(data), len(self.data), description))
+
     def get_all_plot_inputs2(self):
         inputs = []
         for type in self.dropbox_dict:
@@ -204,7 +325,7 @@ class DashPlot:
 
 
     # New Figures go here
-    def make_scatter(self,x, y, color, facet_col, facet_row, marginal_x, marginal_y, size, trendline, style, colorscale, fs):
+    def make_scatter(self,x, y, color, facet_col, facet_row, marginal_x, marginal_y, size, trendline, style, colorscale, fs, relayout=None):
         if not trendline or trendline == "Off":
             trendline = None
 
@@ -214,9 +335,14 @@ class DashPlot:
 
         #print(sorted(self.data['yield'].unique()))
 
+        #Zoomed viewports of unfaceted plots are fetched at full resolution if they fit.
+        if facet_col or facet_row:
+            relayout = None
+        data = self.get_scatter_data([x, y], self.get_viewport(x, y, relayout))
+
         try:
             fig =  px.scatter(
-                self.data,
+                data,
                 x=x,
                 y=y,
                 color=color,
@@ -229,7 +355,7 @@ class DashPlot:
                 trendline=trendline,
                 color_continuous_scale=colorscale,
                 color_discrete_sequence=px.colors.sequential.Jet,
-                category_orders = order_categories(self.data, categories)
+                category_orders = self.get_category_orders(categories)
             )
         except ImportError:
             print("Import error: {0}".format(err))
@@ -238,6 +364,10 @@ class DashPlot:
             size = 5.5
         fig.update_traces(marker=dict(size=size))
 
+        #Keep the zoom when the data is refetched, until the plotted columns change.
+        fig.update_layout(uirevision=str([x, y, facet_col, facet_row]))
+        self.add_reduction_title(fig, data)
+
         if style:
             fig.update_layout(template=style)
 
@@ -251,6 +381,9 @@ class DashPlot:
 
 
     def make_histogram(self,x, y, color,histfunc,histnorm,marginal, style, colorscale, fs):
+        if x and self.is_large():
+            return self.make_binned_histogram(x, y, color, histfunc, histnorm, style, fs)
+
         fig =  px.histogram(
             self.data,
             x=x,
@@ -261,7 +394,7 @@ class DashPlot:
             histfunc=histfunc,
             histnorm=histnorm,
             marginal=marginal,
-            category_orders = order_categories(self.data, [color])
+            category_orders = self.get_category_orders([color])
         )
         change_font(fig, fs)
         if style:
@@ -269,14 +402,39 @@ class DashPlot:
         return fig
 
 
+    def make_binned_histogram(self, x, y, color, histfunc, histnorm, style, fs):
+        """
+        Histogram binned server-side, so only the bars are sent.  Marginals are not drawn.
+        """
+        binned = self.get_binned_histogram(x, y, color, histfunc, histnorm)
+        label = get_histogram_label(y, histfunc or ("sum" if y else "count"))
+        fig = px.bar(
+            binned,
+            x=x,
+            y=label,
+            color=color,
+            height=700,
+            labels={label: histnorm if histnorm else label},
+            category_orders = self.get_category_orders([color])
+        )
+        fig.update_layout(bargap=0)
+        if pandas.api.types.is_numeric_dtype(binned[x]):
+            fig.update_traces(width=binned["width"].iloc[0])
+        change_font(fig, fs)
+        if style:
+            fig.update_layout(template=style)
+        fig.update_layout(title="{:,} decoys binned".format(len(self.data)))
+        return fig
+
     def make_3d_scatter(self, x, y, z, color, size, style, colorscale, fs):
 
         #A bit easier to see as a nice default
         if x and y and z and not color:
             color = z
 
+        data = self.get_scatter_data([x, y, z])
         fig =  px.scatter_3d(
-            self.data,
+            data,
             x = x,
             y= y,
             z = z,
@@ -284,11 +442,12 @@ class DashPlot:
             height=700,
             hover_name=self.hover_name,
             color_continuous_scale=colorscale,
-            category_orders = order_categories(self.data, [color])
+            category_orders = self.get_category_orders([color])
         )
         if not size:
             size = 1.75
         fig.update_traces(marker=dict(size=size))
+        self.add_reduction_title(fig, data)
         change_font(fig, fs)
         if style:
             fig.update_layout(template=style)
@@ -300,8 +459,9 @@ class DashPlot:
         else:
             box = False
 
+        data = self.get_distribution_data(y or x, [x if y else None, color, facet_row, facet_col])
         fig =  px.violin(
-            self.data,
+            data,
             x = x,
             y = y,
             height=700,
@@ -312,9 +472,10 @@ class DashPlot:
             violinmode=mode,
             points=points,
             box=box,
-            category_orders = order_categories(self.data, [color, facet_row, facet_col])
+            category_orders = self.get_category_orders([color, facet_row, facet_col])
         )
         fix_facetting(fig, x, y, facet_row, facet_col)
+        self.add_reduction_title(fig, data, "shown as quantiles")
         change_font(fig, fs)
         if style:
             fig.update_layout(template=style)
@@ -324,8 +485,9 @@ class DashPlot:
         if notched:
             notched = eval(notched)
 
+        data = self.get_distribution_data(y or x, [x if y else None, color, facet_row, facet_col])
         fig = px.box(
-            self.data,
+            data,
             x = x,
             y = y,
             height = 700,
@@ -336,25 +498,27 @@ class DashPlot:
             boxmode=mode,
             points=points,
             notched=notched,
-            category_orders = order_categories(self.data, [color, facet_row, facet_col])
+            category_orders = self.get_category_orders([color, facet_row, facet_col])
         )
 
         change_font(fig, fs)
         fix_facetting(fig, x, y, facet_row, facet_col)
+        self.add_reduction_title(fig, data, "shown as quantiles")
         if style:
             fig.update_layout(template=style)
         return fig
 
     def make_kde(self, x, group, hist, curve, rug, style, colorscale, fs):
 
+        reduced = self.get_distribution_data(x, [group])
         if group:
             data = []
             labels = []
-            for name, d in self.data.groupby(group):
+            for name, d in reduced.groupby(group):
                 labels.append(name)
                 data.append(d[x])
         else:
-            data = [self.data[x]]
+            data = [reduced[x]]
             labels = [x]
 
         if hist:
@@ -373,6 +537,7 @@ class DashPlot:
 
         fig = ff.create_distplot(data, labels, show_hist=hist, show_curve=curve, show_rug=rug, bin_size=.25)
         fig.update_layout(height=700)
+        self.add_reduction_title(fig, reduced, "shown as quantiles")
         change_font(fig, fs)
         if group:
             fig.update_layout(xaxis_title=x)
@@ -446,12 +611,22 @@ class DashPlot:
         LOG.close()
 
         print("Copying ", pdb_path, " into "+outdir)
-        os.system('cp '+selection['points'][0]['hovertext']+' '+outdir+"/"+pdb_path_new)
+        self.copy_queue.submit([(pdb_path, outdir+"/"+pdb_path_new)], self.open_clicked_decoy, "Clicked "+pdb_path_new)
+        return {}
+
+    def open_clicked_decoy(self, job):
+        """
+        Open a copied decoy in PyMOL, showing the selections written in it.
+        """
+        copied = job.get_copied()
+        if not copied:
+            return
+        pdb_path_new = copied[0]
         sele = ['hide sticks, polymer.protein']
 
         colors = ['magenta', 'green', 'blue', 'red', 'orange']
         selections = 0
-        for line in open(outdir+"/"+pdb_path_new):
+        for line in open(pdb_path_new):
             lineSP = line.strip().split()
             if len(lineSP) > 4 and lineSP[1] == "select":
                 sele_name = lineSP[2].strip(',')
@@ -465,11 +640,28 @@ class DashPlot:
 
         cmd = ";".join(sele)
         cmd+=";deselect"
-        #os.system('pymol '+outdir+"/"+pdb_path_new+f" {native}f"+f" -d '{cmd}' &")
         if native:
-            os.system('pymol ' + outdir + "/" + pdb_path_new + f" {native}" + f" -d '{cmd}' &")
+            launch_pymol([pdb_path_new, native, '-d', cmd])
         else:
-            os.system('pymol ' + outdir + "/" + pdb_path_new + f" -d '{cmd}' &")
+            launch_pymol([pdb_path_new, '-d', cmd])
+
+    def get_selected_points(self, x, y, selection, z = None):
+        """
+        Get the points of a box or lasso selection.  If the plot was downsampled,
+        the points are taken from all the data inside the selection, not just the drawn ones.
+        """
+        if z is not None or not self.is_large() or not self.hover_name:
+            return selection['points']
+        if not all(c in self.data.columns and pandas.api.types.is_numeric_dtype(self.data[c]) for c in [x, y]):
+            return selection['points']
+
+        xs = self.get_numeric(x)
+        ys = self.get_numeric(y)
+        rows = get_selected_rows(xs, ys, selection)
+        if rows is None:
+            return selection['points']
+        hover = self.data[self.hover_name].to_numpy()
+        return [{'hovertext': hover[i], 'x': xs[i], 'y': ys[i]} for i in rows]
 
     def copy_decoys(self, x, y, selection, z = None):
         #print("args:",args)
@@ -484,7 +676,7 @@ class DashPlot:
             button_id = ctx.triggered[0]['prop_id'].split('.')[0]
             if button_id != "scatter_graph":
                 return {}
-        points = selection['points']
+        points = self.get_selected_points(x, y, selection, z)
         pdbs = []
         outdir = self.outdir+'/grouped'
         if not os.path.exists(outdir):
@@ -553,6 +745,7 @@ class DashPlot:
             LOG = open(model_log, 'a')
 
         new_names = {}
+        pairs = []
         if not self.skip_box_copy:
             print("Copying box/lasso selection into new directory")
         for i, pdb_path in enumerate(pdbs):
@@ -571,44 +764,60 @@ class DashPlot:
 
             if not self.skip_box_copy:
                 if not self.combined_copy:
-                    os.system('cp '+pdb_path+' '+outdir+"/"+pdb_path_new)
+                    pairs.append((pdb_path, outdir+"/"+pdb_path_new))
                 else:
-                    os.system('cp ' + pdb_path + ' ' + outdir)
+                    pairs.append((pdb_path, outdir+"/"+os.path.basename(pdb_path)))
         LOG.close()
 
-        if len(pdbs) <= self.box_selection_pymol_cutoff:
-            #These could also have the same name from different groups.
-            #So do 1->N
-            scripter = PyMolScriptWriter(outdir)
-            first = True
-            first_name = new_names[pdbs[0]]
-            for i, pdb_path in enumerate(pdbs):
-                new_name = jp.get_decoy_name(new_names[pdb_path])
-                scripter.add_load_pdb(pdb_path, new_name)
-                if not first:
-                    scripter.add_align_to(new_name, first_name)
-                    scripter.add_line("center "+new_name)
-                first = False
-
-            if native and os.path.exists(native):
-                scripter.add_load_pdb("native", native)
-
-            #scripter.add_show("sticks")
-            #scripter.add_hide("(hydro)")
-            scripter.add_line('import os')
-            s = 'cat '+ model_log
-            scripter.add_line("os.system(\'"+s+"\' )")
-
-            s = 'head -n 1 ' +outlog
-            scripter.add_line("os.system(\'"+s+"\' )")
-
-            s = 'tail -n 1 ' +outlog
-            scripter.add_line("os.system(\'"+s+"\' )")
-            scripter.save_script()
-
-            os.system('pymol '+outdir+'/pml_script.pml &')
+        #Copies run in the background.  PyMOL opens the whole selection once they have all finished.
+        def on_done(job):
+            if len(pdbs) <= self.box_selection_pymol_cutoff:
+                self.open_grouped_decoys(outdir, pdbs, new_names, dict(pairs), model_log, outlog)
             os.system('cat '+model_log)
 
+        self.copy_queue.submit(pairs, on_done, os.path.basename(outdir))
+        return {}
+
+    def open_grouped_decoys(self, outdir, pdbs, new_names, copies, model_log, outlog):
+        """
+        Write one PyMOL script for a group of decoys, aligned to the first one, and open it.
+        Copies (original path: copied path) are loaded instead of the originals where they exist.
+        """
+        #These could also have the same name from different groups.
+        #So do 1->N
+        scripter = PyMolScriptWriter(outdir)
+        first = True
+        first_name = jp.get_decoy_name(new_names[pdbs[0]])
+        for i, pdb_path in enumerate(pdbs):
+            new_name = jp.get_decoy_name(new_names[pdb_path])
+            path = copies[pdb_path] if pdb_path in copies and os.path.exists(copies[pdb_path]) else pdb_path
+            scripter.add_load_pdb(path, new_name)
+            if not first:
+                scripter.add_align_to(new_name, first_name)
+                scripter.add_line("center "+new_name)
+            first = False
+
+        if native and os.path.exists(native):
+            scripter.add_load_pdb(native, "native")
+
+        #scripter.add_show("sticks")
+        #scripter.add_hide("(hydro)")
+        scripter.add_line('import os')
+        s = 'cat '+ model_log
+        scripter.add_line("os.system(\'"+s+"\' )")
+
+        s = 'head -n 1 ' +outlog
+        scripter.add_line("os.system(\'"+s+"\' )")
+
+        s = 'tail -n 1 ' +outlog
+        scripter.add_line("os.system(\'"+s+"\' )")
+        scripter.save_script()
+
+        launch_pymol([outdir+'/pml_script.pml'])
+
+    def get_copy_status(self, n_intervals):
+        return [html.P(status) for status in self.copy_queue.get_status()]
+
 def create_figure_tab(col_options: List[Dict[Any,str]], label: str, pt: str) -> dbc.Tab:
     """
     Create a tab for a particular figure type. Use the label.
@@ -671,7 +880,11 @@ def apply_layout(app, df_columns: List[str]):
                 create_figure_tab(col_options, "Box", "box"),
                 create_figure_tab(col_options, "3D Scatter", '3d_scatter')
             ])
-        ])
+        ]),
+
+        #Progress of background decoy copies.
+        html.Div(id='copy_status', style={'clear': 'both', 'font-size': 'small'}),
+        dcc.Interval(id='copy_status_interval', interval=1000)
     ])
 
 def get_options():
@@ -684,6 +897,10 @@ def get_options():
                         default="test",
                         nargs="*")
 
+    parser.add_argument("--warehouse", "-w",
+                        help="A SQLite score warehouse (created if needed).  Scorefiles are ingested into it incrementally "
+                             "and read back from it, so unchanged scorefiles are not re-parsed in later sessions. ")
+
     parser.add_argument("--highlights", "-e",
                         help="A TSV/CSV file with a PDB name and experimental metrics columns.  They can be numerical or otherwise. "
                              "Must have header. Used for subsetting or coloring based on results. Does not need every PDB. decoy should be the column with the decoy name, including 0001 or whatever.",
@@ -728,11 +945,50 @@ def get_options():
                         action = "store_true",
                         default = False)
 
+    parser.add_argument("--no_link",
+                        help = "Always copy decoys.  By default, decoys on the same file system as the output directory are hard-linked instead.",
+                        action = "store_true",
+                        default = False)
+
+    parser.add_argument("--max_points",
+                        help = "Plots of more decoys than this are reduced before being sent to the browser: "
+                               "binned histograms, quantiles for box/violin/KDE and downsampled scatter plots. "
+                               "Zoomed scatter plots are refetched at full resolution when they fit.",
+                        default = MAX_POINTS,
+                        type = int)
+
+    parser.add_argument("--keep_top_n",
+                        help = "Number of top decoys (by total_score and each plotted score term) always kept in downsampled scatter plots",
+                        default = 100,
+                        type = int)
+
+    parser.add_argument("--cache_mb",
+                        help = "Memory used to cache plot computations (views, downsampled rows, bins) across callbacks and browser sessions",
+                        default = DEFAULT_MAX_BYTES // 1024 ** 2,
+                        type = int)
+
+    parser.add_argument("--compact",
+                        help = "Make the loaded data memory-compact: float32 scores, categorical strings, "
+                               "and split path columns (except the hover name).  Use for very large runs.",
+                        action = "store_true",
+                        default = False)
+
     options = parser.parse_args()
     return options
 
 
 
+def get_score_path_and_subset(s) -> Tuple[str, str]:
+    """
+    Split a scorefile argument of scorefile_path or scorefile_path=subset_name.
+    The subset defaults to the last directory in the path.
+    """
+    if '=' not in s:
+        return s, pathlib.PurePath(s).parent.name
+    else:
+        s2 = s.split('=')
+        return s2[0], s2[1]
+
 def read_and_drop_unique_columns(scorefiles) ->pandas.DataFrame:
     """
     Here, we get the union of columns, drop any unique columns, and then concat the result
@@ -746,15 +1002,7 @@ def read_and_drop_unique_columns(scorefiles) ->pandas.DataFrame:
     dfs = []
     for s in scorefiles:
         print("Reading",s)
-        score_path = ""
-        subset_name = ""
-        if '=' not in s:
-            score_path = s
-            subset_name = pathlib.PurePath(s).parent.name
-        else:
-            s2 = s.split('=')
-            score_path = s2[0]
-            subset_name = s2[1]
+        score_path, subset_name = get_score_path_and_subset(s)
 
         if score_path.split('.')[-1] == "csv":
             df = score_util.get_dataframe_from_csv(score_path)
@@ -781,6 +1029,20 @@ def read_and_drop_unique_columns(scorefiles) ->pandas.DataFrame:
 
     return out_df
 
+def read_from_warehouse(scorefiles, db_path) ->pandas.DataFrame:
+    """
+    Ingest the scorefiles into a score warehouse (only new or changed data is parsed) and read them back.
+    Like read_and_drop_unique_columns, only the columns common to all scorefiles are kept.
+    :param scorefiles:
+    :param db_path:
+    :return:
+    """
+    paths_subsets = [get_score_path_and_subset(s) for s in scorefiles]
+    with ScoreWarehouse(db_path) as warehouse:
+        for score_path, subset_name in paths_subsets:
+            warehouse.ingest(score_path, subset_name, verbose=True)
+        return warehouse.query(scorefiles=[p for p, subset in paths_subsets], common_columns=True)
+
 if __name__ == "__main__":
     #app = dash.Dash(
     #    __name__, external_stylesheets=["https://codepen.io/chriddyp/pen/bWLwgP.css"]
@@ -800,18 +1062,12 @@ if __name__ == "__main__":
     if options.scorefile == "test":
         df = px.data.tips()
         hover_name= "day"
+    elif options.warehouse:
+        df = read_from_warehouse(options.scorefile, options.warehouse)
     elif len(options.scorefile) > 1:
         df = read_and_drop_unique_columns(options.scorefile)
     else:
-        s = options.scorefile[0]
-        if '=' in s:
-            s2 = s.split('=')
-            score_path = s2[0]
-            subset_name = s2[1]
-
-        else:
-            score_path = s
-            subset_name = pathlib.PurePath(s).parent.name
+        score_path, subset_name = get_score_path_and_subset(options.scorefile[0])
 
         print("Reading Single Scorefile:", score_path)
         if score_path.split('.')[-1] == "csv":
@@ -865,15 +1121,24 @@ if __name__ == "__main__":
         df = df.merge(df2, how="outer", on="decoy").fillna(0)
 
     if options.sequence_column in df.columns:
-        df["MW (kDa)"] = df[options.sequence_column].apply(calculate_mw)
+        #Designs share sequences, so each unique sequence is only calculated once.
+        sequences = df[options.sequence_column]
+        df["MW (kDa)"] = sequences.map({seq: calculate_mw(seq) for seq in sequences.unique()})
 
         print("Added molecular weight data as MW (kDa)")
 
+    if options.compact:
+        #The hover name is the path decoys are copied from, so it is kept whole.
+        compact_df = compact_dataframe(df, path_columns=[c for c in default_path_columns if c != hover_name])
+        print_memory_report(compact_df, df)
+        df = compact_df
+
     #print(df['decoy'])
     apply_layout(app, df)
 
     #DO ALL YOUR DF MANIPULATIONS ABOVE THIS LINE!
-    p = DashPlot(df, hover_name, options.outdir, int(options.box_selection_pymol_cutoff), options.skip_box_copy, not options.split_copy)
+    p = DashPlot(df, hover_name, options.outdir, int(options.box_selection_pymol_cutoff), options.skip_box_copy, not options.split_copy,
+                 options.max_points, options.keep_top_n, options.cache_mb * 1024 ** 2, not options.no_link)
     if not os.path.exists(p.outdir):
         os.mkdir(p.outdir)
 
@@ -882,10 +1147,14 @@ if __name__ == "__main__":
     df.to_csv(p.outdir+"/"+"current_data.csv")
     col_options = [dict(label=x, value=x) for x in df.columns]
 
+    app.callback(Output('copy_status', 'children'), Input('copy_status_interval', 'n_intervals'))(p.get_copy_status)
+
     #Decorate the given figure type
 
     for pt in DashPlot.dropbox_dict:
-        app.callback(Output(pt+"_graph", "figure"), [Input(pt+"_"+d, "value") for d in p.get_all_plot_inputs(pt)], [Input(d, "value") for d in p.style_options])(p.figure_dict[pt])
+        #Zooming a scatter plot refetches its viewport.
+        viewport = [Input(pt+"_graph", "relayoutData")] if pt == "scatter" else []
+        app.callback(Output(pt+"_graph", "figure"), [Input(pt+"_"+d, "value") for d in p.get_all_plot_inputs(pt)], [Input(d, "value") for d in p.style_options]+viewport)(p.figure_dict[pt])
         if pt == "scatter":
             app.callback(Output(pt+'_store', 'data'), [Input(pt+"_"+d, "value") for d in ["x", "y"]],Input(pt+"_graph", 'clickData'))(p.copy_decoy_scatter)
             app.callback(Output(pt+'_lasso_store', 'data'), [Input(pt+"_"+d, "value") for d in ["x", "y"]],Input(pt+"_graph", 'selectedData'))(p.copy_decoys_scatter)
@@ -13,16 +13,52 @@
 
 from argparse import ArgumentParser
 from jade2.pymol_jade.PyMolScriptWriter import *
-from jade2.rosetta_jade.ScoreFiles import ScoreFile
+from jade2.rosetta_jade.ScoreFiles import ScoreFile, load_scorefiles, get_scorefile_stats
+from jade2.rosetta_jade.score_selection import is_ascending
 from jade2.basic.figure.creation import *
 
 import os
+import heapq
 
 ########################################################################
 
 def printVerbose(s):
     print(s)
 
+def follow_top_decoys(sf, scoretypes, top_n, high_to_low, interval):
+    """
+    Print the top decoys of each scoretype every time new decoys are written to the scorefile.
+    Keeps a running top N per scoretype, so each update only costs the new decoys.
+    """
+    if top_n == -1:
+        top_n = 10
+
+    top = defaultdict(list)
+    def add(columns):
+        for term in scoretypes:
+            if term not in columns: continue
+            reverse = high_to_low or not is_ascending(term)
+            pairs = [(v, d) for v, d in zip(list(columns[term]), list(columns[sf.decoy_field_name])) if v == v]
+            select = heapq.nlargest if reverse else heapq.nsmallest
+            top[term] = select(top_n, top[term] + pairs, key=lambda x: x[0])
+
+    def show():
+        for term in scoretypes:
+            if term not in top: continue
+            print("\nBy " + term + " ("+repr(sf.get_decoy_count())+" decoys)")
+            for o in top[term]:
+                print("%.2f" % o[0] + "\t" + o[1])
+
+    add(sf.columns)
+    show()
+    try:
+        for df in sf.follow(interval):
+            print("\n" + repr(len(df)) + " new decoys")
+            add(df)
+            show()
+    except KeyboardInterrupt:
+        pass
+
 def get_parser():
 
     parser = ArgumentParser(
@@ -78,6 +114,10 @@ def get_parser():
                         type=str,
                         help="Directory for PDBs if different than the directory of the scorefile")
 
+    parser.add_argument("--processes", "-j",
+                        type=int,
+                        help="Processes to use when combining scorefiles of a directory. Default is all cores.")
+
     parser.add_argument("--strip_last_inc",
                         default=False,
                         action="store_true",
@@ -129,6 +169,17 @@ def get_parser():
                              action = "store_true")
 
 
+    output_opts.add_argument("--follow",
+                             default=False,
+                             action="store_true",
+                             help="Keep reading the scorefile as a running job writes to it, printing the top -n of each scoretype "
+                                  "whenever new decoys land.  Only new lines are parsed.  Ctrl-C to stop.")
+
+    output_opts.add_argument("--follow_interval",
+                             default=10.0,
+                             type=float,
+                             help="Seconds between checks for new decoys when using --follow.")
+
     output_opts.add_argument("--prefix",
                              default="",
                              help="Prefix to use for any file output. Do not include any _")
@@ -171,29 +222,56 @@ def get_parser():
     return parser
 ########################################################################
 
+def print_summary(stats, prefix=""):
+    """
+    Print the stats of ScoreFile.get_stats or get_scorefile_stats as a table.
+    """
+    if not stats:
+        return
+    max_width = max([len(x) for x in list(stats.keys())])
+    fmt = "%*s:  %4s  %10s  %10s  %10s  %10s  %10s"
+    print("SUMMARY:  " +prefix+ "  "+ fmt % (max_width, "TERM", "n", "Min", "Max", "Mean", "Median", "StdDev"))
+
+    for column in stats:
+        if column == "top_n_by_10": continue
+        v = stats[column]
+        for f in ['min', 'max', 'mean', 'median', 'stddev']:
+            if not v[f] == None:
+                v[f] = "%.3f" % v[f]
+        print("SUMMARY:  " +prefix+ "  "+ fmt % (max_width, column, v['n'], v['min'], v['max'], v['mean'], v['median'], v['stddev']))
+
 def main():
 
     parser = get_parser()
     global options
     options = parser.parse_args()
 
-    #Combine SF using pandas.
-    # Replace name with path
-    # Write out new json file.  Load this for analysis.
+    #Summaries of whole scorefiles (or of every scorefile in a directory) are streamed, so they are never loaded.
+    if options.summary and not options.decoy_names and not options.follow and "-" not in options.scorefiles:
+        if os.path.isdir(options.scorefiles[0]):
+            if len(options.scorefiles) > 1:
+                sys.exit("Can only combine all scorefiles in a single path.")
+            groups = [(options.scorefiles[0], get_scorefiles_recursively(options.scorefiles[0]))]
+        else:
+            groups = [(f, [f]) for f in options.scorefiles if os.path.isfile(f)]
+        for name, scorefiles in groups:
+            printVerbose("    Scorefile: %s" % name)
+            print_summary(get_scorefile_stats(scorefiles, options.scoretypes, processes=options.processes), options.prefix)
+        return
+
+    #Combine all scorefiles in a directory.  Parsed in parallel and merged in memory.
+    # The combined json is still written for reference.
+    combined = None
     if os.path.isdir(options.scorefiles[0]):
         if len(options.scorefiles) > 1:
             sys.exit("Can only combine all scorefiles in a single path.")
         print("Searching for .sc files.")
         scorefiles = get_scorefiles_recursively(options.scorefiles[0])
-        dfs = []
-        for s in scorefiles:
-
-            sf = ScoreFile(s, strip_last_inc=options.strip_last_inc, strip_prefix=options.strip_prefix)
-            df = sf.get_Dataframe()
-            df['decoy'] = os.path.dirname(s) + "/"+df['decoy']
-            dfs.append(df)
-        df = pandas.concat(dfs)
-        df.to_json(options.c_name+".json", orient='records', lines=True)
+        n_decoys, columns, failures = load_scorefiles(scorefiles, processes=options.processes,
+                                                      strip_last_inc=options.strip_last_inc,
+                                                      strip_prefix=options.strip_prefix)
+        combined = ScoreFile.from_columns(options.c_name+".json", n_decoys, columns)
+        combined.get_Dataframe().to_json(options.c_name+".json", orient='records', lines=True)
         options.scorefiles[0]=options.c_name+".json"
 
     if options.decoy_names:
@@ -212,27 +290,17 @@ def main():
         if filename != "":
             printVerbose("    Scorefile: %s" % filename)
 
-        if filename != "-" and not os.path.isfile(filename):
+        if combined:
+            sf = combined
+        elif filename != "-" and not os.path.isfile(filename):
             print("File not found:", filename)
             continue
-
-        sf = ScoreFile(filename, strip_last_inc=options.strip_last_inc, strip_prefix=options.strip_prefix)
+        else:
+            sf = ScoreFile(filename, strip_last_inc=options.strip_last_inc, strip_prefix=options.strip_prefix)
 
         # Update Decoys
         if options.decoy_names:
-            decoy_dict = defaultdict()
-            new_decoy_list = []
-            #print sf.decoys
-
-            #Pre-organize data
-            for r in sf.decoys:
-                decoy_dict[r[sf.decoy_field_name]] = r
-
-
-            for name in options.decoy_names:
-                new_decoy_list.append(decoy_dict[name])
-
-            sf.decoys = new_decoy_list
+            sf.select_decoys(options.decoy_names)
 
         df = sf.get_Dataframe()
 
@@ -240,6 +308,10 @@ def main():
         printVerbose("  Score terms: %s" % ", ".join(sf.get_scoreterm_names()))
         printVerbose("")
 
+        if options.follow:
+            follow_top_decoys(sf, options.scoretypes, options.top_n, options.high_to_low, options.follow_interval)
+            continue
+
         #Optionally make the output directory.
         if options.outdir and not os.path.exists(options.outdir):
             os.mkdir(options.outdir)
@@ -266,25 +338,15 @@ def main():
 
         ### Stats summary
         if options.summary:
-            stats = sf.get_stats(options.scoretypes, decoy_names)
-            max_width = max([len(x) for x in list(stats.keys())])
-            fmt = "%*s:  %4s  %10s  %10s  %10s  %10s  %10s"
-            print("SUMMARY:  " +options.prefix+ "  "+ fmt % (max_width, "TERM", "n", "Min", "Max", "Mean", "Median", "StdDev"))
-
-            for column in stats:
-                if column == "top_n_by_10": continue
-                v = stats[column]
-                for f in ['min', 'max', 'mean', 'median', 'stddev']:
-                    if not v[f] == None:
-                        v[f] = "%.3f" % v[f]
-                print("SUMMARY:  " +options.prefix+ "  "+ fmt % (max_width, column, v['n'], v['min'], v['max'], v['mean'], v['median'], v['stddev']))
+            print_summary(sf.get_stats(options.scoretypes, decoy_names), options.prefix)
             continue
 
         ### Default score list handler
         scores = sf.get_scoreterms(options.scoretypes)
+        decoy_name_set = set(decoy_names)
         out = []
         for decoy_name in scores:
-            if not decoy_name in decoy_names: continue
+            if not decoy_name in decoy_name_set: continue
             terms = scores[decoy_name]
             decoy_scores = [("decoy", decoy_name)]
             for term in terms:
@@ -303,30 +365,27 @@ def main():
                 ordered = sf.get_ordered_decoy_list(term, decoy_names=decoy_names, top_n=options.top_n, reverse=options.high_to_low)
 
                 if options.pdb_dir:
-                    top_decoy_paths = [get_decoy_path(options.pdb_dir + "/" + o[1]) for o in ordered]
+                    top_decoy_paths = get_decoy_paths([options.pdb_dir + "/" + o[1] for o in ordered])
                 elif os.path.dirname(filename):
-                    top_decoy_paths = [get_decoy_path(os.path.dirname(filename) + "/" + o[1]) for o in ordered]
+                    top_decoy_paths = get_decoy_paths([os.path.dirname(filename) + "/" + o[1] for o in ordered])
                 else:
-                    top_decoy_paths = [get_decoy_path(o[1]) for o in ordered]
+                    top_decoy_paths = get_decoy_paths([o[1] for o in ordered])
 
-                passed_cutoff = []
-                for j in range(len(ordered)):
-                    if options.high_to_low==False and ordered[j][0] <= cutoff:
-                        passed_cutoff.append([ordered[j][1],[ordered[j][0]]])
-                    elif options.high_to_low==True and ordered[j][0] >= cutoff:
-                        passed_cutoff.append([ordered[j][1], [ordered[j][0]]])
+                if is_ascending(term) and not options.high_to_low:
+                    passed_cutoff = [[o[1], [o[0]]] for o in ordered if o[0] <= cutoff]
+                else:
+                    passed_cutoff = [[o[1], [o[0]]] for o in ordered if o[0] >= cutoff]
 
                 if passed_all_decoys == []:
                     passed_all_decoys = passed_cutoff
                 else:
                     curr_passed_all = []
+                    passed_all_by_name = dict([(d[0], d) for d in passed_all_decoys])
                     for decoy in passed_cutoff:
-                        decoy_name = decoy[0]
-                        for passed_all_decoy in passed_all_decoys:
-                            if decoy_name == passed_all_decoy[0]:
-                                passed_all_decoy[1] += decoy[1]
-                                curr_passed_all.append(passed_all_decoy)
-                                break
+                        passed_all_decoy = passed_all_by_name.get(decoy[0])
+                        if passed_all_decoy:
+                            passed_all_decoy[1] += decoy[1]
+                            curr_passed_all.append(passed_all_decoy)
                     passed_all_decoys = curr_passed_all
 
             scoretypes = " ".join(options.scoretypes)
@@ -354,11 +413,11 @@ def main():
                 ordered = sf.get_ordered_decoy_list(term, decoy_names=decoy_names, top_n=options.top_n, reverse=options.high_to_low)
 
                 if options.pdb_dir:
-                    top_decoy_paths = [get_decoy_path(options.pdb_dir + "/" + o[1]) for o in ordered]
+                    top_decoy_paths = get_decoy_paths([options.pdb_dir + "/" + o[1] for o in ordered])
                 elif os.path.dirname(filename):
-                    top_decoy_paths = [get_decoy_path(os.path.dirname(filename) + "/" + o[1]) for o in ordered]
+                    top_decoy_paths = get_decoy_paths([os.path.dirname(filename) + "/" + o[1] for o in ordered])
                 else:
-                    top_decoy_paths = [get_decoy_path(o[1]) for o in ordered]
+                    top_decoy_paths = get_decoy_paths([o[1] for o in ordered])
 
                 for o in ordered:
                     print("%.2f" % o[0] +"\t"+o[1])
@@ -375,17 +434,14 @@ def main():
 
         ### Top 10 by ten
         if "top_n_by_10" in options.scoretypes and options.top_n_by_10_scoretype in scoreterms:
-            top_p = int(len(decoy_names) / 10)
-            top_decoys = [o[1] for o in sf.get_ordered_decoy_list("total_score", decoy_names=decoy_names, top_n=top_p, reverse=options.high_to_low)]
-            top_by_n_decoys = [o for o in sf.get_ordered_decoy_list(options.top_n_by_10_scoretype, decoy_names=decoy_names, reverse=options.high_to_low) if
-                               o[1] in top_decoys][
-                              :options.top_n_by_10]
+            top_by_n_decoys = sf.get_ordered_decoy_list_by_percentile(options.top_n_by_10_scoretype, "total_score", .10, decoy_names,
+                                                                      options.top_n_by_10, options.high_to_low)
 
             print("\n\nTop " + options.top_n_by_10_scoretype + " by top 10% Total Score")
             print(options.top_n_by_10_scoretype + "\t" + "decoy" + "\t" + "total_score")
 
             for o in top_by_n_decoys:
-                print("%.2f\t" % o[0] + o[1] + "%.2f" % sf.get_score(o[1], "total_score"))
+                print("%.2f\t" % o[0] + o[1] + "\t%.2f" % sf.get_score(o[1], "total_score"))
 
         if options.pymol_session:
             print("Making PyMol Session ")
@@ -416,14 +472,9 @@ def main():
                 print("PDB DIR: " + pdb_dir)
 
                 if scoreterm == "top_n_by_10" and "top_n_by_10" in options.scoretypes and options.top_n_by_10_scoretype in scoreterms:
-                    top_p = int(len(decoy_names) / 10)
-                    top_decoys = [o[1] for o in
-                                  sf.get_ordered_decoy_list("total_score", decoy_names=decoy_names, top_n=int(options.top_n), reverse=options.high_to_low)]
-
                     top_by_n_decoys = [[o[0], pdb_dir + "/" + o[1]] for o in
-                                       sf.get_ordered_decoy_list(options.top_n_by_10_scoretype, decoy_names=decoy_names, reverse=options.high_to_low) if
-                                       o[1] in top_decoys][
-                                      :options.top_n_by_10]
+                                       sf.get_ordered_decoy_list_by_percentile(options.top_n_by_10_scoretype, "total_score", .10,
+                                                                               decoy_names, options.top_n_by_10, options.high_to_low)]
 
 
                     if len(top_by_n_decoys) == 0:
@@ -483,13 +534,9 @@ def main():
         if options.copy_top_models:
             for scoreterm in options.scoretypes:
                 if scoreterm == "top_n_by_10" and "top_n_by_10" in options.scoretypes and options.top_n_by_10_scoretype in scoreterms:
-                    top_p = int(len(decoy_names) / 10)
-                    top_decoys = [o[1] for o in
-                                  sf.get_ordered_decoy_list("total_score", decoy_names=decoy_names, top_n=int(options.top_n), reverse=options.high_to_low)]
                     top_by_n_decoys = [[o[0], pdb_dir + "/" + o[1]] for o in
-                                       sf.get_ordered_decoy_list(options.top_n_by_10_scoretype, decoy_names=decoy_names, reverse=options.high_to_low) if
-                                       o[1] in top_decoys][
-                                      :options.top_n_by_10]
+                                       sf.get_ordered_decoy_list_by_percentile(options.top_n_by_10_scoretype, "total_score", .10,
+                                                                               decoy_names, options.top_n_by_10, options.high_to_low)]
 
 
                     if len(top_by_n_decoys) == 0:
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+from argparse import ArgumentParser
+from jade2.rosetta_jade.score_warehouse import ScoreWarehouse
+from jade2.basic.path import get_scorefiles_recursively
+import pandas
+import os, sys
+
+def get_parser():
+    parser = ArgumentParser(description="Ingest scorefiles into a persistent SQLite score warehouse and query it. "
+                                        "Ingestion is incremental: unchanged scorefiles are skipped and appended-to "
+                                        "scorefiles only add their new decoys.")
+
+    parser.add_argument("database",
+                        help = "Path to the warehouse database.  Created if it does not exist.")
+
+    parser.add_argument("-s", "--scorefiles",
+                        help = "Scorefiles to ingest.  Directories are searched recursively for --ext files.  "
+                               "Use scorefile_path=subset_name to name the subset of a scorefile. "
+                               "Default subset is the scorefile's directory name.",
+                        default = [],
+                        nargs = "*")
+
+    parser.add_argument("--ext",
+                        help = "Scorefile extension used when searching directories",
+                        default = ".sc")
+
+    parser.add_argument("--subsets",
+                        help = "Only query these subsets",
+                        nargs = "*")
+
+    parser.add_argument("--where",
+                        help = "SQL filter on the score columns, such as 'dG_separated < -10 AND hbonds_int > 2'")
+
+    parser.add_argument("-t", "--scoretype",
+                        help = "Scoretype to get the top decoys of",
+                        default = "total_score")
+
+    parser.add_argument("-n", "--top_n",
+                        help = "Number of top decoys to get.  -1 is all of them.",
+                        default = 10,
+                        type = int)
+
+    parser.add_argument("--groupby",
+                        help = "Get the top decoys of each group of this column, such as subset")
+
+    parser.add_argument("--stats",
+                        help = "Print statistics of these scoretypes for each --groupby group instead of top decoys",
+                        nargs = "*")
+
+    parser.add_argument("--index",
+                        help = "Index these scoretypes for faster filtering and ordering",
+                        default = [],
+                        nargs = "*")
+
+    parser.add_argument("--list",
+                        help = "List the ingested scorefiles and exit",
+                        default = False,
+                        action = "store_true")
+
+    parser.add_argument("-o", "--outfile",
+                        help = "Write the result as a CSV")
+
+    return parser
+
+if __name__ == "__main__":
+    options = get_parser().parse_args()
+
+    with ScoreWarehouse(options.database) as warehouse:
+        if options.index:
+            warehouse.index_scoreterms(options.index)
+
+        for s in options.scorefiles:
+            path, subset = s.split('=') if '=' in s else (s, None)
+            if os.path.isdir(path):
+                for scorefile in get_scorefiles_recursively(path, options.ext):
+                    warehouse.ingest(scorefile, subset, verbose=True)
+            else:
+                warehouse.ingest(path, subset, verbose=True)
+
+        if options.list:
+            print(warehouse.get_sources().to_string())
+            sys.exit()
+
+        if options.stats:
+            if not options.groupby:
+                sys.exit("--stats requires --groupby")
+            df = warehouse.group_by(options.groupby, options.stats, where=options.where, subsets=options.subsets)
+        else:
+            columns = ['decoy', 'decoy_path', options.scoretype, 'subset']
+            if options.groupby and options.groupby not in columns:
+                columns.append(options.groupby)
+            df = warehouse.top_n(options.scoretype, options.top_n, options.groupby, columns,
+                                 where=options.where, subsets=options.subsets)
+
+    pandas.set_option('display.width', 250)
+    print(df.to_string())
+    if options.outfile:
+        df.to_csv(options.outfile, index=False)
+        print("Wrote " + options.outfile)
@@ -16,6 +16,7 @@ from jade2.RAbD_BM.AnalysisInfo import *
 
 # Rosetta Tools
 import jade2.rosetta_jade.FeaturesJsonCreator as json_creator
+from jade2.rosetta_jade.score_selection import get_top_n
 
 
 class CompareAntibodyDesignStrategies:
@@ -539,13 +540,9 @@ class CompareAntibodyDesignStrategies:
         Gets a dataframe Dataframe for top
         :rtype: pandas.DataFrame
         """
-        df = self.get_pandas_dataframe()
-        dfs = []
-        for strategy in self.get_strategies():
-            dfs.append(df["strategy" == strategy].sort_values(score_name)[0:self.top_n.get()-1])
-
-        df = PandasDataFrame.drop_duplicate_columns(pandas.concat(dfs))
-        return df
+        df = PandasDataFrame.drop_duplicate_columns(self.get_pandas_dataframe())
+        df = df[df["strategy"].isin(self.get_strategies())]
+        return get_top_n(df, score_name, self.top_n.get(), groupby="strategy")
 
     def get_top_dataframe_by_all_scores(self):
         """
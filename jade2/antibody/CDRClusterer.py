@@ -6,7 +6,8 @@ from pathlib import Path
 from typing import List, Union, DefaultDict, Tuple
 from collections import defaultdict
 
-from Bio.PDB.Polypeptide import is_aa
+import numpy
+
 from jade2.basic import path
 from jade2.basic.structure.BioPose import BioPose
 from jade2.basic.restype_definitions import RestypeDefinitions
@@ -56,19 +57,12 @@ class CDRClusterer:
         :param chain: str
         """
         self.dihedrals = defaultdict(list)
-        reslist = [i for i in self.pose.chain(chain, 0).get_residues() if
-                   i.id[1] in range(start - 1, end + 2) and is_aa(i, standard=False)]
-
-        for res in reslist[1:-1]:
-            resindex = reslist.index(res)
-            resnextindex = resindex + 1
-            resprevindex = resindex - 1
-            resnext = reslist[resnextindex]
-            resprev = reslist[resprevindex]
-
-            self.dihedrals['phi'].append(math.degrees(self.pose.phi(res, resprev)))
-            self.dihedrals['psi'].append(math.degrees(self.pose.psi(res, resnext)))
-            self.dihedrals['omega'].append(math.degrees(self.pose.omega(res, resnext, resprev, rosetta_definitions=False)))
+        reslist = [i for i in self.pose.get_aa_residues(chain, 0) if start - 1 <= i.id[1] <= end + 1]
+
+        #All dihedrals in one pass.  The first and last residues are only neighbors.
+        dihedrals = self.pose.get_backbone_dihedrals(reslist, rosetta_definitions=False)
+        for angle in ['phi', 'psi', 'omega']:
+            self.dihedrals[angle] = numpy.degrees(dihedrals[angle][1:-1]).tolist()
     
     def set_dihedrals_from_cdr(self, cdr_name: str, chain: str):
         start = self.regions[cdr_name][1]
@@ -6,9 +6,9 @@ from collections import defaultdict
 import sys
 import os
 import glob
-import copy
+import numpy as np
 
-from jade2.basic.structure.PythonPDB2 import PythonPDB2
+from jade2.basic.structure.PythonPDB2 import PythonPDB2, pdb_map_to_atoms
 from jade2.antibody import ab_db
 
 
@@ -92,9 +92,9 @@ def separate_proto_CDR4(pdb_path, output_dir, chain, overhang = 0, skip_present
     if not os.path.exists(output_dir):
         os.mkdir(output_dir)
 
-    if (has_chain(parent_PDB.get_pdb_map(), chain)):
+    if (has_chain(parent_PDB.get_atoms(), chain)):
         cdr4 = split_CDR4(parent_PDB, chain, overhang)
-        parent_PDB.set_pdb_map(cdr4)
+        parent_PDB.set_atoms(cdr4)
         parent_PDB.save_PDB(output_dir+"/"+pdb_name)
 
 def separate_pdb(pdb_path, output_dir, only_dimer = True):
@@ -103,7 +103,7 @@ def separate_pdb(pdb_path, output_dir, only_dimer = True):
     """
     pdb_name = pdb_path.split("/")[-1]
     parent_PDB = PythonPDB2(pdb_path)
-    if not (has_chain(parent_PDB.get_pdb_map(), "L") and has_chain(parent_PDB.get_pdb_map(), "H")):
+    if not (has_chain(parent_PDB.get_atoms(), "L") and has_chain(parent_PDB.get_atoms(), "H")):
 
 
         if only_dimer:
@@ -120,49 +120,45 @@ def separate_pdb(pdb_path, output_dir, only_dimer = True):
         parent_PDB.save_PDB(output_dir+"/FAB/"+pdb_name)
         #message(pdb_name, "FAB")
 
-        Fv_pdb_map = split_Fv(parent_PDB)
-        Fc_pdb_map = split_Fc(parent_PDB)
-        li_pdb_map = split_linker(parent_PDB)
+        Fv_atoms = split_Fv(parent_PDB)
+        Fc_atoms = split_Fc(parent_PDB)
+        li_atoms = split_linker(parent_PDB)
 
-        parent_PDB.set_pdb_map(Fc_pdb_map)
+        parent_PDB.set_atoms(Fc_atoms)
         parent_PDB.save_PDB(output_dir+"/Fc/"+pdb_name)
 
 
-        parent_PDB.set_pdb_map(Fv_pdb_map)
+        parent_PDB.set_atoms(Fv_atoms)
         parent_PDB.save_PDB(output_dir+"/Fv/"+pdb_name)
 
 
-        parent_PDB.set_pdb_map(li_pdb_map)
+        parent_PDB.set_atoms(li_atoms)
         parent_PDB.save_PDB(output_dir+"/linker/"+pdb_name)
 
-        liL_pdb_map = split_linker_L(parent_PDB)
-        liH_pdb_map = split_linker_H(parent_PDB)
+        liL_atoms = split_linker_L(parent_PDB)
+        liH_atoms = split_linker_H(parent_PDB)
 
-        if has_chain(liL_pdb_map, "L"):
-            parent_PDB.set_pdb_map(liL_pdb_map)
+        if has_chain(liL_atoms, "L"):
+            parent_PDB.set_atoms(liL_atoms)
             parent_PDB.save_PDB(output_dir+"/linker_L/"+pdb_name)
 
-        if has_chain(liH_pdb_map, "H"):
-            parent_PDB.set_pdb_map(liH_pdb_map)
+        if has_chain(liH_atoms, "H"):
+            parent_PDB.set_atoms(liH_atoms)
             parent_PDB.save_PDB(output_dir+"/linker_H/"+pdb_name)
 
         #message(pdb_name, "Fc, Fv, and linker")
 
 def has_Fc(parent_PDB):
-    pdb_map = parent_PDB.get_pdb_map()
-    for i in pdb_map:
-        if int(pdb_map[i]["residue_number"]) > 200:
-            return True
-        else:
-            continue
-    return False
+    return bool(np.any(parent_PDB.get_atoms()["residue_number"] > 200))
 
 
-def has_chain(pdb_map, chain):
-    for i in pdb_map:
-        if pdb_map[i]["chain"] == chain:
-            return True
-    return False
+def has_chain(atoms, chain):
+    """
+    Does the atom array (or pdb_map) have the chain
+    """
+    if not isinstance(atoms, np.ndarray):
+        atoms = pdb_map_to_atoms(atoms)
+    return bool(np.any(atoms["chain"] == chain))
 
 def message(pdb_name, type):
     print("Saved "+pdb_name+" as "+type)
@@ -170,85 +166,43 @@ def message(pdb_name, type):
 
 def split_Fc(parent_PDB):
     """
-    Split Fc from FAB.  Return new pdb_map to save
+    Split Fc from FAB.  Return new atom array to save
     """
-    pdb_map = parent_PDB.get_pdb_map()
-    pdb_map_cp = copy.deepcopy(parent_PDB.get_pdb_map())
-    for i in pdb_map:
-        if int(pdb_map[i]['residue_number']) < 153:
-            del pdb_map_cp[i]
-    return pdb_map_cp
+    atoms = parent_PDB.get_atoms()
+    return atoms[atoms['residue_number'] >= 153]
 
 def split_Fv(parent_PDB):
     """
-    Split Fv from FAB.  Return new pdb_map to save
+    Split Fv from FAB.  Return new atom array to save
     """
-    pdb_map = parent_PDB.get_pdb_map()
-    pdb_map_cp = copy.deepcopy(parent_PDB.get_pdb_map())
-    for i in pdb_map:
-        if int(pdb_map[i]['residue_number']) > 149:
-            del pdb_map_cp[i]
-    return pdb_map_cp
+    atoms = parent_PDB.get_atoms()
+    return atoms[atoms['residue_number'] <= 149]
 
 def split_CDR4(parent_PDB, chain, overhang = 0):
-    pdb_map = parent_PDB.get_pdb_map()
-    pdb_map_cp = copy.deepcopy(parent_PDB.get_pdb_map())
-    for i in pdb_map:
-        resnum = int(pdb_map[i]['residue_number'])
-        if pdb_map[ i ]['chain'] != chain:
-            del pdb_map_cp[ i ]
-            continue
-        if resnum < (82 - overhang) or resnum > (89 + overhang):
-
-            del pdb_map_cp[ i ]
-            continue
-    return pdb_map_cp
+    atoms = parent_PDB.get_atoms()
+    resnums = atoms['residue_number']
+    return atoms[(atoms['chain'] == chain) & (resnums >= (82 - overhang)) & (resnums <= (89 + overhang))]
+
+def get_linker_mask(atoms):
+    return (atoms['residue_number'] >= 149) & (atoms['residue_number'] <= 152)
 
 def split_linker(parent_PDB):
     """
     Split 4 Residue linker from FAB.  Linker may be longer than this, but I think this is about it.
     """
-    pdb_map = parent_PDB.get_pdb_map()
-    pdb_map_cp = copy.deepcopy(parent_PDB.get_pdb_map())
-    for i in pdb_map:
-        resnum = int(pdb_map[i]['residue_number'])
-        if resnum < 149 or resnum > 152:
-            del pdb_map_cp[i]
-    return pdb_map_cp
+    atoms = parent_PDB.get_atoms()
+    return atoms[get_linker_mask(atoms)]
 
 def split_linker_L(parent_PDB):
     """
     Split 4 Residue linker from FAB.  Linker may be longer than this, but I think this is about it.
     """
-    pdb_map = parent_PDB.get_pdb_map()
-    pdb_map_cp = copy.deepcopy(parent_PDB.get_pdb_map())
-    for i in pdb_map:
-        if pdb_map[i]['chain'] == "H":
-            del pdb_map_cp[i]
-            continue
-        resnum = int(pdb_map[i]['residue_number'])
-        if resnum < 149 or resnum > 152:
-            del pdb_map_cp[i]
-    return pdb_map_cp
+    atoms = parent_PDB.get_atoms()
+    return atoms[get_linker_mask(atoms) & (atoms['chain'] != "H")]
 
 def split_linker_H(parent_PDB):
     """
     Split 4 Residue linker from FAB.  Linker may be longer than this, but I think this is about it.
     """
-    pdb_map = parent_PDB.get_pdb_map()
-    pdb_map_cp = copy.deepcopy(parent_PDB.get_pdb_map())
-    for i in pdb_map:
-        if pdb_map[i]['chain'] == "L":
-            del pdb_map_cp[i]
-            continue
-        resnum = int(pdb_map[i]['residue_number'])
-        if resnum < 149 or resnum > 152:
-            del pdb_map_cp[i]
-    return pdb_map_cp
-
-
-
-
-
-
-
+    atoms = parent_PDB.get_atoms()
+    return atoms[get_linker_mask(atoms) & (atoms['chain'] != "L")]
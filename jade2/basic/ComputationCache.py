@@ -0,0 +1,123 @@
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+import numpy as np
+import pandas as pd
+
+#Default memory bound of a ComputationCache.
+DEFAULT_MAX_BYTES = 512 * 1024 ** 2
+
+
+def get_size(value: Any) -> int:
+    """
+    Get the approximate memory used by a cached value, in bytes.
+    Arrays and dataframes count their data buffers.  Containers count their items.
+
+    :param value: Any
+    :rtype: int
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage())
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(get_size(v) for v in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(get_size(k) + get_size(v) for k, v in value.items())
+    return sys.getsizeof(value)
+
+class ComputationCache(object):
+    """
+    A thread-safe, memory-bounded LRU cache of computed values.
+
+    Values are computed on a miss by get and the least recently used values are evicted once the cache holds more
+    than max_bytes.  If several threads (such as the callbacks of different browser sessions) miss the same key
+    at once, only one computes it and the others wait for its result.
+
+    Keys are any hashable, usually (data version, kind, spec), so that changing the data never returns stale values.
+
+    Example:
+        cache = ComputationCache(256 * 1024 ** 2)
+        rows = cache.get((version, 'top', 'total_score'), lambda: get_top_n_indices(values, 100))
+    """
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable):
+        return key in self._entries
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def get(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        Get the value of key, calling compute() to get (and cache) it on a miss.
+
+        :param key: Hashable
+        :param compute: function without arguments
+        :rtype: Any
+        """
+        while True:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._entries[key][0]
+                event = self._pending.get(key)
+                if event is None:
+                    event = self._pending[key] = threading.Event()
+                    self.misses += 1
+                    break
+            #Another thread is computing it.  If it failed or the value was too large to keep, compute it here.
+            event.wait()
+
+        try:
+            value = compute()
+            self.put(key, value)
+        finally:
+            with self._lock:
+                del self._pending[key]
+            event.set()
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        """
+        Cache a value, evicting the least recently used values to stay within max_bytes.
+        Values larger than max_bytes are not cached.
+
+        :param key: Hashable
+        :param value: Any
+        """
+        size = get_size(value)
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            while self._entries and self._bytes + size > self.max_bytes:
+                self._bytes -= self._entries.popitem(last=False)[1][1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get_stats(self) -> str:
+        return "{} cached values, {:.1f} MB, {} hits, {} misses".format(len(self), self._bytes / 1e6, self.hits, self.misses)
@@ -0,0 +1,250 @@
+from collections import OrderedDict
+from typing import Dict, List, Any
+
+import numpy as np
+import pandas as pd
+
+#Single-pass statistics that can be fed chunk by chunk and merged.
+# Count, mean and variance use Welford/Chan updates and min and max are tracked directly, so merging is exact.
+# Quantiles use a KLL sketch: values are kept exactly up to QuantileSketch.exact_size,
+# after which rank error stays within about 1% no matter how many values are added or merged.
+
+#Accuracy of a QuantileSketch.  Rank error is roughly 1.7 / k.
+DEFAULT_SKETCH_K = 256
+
+#Values kept exactly before a QuantileSketch starts compacting.
+DEFAULT_EXACT_SIZE = 100000
+
+
+class QuantileSketch(object):
+    """
+    A mergeable quantile sketch (KLL).
+
+    Values of level h stand for 2^h values each.  When the sketch is full, the first level over its capacity
+    is sorted and every other value (from a random offset) is promoted to the next level.
+    Until more than exact_size values have been added, nothing is compacted and quantiles are exact.
+
+    The random offsets use a seeded generator, so the same input gives the same sketch.
+    """
+    def __init__(self, k: int = DEFAULT_SKETCH_K, exact_size: int = DEFAULT_EXACT_SIZE, seed: int = 0):
+        self.k = k
+        self.exact_size = exact_size
+        self.n = 0
+        self.levels = [np.array([], dtype=np.float64)]
+        self._rng = np.random.RandomState(seed)
+
+    def __len__(self):
+        return self.n
+
+    def is_exact(self) -> bool:
+        return len(self.levels) == 1
+
+    def _get_capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * (2.0 / 3.0) ** depth)))
+
+    def _get_size(self) -> int:
+        return sum(len(values) for values in self.levels)
+
+    def _compress(self):
+        if self.is_exact() and self.n <= self.exact_size:
+            return
+        while self._get_size() > sum(self._get_capacity(h) for h in range(len(self.levels))):
+            for h in range(len(self.levels)):
+                if len(self.levels[h]) > self._get_capacity(h):
+                    self._compact(h)
+                    break
+
+    def _compact(self, h: int):
+        values = np.sort(self.levels[h])
+        #An odd value out stays at this level.
+        keep = values[-1:] if len(values) % 2 else values[:0]
+        if len(values) % 2:
+            values = values[:-1]
+        promoted = values[self._rng.randint(2)::2]
+
+        if h + 1 == len(self.levels):
+            self.levels.append(np.array([], dtype=np.float64))
+        self.levels[h] = keep
+        self.levels[h + 1] = np.concatenate([self.levels[h + 1], promoted])
+
+    def update(self, values):
+        """
+        Add values (NaN values are skipped).
+
+        :param values: array-like
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.n += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def merge(self, other: "QuantileSketch"):
+        """
+        Add the values of another sketch.
+
+        :param other: QuantileSketch
+        """
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.array([], dtype=np.float64))
+        for h, values in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], values])
+        self.n += other.n
+        self._compress()
+
+    def get_quantiles(self, qs) -> np.ndarray:
+        """
+        Get the values at quantiles qs (0-1): the value at 0-based rank floor(q * n) of the sorted values
+        (so the median of an even number of values is the upper middle value).  NaN if the sketch is empty.
+
+        :param qs: array-like
+        :rtype: np.ndarray
+        """
+        qs = np.atleast_1d(np.asarray(qs, dtype=np.float64))
+        if self.n == 0:
+            return np.full(len(qs), np.nan)
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(v), 2.0 ** h) for h, v in enumerate(self.levels)])
+        order = np.argsort(values, kind='stable')
+        values = values[order]
+        cumulative = np.cumsum(weights[order])
+
+        ranks = np.minimum(np.floor(qs * cumulative[-1]) + 1, cumulative[-1])
+        i = np.searchsorted(cumulative, ranks, side='left')
+        return values[np.clip(i, 0, len(values) - 1)]
+
+    def get_quantile(self, q: float) -> float:
+        return float(self.get_quantiles([q])[0])
+
+class StreamingStats(object):
+    """
+    Single-pass count, mean, variance, min, max and quantiles of a stream of values.
+    Feed it chunks with update and combine partial results with merge.  NaN values are skipped.
+
+    Example:
+        stats = StreamingStats()
+        for chunk in chunks:
+            stats.update(chunk)
+        stats.get_summary()
+    """
+    def __init__(self, k: int = DEFAULT_SKETCH_K, exact_size: int = DEFAULT_EXACT_SIZE):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self.sketch = QuantileSketch(k, exact_size)
+
+    def __len__(self):
+        return self.n
+
+    def _combine(self, n: int, mean: float, m2: float, low: float, high: float):
+        """
+        Chan et al.'s parallel update of count, mean and sum of squared deviations.
+        """
+        if n == 0:
+            return
+        total = self.n + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta * delta * self.n * n / total
+        self.n = total
+        self.min = min(self.min, low)
+        self.max = max(self.max, high)
+
+    def update(self, values):
+        """
+        Add a chunk of values.
+
+        :param values: array-like
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        mean = values.mean()
+        self._combine(len(values), mean, float(((values - mean) ** 2).sum()), values.min(), values.max())
+        self.sketch.update(values)
+
+    def merge(self, other: "StreamingStats"):
+        """
+        Add the values of another StreamingStats, such as one filled by another worker.
+
+        :param other: StreamingStats
+        """
+        self._combine(other.n, other.mean, other.m2, other.min, other.max)
+        self.sketch.merge(other.sketch)
+
+    def get_variance(self, ddof: int = 0) -> float:
+        return self.m2 / (self.n - ddof) if self.n > ddof else np.nan
+
+    def get_stddev(self, ddof: int = 0) -> float:
+        return float(np.sqrt(self.get_variance(ddof)))
+
+    def get_median(self) -> float:
+        return self.sketch.get_quantile(.5)
+
+    def get_summary(self) -> Dict[str, Any]:
+        """
+        Get n, mean, median, stddev (population), min and max, as ScoreFile.get_stats.  Values are None if n is 0.
+
+        :rtype: dict
+        """
+        if self.n == 0:
+            return {'n': 0, 'mean': None, 'median': None, 'stddev': None, 'min': None, 'max': None}
+        return {
+            'n': self.n,
+            'mean': float(self.mean),
+            'median': self.get_median(),
+            'stddev': self.get_stddev(),
+            'min': float(self.min),
+            'max': float(self.max)
+        }
+
+class StatsTable(object):
+    """
+    StreamingStats of many columns, fed by chunks of columns (a dataframe or a dict of arrays).
+    Only numeric columns are used.  Columns seen in only some chunks are counted where present.
+    """
+    def __init__(self, columns: List[str] = None, k: int = DEFAULT_SKETCH_K, exact_size: int = DEFAULT_EXACT_SIZE):
+        self.columns = columns
+        self.k = k
+        self.exact_size = exact_size
+        self.stats = OrderedDict()
+
+    def _get(self, column: str) -> StreamingStats:
+        if column not in self.stats:
+            self.stats[column] = StreamingStats(self.k, self.exact_size)
+        return self.stats[column]
+
+    def update(self, chunk):
+        """
+        Add a chunk of columns.
+
+        :param chunk: pd.DataFrame or dict of column: array
+        """
+        for column in (self.columns if self.columns is not None else list(chunk.keys())):
+            if column not in chunk: continue
+            values = np.asarray(chunk[column])
+            if values.dtype.kind not in 'iuf': continue
+            self._get(column).update(values)
+
+    def merge(self, other: "StatsTable"):
+        for column, stats in other.stats.items():
+            self._get(column).merge(stats)
+
+    def get_summary(self) -> "OrderedDict[str, Dict[str, Any]]":
+        """
+        Get the summary of each column (see StreamingStats.get_summary), in the order the columns were seen
+        or were given.
+
+        :rtype: OrderedDict
+        """
+        columns = self.columns if self.columns is not None else list(self.stats.keys())
+        return OrderedDict((c, self.stats[c].get_summary() if c in self.stats else StreamingStats().get_summary()) for c in columns)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        return pd.DataFrame.from_dict(self.get_summary(), orient='index')[['n', 'mean', 'median', 'stddev', 'min', 'max']]
@@ -0,0 +1,211 @@
+import os
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+#Memory-compact dataframes.
+# Repeated strings become categoricals, numeric columns are downcast according to a per-column precision policy,
+# and path columns are split into a categorical directory (whose codes are directory ids) and a basename.
+
+#Precision policy of a numeric column: a numpy dtype name (such as 'float64', 'float32' or 'int32'),
+# 'int' for the smallest integer type that holds the values, or 'keep' to leave the column alone.
+DEFAULT_FLOAT_POLICY = "float32"
+DEFAULT_INT_POLICY = "int"
+
+#Per-column precision policies used unless overridden.
+precision_policies = {
+    "nstruct": "int",
+}
+
+#Path columns split into directory/basename columns by default.
+default_path_columns = ["decoy_path", "scorefile"]
+
+#Suffixes of the columns a path column is split into.
+PATH_DIR_SUFFIX = "_dir"
+PATH_BASE_SUFFIX = "_base"
+
+#String columns with at most this fraction of unique values become categoricals.
+MAX_CATEGORY_FRACTION = 0.5
+
+
+def downcast_numeric(s: pd.Series, policy: str) -> pd.Series:
+    """
+    Downcast a numeric series according to a precision policy.
+    Floats are only downcast if every value fits in the new type, integers only if no value changes.
+
+    :param s: pd.Series
+    :param policy: str
+    :rtype: pd.Series
+    """
+    if policy == "keep" or s.dtype.kind not in 'iuf':
+        return s
+    if policy == "int":
+        if s.dtype.kind == 'f':
+            return s
+        return pd.to_numeric(s, downcast='signed' if s.min() < 0 else 'unsigned')
+
+    dtype = np.dtype(policy)
+    if dtype.kind == 'f':
+        finite = s[np.isfinite(s)] if s.dtype.kind == 'f' else s
+        if len(finite) and np.abs(finite).max() > np.finfo(dtype).max:
+            return s
+        return s.astype(dtype)
+    if s.dtype.kind == 'f' and s.isnull().any():
+        return s
+    info = np.iinfo(dtype)
+    if len(s) and (s.min() < info.min or s.max() > info.max or (s.dtype.kind == 'f' and not (s == np.round(s)).all())):
+        return s
+    return s.astype(dtype)
+
+def split_path_column(df: pd.DataFrame, column: str) -> pd.DataFrame:
+    """
+    Replace a path column with a categorical directory column (column_dir) and a basename column (column_base).
+    The category codes of the directory column are the directory ids.  See join_path_column.
+
+    :param df: pd.DataFrame
+    :param column: str
+    :rtype: pd.DataFrame
+    """
+    paths = df[column].astype(str)
+    dirs = [os.path.dirname(p) for p in paths]
+    bases = [os.path.basename(p) for p in paths]
+
+    i = df.columns.get_loc(column)
+    df = df.drop(columns=[column])
+    df.insert(i, column + PATH_DIR_SUFFIX, pd.Categorical(dirs))
+    df.insert(i + 1, column + PATH_BASE_SUFFIX, pd.Series(bases, index=df.index))
+    return df
+
+def join_path_column(df: pd.DataFrame, column: str) -> pd.Series:
+    """
+    Get the full paths of a path column, whether it was split by split_path_column or not.
+
+    :param df: pd.DataFrame
+    :param column: str
+    :rtype: pd.Series
+    """
+    if column in df.columns:
+        return df[column]
+    dirs = df[column + PATH_DIR_SUFFIX].astype(object)
+    bases = df[column + PATH_BASE_SUFFIX].astype(object)
+    paths = [os.path.join(d, b) if d else b for d, b in zip(dirs, bases)]
+    return pd.Series(paths, index=df.index, name=column)
+
+def expand_path_columns(df: pd.DataFrame, columns: List[str] = None) -> pd.DataFrame:
+    """
+    Undo split_path_column for the given (or all split) path columns.
+
+    :param df: pd.DataFrame
+    :param columns: list
+    :rtype: pd.DataFrame
+    """
+    if columns is None:
+        columns = [c[:-len(PATH_DIR_SUFFIX)] for c in df.columns if c.endswith(PATH_DIR_SUFFIX) and
+                   c[:-len(PATH_DIR_SUFFIX)] + PATH_BASE_SUFFIX in df.columns]
+    for column in columns:
+        if column in df.columns: continue
+        i = df.columns.get_loc(column + PATH_DIR_SUFFIX)
+        paths = join_path_column(df, column)
+        df = df.drop(columns=[column + PATH_DIR_SUFFIX, column + PATH_BASE_SUFFIX])
+        df.insert(i, column, paths)
+    return df
+
+def _is_categorical_candidate(s: pd.Series, max_fraction: float) -> bool:
+    if isinstance(s.dtype, pd.CategoricalDtype) or not pd.api.types.is_string_dtype(s.dtype) or len(s) == 0:
+        return False
+    try:
+        n_unique = s.nunique(dropna=True)
+    except TypeError:
+        #Unhashable values such as lists.
+        return False
+    return n_unique <= max(1, max_fraction * len(s))
+
+def compact_dataframe(df: pd.DataFrame, precision: Dict[str, str] = None, float_policy: str = DEFAULT_FLOAT_POLICY,
+                      int_policy: str = DEFAULT_INT_POLICY, path_columns: List[str] = None,
+                      max_category_fraction: float = MAX_CATEGORY_FRACTION) -> pd.DataFrame:
+    """
+    Get a memory-compact copy of a dataframe.
+
+     - Numeric columns are downcast: floats by float_policy, integers by int_policy,
+       unless the column has its own policy in precision (or in precision_policies).
+     - Path columns are split into a categorical directory and a basename (see split_path_column).
+     - String columns (including basenames) with at most max_category_fraction unique values become categoricals.
+
+    Example: compact_dataframe(df, precision={'total_score': 'float64'})
+
+    :param df: pd.DataFrame
+    :param precision: dict of column: policy, such as 'float64', 'float32', 'int32', 'int' or 'keep'.
+    :param float_policy: str
+    :param int_policy: str
+    :param path_columns: list.  Default is default_path_columns.
+    :param max_category_fraction: float
+    :rtype: pd.DataFrame
+    """
+    policies = dict(precision_policies)
+    if precision:
+        policies.update(precision)
+    if path_columns is None:
+        path_columns = default_path_columns
+
+    df = df.copy()
+    for column in path_columns:
+        if column in df.columns:
+            df = split_path_column(df, column)
+
+    for column in df.columns:
+        s = df[column]
+        if isinstance(s, pd.DataFrame): continue
+        if s.dtype.kind in 'iuf':
+            default = float_policy if s.dtype.kind == 'f' else int_policy
+            df[column] = downcast_numeric(s, policies.get(column, default))
+        elif _is_categorical_candidate(s, max_category_fraction):
+            df[column] = s.astype('category')
+    return df
+
+def get_memory_report(df: pd.DataFrame, before: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    Get the memory used by each column (deep, in bytes), with a 'total' row.
+    If before is given, also get the memory of the same columns in it and the ratio.
+    The ratio of a split path column (on its directory row) includes its basename column.
+
+    :param df: pd.DataFrame
+    :param before: pd.DataFrame
+    :rtype: pd.DataFrame
+    """
+    usage = df.memory_usage(deep=True, index=True)
+    report = pd.DataFrame({"dtype": [str(df[c].dtype) if c in df.columns else "" for c in usage.index],
+                           "bytes": usage.values}, index=usage.index)
+    if before is not None:
+        before_usage = before.memory_usage(deep=True, index=True)
+        report["bytes_before"] = [before_usage.get(c, np.nan) for c in usage.index]
+        report.loc["total", "bytes_before"] = before_usage.sum()
+
+    report.loc["total", "bytes"] = usage.sum()
+    report.loc["total", "dtype"] = ""
+    if before is not None:
+        report["ratio"] = report["bytes"] / report["bytes_before"]
+
+        #A split path column is compared against the original column, on its directory row.
+        for c in before_usage.index:
+            if c not in usage.index and c + PATH_DIR_SUFFIX in usage.index and c + PATH_BASE_SUFFIX in usage.index:
+                report.loc[c + PATH_DIR_SUFFIX, "bytes_before"] = before_usage[c]
+                report.loc[c + PATH_DIR_SUFFIX, "ratio"] = (usage[c + PATH_DIR_SUFFIX] + usage[c + PATH_BASE_SUFFIX]) / before_usage[c]
+    return report
+
+def print_memory_report(df: pd.DataFrame, before: pd.DataFrame = None, by_column: bool = False):
+    """
+    Print the memory used by a dataframe (and by the dataframe it was made from).
+
+    :param df: pd.DataFrame
+    :param before: pd.DataFrame
+    :param by_column: Print every column, not just the total.
+    """
+    report = get_memory_report(df, before)
+    if by_column:
+        print(report.to_string())
+    total = report.loc["total"]
+    line = "Dataframe memory: %.1f MB" % (total["bytes"] / 1e6)
+    if before is not None:
+        line += " (from %.1f MB, %.0f%%)" % (total["bytes_before"] / 1e6, 100 * total["ratio"])
+    print(line)
@@ -0,0 +1,232 @@
+from typing import List, Dict, Any
+
+import numpy as np
+import pandas as pd
+
+#Server-side data reduction for interactive (plotly/dash) plots.
+# Large dataframes are reduced before they are sent to the browser:
+#  - histograms are binned and aggregated here, so only one row per bar is sent,
+#  - scatter plots keep every sparse region (one point per occupied grid cell), the extremes of each axis,
+#    and a uniform random sample of the rest, so dense regions keep their relative density,
+#  - box, violin and KDE plots are drawn from each group's order statistics at evenly spaced ranks (exact quantiles).
+# Reduced data are always real rows.  Scatter plots never drop rows passed as keep (such as the top decoys).
+
+#Data with more rows than this are reduced.
+MAX_POINTS = 20000
+
+#Number of histogram bins of a numeric column.
+HISTOGRAM_BINS = 200
+
+#Number of grid cells per axis used to keep sparse regions of a scatter plot.
+SCATTER_GRID = 100
+
+#Number of order statistics kept per group for box, violin and KDE plots.
+N_QUANTILES = 1001
+
+#Number of extreme rows kept on each side of each column of a scatter plot.
+N_TAIL = 50
+
+_histfuncs = {"sum": "sum", "avg": "mean", "min": "min", "max": "max"}
+
+
+def get_numeric_values(s: pd.Series) -> np.ndarray:
+    """
+    Get a float array of a column.  Non-numeric columns give their category codes (missing values are NaN).
+
+    :param s: pd.Series
+    :rtype: np.ndarray
+    """
+    if pd.api.types.is_numeric_dtype(s.dtype) and not pd.api.types.is_bool_dtype(s.dtype):
+        return s.to_numpy(dtype=np.float64, na_value=np.nan)
+    codes = pd.factorize(s, sort=True)[0].astype(np.float64)
+    codes[codes < 0] = np.nan
+    return codes
+
+def get_extreme_indices(values: np.ndarray, n: int = N_TAIL) -> np.ndarray:
+    """
+    Get the positions of the n lowest and n highest (non-NaN) values.
+
+    :param values: np.ndarray
+    :param n: int
+    :rtype: np.ndarray
+    """
+    rows = np.flatnonzero(~np.isnan(values))
+    if len(rows) <= 2 * n:
+        return rows
+    low = rows[np.argpartition(values[rows], n - 1)[:n]]
+    high = rows[np.argpartition(-values[rows], n - 1)[:n]]
+    return np.union1d(low, high)
+
+def downsample_indices(columns: List[np.ndarray], max_points: int = MAX_POINTS, keep = None, grid: int = SCATTER_GRID,
+                       n_tail: int = N_TAIL, seed: int = 0) -> np.ndarray:
+    """
+    Get the sorted positions of at most about max_points rows of a scatter plot of the given (float) columns.
+
+    Rows in keep and the n_tail extremes of each column are always kept.
+    Then one row of each occupied grid cell is kept, sparsest cells first, so outliers and small clusters stay visible.
+    The rest of the budget is a uniform random sample, so dense regions keep their relative density.
+    The sample is seeded, so the same data give the same plot.
+
+    :param columns: list of np.ndarray
+    :param max_points: int
+    :param keep: positions that are always kept
+    :param grid: int
+    :param n_tail: int
+    :param seed: int
+    :rtype: np.ndarray
+    """
+    n = len(columns[0])
+    if n <= max_points:
+        return np.arange(n)
+
+    selected = np.zeros(n, dtype=bool)
+    if keep is not None:
+        selected[np.asarray(keep, dtype=np.int64)] = True
+    for values in columns:
+        selected[get_extreme_indices(values, n_tail)] = True
+
+    #Grid cell of each row.  Rows with missing values are never drawn, so they are only used to fill the budget.
+    cells = np.zeros(n, dtype=np.int64)
+    valid = np.ones(n, dtype=bool)
+    for values in columns:
+        finite = np.isfinite(values)
+        valid &= finite
+        low, high = (np.min(values[finite]), np.max(values[finite])) if finite.any() else (0, 0)
+        span = (high - low) or 1
+        cell = np.clip(((np.where(finite, values, low) - low) / span * grid).astype(np.int64), 0, grid - 1)
+        cells = cells * grid + cell
+
+    rows = np.flatnonzero(valid)
+    _, first, counts = np.unique(cells[rows], return_index=True, return_counts=True)
+    budget = max(0, max_points - np.count_nonzero(selected))
+    sparse_first = rows[first[np.argsort(counts, kind='stable')]]
+    selected[sparse_first[:budget]] = True
+
+    budget = max(0, max_points - np.count_nonzero(selected))
+    rest = np.flatnonzero(~selected & valid)
+    if budget and len(rest):
+        rng = np.random.RandomState(seed)
+        selected[rng.choice(rest, min(budget, len(rest)), replace=False)] = True
+    return np.flatnonzero(selected)
+
+def get_quantile_indices(values: np.ndarray, codes: np.ndarray = None, n_quantiles: int = N_QUANTILES) -> np.ndarray:
+    """
+    Get the sorted positions of the rows at n_quantiles evenly spaced ranks of each group, including the min and max.
+    Quantiles, box statistics and densities of the selected rows match those of the full data
+    to within 1/n_quantiles in rank, so nothing else should be added to them.  NaN values are skipped.
+
+    :param values: np.ndarray
+    :param codes: integer group codes, or None for one group
+    :param n_quantiles: int
+    :rtype: np.ndarray
+    """
+    values = np.asarray(values, dtype=np.float64)
+    codes = np.zeros(len(values), dtype=np.int64) if codes is None else np.asarray(codes)
+    rows = np.flatnonzero(~np.isnan(values))
+    rows = rows[np.lexsort((values[rows], codes[rows]))]
+    bounds = np.concatenate([[0], np.flatnonzero(np.diff(codes[rows])) + 1, [len(rows)]])
+
+    selected = []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        m = end - start
+        if m <= n_quantiles:
+            selected.append(rows[start:end])
+            continue
+        ranks = np.round(np.linspace(0, m - 1, n_quantiles)).astype(np.int64)
+        selected.append(rows[start + ranks])
+    return np.sort(np.concatenate(selected)) if selected else np.array([], dtype=np.int64)
+
+def aggregate_histogram(df: pd.DataFrame, x: str, y: str = None, color: str = None, histfunc: str = None,
+                        histnorm: str = None, bins: int = HISTOGRAM_BINS) -> pd.DataFrame:
+    """
+    Bin and aggregate a histogram the way plotly's histogram would, returning one row per bar.
+    Numeric x columns are cut into bins (x becomes the bin center, 'width' the bin width), other x columns
+    are used as categories.  histfunc ('count', 'sum', 'avg', 'min', 'max') is applied to y if given (default sum).
+    histnorm ('percent', 'probability', 'density', 'probability density') is applied within each color.
+    The aggregated value column is named by get_histogram_label.
+
+    :param df: pd.DataFrame
+    :param x: str
+    :param y: str
+    :param color: str
+    :param histfunc: str
+    :param histnorm: str
+    :param bins: int
+    :rtype: pd.DataFrame
+    """
+    if not histfunc:
+        histfunc = "sum" if y else "count"
+    label = get_histogram_label(y, histfunc)
+    values = df[x]
+    if pd.api.types.is_numeric_dtype(values.dtype) and not pd.api.types.is_bool_dtype(values.dtype):
+        v = values.to_numpy(dtype=np.float64, na_value=np.nan)
+        finite = v[np.isfinite(v)]
+        edges = np.histogram_bin_edges(finite, bins) if len(finite) else np.array([0.0, 1.0])
+        i = np.clip(np.searchsorted(edges, v, side='right') - 1, 0, len(edges) - 2)
+        centers = (edges[:-1] + edges[1:]) / 2
+        keys = pd.Series(np.where(np.isfinite(v), centers[i], np.nan), index=df.index, name=x)
+        width = edges[1] - edges[0]
+    else:
+        keys = values.rename(x)
+        width = 1.0
+
+    groups = [keys] if not color else [df[color], keys]
+    if not y:
+        binned = keys.groupby(groups, observed=True, sort=True).size().rename(label).reset_index()
+    elif histfunc == "count":
+        binned = df[y].groupby(groups, observed=True, sort=True).count().rename(label).reset_index()
+    else:
+        binned = df[y].groupby(groups, observed=True, sort=True).agg(_histfuncs[histfunc]).rename(label).reset_index()
+    binned["width"] = width
+
+    if histnorm:
+        totals = binned.groupby(color, observed=True)[label].transform("sum") if color else binned[label].sum()
+        if histnorm in ("percent", "probability", "probability density"):
+            binned[label] = binned[label] / totals
+        if histnorm == "percent":
+            binned[label] = binned[label] * 100
+        if histnorm in ("density", "probability density"):
+            binned[label] = binned[label] / width
+    return binned
+
+def get_histogram_label(y: str = None, histfunc: str = None) -> str:
+    """
+    Get the name of the aggregated column of aggregate_histogram, as plotly labels it.
+
+    :param y: str
+    :param histfunc: str
+    :rtype: str
+    """
+    if not y:
+        return "count"
+    return (histfunc or "sum") + " of " + y
+
+def get_selected_rows(x: np.ndarray, y: np.ndarray, selection: Dict[str, Any]) -> np.ndarray:
+    """
+    Get the positions of all rows inside a plotly box or lasso selection (selectedData), including rows that were
+    not drawn.  Returns None if the selection has no shape.
+
+    :param x: np.ndarray
+    :param y: np.ndarray
+    :param selection: dict
+    :rtype: np.ndarray
+    """
+    if selection.get("range") and "x" in selection["range"] and "y" in selection["range"]:
+        x0, x1 = sorted(selection["range"]["x"])
+        y0, y1 = sorted(selection["range"]["y"])
+        return np.flatnonzero((x >= x0) & (x <= x1) & (y >= y0) & (y <= y1))
+
+    if selection.get("lassoPoints") and "x" in selection["lassoPoints"]:
+        px = np.asarray(selection["lassoPoints"]["x"], dtype=np.float64)
+        py = np.asarray(selection["lassoPoints"]["y"], dtype=np.float64)
+
+        #Even-odd rule: count crossings of a ray from each point with each polygon edge.
+        inside = np.zeros(len(x), dtype=bool)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            j = len(px) - 1
+            for i in range(len(px)):
+                crosses = (py[i] > y) != (py[j] > y)
+                inside ^= crosses & (x < (px[j] - px[i]) * (y - py[i]) / (py[j] - py[i]) + px[i])
+                j = i
+        return np.flatnonzero(inside)
+    return None
@@ -69,6 +69,26 @@ def distance_numpy(array1: numpy.array, array2: numpy.array) -> float:
 
     return numpy.linalg.norm(array1-array2)
 
+def dihedrals_numpy(p0: numpy.ndarray, p1: numpy.ndarray, p2: numpy.ndarray, p3: numpy.ndarray) -> numpy.ndarray:
+    """
+    Get the dihedral angles (radians, -pi to pi) of many sets of four points at once,
+    with the same sign convention as Bio.PDB.calc_dihedral.
+
+    :param p0: numpy.ndarray (n x 3)
+    :rtype: numpy.ndarray
+    """
+    b0 = p0 - p1
+    b1 = p2 - p1
+    b2 = p3 - p2
+
+    #Project b0 and b2 onto the plane perpendicular to b1 and get the angle between them.
+    b1 = b1 / numpy.linalg.norm(b1, axis=-1)[..., None]
+    v = b0 - numpy.sum(b0 * b1, axis=-1)[..., None] * b1
+    w = b2 - numpy.sum(b2 * b1, axis=-1)[..., None] * b1
+    x = numpy.sum(v * w, axis=-1)
+    y = numpy.sum(numpy.cross(b1, v) * w, axis=-1)
+    return numpy.arctan2(y, x)
+
 def distance(x1: float, y1: float, z1: float, x2: float, y2: float, z2: float) -> float:
     """
     Get the distance between variables.
@@ -2,6 +2,7 @@ import os
 import re
 import gzip
 import glob
+import json
 
 
 
@@ -151,6 +152,113 @@ def get_decoy_path(decoy, alternate_paths = None):
 
     return None
 
+class DirectoryListingIndex(object):
+    """
+    Resolves many paths against in-memory directory listings.
+    Each directory is listed once (os.scandir), so resolving a column of decoys costs one listing per directory
+    instead of a stat per decoy per extension/compression - which is very slow on NFS/Lustre.
+
+    Listings can optionally be cached on disk in each directory (.jade_listing.json) and are reused
+    while the directory mtime is unchanged.
+    """
+    listing_cache_name = ".jade_listing.json"
+
+    def __init__(self, use_disk_cache = False):
+        self.use_disk_cache = use_disk_cache
+        self.listings = {}
+
+    def listdir(self, directory):
+        """
+        Get the set of entry names in a directory.  Empty if it does not exist.
+        :param directory: str
+        :rtype: set
+        """
+        directory = directory or "."
+        if directory in self.listings:
+            return self.listings[directory]
+
+        names = self._read_disk_cache(directory) if self.use_disk_cache else None
+        if names is None:
+            try:
+                with os.scandir(directory) as it:
+                    names = set(entry.name for entry in it)
+            except OSError:
+                names = set()
+            if self.use_disk_cache and names:
+                self._write_disk_cache(directory, names)
+
+        self.listings[directory] = names
+        return names
+
+    def exists(self, path):
+        """
+        Does the path exist, according to the listing of its directory?
+        :param path: str
+        :rtype: bool
+        """
+        if not path: return False
+        path = path.rstrip("/")
+        return os.path.basename(path) in self.listdir(os.path.dirname(path))
+
+    def find_decoy(self, f):
+        """
+        Search .pdb, .pdb.gz, .cif, .cif.gz, .xml, .xml.gz for a decoy path or name, like get_decoy_path.
+        Return found path or None.
+        :param f: str
+        :rtype: str
+        """
+        if get_decoy_extension(f):
+            f = ".".join(f.split(".")[:-1])
+
+        names = self.listdir(os.path.dirname(f))
+        base = os.path.basename(f)
+        for ext in extensions:
+            for comp in compressions:
+                if base+ext+comp in names:
+                    return f+ext+comp
+        return None
+
+    def _read_disk_cache(self, directory):
+        cache = os.path.join(directory, self.listing_cache_name)
+        try:
+            with open(cache, 'r') as INFILE:
+                data = json.load(INFILE)
+            if data["mtime_ns"] == os.stat(directory).st_mtime_ns:
+                return set(data["names"])
+        except (OSError, ValueError, KeyError):
+            pass
+        return None
+
+    def _write_disk_cache(self, directory, names):
+        cache = os.path.join(directory, self.listing_cache_name)
+        try:
+            #Creating the cache file changes the directory mtime, so create it first and stamp it afterwards.
+            if not os.path.exists(cache):
+                open(cache, 'w').close()
+            data = {"mtime_ns": os.stat(directory).st_mtime_ns, "names": sorted(names)}
+            with open(cache, 'w') as OUTFILE:
+                json.dump(data, OUTFILE)
+        except OSError:
+            pass
+
+def get_decoy_paths(decoys, alternate_paths = None, index = None):
+    """
+    Batched get_decoy_path.  Resolves a list of decoy paths/names using one listing per directory.
+    Return a list of found paths (or None).
+
+    :param decoys: list
+    :param alternate_paths: list
+    :param index: DirectoryListingIndex
+    :rtype: list
+    """
+    if index is None:
+        index = DirectoryListingIndex()
+
+    if alternate_paths:
+        return [index.find_decoy(alternate_paths[0] + "/" + decoy) for decoy in decoys]
+    else:
+        return [index.find_decoy(decoy) for decoy in decoys]
+
 def get_decoy_extension(decoy):
     """
     Return the extension of the decoy.  .pdb, .pdb.gz, .cif, .cif.gz,
@@ -262,18 +370,15 @@ def get_directories_recursively(inpath):
 def get_scorefiles_recursively(inpath, ext=".sc"):
     """
     Get a list of scorefile paths recursively, matching the extension.
+    Uses a single walk of the tree.  Skips hidden directories.
     :param inpath:
     :param ext:
     :return:
     """
     scorefiles=[]
-    dirs = get_directories_recursively(inpath)
-    dirs.append(inpath)
-    for d in dirs:
-        #print(d)
-        files = glob.glob(d + "/" + '*' + ext)
-        #print(files)
-        scorefiles.extend(files)
+    for root, dirs, files in os.walk(inpath):
+        dirs[:] = sorted([d for d in dirs if d[0] != '.'])
+        scorefiles.extend([root + "/" + f for f in sorted(files) if f.endswith(ext) and f[0] != "."])
     return scorefiles
 
 ###############
@@ -0,0 +1,111 @@
+import sqlite3
+from typing import List, Tuple, Union
+
+import numpy as np
+
+#The flat pdb table of SQLPose and SQLPDB, and a registry of the structures it holds.
+# Each atom row carries its pdbID, modelID and strucID, so one database can hold a whole decoy set,
+# and the indexes below make per-structure, per-residue and per-atom-name queries index lookups instead of scans.
+
+PDB_TABLE = "CREATE TABLE IF NOT EXISTS pdb(l integer PRIMARY KEY, pdbID TEXT, modelID TEXT, strucID INT, type TEXT, atomNum INT, atomName TEXT, altLoc TEXT, residue TEXT, chain TEXT, resNum INT, icode TEXT, x REAL, y REAL, z REAL, occupancy REAL, bfactor REAL)"
+
+STRUCTURES_TABLE = "CREATE TABLE IF NOT EXISTS structures(strucID INTEGER PRIMARY KEY, pdbID TEXT, modelID TEXT, path TEXT, n_atoms INT)"
+
+#Atom names are stored with their PDB padding (' CA '), so atom name queries use trim(atomName).
+PDB_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS {table}_strucID ON {table}(strucID, chain, resNum)",
+    "CREATE INDEX IF NOT EXISTS {table}_pdbID ON {table}(pdbID, strucID)",
+    "CREATE INDEX IF NOT EXISTS {table}_residue ON {table}(chain, resNum)",
+    "CREATE INDEX IF NOT EXISTS {table}_atom ON {table}(chain, trim(atomName), resNum)",
+]
+
+#Atom array (pdb_io.PDB_DTYPE) field of each pdb table column after strucID.
+SQL_FIELDS = ['id', 'atom_number', 'atom_name', 'alternate_location', 'three_letter_code', 'chain', 'residue_number',
+              'i_code', 'x', 'y', 'z', 'occupancy', 'b_factor']
+
+PDB_INSERT = "INSERT INTO {table} VALUES(NULL, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+
+
+def set_bulk_pragmas(db: sqlite3.Connection):
+    """
+    Use WAL journaling (readers do not block the writer) with fewer syncs, for fast bulk loads.
+    In-memory databases keep their own journal.
+
+    :param db: sqlite3.Connection
+    """
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+
+def create_pdb_tables(db: Union[sqlite3.Connection, sqlite3.Cursor], table: str = "pdb"):
+    db.execute(PDB_TABLE.replace("pdb(", table+"(", 1))
+    db.execute(STRUCTURES_TABLE)
+
+def create_pdb_indexes(db: Union[sqlite3.Connection, sqlite3.Cursor], table: str = "pdb"):
+    """
+    Create the PDB_INDEXES of a pdb table, if they do not exist.
+    Loading many structures is faster with the indexes created once at the end.
+
+    :param db: sqlite3.Connection or sqlite3.Cursor
+    :param table: str
+    """
+    for index in PDB_INDEXES:
+        db.execute(index.format(table=table))
+
+def get_pdb_rows(atoms: np.ndarray, pdbID: str, modelID: str, strucID, specific_chain: str = False) -> List[Tuple]:
+    """
+    Get the pdb table rows (without the row id) of an atom array from pdb_io (read_pdb_file or parse_pdb_buffer).
+    Values are typed, so SQLite does not convert each one.  Blank numbers are NULL.
+
+    :param atoms: np.ndarray of PDB_DTYPE
+    :param pdbID: str
+    :param modelID: str
+    :param strucID: int
+    :param specific_chain: str.  Only keep this chain.
+    :rtype: list
+    """
+    chains = np.char.strip(atoms['chain'])
+    if specific_chain:
+        #Only copy a specific chain into the database.
+        keep = chains == specific_chain
+        atoms = atoms[keep]
+        chains = chains[keep]
+
+    columns = []
+    for field in SQL_FIELDS:
+        if field == 'chain':
+            columns.append(chains.tolist())
+        elif atoms.dtype[field].kind == 'f' and np.isnan(atoms[field]).any():
+            columns.append([None if v != v else v for v in atoms[field].tolist()])
+        else:
+            columns.append(atoms[field].tolist())
+    n = len(atoms)
+    return list(zip([pdbID] * n, [modelID] * n, [strucID] * n, *columns))
+
+def insert_pdb_rows(db: Union[sqlite3.Connection, sqlite3.Cursor], rows: List[Tuple], table: str = "pdb") -> int:
+    """
+    Insert rows from get_pdb_rows with one executemany.  Run it inside a transaction ('with db:') when loading
+    several structures, so they are committed together.  Returns the number of rows.
+
+    :param db: sqlite3.Connection or sqlite3.Cursor
+    :param rows: list
+    :param table: str
+    :rtype: int
+    """
+    db.executemany(PDB_INSERT.format(table=table), rows)
+    return len(rows)
+
+def get_next_strucID(db: Union[sqlite3.Connection, sqlite3.Cursor], table: str = "pdb") -> int:
+    """
+    Get one more than the largest integer strucID in the database (strucIDs set by hand may be labels).
+
+    :rtype: int
+    """
+    row = db.execute("SELECT max(m) FROM (SELECT max(strucID) AS m FROM structures UNION ALL "
+                     "SELECT max(strucID) FROM "+table+" WHERE typeof(strucID)='integer')").fetchone()
+    return 1 if row[0] is None else int(row[0]) + 1
+
+def blank_null(value):
+    """
+    Blank numbers are stored as NULL.  Get '' for them, as they were in the PDB file.
+    """
+    return '' if value is None else value
@@ -0,0 +1,227 @@
+import os
+import glob
+import functools
+import multiprocessing
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Tuple, Union
+
+import numpy as np
+from Bio.PDB.Structure import Structure
+
+from jade2.basic.structure.pdb_io import read_pdb_file
+from jade2.basic.structure.PythonPDB2 import PythonPDB2
+from jade2.basic.structure.BioPose import BioPose
+from jade2.basic.structure import util
+
+#Structure files picked up when a directory is given.
+STRUCTURE_EXTENSIONS = (".pdb", ".pdb.gz", ".cif", ".cif.gz", ".ent", ".ent.gz")
+
+#Files picked up when a directory is given to a PDB-only loader ('atoms' and 'pdb').
+PDB_EXTENSIONS = (".pdb", ".pdb.gz", ".ent", ".ent.gz")
+
+#mmCIF files, which the PDB-only loaders refuse instead of returning no atoms.
+MMCIF_EXTENSIONS = (".cif", ".cif.gz", ".mmcif", ".mmcif.gz")
+
+#Fewer files than this are loaded in this process unless processes is given.
+PARALLEL_MIN_FILES = 8
+
+#Files parsed per task sent to a worker.
+DEFAULT_CHUNKSIZE = 4
+
+
+def get_structure_paths(paths: Union[str, Path, List[str]], extensions: Tuple[str, ...] = STRUCTURE_EXTENSIONS) -> List[str]:
+    """
+    Get a list of structure files from a list of paths, a directory (every file with one of the extensions)
+    or a glob pattern.  Directories and patterns are sorted.
+
+    :param paths: str, Path or list
+    :param extensions: tuple.  Such as PDB_EXTENSIONS for PDB-only use.
+    :rtype: list
+    """
+    if not isinstance(paths, (str, Path)):
+        return [str(p) for p in paths]
+
+    paths = str(paths)
+    if os.path.isdir(paths):
+        return sorted(os.path.join(paths, name) for name in os.listdir(paths) if name.endswith(extensions))
+    if glob.has_magic(paths):
+        return sorted(glob.glob(paths, recursive=True))
+    return [paths]
+
+########  Loaders.  These run in worker processes, so they are module-level functions. ##########
+
+def check_pdb_path(path: str):
+    """
+    Raise ValueError for an mmCIF file, which the PDB parser would read as a structure with no atoms.
+    """
+    if path.lower().endswith(MMCIF_EXTENSIONS):
+        raise ValueError("Not a PDB file (mmCIF is not supported by this loader): "+path)
+
+def load_atoms(path: str) -> np.ndarray:
+    """
+    Load the atoms of a PDB file as a PDB_DTYPE array (see pdb_io).
+    """
+    check_pdb_path(path)
+    return read_pdb_file(path)[0]
+
+def load_pdb(path: str) -> PythonPDB2:
+    check_pdb_path(path)
+    return PythonPDB2(path)
+
+def load_bio(path: str, cache: Union[bool, None] = None) -> Tuple[Structure, Dict]:
+    """
+    Load the Biopython (structure, header) of a PDB or mmCIF file, from the StructureCache if enabled
+    (cache is as in BioPose).
+    """
+    structure_cache = BioPose._get_cache(cache)
+    if structure_cache:
+        return structure_cache.get_structure(path, lambda: BioPose.parse_file(path))
+    return BioPose.parse_file(path)
+
+def load_sequences(path: str, cache: Union[bool, None] = None) -> "OrderedDict[str, str]":
+    """
+    Load the sequence of each chain of the first model, as util.get_seq_from_biochain.
+    Chains without non-hetero residues are left out.
+    """
+    structure_cache = BioPose._get_cache(cache)
+    if structure_cache:
+        return structure_cache.get_sequences(path, lambda: BioPose.parse_file(path))
+    structure, header = BioPose.parse_file(path)
+    return OrderedDict((chain.id, util.get_seq_from_biochain(chain)) for chain in structure[0]
+                       if util.get_chain_length(chain) != 0)
+
+LOADERS = {
+    'atoms': load_atoms,
+    'pdb': load_pdb,
+    'bio': load_bio,
+    'sequences': load_sequences,
+}
+
+#Loaders that can read from the StructureCache.
+CACHED_LOADERS = ('bio', 'sequences')
+
+#Loaders that only read PDB files.  Directories given to them only pick up PDB_EXTENSIONS files.
+PDB_LOADERS = ('atoms', 'pdb')
+
+def _load_chunk(loader: Callable[[str], Any], paths: List[str]) -> List[Tuple[str, Any, str]]:
+    results = []
+    for path in paths:
+        try:
+            results.append((path, loader(path), None))
+        except Exception as e:
+            #Parsers raise many kinds of errors on bad files.  One bad file never stops the batch.
+            results.append((path, None, "{}: {}".format(type(e).__name__, e)))
+    return results
+
+class BatchLoader(object):
+    """
+    Loads many structure files in a pool of worker processes, yielding (path, value) as files finish.
+
+    Files are sent to workers in chunks of chunksize, and at most max_pending chunks are in flight at once,
+    so memory stays bounded however many files there are and however slowly results are used.
+    If ordered, results come in the order of the paths.  Otherwise they come as soon as each chunk is done.
+
+    Files that fail to load are not yielded.  They are collected in errors as (path, error), and the rest of
+    the batch carries on.
+
+    loader is one of LOADERS:
+        'atoms':     PDB_DTYPE atom array (PDB only, the lightest)
+        'pdb':       PythonPDB2 (PDB only)
+        'bio':       (Bio.PDB.Structure.Structure, header dict)
+        'sequences': OrderedDict of chain: sequence of the first model
+    or any module-level function taking a path (so it can be sent to workers).
+
+    Example:
+        loader = BatchLoader("natives/*.pdb.gz", 'sequences')
+        for path, sequences in loader:
+            ...
+        print(loader.errors)
+    """
+    def __init__(self, paths: Union[str, Path, List[str]], loader: Union[str, Callable[[str], Any]] = 'atoms',
+                 processes: int = None, ordered: bool = True, chunksize: int = DEFAULT_CHUNKSIZE,
+                 max_pending: int = None, cache: Union[bool, None] = None, verbose: bool = True):
+        """
+        :param paths: list of paths, a directory or a glob pattern.  With a PDB-only loader, a directory gives its PDB files.
+        :param loader: name in LOADERS or function
+        :param processes: int.  Default is every core for PARALLEL_MIN_FILES or more files.  1 loads in this process.
+        :param ordered: bool
+        :param chunksize: int
+        :param max_pending: int.  Default is 2 chunks per process.
+        :param cache: bool.  Use the StructureCache for 'bio' and 'sequences' (as in BioPose).
+        :param verbose: bool.  Print each error as it happens.
+        """
+        self.paths = get_structure_paths(paths, PDB_EXTENSIONS if loader in PDB_LOADERS else STRUCTURE_EXTENSIONS)
+        if isinstance(loader, str):
+            if loader not in LOADERS:
+                raise KeyError("Unknown loader "+loader+".  Options: "+", ".join(LOADERS))
+            self.loader = functools.partial(LOADERS[loader], cache=cache) if loader in CACHED_LOADERS else LOADERS[loader]
+        else:
+            self.loader = loader
+
+        self.chunksize = max(1, chunksize)
+        n_chunks = -(-len(self.paths) // self.chunksize)
+        if processes is None:
+            processes = multiprocessing.cpu_count() if len(self.paths) >= PARALLEL_MIN_FILES else 1
+        self.processes = max(1, min(processes, n_chunks))
+        self.max_pending = max_pending or 2 * self.processes
+        self.ordered = ordered
+        self.verbose = verbose
+
+        self.errors = []
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __iter__(self) -> Iterator[Tuple[str, Any]]:
+        self.errors = []
+        chunks = [self.paths[i:i + self.chunksize] for i in range(0, len(self.paths), self.chunksize)]
+        if self.processes == 1:
+            for chunk in chunks:
+                yield from self._collect(_load_chunk(self.loader, chunk))
+            return
+
+        executor = ProcessPoolExecutor(self.processes)
+        try:
+            remaining = iter(chunks)
+            pending = deque()
+
+            def submit():
+                chunk = next(remaining, None)
+                if chunk is not None:
+                    pending.append(executor.submit(_load_chunk, self.loader, chunk))
+
+            for i in range(self.max_pending):
+                submit()
+            while pending:
+                if self.ordered:
+                    future = pending.popleft()
+                else:
+                    done, not_done = wait(pending, return_when=FIRST_COMPLETED)
+                    future = next(f for f in pending if f in done)
+                    pending.remove(future)
+                results = future.result()
+                #Keep the workers busy while the caller uses these results.
+                submit()
+                yield from self._collect(results)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _collect(self, results: List[Tuple[str, Any, str]]) -> Iterator[Tuple[str, Any]]:
+        for path, value, error in results:
+            if error is not None:
+                self.errors.append((path, error))
+                if self.verbose:
+                    print("Could not load "+path+": "+error)
+            else:
+                yield path, value
+
+    def load_all(self) -> "OrderedDict[str, Any]":
+        """
+        Load every file, returning path: value in the order of the paths.  Failed files are left out (see errors).
+
+        :rtype: OrderedDict
+        """
+        values = dict(self)
+        return OrderedDict((path, values[path]) for path in self.paths if path in values)
@@ -7,6 +7,7 @@ import os
 import re
 import logging
 from pathlib import Path
+import numpy as np
 from typing import Union, DefaultDict, Dict, Tuple, List, Any, ClassVar
 
 from collections import defaultdict
@@ -30,6 +31,8 @@ from jade2.basic.numeric import *
 from jade2.basic import vector1
 from jade2.basic.path import *
 from jade2.basic.structure.biopython_util import is_connected_to_prev, is_connected_to_next
+from jade2.basic.structure.StructureCache import StructureCache, get_default_cache
+from jade2.basic.structure.biopython_util import get_backbone_coords, get_peptide_bond_lengths, BACKBONE_ATOMS, PEPTIDE_BOND_CUTOFF
 
 class PoseResidue(Residue):
     def __init__(self, res: Residue, chain_id: str):
@@ -47,12 +50,15 @@ class BioPose(object):
 
     Right now, you need a path as I don't know how we would use this from sequence, etc as you do in Rosetta.
     :path: Is a path to an RCSB file.  PDB (.pdb), mmCIF(.cif), and gzipped (.gz) versions.
+    :cache: A StructureCache to load unchanged files from without parsing, True for the default cache,
+            or False for none.  By default, the default cache is used only if $JADE_STRUCTURE_CACHE is set.
     """
-    def __init__(self, path: Union[Path, str], model_num: int = 0):
+    def __init__(self, path: Union[Path, str], model_num: int = 0, cache: Union[StructureCache, bool, None] = None):
 
         self.res_definitions: ClassVar[RestypeDefinitions] = RestypeDefinitions()
         self.name = os.path.basename(str(path))
         self.in_path = str(path)
+        self.cache: Union[StructureCache, None] = self._get_cache(cache)
 
         ####Setup Class###:
         struct_header:      Tuple[Structure, Dict] = self.load_from_file(path) #Bio struct, Header dictionary
@@ -67,10 +73,24 @@ class BioPose(object):
     def load_from_file(self, path: Union[Path, str]) -> Tuple[Structure, Dict]:
         """
         Load a file from PDB or mmCIF.  .gz is supported.
+        If this pose has a StructureCache, an unchanged file is rebuilt from the cache instead of parsed.
 
         :param path: Path to PDB or mmCIF file
         :rtype: tuple(bio.PDB.Structure.Structure, dict)
         """
+        if self.cache:
+            return self.cache.get_structure(path, lambda: self.parse_file(path, self.name), self.name)
+        return self.parse_file(path, self.name)
+
+    @staticmethod
+    def parse_file(path: Union[Path, str], model_id: str = None) -> Tuple[Structure, Dict]:
+        """
+        Parse a file from PDB or mmCIF with Biopython.  .gz is supported.
+
+        :param path: Path to PDB or mmCIF file
+        :param model_id: str.  Default is the file name.
+        :rtype: tuple(bio.PDB.Structure.Structure, dict)
+        """
         structure = None
         if re.search(".pdb", str(path)):
             parser = PDBParser()
@@ -78,7 +98,8 @@ class BioPose(object):
             parser = MMCIFParser()
 
         path = str(path).strip()
-        model_id = self.name
+        if model_id is None:
+            model_id = os.path.basename(path)
         if os.path.basename(str(path)).split('.')[-1] == 'gz':
             logging.info("Opening Gzipped file")
             GZ = gzip.open(path, 'rt')
@@ -91,6 +112,14 @@ class BioPose(object):
 
         return (structure, header)
 
+    @staticmethod
+    def _get_cache(cache: Union[StructureCache, bool, None]) -> Union[StructureCache, None]:
+        if cache is None:
+            return get_default_cache()
+        if cache is True:
+            return get_default_cache(force=True)
+        return cache or None
+
     def reload_from_file(self, path: Union[Path, str], model_num: int =0):
         """
         Reload a BioPose from a file path.
@@ -210,57 +239,13 @@ class BioPose(object):
         """
         Get the Phi Angle of i in radians
         """
-        resatomlist = [i.name for i in
-                       self.atoms(resnum=res.id[1], chain_id=res.chain_id, icode=res.id[2], alt=res.id[0])]
-        resprevatomlist = [i.name for i in
-                           self.atoms(resnum=resprev.id[1], chain_id=resprev.chain_id, icode=resprev.id[2],
-                                      alt=resprev.id[0])]
-
-        if not is_connected_to_prev(res, resprev):
-            return 0.0
-        if not all(x in resatomlist for x in ['N', 'C', 'CA', 'O']):
-            return 0.0
-        if not all(x in resprevatomlist for x in ['N', 'C', 'CA', 'O']):
-            return 0.0
-
-        try:
-            n = res['N'].get_vector()
-            ca = res['CA'].get_vector()
-            c = res['C'].get_vector()
-            cp = resprev['C'].get_vector()
-            phi = calc_dihedral(cp, n, ca, c)
-            return phi
-        except Exception:
-            print("Could not get phi for " + repr(res))
-            raise LookupError
-
-
+        return float(self.get_backbone_dihedrals([resprev, res])['phi'][1])
 
     def psi(self, res: PoseResidue, resnext: PoseResidue) -> float:
         """
         Get the Psi Angle of i in radians
         """
-        resatomlist = [i.name for i in self.atoms(resnum=res.id[1], chain_id=res.chain_id, icode=res.id[2], alt=res.id[0])]
-        resnextatomlist = [i.name for i in self.atoms(resnum=resnext.id[1], chain_id=resnext.chain_id, icode=resnext.id[2], alt=resnext.id[0])]
-
-        if not is_connected_to_next(res, resnext):
-            return 0.0
-        if not all(x in resatomlist for x in ['N', 'C', 'CA', 'O']):
-            return 0.0
-        if not all(x in resnextatomlist for x in ['N', 'C', 'CA', 'O']):
-            return 0.0
-
-        try:
-            n = res['N'].get_vector()
-            ca = res['CA'].get_vector()
-            c = res['C'].get_vector()
-            nn = resnext['N'].get_vector()
-            psi = calc_dihedral(n, ca, c, nn)
-            return psi
-        except Exception:
-            print("Could not get psi for "+repr(res))
-            raise LookupError
-
+        return float(self.get_backbone_dihedrals([res, resnext])['psi'][0])
 
     def omega(self, res: PoseResidue, resnext: PoseResidue, resprev: PoseResidue, rosetta_definitions: bool = True) -> float:
         """
@@ -269,40 +254,70 @@ class BioPose(object):
         If rosetta_definitions are False, omega is then treated as being between i and i -1
         :rtype: float
         """
-        resatomlist = [i.name for i in self.atoms(resnum=res.id[1], chain_id=res.chain_id, icode=res.id[2], alt=res.id[0])]
-        resprevatomlist = [i.name for i in self.atoms(resnum=resprev.id[1], chain_id=resprev.chain_id, icode=resprev.id[2], alt=resprev.id[0])]
-        resnextatomlist = [i.name for i in self.atoms(resnum=resnext.id[1], chain_id=resnext.chain_id, icode=resnext.id[2], alt=resnext.id[0])]
-        if not is_connected_to_prev(res, resprev):
-            return 0.0
-        if not all(x in resatomlist for x in ['N', 'C', 'CA', 'O']):
-            return 0.0
-        if not all(x in resprevatomlist for x in ['N', 'C', 'CA', 'O']):
-            return 0.0
-        if not all(x in resnextatomlist for x in ['N', 'C', 'CA', 'O']):
-            return 0.0
+        return float(self.get_backbone_dihedrals([resprev, res, resnext], rosetta_definitions)['omega'][1])
 
-        try:
-            n = res['N'].get_vector()
-            ca = res['CA'].get_vector()
-            c = res['C'].get_vector()
-
-            if rosetta_definitions and is_connected_to_next(res, resnext):
-                next_n = resnext['N'].get_vector()
-                next_ca = resnext['CA'].get_vector()
-                omega = calc_dihedral(ca, c, next_n, next_ca)
-                return omega
-
-            elif not rosetta_definitions and is_connected_to_prev(res, resprev):
-                pre_c = resprev['C'].get_vector()
-                pre_ca = resprev['CA'].get_vector()
-                omega = calc_dihedral(pre_ca, pre_c, n, ca)
-                return omega
-            else:
-                return 0.0
+    def get_aa_residues(self, chain_id: str, model_num: int = 0) -> List[PoseResidue]:
+        """
+        Get all amino acid residues of a chain (including non-standard and HETATM amino acids), in chain order.
+        Adds chain_id attribute to residue.
+
+        :rtype: list[bio.PDB.Residue.Residue]
+        """
+        residues = [res for res in self.chain(chain_id, model_num).get_residues() if is_aa(res, standard=False)]
+        for res in residues:
+            res.chain_id = chain_id
+        return residues
+
+    def get_backbone_dihedrals(self, residues: List[PoseResidue], rosetta_definitions: bool = True) -> Dict[str, np.ndarray]:
+        """
+        Get phi, psi and omega (radians) of every residue in a list of consecutive residues in one vectorized pass.
+        Neighbors are the previous and next residues in the list.
+
+        As for single residues, an angle is 0.0 if the residues involved are not bonded (C-N > 1.8 A),
+        or if the residue or a neighbor is missing any of N, CA, C or O.  The first and last residues of the list
+        have no neighbor on one side, so those angles are 0.0.
+
+        Returns a dict of arrays (phi, psi, omega) along with the C-N 'peptide_bond' lengths to the next residue
+        and 'has_backbone' for each residue.
+
+        :param residues: list[bio.PDB.Residue.Residue]
+        :param rosetta_definitions: bool - Omega between i and i + 1 (True) or i - 1 and i (False)
+        :rtype: dict
+        """
+        n_res = len(residues)
+        coords = get_backbone_coords(residues)
+        n, ca, c = [coords[:, BACKBONE_ATOMS.index(name)] for name in ['N', 'CA', 'C']]
 
-        except BaseException:
-            print("Could not get omega for "+repr(res))
-            raise LookupError
+        has_bb = ~np.isnan(coords).any(axis=(1, 2))
+        bonds = np.full(n_res, np.nan)
+        bonds[:-1] = get_peptide_bond_lengths(coords)
+        with np.errstate(invalid='ignore'):
+            connected_next = bonds <= PEPTIDE_BOND_CUTOFF
+        connected_prev = np.concatenate([[False], connected_next[:-1]])
+
+        prev_ok = np.concatenate([[False], has_bb[:-1]]) & has_bb & connected_prev
+        next_ok = np.concatenate([has_bb[1:], [False]]) & has_bb & connected_next
+
+        dihedrals = {'phi': np.zeros(n_res), 'psi': np.zeros(n_res), 'omega': np.zeros(n_res)}
+        if n_res < 2:
+            dihedrals.update({'peptide_bond': bonds, 'has_backbone': has_bb})
+            return dihedrals
+
+        i = np.flatnonzero(prev_ok)
+        dihedrals['phi'][i] = dihedrals_numpy(c[i - 1], n[i], ca[i], c[i])
+        i = np.flatnonzero(next_ok)
+        dihedrals['psi'][i] = dihedrals_numpy(n[i], ca[i], c[i], n[i + 1])
+
+        #Omega also needs the residue on the other side to have its backbone.
+        if rosetta_definitions:
+            i = np.flatnonzero(next_ok & prev_ok)
+            dihedrals['omega'][i] = dihedrals_numpy(ca[i], c[i], n[i + 1], ca[i + 1])
+        else:
+            i = np.flatnonzero(prev_ok & np.concatenate([has_bb[1:], [False]]))
+            dihedrals['omega'][i] = dihedrals_numpy(ca[i - 1], c[i - 1], n[i], ca[i])
+
+        dihedrals.update({'peptide_bond': bonds, 'has_backbone': has_bb})
+        return dihedrals
 
     def get_sequence(self, chain_id: str, model_num: int = 0) -> str:
         """
@@ -328,33 +343,30 @@ class BioPose(object):
         Author: Simon Kelow
 
         Returns a list of missing residues for each chain id.
+        Residues within 10 of either chain end, and residues missing N, CA, C or O, are not checked.
+        A residue is listed once for a break to the next residue and once for a break to the previous one,
+        or once if a neighbor is missing backbone atoms.
         """
 
         chainbreak_dict = dict()
 
         for chain in self.model():
-            missinglist = []
-            reslist = [i for i in chain.get_residues() if is_aa(i, standard=False)]
-            for res in reslist[10:-10]:
-                resatomlist = [i.name for i in self.atoms(resnum=res.id[1], chain_id=res.chain_id, icode=res.id[2], alt=res.id[0])]
-                if is_aa(res, standard=False) and all(x in resatomlist for x in ['N', 'C', 'CA', 'O']):
-                    resindex = reslist.index(res)
-                    resnextindex = resindex + 1
-                    resnext = reslist[resnextindex]
-                    resnextatomlist = [i.name for i in self.atoms(resnum=resnext.id[1], chain_id=resnext.chain_id, icode=resnext.id[2], alt=resnext.id[0])]
-                    resprevindex = resindex - 1
-                    resprev = reslist[resprevindex]
-                    resprevatomlist = [i.name for i in self.atoms(resnum=resprev.id[1], chain_id=resprev.chain_id, icode=resprev.id[2], alt=resprev.id[0])]
-                    if is_aa(resnext, standard=False) and is_aa(resprev, standard=False) and all(x in resnextatomlist for x in ['N', 'C', 'CA', 'O']) and all(x in resprevatomlist for x in ['N', 'C', 'CA', 'O']):
-                        connectedtonext = is_connected_to_next(res, resnext)
-                        connectedtoprev = is_connected_to_prev(res, resprev)
-                        if not connectedtonext:
-                            missinglist.append(res.id[1])
-                        if not connectedtoprev:
-                            missinglist.append(res.id[1])
-                    else:
-                        missinglist.append(res.id[1])
-            chainbreak_dict[chain.id] = missinglist
+            reslist = self.get_aa_residues(chain.id)
+            if len(reslist) <= 20:
+                chainbreak_dict[chain.id] = []
+                continue
+
+            geometry = self.get_backbone_dihedrals(reslist)
+            has_bb = geometry['has_backbone']
+            with np.errstate(invalid='ignore'):
+                broken_next = geometry['peptide_bond'] > PEPTIDE_BOND_CUTOFF
+
+            i = np.arange(10, len(reslist) - 10)
+            neighbors_bb = has_bb[i - 1] & has_bb[i + 1]
+            counts = np.where(neighbors_bb, broken_next[i].astype(int) + broken_next[i - 1], 1) * has_bb[i]
+
+            resnums = np.array([res.id[1] for res in reslist])
+            chainbreak_dict[chain.id] = np.repeat(resnums[i], counts).tolist()
         return chainbreak_dict
 
     def get_regional_sequence(self, start: int, end: int) -> str:
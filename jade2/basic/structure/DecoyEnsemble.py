@@ -0,0 +1,304 @@
+import os
+import json
+import shutil
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Union
+
+import numpy as np
+import pandas
+
+from jade2.basic.structure.pdb_io import get_atom_coords, get_atom_mask, write_pdb_file
+from jade2.basic.structure.PythonPDB2 import PythonPDB2
+from jade2.basic.structure.BatchLoader import BatchLoader, get_structure_paths, PDB_EXTENSIONS
+from jade2.basic.path import get_decoy_name, get_decoy_paths
+
+#Compact on-disk store of a decoy ensemble: every decoy has the same atoms, so the atoms are stored once
+# (the topology) and each decoy is only its float32 coordinates.
+# An ensemble is a directory of:
+#   manifest.json  version, shape and metadata column kinds
+#   topology.npy   PDB_DTYPE atoms of the first decoy
+#   coords.f4      raw float32 coordinates of shape (n_decoys, n_atoms, 3), memory-mapped on load
+#   meta_<column>.npy  one per metadata column ('decoy', 'path' and any scores)
+# Slicing decoys and atoms out of the coordinates reads only those bytes from disk.
+
+ENSEMBLE_VERSION = 1
+
+#Atom fields that must match the topology for a decoy to be added.
+TOPOLOGY_FIELDS = ("atom_name", "alternate_location", "three_letter_code", "chain", "residue_number", "i_code")
+
+COORDS_FILE = "coords.f4"
+
+
+def check_topology(topology: np.ndarray, atoms: np.ndarray) -> bool:
+    """
+    Check that an atom array has the same atoms, in the same order, as the topology.
+
+    :param topology: np.ndarray of PDB_DTYPE
+    :param atoms: np.ndarray of PDB_DTYPE
+    :rtype: bool
+    """
+    if len(topology) != len(atoms):
+        return False
+    return all(np.array_equal(topology[field], atoms[field]) for field in TOPOLOGY_FIELDS)
+
+def _write_manifest(outdir: str, manifest: Dict[str, Any]):
+    tmp = os.path.join(outdir, "manifest.json.tmp")
+    with open(tmp, 'w') as OUTFILE:
+        json.dump(manifest, OUTFILE, indent=1)
+    os.replace(tmp, os.path.join(outdir, "manifest.json"))
+
+def _save_column(path: str, values: List[Any]) -> str:
+    """
+    Save a metadata column as a numeric or fixed-width string array, returning which.  None becomes NaN or ''.
+    """
+    arr = np.asarray(values)
+    if arr.dtype.kind in 'biuf':
+        kind = "numeric"
+    elif arr.dtype.kind == 'O' and all(v is None or isinstance(v, (int, float, np.number)) for v in values):
+        kind = "numeric"
+        arr = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    else:
+        kind = "string"
+        arr = np.array(['' if v is None else str(v) for v in values], dtype=str)
+    np.save(path, arr, allow_pickle=False)
+    return kind
+
+def create_ensemble(outdir: Union[str, Path], paths: Union[str, Path, List[str]],
+                    metadata: Dict[str, List[Any]] = None, processes: int = None, overwrite: bool = False,
+                    verbose: bool = True) -> 'DecoyEnsemble':
+    """
+    Create an ensemble from PDB files (a list of paths, a directory or a glob pattern).
+    Files are parsed in parallel with the BatchLoader, and their coordinates streamed to disk.
+
+    The first file that loads is the topology.  Files with different atoms are skipped (see DecoyEnsemble.errors).
+    metadata is a dict of column: values (one per path), such as scores, kept for the decoys that were added.
+
+    :param outdir: str.  Ensemble directory.
+    :param paths: list, directory or glob pattern
+    :param metadata: dict
+    :param processes: int.  Parsing processes (see BatchLoader)
+    :param overwrite: bool.  Replace an existing ensemble.
+    :param verbose: bool
+    :rtype: DecoyEnsemble
+    """
+    outdir = str(outdir)
+    paths = get_structure_paths(paths, PDB_EXTENSIONS)
+    metadata = metadata or {}
+    for column, values in metadata.items():
+        if len(values) != len(paths):
+            raise ValueError("Metadata column "+column+" has "+str(len(values))+" values for "+str(len(paths))+" paths")
+
+    if os.path.exists(outdir):
+        if not overwrite:
+            raise FileExistsError(outdir+" exists.  Set overwrite to replace it.")
+        shutil.rmtree(outdir)
+    os.makedirs(outdir)
+
+    loader = BatchLoader(paths, 'atoms', processes=processes, verbose=verbose)
+    rows = {path: i for i, path in enumerate(paths)}
+    topology = None
+    kept = []
+    errors = []
+    with open(os.path.join(outdir, COORDS_FILE), 'wb') as OUTFILE:
+        for path, atoms in loader:
+            if topology is None:
+                if len(atoms) == 0:
+                    errors.append((path, "No atoms"))
+                    continue
+                topology = atoms
+            elif not check_topology(topology, atoms):
+                errors.append((path, "Atoms do not match the topology"))
+                if verbose:
+                    print("Skipping "+path+": atoms do not match the topology")
+                continue
+            OUTFILE.write(get_atom_coords(atoms).astype(np.float32).tobytes())
+            kept.append(rows[path])
+    errors = loader.errors + errors
+
+    if topology is None:
+        shutil.rmtree(outdir)
+        raise ValueError("No structures could be loaded: "+"; ".join(error for path, error in errors))
+    np.save(os.path.join(outdir, "topology.npy"), topology, allow_pickle=False)
+
+    columns = OrderedDict([("decoy", [get_decoy_name(paths[i]) for i in kept]),
+                           ("path", [os.path.abspath(paths[i]) for i in kept])])
+    for column, values in metadata.items():
+        columns[column] = [values[i] for i in kept]
+    kinds = OrderedDict((column, _save_column(os.path.join(outdir, "meta_"+str(i)+".npy"), values))
+                        for i, (column, values) in enumerate(columns.items()))
+
+    _write_manifest(outdir, OrderedDict([
+        ("version", ENSEMBLE_VERSION),
+        ("n_decoys", len(kept)),
+        ("n_atoms", len(topology)),
+        ("metadata", [[column, kind] for column, kind in kinds.items()]),
+        ("errors", [[path, error] for path, error in errors]),
+    ]))
+    return DecoyEnsemble(outdir)
+
+def create_ensemble_from_scorefile(outdir: Union[str, Path], scorefile: str, scoreterm: str = "total_score",
+                                   top_n: int = -1, decoy_dir: str = None, processes: int = None,
+                                   overwrite: bool = False, verbose: bool = True) -> 'DecoyEnsemble':
+    """
+    Create an ensemble of the top_n decoys of a scorefile by scoreterm (all of them with -1), ordered by score.
+    Every scoreterm of the decoys is added to the metadata.
+    Decoys are looked for in decoy_dir, or next to the scorefile.
+
+    :param outdir: str
+    :param scorefile: str
+    :param scoreterm: str
+    :param top_n: int
+    :param decoy_dir: str
+    :param processes: int
+    :param overwrite: bool
+    :param verbose: bool
+    :rtype: DecoyEnsemble
+    """
+    from jade2.rosetta_jade.ScoreFiles import ScoreFile
+
+    sf = ScoreFile(scorefile)
+    names = [name for score, name in sf.get_ordered_decoy_list(scoreterm, top_n=top_n)]
+    if decoy_dir is None:
+        decoy_dir = os.path.dirname(scorefile)
+    found = get_decoy_paths([os.path.join(decoy_dir, name) for name in names])
+
+    missing = [name for name, path in zip(names, found) if path is None]
+    if missing and verbose:
+        print("Could not find "+str(len(missing))+" decoys, such as "+missing[0])
+    paths = [path for path in found if path is not None]
+    rows = sf.get_rows([name for name, path in zip(names, found) if path is not None])
+
+    metadata = OrderedDict((term, np.asarray(sf.columns[term])[rows].tolist()) for term in sf.get_scoreterm_names())
+    return create_ensemble(outdir, paths, metadata, processes=processes, overwrite=overwrite, verbose=verbose)
+
+class DecoyEnsemble(object):
+    """
+    A memory-mapped decoy ensemble (see create_ensemble).
+
+    Example:
+        ensemble = create_ensemble("design.ensemble", "decoys/*.pdb.gz")
+        ca = ensemble.get_atom_mask(chains="H", atom_names="CA")
+        coords = ensemble.get_coords(ensemble.get_decoy_indexes(top_names), ca)  #decoys x CA x 3
+    """
+    def __init__(self, path: Union[str, Path], mmap: bool = True):
+        """
+        :param path: str.  Ensemble directory
+        :param mmap: bool.  Memory-map the coordinates instead of reading them all.
+        """
+        self.path = str(path)
+        with open(os.path.join(self.path, "manifest.json"), 'r') as INFILE:
+            manifest = json.load(INFILE)
+        if manifest.get("version") != ENSEMBLE_VERSION:
+            raise ValueError("Unsupported ensemble version "+str(manifest.get("version"))+" in "+self.path)
+
+        self.n_decoys = manifest["n_decoys"]
+        self.n_atoms = manifest["n_atoms"]
+        self.errors = [tuple(e) for e in manifest.get("errors", [])]
+        self.topology = np.load(os.path.join(self.path, "topology.npy"), allow_pickle=False)
+
+        shape = (self.n_decoys, self.n_atoms, 3)
+        coords_path = os.path.join(self.path, COORDS_FILE)
+        if mmap and self.n_decoys:
+            self.coords = np.memmap(coords_path, dtype=np.float32, mode='r', shape=shape)
+        else:
+            self.coords = np.fromfile(coords_path, dtype=np.float32).reshape(shape)
+
+        self.metadata = OrderedDict()
+        for i, (column, kind) in enumerate(manifest["metadata"]):
+            values = np.load(os.path.join(self.path, "meta_"+str(i)+".npy"), allow_pickle=False)
+            self.metadata[column] = values.astype(object) if kind == "string" else values
+
+        self._index = None
+
+    def __len__(self):
+        return self.n_decoys
+
+    def get_decoy_names(self) -> List[str]:
+        return list(self.metadata["decoy"])
+
+    def get_decoy_indexes(self, decoys: List[Union[str, int]]) -> np.ndarray:
+        """
+        Get the index of each decoy, given by name or index, or of each True of a decoy mask.
+        Raises KeyError for unknown names.
+
+        :param decoys: list
+        :rtype: np.ndarray
+        """
+        #bool is an int, so masks are found by dtype before indexes are.
+        arr = np.asarray(decoys)
+        if arr.dtype == bool:
+            if len(arr) != self.n_decoys:
+                raise IndexError("Decoy mask has "+str(len(arr))+" values for "+str(self.n_decoys)+" decoys")
+            return np.flatnonzero(arr)
+        if self._index is None:
+            self._index = {}
+            for i, name in enumerate(self.metadata["decoy"]):
+                self._index.setdefault(name, i)
+        return np.array([d if isinstance(d, (int, np.integer)) else self._index[d] for d in decoys], dtype=np.int64)
+
+    def get_atom_mask(self, chains: Union[str, List[str]] = None, atom_names: Union[str, List[str]] = None,
+                      start: int = None, end: int = None, heavy_atoms: bool = False) -> np.ndarray:
+        """
+        Get a mask of the topology atoms (see pdb_io.get_atom_mask).
+
+        :rtype: np.ndarray
+        """
+        return get_atom_mask(self.topology, chains, atom_names, start, end, heavy_atoms)
+
+    def get_coords(self, decoys: Union[slice, List, np.ndarray] = None, atoms: Union[slice, np.ndarray] = None) -> np.ndarray:
+        """
+        Get float32 coordinates of shape (decoys, atoms, 3), read into memory.
+
+        :param decoys: slice, indexes, names or mask.  Default is all of them
+        :param atoms: slice, indexes or mask (see get_atom_mask).  Default is all of them
+        :rtype: np.ndarray
+        """
+        if decoys is None:
+            decoys = slice(None)
+        elif not (isinstance(decoys, slice) or (isinstance(decoys, np.ndarray) and decoys.dtype == bool)):
+            decoys = self.get_decoy_indexes(list(decoys))
+        if atoms is None:
+            atoms = slice(None)
+
+        #Index decoys first, so only their rows are read from disk.
+        coords = self.coords[decoys]
+        return np.array(coords[:, atoms], dtype=np.float32)
+
+    def get_atoms(self, decoy: Union[str, int]) -> np.ndarray:
+        """
+        Get the PDB_DTYPE atoms of a decoy (the topology with its coordinates).
+
+        :param decoy: name or index
+        :rtype: np.ndarray
+        """
+        i = self.get_decoy_indexes([decoy])[0]
+        atoms = self.topology.copy()
+        coords = self.coords[i]
+        for j, axis in enumerate(("x", "y", "z")):
+            atoms[axis] = np.round(coords[:, j].astype(np.float64), 3)
+        return atoms
+
+    def get_pdb(self, decoy: Union[str, int]) -> PythonPDB2:
+        """
+        Get a decoy as a PythonPDB2 (no header).
+
+        :param decoy: name or index
+        :rtype: PythonPDB2
+        """
+        pdb = PythonPDB2()
+        pdb.set_atoms(self.get_atoms(decoy))
+        pdb.pdb_file_path = self.metadata["path"][self.get_decoy_indexes([decoy])[0]]
+        return pdb
+
+    def save_pdb(self, decoy: Union[str, int], outpath: Union[str, Path]):
+        """
+        Write a decoy as a PDB file (gzipped if outpath ends in .gz).
+        """
+        write_pdb_file(outpath, self.get_atoms(decoy))
+
+    def get_dataframe(self) -> pandas.DataFrame:
+        """
+        Get the metadata as a dataframe, one row per decoy.
+        """
+        return pandas.DataFrame(self.metadata)
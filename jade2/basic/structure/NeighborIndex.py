@@ -0,0 +1,266 @@
+import itertools
+from typing import List, Tuple, Union
+
+import numpy as np
+
+from jade2.basic.structure.pdb_io import get_atom_coords, get_atom_mask
+
+#Spatial queries over coordinate arrays with a cell list.
+# Points are binned into cubic cells of cell_size and sorted by cell, so the points of a cell are one slice.
+# A query only measures the points in the cells around it, so building is O(n log n) and each query costs
+# its number of candidates rather than n.  Every query is vectorized over all query points at once.
+#
+# Points can be split into groups (such as the decoys of a batch) that never neighbor each other,
+# so many decoys are indexed and queried in one pass.
+
+#Default cell edge (Angstroms).  Queries are fastest for radii up to the cell size.
+DEFAULT_CELL_SIZE = 6.0
+
+#Heavy atom distance (Angstroms) for interface contacts.
+DEFAULT_INTERFACE_CUTOFF = 4.5
+
+
+def _expand_ranges(starts: np.ndarray, counts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Expand [start, start + count) ranges into (range index, position) pairs.
+    """
+    owner = np.repeat(np.arange(len(counts)), counts)
+    first = np.repeat(np.cumsum(counts) - counts, counts)
+    return owner, np.repeat(starts, counts) + np.arange(len(owner)) - first
+
+class NeighborIndex(object):
+    """
+    A cell list over a set of points, for radius, k-nearest neighbor and contact queries.
+    Build it once per structure (or batch of decoys) and reuse it for any number of queries.
+
+    Queries return flat arrays of (query index, point index, distance) sorted by query and then point index,
+    which can be used directly as graph edges or as masks of the atom array.
+
+    Example:
+        index = NeighborIndex(get_atom_coords(atoms))
+        q, j, d = index.query_radius(ligand_coords, 5.0)
+        indices, distances = index.query_knn(ca_coords, 8)
+    """
+    def __init__(self, coords: np.ndarray, cell_size: float = DEFAULT_CELL_SIZE, groups: np.ndarray = None):
+        """
+        :param coords: n x 3 array
+        :param cell_size: float
+        :param groups: n array of ints.  Points only neighbor points of the same group.
+        """
+        self.coords = np.asarray(coords, dtype=np.float64).reshape(-1, 3)
+        self.cell_size = float(cell_size)
+        self.groups = np.zeros(len(self.coords), dtype=np.int64) if groups is None else np.asarray(groups, dtype=np.int64)
+        if len(self.groups) != len(self.coords):
+            raise ValueError("groups must have one value per point")
+
+        if len(self.coords):
+            self.origin = self.coords.min(axis=0)
+            self.dims = np.floor((self.coords.max(axis=0) - self.origin) / self.cell_size).astype(np.int64) + 1
+        else:
+            self.origin = np.zeros(3)
+            self.dims = np.ones(3, dtype=np.int64)
+
+        keys = self._get_keys(self._get_cells(self.coords), self.groups)
+        self.order = np.argsort(keys, kind='stable')
+        self.cell_keys, self.cell_starts, self.cell_counts = np.unique(keys[self.order], return_index=True, return_counts=True)
+
+    def __len__(self):
+        return len(self.coords)
+
+    def _get_cells(self, points: np.ndarray) -> np.ndarray:
+        return np.floor((points - self.origin) / self.cell_size).astype(np.int64)
+
+    def _get_keys(self, cells: np.ndarray, groups: np.ndarray) -> np.ndarray:
+        return ((groups * self.dims[0] + cells[:, 0]) * self.dims[1] + cells[:, 1]) * self.dims[2] + cells[:, 2]
+
+    def _get_query_groups(self, points: np.ndarray, groups: np.ndarray) -> np.ndarray:
+        if groups is None:
+            return np.zeros(len(points), dtype=np.int64)
+        groups = np.asarray(groups, dtype=np.int64)
+        if len(groups) != len(points):
+            raise ValueError("groups must have one value per query point")
+        return groups
+
+    def query_radius(self, points: np.ndarray, radius: float, groups: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Find every indexed point within radius of each query point (of the same group).
+
+        :param points: m x 3 array
+        :param radius: float
+        :param groups: m array of ints, if the index has groups
+        :return: query indices, point indices and distances, sorted by query and then point index
+        :rtype: (np.ndarray, np.ndarray, np.ndarray)
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        groups = self._get_query_groups(points, groups)
+        cells = self._get_cells(points)
+        reach = int(np.ceil(radius / self.cell_size))
+
+        #Only offsets that reach a cell of the grid from some query point.
+        if len(points):
+            low = np.maximum(-reach, -cells.max(axis=0))
+            high = np.minimum(reach, self.dims - 1 - cells.min(axis=0))
+        else:
+            low = high = np.zeros(3, dtype=np.int64)
+
+        found_queries = [np.zeros(0, dtype=np.int64)]
+        found_points = [np.zeros(0, dtype=np.int64)]
+        found_d2 = [np.zeros(0)]
+        for offset in itertools.product(*[range(l, h + 1) for l, h in zip(low, high)]):
+            neighbor_cells = cells + offset
+            queries = np.flatnonzero(np.all((neighbor_cells >= 0) & (neighbor_cells < self.dims), axis=1))
+            keys = self._get_keys(neighbor_cells[queries], groups[queries])
+
+            slots = np.minimum(np.searchsorted(self.cell_keys, keys), len(self.cell_keys) - 1)
+            hit = self.cell_keys[slots] == keys if len(self.cell_keys) else np.zeros(len(keys), dtype=bool)
+            queries = queries[hit]
+            slots = slots[hit]
+
+            owner, positions = _expand_ranges(self.cell_starts[slots], self.cell_counts[slots])
+            query = queries[owner]
+            point = self.order[positions]
+            d2 = np.sum((points[query] - self.coords[point]) ** 2, axis=1)
+            keep = d2 <= radius * radius
+            found_queries.append(query[keep])
+            found_points.append(point[keep])
+            found_d2.append(d2[keep])
+
+        query = np.concatenate(found_queries)
+        point = np.concatenate(found_points)
+        d2 = np.concatenate(found_d2)
+        order = np.lexsort((point, query))
+        return query[order], point[order], np.sqrt(d2[order])
+
+    def count_neighbors(self, points: np.ndarray, radius: float, groups: np.ndarray = None) -> np.ndarray:
+        """
+        Count the indexed points within radius of each query point.
+
+        :param points: m x 3 array
+        :param radius: float
+        :param groups: m array of ints, if the index has groups
+        :rtype: np.ndarray
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        query, point, distances = self.query_radius(points, radius, groups)
+        return np.bincount(query, minlength=len(points))
+
+    def query_pairs(self, radius: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Find every pair of indexed points (i < j, of the same group) within radius.
+
+        :param radius: float
+        :rtype: (np.ndarray, np.ndarray, np.ndarray)
+        """
+        i, j, distances = self.query_radius(self.coords, radius, self.groups)
+        keep = i < j
+        return i[keep], j[keep], distances[keep]
+
+    def query_knn(self, points: np.ndarray, k: int, groups: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k nearest indexed points of each query point (of the same group).
+        The search radius starts at the cell size and doubles for queries with fewer than k points in range.
+        Queries with fewer than k points in their group are padded with index -1 and distance inf.
+
+        :param points: m x 3 array
+        :param k: int
+        :param groups: m array of ints, if the index has groups
+        :return: m x k indices and m x k distances, nearest first
+        :rtype: (np.ndarray, np.ndarray)
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        groups = self._get_query_groups(points, groups)
+        indices = np.full((len(points), k), -1, dtype=np.int64)
+        distances = np.full((len(points), k), np.inf)
+        if not len(self.coords) or not k:
+            return indices, distances
+
+        todo = np.arange(len(points))
+        radius = self.cell_size
+        #Once a radius spans more cells than are filled, measuring every point is cheaper.
+        while len(todo) and (2 * np.ceil(radius / self.cell_size) + 1) ** 3 <= len(self.cell_keys):
+            query, point, d = self.query_radius(points[todo], radius, groups[todo])
+            counts = np.bincount(query, minlength=len(todo))
+            done = counts >= k
+
+            keep = done[query]
+            query, point, d = query[keep], point[keep], d[keep]
+            order = np.lexsort((point, d, query))
+            query, point, d = query[order], point[order], d[order]
+            rank = np.arange(len(query)) - np.repeat(np.cumsum(counts[done]) - counts[done], counts[done])
+            first = rank < k
+            rows = todo[query[first]]
+            indices[rows, rank[first]] = point[first]
+            distances[rows, rank[first]] = d[first]
+
+            todo = todo[~done]
+            radius *= 2
+
+        n = min(k, len(self.coords))
+        for start in range(0, len(todo), 256):
+            rows = todo[start:start + 256]
+            d = np.linalg.norm(points[rows][:, None] - self.coords[None], axis=2)
+            d[groups[rows][:, None] != self.groups[None]] = np.inf
+            nearest = np.argsort(d, axis=1, kind='stable')[:, :n]
+            nearest_d = np.take_along_axis(d, nearest, axis=1)
+            indices[rows, :n] = np.where(np.isinf(nearest_d), -1, nearest)
+            distances[rows, :n] = nearest_d
+        return indices, distances
+
+def get_contacts(coords_a: np.ndarray, coords_b: np.ndarray, cutoff: float = DEFAULT_INTERFACE_CUTOFF) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Find every pair of points of A and B within cutoff.
+
+    :param coords_a: n x 3 array
+    :param coords_b: m x 3 array
+    :param cutoff: float
+    :return: indices into A, indices into B and distances
+    :rtype: (np.ndarray, np.ndarray, np.ndarray)
+    """
+    return NeighborIndex(coords_b, max(cutoff, 1.0)).query_radius(coords_a, cutoff)
+
+def get_batch_contacts(coords: np.ndarray, index_a: np.ndarray, index_b: np.ndarray, cutoff: float = DEFAULT_INTERFACE_CUTOFF) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Find the A-B contacts of many decoys of the same atoms in one pass.
+
+    :param coords: decoys x n x 3 array
+    :param index_a: indices (or mask) of the A atoms
+    :param index_b: indices (or mask) of the B atoms
+    :param cutoff: float
+    :return: decoy indices, A atom indices, B atom indices (into the n atoms) and distances
+    :rtype: (np.ndarray, np.ndarray, np.ndarray, np.ndarray)
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    n_decoys = coords.shape[0]
+    index_a = np.flatnonzero(index_a) if np.asarray(index_a).dtype == bool else np.asarray(index_a)
+    index_b = np.flatnonzero(index_b) if np.asarray(index_b).dtype == bool else np.asarray(index_b)
+
+    index = NeighborIndex(coords[:, index_b].reshape(-1, 3), max(cutoff, 1.0), np.repeat(np.arange(n_decoys), len(index_b)))
+    query, point, distances = index.query_radius(coords[:, index_a].reshape(-1, 3), cutoff,
+                                                 np.repeat(np.arange(n_decoys), len(index_a)))
+    return query // len(index_a), index_a[query % len(index_a)], index_b[point % len(index_b)], distances
+
+def get_interface_residues(atoms: np.ndarray, chains_a: Union[str, List[str]], chains_b: Union[str, List[str]],
+                           cutoff: float = DEFAULT_INTERFACE_CUTOFF, heavy_atoms: bool = True) -> Tuple[List[Tuple[str, int, str]], List[Tuple[str, int, str]]]:
+    """
+    Get the residues of chains A and B with an atom within cutoff of the other side.
+
+    :param atoms: PDB_DTYPE atom array (PythonPDB2.get_atoms)
+    :param chains_a: chains of side A, such as 'LH'
+    :param chains_b: chains of side B, such as 'A'
+    :param cutoff: float
+    :param heavy_atoms: bool.  Skip hydrogens.
+    :return: (chain, residue number, insertion code) of the interface residues of A and of B, in atom order
+    :rtype: (list, list)
+    """
+    use = get_atom_mask(atoms, heavy_atoms=heavy_atoms)
+    index_a = np.flatnonzero(use & np.isin(atoms['chain'], list(chains_a)))
+    index_b = np.flatnonzero(use & np.isin(atoms['chain'], list(chains_b)))
+
+    coords = get_atom_coords(atoms)
+    i, j, distances = get_contacts(coords[index_a], coords[index_b], cutoff)
+
+    def get_residues(atom_indices):
+        residues = atoms[np.unique(atom_indices)][['chain', 'residue_number', 'i_code']]
+        return list(dict.fromkeys((str(c), int(r), str(icode)) for c, r, icode in residues.tolist()))
+
+    return get_residues(index_a[i]), get_residues(index_b[j])
@@ -0,0 +1,377 @@
+import os
+import functools
+from pathlib import Path
+from typing import Any, Dict, List, Tuple, Union
+
+import numpy as np
+
+from jade2.basic.structure.pdb_io import PDB_DTYPE, value_from_string, read_pdb_file, write_pdb_file, get_hydrogen_mask
+from jade2.basic.structure.PythonPDB2 import WATER_CODES, ATOM_ALIASES, DNA_ALIASES
+from jade2.basic.structure.BatchLoader import BatchLoader, get_structure_paths, check_pdb_path, PDB_EXTENSIONS
+
+#Composable edits of PDB atom arrays (PythonPDB2.atoms), applied in one pass per structure.
+# Steps are recorded in order, then compiled: consecutive value maps of a field become one lookup table on the
+# unique values of that field, removals become one mask, and the atoms are compacted and reordered once at the end.
+# A pipeline holds only plain data, so it can be sent to worker processes to transform a whole directory.
+
+#Water residue names renamed to TP3 by clean (as PythonPDB2.clean_PDB).
+CLEAN_WATER_CODES = ["HOH", "TIP3", "WAT", "TIP5"]
+
+ResidueKey = Union[Tuple[str, int], Tuple[str, int, str]]
+
+
+def _parse_residue_number(number: Union[int, str, Tuple[int, str]]) -> Tuple[int, str]:
+    """
+    Get (residue number, insertion code) from 52, '52A' or (52, 'A').
+    """
+    if isinstance(number, tuple):
+        return int(number[0]), number[1] or " "
+    number = str(number).strip()
+    if number[-1].isalpha():
+        return int(number[:-1]), number[-1]
+    return int(number), " "
+
+def _compose(first: Dict[Any, Any], second: Dict[Any, Any]) -> Dict[Any, Any]:
+    """
+    Compose two value maps: the result maps each value as first, then second, would.
+    """
+    composed = {old: second.get(new, new) for old, new in first.items()}
+    for old, new in second.items():
+        composed.setdefault(old, new)
+    return composed
+
+def _map_values(values: np.ndarray, pairs: Dict[Any, Any]) -> np.ndarray:
+    """
+    Map values through a dict, looking up each unique value once.
+    """
+    uniques, inverse = np.unique(values, return_inverse=True)
+    mapped = np.array([pairs.get(u, u) for u in uniques.tolist()], dtype=values.dtype)
+    return mapped[inverse.ravel()]
+
+class _State(object):
+    """
+    Columns being edited and the mask of kept atoms, over the input atoms.  Nothing is compacted until finish.
+    """
+    def __init__(self, atoms: np.ndarray):
+        self.atoms = atoms
+        self.columns = {}
+        self.mask = np.ones(len(atoms), dtype=bool)
+        self.order = None
+
+    def get(self, field: str) -> np.ndarray:
+        return self.columns[field] if field in self.columns else self.atoms[field]
+
+    def set(self, field: str, values: np.ndarray, where: np.ndarray = None):
+        if where is None:
+            self.columns[field] = values
+        else:
+            column = self.get(field).copy()
+            column[where] = values[where] if len(values) == len(column) else values
+            self.columns[field] = column
+
+    def finish(self) -> np.ndarray:
+        index = np.flatnonzero(self.mask)
+        if self.order is not None:
+            index = index[np.argsort(self.order[index], kind='stable')]
+        atoms = self.atoms[index]
+        for field, values in self.columns.items():
+            atoms[field] = values[index]
+        return atoms
+
+class PDBPipeline(object):
+    """
+    A list of edits of PDB atoms, applied together in one pass (see apply).  Each method adds a step and returns
+    the pipeline, so steps chain.  Steps act in the order they are added: a chain renamed by one step is selected by
+    its new name in later steps.
+
+    Example:
+        pipeline = PDBPipeline().remove_waters().remove_hetatms().rename_chains({'A': 'H', 'B': 'L'})\
+                                .renumber(offset=-100, chains='H').set_occupancy(1.0)
+        pdb.transform(pipeline)
+        pipeline.run("natives", "cleaned", processes=4)
+    """
+    def __init__(self):
+        self.steps = []
+        #(path, error) of the files that failed in the last run.
+        self.errors = []
+
+    def __len__(self):
+        return len(self.steps)
+
+    def _add(self, kind: str, *args) -> 'PDBPipeline':
+        self.steps.append((kind, args))
+        return self
+
+    ####################################################################
+    # Values
+    #
+    #
+
+    def alias(self, field: str, pairs: Dict[Any, Any], residues: List[str] = None) -> 'PDBPipeline':
+        """
+        Replace every old value of a field with its new value, as PythonPDB2.pdb_alias.
+        Atom names are padded as in the PDB (' CA ').
+
+        :param field: field of PDB_DTYPE
+        :param pairs: dict of old: new
+        :param residues: list.  Only replace in these residue types (three letter codes).
+        """
+        pairs = {value_from_string(field, old): value_from_string(field, new) for old, new in pairs.items()}
+        return self._add('alias', field, pairs, None if residues is None else list(residues))
+
+    def rename_chains(self, pairs: Dict[str, str]) -> 'PDBPipeline':
+        return self.alias("chain", pairs)
+
+    def alias_residues(self, pairs: Dict[str, str]) -> 'PDBPipeline':
+        return self.alias("three_letter_code", pairs)
+
+    def alias_atoms(self, pairs: Dict[str, str], residues: List[str] = None) -> 'PDBPipeline':
+        return self.alias("atom_name", pairs, residues)
+
+    def clean(self) -> 'PDBPipeline':
+        """
+        Rename MD (CHARMM/NAMD) waters, atoms and DNA residues for Rosetta, as PythonPDB2.clean_PDB.
+        Waters become TP3 HETATMs.
+        """
+        self._add('set_where', "id", "HETATM", "three_letter_code", CLEAN_WATER_CODES)
+        self.alias_residues({code: "TP3" for code in CLEAN_WATER_CODES})
+        for residue, pairs in ATOM_ALIASES.items():
+            self.alias_atoms(pairs, [residue])
+        return self.alias_residues(DNA_ALIASES)
+
+    def set_occupancy(self, occupancy: float = 1.0) -> 'PDBPipeline':
+        return self._add('set', "occupancy", float(occupancy))
+
+    def set_b_factors(self, values: Dict[ResidueKey, float], default: float = None) -> 'PDBPipeline':
+        """
+        Set the b factor of each atom of a residue, such as to show per-residue data.
+
+        :param values: dict of (chain, residue number): value, for residues with any insertion code,
+                       or (chain, residue number, insertion code): value
+        :param default: float.  B factor of residues not given.  None keeps them.
+        """
+        values = {(key[0], int(key[1])) + ((key[2] or " ",) if len(key) > 2 else ()): round(float(value), 2)
+                  for key, value in values.items()}
+        return self._add('b_factors', values, default)
+
+    ####################################################################
+    # Numbering
+    #
+    #
+
+    def renumber(self, offset: int = None, start: int = None, chains: str = None) -> 'PDBPipeline':
+        """
+        Renumber residues by an offset, or sequentially from start (insertion codes are removed).
+
+        :param offset: int.  Added to every residue number.
+        :param start: int.  Number of the first residue of each chain.
+        :param chains: chains to renumber, such as 'LH'.  Default is all of them.
+        """
+        if (offset is None) == (start is None):
+            raise ValueError("Give either an offset or a start")
+        return self._add('renumber', offset, start, None if chains is None else list(chains))
+
+    def renumber_by_alignment(self, chain: str, numbering: List[Union[int, str, None]]) -> 'PDBPipeline':
+        """
+        Give the residues of a chain, in order, new numbers, such as those of an aligned reference numbering scheme.
+        Residues numbered None are removed.
+
+        :param chain: str
+        :param numbering: list of the new number of each residue: 52, '52A' or None
+        """
+        numbering = [None if n is None else _parse_residue_number(n) for n in numbering]
+        return self._add('renumber_alignment', chain, numbering)
+
+    ####################################################################
+    # Atoms
+    #
+    #
+
+    def remove_waters(self) -> 'PDBPipeline':
+        return self._add('remove_values', "three_letter_code", list(WATER_CODES))
+
+    def remove_hetatms(self) -> 'PDBPipeline':
+        return self._add('remove_values', "id", ["HETATM"])
+
+    def remove_hydrogens(self) -> 'PDBPipeline':
+        return self._add('remove_hydrogens')
+
+    def remove_chains(self, chains: str) -> 'PDBPipeline':
+        return self._add('remove_values', "chain", list(chains))
+
+    def keep_chains(self, chains: str) -> 'PDBPipeline':
+        return self._add('keep_values', "chain", list(chains))
+
+    def remove_residue_types(self, residues: List[str]) -> 'PDBPipeline':
+        return self._add('remove_values', "three_letter_code", list(residues))
+
+    def order_chains(self, chains: str) -> 'PDBPipeline':
+        """
+        Put these chains first, in this order, followed by the rest as they were.  Such as 'LH' for order_ab_chains.
+        """
+        return self._add('order_chains', list(chains))
+
+    ####################################################################
+    # Running
+    #
+    #
+
+    def compile(self) -> List[Tuple[str, tuple]]:
+        """
+        Get the steps with consecutive value maps of the same field (and residues) merged into one.
+        """
+        compiled = []
+        for kind, args in self.steps:
+            if kind == 'alias' and compiled and compiled[-1][0] == 'alias' and compiled[-1][1][0::2] == args[0::2]:
+                field, pairs, residues = compiled[-1][1]
+                compiled[-1] = (kind, (field, _compose(pairs, args[1]), residues))
+            else:
+                compiled.append((kind, args))
+        return compiled
+
+    def apply(self, atoms: np.ndarray) -> np.ndarray:
+        """
+        Get the transformed atoms.  The input is not changed.
+
+        :param atoms: np.ndarray of PDB_DTYPE
+        :rtype: np.ndarray
+        """
+        state = _State(atoms)
+        for kind, args in self.compile():
+            getattr(self, "_apply_"+kind)(state, *args)
+        return state.finish()
+
+    def apply_file(self, in_path: Union[str, Path], out_path: Union[str, Path]) -> int:
+        """
+        Transform a PDB file, keeping its header and remarks.  Returns the number of atoms written.
+        """
+        atoms, header, remarks = read_pdb_file(in_path)
+        atoms = self.apply(atoms)
+        write_pdb_file(out_path, atoms, header, remarks)
+        return len(atoms)
+
+    def run(self, paths: Union[str, Path, List[str]], out_dir: str, suffix: str = "", processes: int = None,
+            verbose: bool = True) -> List[str]:
+        """
+        Transform PDB files (a list of paths, a directory or a glob pattern) into out_dir, in parallel.
+        A directory gives its PDB_EXTENSIONS files.  mmCIF files are not supported and are reported as errors.
+        Output files have the input name, with suffix added before the extension.  Returns the written paths.
+        Files that fail are skipped and reported (see BatchLoader).
+
+        :param paths: list, directory or glob pattern
+        :param out_dir: str
+        :param suffix: str
+        :param processes: int.  See BatchLoader.
+        :param verbose: bool
+        :rtype: list
+        """
+        if not os.path.exists(out_dir):
+            os.makedirs(out_dir)
+        loader = BatchLoader(get_structure_paths(paths, PDB_EXTENSIONS), functools.partial(_transform_file, pipeline=self,
+                             out_dir=out_dir, suffix=suffix), processes=processes, verbose=verbose)
+        out_paths = [out_path for path, out_path in loader]
+        self.errors = loader.errors
+        return out_paths
+
+    ####################################################################
+    # Steps
+    #
+    #
+
+    def _apply_alias(self, state: _State, field: str, pairs: Dict[Any, Any], residues: List[str]):
+        values = _map_values(state.get(field), pairs)
+        where = None if residues is None else np.isin(state.get("three_letter_code"), residues)
+        state.set(field, values, where)
+
+    def _apply_set(self, state: _State, field: str, value: Any):
+        state.set(field, np.full(len(state.atoms), value, dtype=PDB_DTYPE[field]))
+
+    def _apply_set_where(self, state: _State, field: str, value: Any, select_field: str, select_values: List[Any]):
+        state.set(field, np.full(len(state.atoms), value, dtype=PDB_DTYPE[field]),
+                  np.isin(state.get(select_field), select_values))
+
+    def _apply_b_factors(self, state: _State, values: Dict[Tuple, float], default: float):
+        chains, numbers, icodes = state.get("chain"), state.get("residue_number"), state.get("i_code")
+        #Atoms of a residue are together, so each residue is looked up once.
+        new_residue = np.concatenate([[True], (chains[1:] != chains[:-1]) | (numbers[1:] != numbers[:-1]) |
+                                              (icodes[1:] != icodes[:-1])])[:len(chains)]
+        starts = np.flatnonzero(new_residue)
+        residue_index = np.cumsum(new_residue) - 1
+        missing = np.nan if default is None else default
+        b_factors = np.array([values.get(r, values.get(r[:2], missing)) for r in
+                              zip(chains[starts].tolist(), numbers[starts].tolist(), icodes[starts].tolist())])
+        b_factors = b_factors[residue_index]
+        state.set("b_factor", b_factors, None if default is not None else ~np.isnan(b_factors))
+
+    def _apply_renumber(self, state: _State, offset: int, start: int, chains: List[str]):
+        chain_values = state.get("chain")
+        selected = state.mask if chains is None else state.mask & np.isin(chain_values, chains)
+        if offset is not None:
+            state.set("residue_number", state.get("residue_number") + offset, selected)
+            return
+
+        numbers = state.get("residue_number").copy()
+        icodes = state.get("i_code").copy()
+        for chain in (chains or np.unique(chain_values[selected]).tolist()):
+            lines = np.flatnonzero(selected & (chain_values == chain))
+            if not len(lines): continue
+            #A residue starts wherever the number or insertion code differs from the kept line before it.
+            new_residue = (numbers[lines[1:]] != numbers[lines[:-1]]) | (icodes[lines[1:]] != icodes[lines[:-1]])
+            numbers[lines] = start + np.concatenate([[0], np.cumsum(new_residue)])
+            icodes[lines] = " "
+        state.set("residue_number", numbers)
+        state.set("i_code", icodes)
+
+    def _apply_renumber_alignment(self, state: _State, chain: str, numbering: List[Tuple[int, str]]):
+        lines = np.flatnonzero(state.mask & (state.get("chain") == chain))
+        if not len(lines):
+            return
+        numbers = state.get("residue_number")
+        icodes = state.get("i_code")
+        new_residue = (numbers[lines[1:]] != numbers[lines[:-1]]) | (icodes[lines[1:]] != icodes[lines[:-1]])
+        residue_index = np.concatenate([[0], np.cumsum(new_residue)])
+        if residue_index[-1] + 1 != len(numbering):
+            raise ValueError("Chain "+chain+" has "+str(residue_index[-1] + 1)+" residues, but the numbering has "+str(len(numbering)))
+
+        removed = np.array([n is None for n in numbering])
+        new_numbers = np.array([0 if n is None else n[0] for n in numbering], dtype=np.int64)
+        new_icodes = np.array([" " if n is None else n[1] for n in numbering], dtype=PDB_DTYPE["i_code"])
+        numbers, icodes = numbers.copy(), icodes.copy()
+        numbers[lines] = new_numbers[residue_index]
+        icodes[lines] = new_icodes[residue_index]
+        state.set("residue_number", numbers)
+        state.set("i_code", icodes)
+        state.mask[lines[removed[residue_index]]] = False
+
+    def _apply_remove_values(self, state: _State, field: str, values: List[Any]):
+        state.mask &= ~np.isin(state.get(field), values)
+
+    def _apply_keep_values(self, state: _State, field: str, values: List[Any]):
+        state.mask &= np.isin(state.get(field), values)
+
+    def _apply_remove_hydrogens(self, state: _State):
+        current = np.empty(len(state.atoms), dtype=[("atom_name", PDB_DTYPE["atom_name"]), ("element", PDB_DTYPE["element"])])
+        current["atom_name"] = state.get("atom_name")
+        current["element"] = state.get("element")
+        state.mask &= ~get_hydrogen_mask(current)
+
+    def _apply_order_chains(self, state: _State, chains: List[str]):
+        chain_values = state.get("chain")
+        rank = np.full(len(state.atoms), len(chains), dtype=np.int64)
+        for i, chain in enumerate(chains):
+            rank[chain_values == chain] = i
+        state.order = rank
+
+def _transform_file(path: str, pipeline: PDBPipeline, out_dir: str, suffix: str) -> str:
+    """
+    Transform a file into out_dir.  Run by BatchLoader workers, so it is a module-level function.
+    """
+    check_pdb_path(path)
+    name = os.path.basename(path)
+    for extension in (".pdb.gz", ".ent.gz", ".pdb", ".ent"):
+        if name.endswith(extension):
+            name = name[:-len(extension)] + suffix + extension
+            break
+    out_path = os.path.join(out_dir, name)
+    pipeline.apply_file(path, out_path)
+    return out_path
@@ -3,13 +3,109 @@
 
 #Python Imports
 import copy
+import numpy as np
 import pandas
-import re, logging
-from collections import defaultdict
-from typing import Union, DefaultDict, List, Any, Dict
+import logging
+from collections import defaultdict, OrderedDict
+from collections.abc import MutableMapping
+from typing import Union, DefaultDict, List, Any, Dict, Callable
 from pathlib import Path
 
 from jade2.basic.path import *
+from jade2.basic.structure.pdb_io import *
+
+WATER_CODES = ["HOH","TP3","TP5","TIP3","TIP5"]
+
+#Atom names (padded, as in the PDB) of MD (CHARMM/NAMD) atoms and their Rosetta names, used by clean_PDB.
+ATOM_ALIASES = {
+    "SER": {" HG1":" HG "},
+    "ILE": {" CD ":" CD1"},
+    "LEU": {" OT1":" O  ", " OT2":" OXT"},
+    "VAL": {" OT1":" O  ", " OT2":" OXT"},
+    "LYS": {" HZ1":"1HZ ", " HZ2":"2HZ ", " HZ3":"3HZ "},
+    "ARG": {"HH11":"1HH1", "HH12":"2HH1", "HH21":"1HH2", "HH22":"2HH2"},
+    "ASN": {"HD21":"1HD2", "HD22":"2HD2"},
+    "PRO": {" OT1":" O  ", " OT2":" OXT", " HD1":"1HD ", " HD2":"2HD ", " HB1":"1HB ", " HG1":"1HG ", " HG2":"2HG "}
+}
+
+DNA_ALIASES = {"DA":"A", "DT":"T", "DC":"C", "DG":"G"}
+
+def atoms_to_pdb_map(atoms: np.ndarray) -> List[DefaultDict[str, str]]:
+    """
+    Convert an atom array to a pdb_map of (detached) string dictionaries.
+
+    :param atoms: np.ndarray of PDB_DTYPE
+    :rtype: list
+    """
+    columns = get_string_columns(atoms)
+    pdb_map = []
+    for values in zip(*[columns[field] for field in PDB_DTYPE.names]):
+        pdb_map.append(defaultdict(str, zip(PDB_DTYPE.names, values)))
+    return pdb_map
+
+def pdb_map_to_atoms(pdb_map: List[Dict[str, Any]]) -> np.ndarray:
+    """
+    Convert a pdb_map (string dictionaries or PDBAtom views) to an atom array.
+
+    :param pdb_map: list of dict
+    :rtype: np.ndarray
+    """
+    if isinstance(pdb_map, np.ndarray):
+        return pdb_map.astype(PDB_DTYPE)
+    atoms = np.zeros(len(pdb_map), dtype=PDB_DTYPE)
+    for i, entry in enumerate(pdb_map):
+        if isinstance(entry, PDBAtom):
+            atoms[i] = entry.get_record()
+            continue
+        atoms[i] = tuple(value_from_string(field, entry.get(field, "")) for field in PDB_DTYPE.names)
+    return atoms
+
+class PDBAtom(MutableMapping):
+    """
+    A pdb_map entry: a view of one row of a PythonPDB2 atom array that reads and writes strings,
+    as the dictionaries of the old pdb_map did.  Edits go straight to the array.
+
+    Copies (copy.copy/deepcopy) are plain string dictionaries.
+    """
+    __slots__ = ("atoms", "index")
+
+    def __init__(self, atoms: np.ndarray, index: int):
+        self.atoms = atoms
+        self.index = index
+
+    def __getitem__(self, field: str) -> str:
+        if field not in PDB_DTYPE.fields:
+            raise KeyError(field)
+        return value_to_string(field, self.atoms[field][self.index])
+
+    def __setitem__(self, field: str, value: Any):
+        if field not in PDB_DTYPE.fields:
+            raise KeyError(field+" is not a PDB column")
+        self.atoms[field][self.index] = value_from_string(field, value)
+
+    def __delitem__(self, field: str):
+        raise KeyError("PDB columns cannot be removed")
+
+    def __iter__(self):
+        return iter(PDB_DTYPE.names)
+
+    def __len__(self):
+        return len(PDB_DTYPE.names)
+
+    def __repr__(self):
+        return "PDBAtom("+repr(dict(self))+")"
+
+    def get_record(self) -> np.void:
+        return self.atoms[self.index]
+
+    def copy(self) -> DefaultDict[str, str]:
+        return defaultdict(str, self.items())
+
+    def __copy__(self):
+        return self.copy()
+
+    def __deepcopy__(self, memo):
+        return self.copy()
 
 class PythonPDB2:
     def __init__(self, pdb_file_path: Union[str, Path, list] = ""):
@@ -18,17 +114,16 @@ class PythonPDB2:
         Lightweight PDB class specifically for manipulating pdbs in scripts and simple apps as well as obtaining subsets of data in the PDB.
         2.0 Uses a vector of dictionaries as main pdb_map for easier manipulation of the pdb_map.
         Notes:
-          Not Meant to be fast - written for ease of use!
-          ALL elements of the pdb_map data are stored as strings!
+          Atoms are held in a NumPy structured array (self.atoms, see PDB_DTYPE), so selections and edits are mask operations.
+          The pdb_map is a list of PDBAtom views of this array, which read and write strings as before.
+          Appending to the pdb_map list itself does nothing - use add_atom or set_pdb_map.
 
         """
 
-        self.elements = ("id", "atom_number", "atom_name", "alternate_location", \
-                         "three_letter_code", "chain", "residue_number", "i_code", "x", "y", "z", \
-                         "occupancy", "b_factor", "element", "charge")
+        self.elements = PDB_DTYPE.names
         self.pdb_file_path = str(pdb_file_path)
 
-        self.pdb_map:     List[DefaultDict[str, str]]  = [] #[int line]:[string element]:[string value]
+        self.atoms:       np.ndarray = np.zeros(0, dtype=PDB_DTYPE) #[int line] of PDB_DTYPE records
 
         self.header:      List[str] = [] #Unparsed header, but the data is held here as a list of strings. - Everything NOT ATOM or HETATM is here
         self.remarks:     List[str] = []  #Only REMARK lines as strings
@@ -41,10 +136,29 @@ class PythonPDB2:
         else:
             logging.info("Loading blank PythonPDB")
 
+    def __len__(self):
+        return len(self.atoms)
+
+    @property
+    def pdb_map(self) -> List[PDBAtom]:
+        return self._get_views(np.ones(len(self.atoms), dtype=bool))
+
+    @pdb_map.setter
+    def pdb_map(self, pdb_map: List[Dict[str, Any]]):
+        self.atoms = pdb_map_to_atoms(pdb_map)
 
     def set_pdb_map(self, pdb_map: List[DefaultDict[str, str]]):
         self.pdb_map = pdb_map
 
+    def set_atoms(self, atoms: np.ndarray):
+        """
+        Set the atom array (PDB_DTYPE)
+        """
+        self.atoms = atoms
+
+    def _get_views(self, mask: np.ndarray) -> List[PDBAtom]:
+        return [PDBAtom(self.atoms, i) for i in np.flatnonzero(mask)]
+
     ####################################################################
     # Getters + PDB_Map Subsets
     #
@@ -53,11 +167,17 @@ class PythonPDB2:
     def get_pdb_map(self) -> List[DefaultDict[str, str]]:
         return self.pdb_map
 
+    def get_atoms(self) -> np.ndarray:
+        """
+        Get the atom array (PDB_DTYPE).  Edits to it are edits to the PDB.
+        """
+        return self.atoms
+
     def get_dataframe(self) -> pandas.DataFrame:
         """
-        Get the PDB Map as a dataframe dataframe
+        Get the PDB Map as a dataframe dataframe.  Numeric columns are typed.
         """
-        return pandas.DataFrame(self.pdb_map)
+        return pandas.DataFrame(self.atoms)
 
     def get_header(self) -> List[str]:
         """
@@ -75,96 +195,101 @@ class PythonPDB2:
         remark = "REMARK "+remark
         self.remarks.append(remark)
 
+    def get_atom_names(self) -> np.ndarray:
+        """
+        Get atom names without their PDB padding
+        """
+        return np.char.strip(self.atoms["atom_name"])
+
+    def get_coords(self) -> np.ndarray:
+        """
+        Get the n x 3 coordinates of the atoms, such as for a NeighborIndex.
+        """
+        return get_atom_coords(self.atoms)
+
+    def get_residue_mask(self, resnum: Union[int, str], chain: str, icode: str = None) -> np.ndarray:
+        """
+        Get the mask of atoms of a residue.  If icode is None, the insertion code is not checked.
+        """
+        mask = (self.atoms["residue_number"] == int(resnum)) & (self.atoms["chain"] == chain)
+        if icode is not None:
+            mask &= (self.atoms["i_code"] == (icode or " "))
+        return mask
+
+    def get_subset(self, mask: np.ndarray) -> 'PythonPDB2':
+        """
+        Get a new PythonPDB2 of the masked atoms, with the same header and remarks.
+        """
+        pdb = PythonPDB2()
+        pdb.pdb_file_path = self.pdb_file_path
+        pdb.header = list(self.header)
+        pdb.remarks = list(self.remarks)
+        pdb.atoms = self.atoms[mask]
+        return pdb
+
     def get_chain(self, chain) -> List[DefaultDict[str, str]]:
         """
         Get Chain data as pdb_map subset
         """
-        chain_data = []
-        for dat in self.pdb_map:
-            if dat["chain"] == chain:
-                chain_data.append(dat)
-        return chain_data
+        return self._get_views(self.atoms["chain"] == chain)
+
+    def get_chains(self) -> List[str]:
+        """
+        Get chains in the order they first appear
+        """
+        chains, first = np.unique(self.atoms["chain"], return_index=True)
+        return chains[np.argsort(first)].tolist()
+
+    def has_chain(self, chain: str) -> bool:
+        return bool(np.any(self.atoms["chain"] == chain))
 
     def rename_chain(self, old_chain, new_chain):
-        for i in range(0, len(self.pdb_map)  ):
-            #print("CHAIN :",self.pdb_map[i]["chain"],":")
-            if self.pdb_map[i]["chain"] == old_chain:
-                #print("Chain found. Attempting to change")
-                self.pdb_map[i]["chain"] = new_chain
+        self.atoms["chain"][self.atoms["chain"] == old_chain] = new_chain
 
     def get_waters(self) -> List[DefaultDict[str, str]]:
         """
         Get water data as pdb_map subset
         """
-        water_data = []
-        for dat in self.pdb_map:
-            if dat["three_letter_code"] in ["HOH","TP3","TP5","TIP3","TIP5"]:
-                water_data.append(dat)
-        return water_data
+        return self._get_views(np.isin(self.atoms["three_letter_code"], WATER_CODES))
 
     def get_hetatms(self) -> List[DefaultDict[str, str]]:
         """
         Get hetatm data as pdb_map subset
         """
-        het_data = []
-        for dat in self.pdb_map:
-            if dat["id"] == "HETATM":
-                het_data.append(dat)
-        return het_data
+        return self._get_views(self.atoms["id"] == "HETATM")
 
     def get_bb_data(self) -> List[DefaultDict[str, str]]:
         """
         Get pdb_map subset of only N, CA, and C atoms
         """
-        bb_data = []
-        for dat in self.pdb_map:
-            if dat["atom_name"] in ["N", "CA", "C"]:
-                bb_data.append(dat)
-        return bb_data
+        return self._get_views(np.isin(self.get_atom_names(), ["N", "CA", "C"]))
 
     def get_all_residues_of_type(self, name3: str) -> List[DefaultDict[str, str]]:
         """
         Get PDB_Map subset of all residues of specific type
         """
-        res_data = []
-        for dat in self.pdb_map:
-            if dat["three_letter_code"] == name3:
-                res_data.append(dat)
-        return res_data
+        return self._get_views(self.atoms["three_letter_code"] == name3)
 
     def get_residue(self, resnum: int, chain: str, icode: str= "") -> List[DefaultDict[str, str]]:
         """
         Get PDB_Map subset of a specific residue
         """
-        residue = []
-        for dat in self.pdb_map:
-            if dat["chain"] == chain and dat["residue_number"] == str(resnum) and dat["i_code"] == icode:
-                residue.append(dat)
-        return residue
+        return self._get_views(self.get_residue_mask(resnum, chain, icode))
 
     def replace_atom(self, atom: Dict) -> bool:
         """
         Replace an atom in the pdbmap matching resnum, chain, and icode, and atom name
         """
-        #print(residue)
-        resnum = atom['residue_number']
-        chain = atom['chain']
-        icode = atom['i_code']
-        atom_number = atom['atom_name']
-        for num,dat in enumerate(self.pdb_map):
-            if dat['chain'] == chain and dat['residue_number'] == resnum and dat['i_code'] == icode and dat['atom_name'] == atom_number:
-                #print("Replacing residue")
-                #print(resnum, data['residue_number'])
-                #print(dat['x'], residue['x'])
-                #print(dat)
-                #print(residue)
-                self.pdb_map[num] = atom
-                return True
-
-        return False
+        record = pdb_map_to_atoms([atom])[0]
+        matches = np.flatnonzero(self.get_residue_mask(record["residue_number"], record["chain"], record["i_code"]) &
+                                 (self.atoms["atom_name"] == record["atom_name"]))
+        if not len(matches):
+            return False
+        self.atoms[matches[0]] = record
+        return True
 
     def add_atom(self, atom):
-        self.pdb_map.append(atom)
+        self.atoms = np.concatenate([self.atoms, pdb_map_to_atoms([atom])])
 
 
     ####################################################################
@@ -176,83 +301,36 @@ class PythonPDB2:
         """
         Reads PDB file held as a list of lines
         """
-        i = 0
-        for line in lines:
-            line = line.strip()
-            line = line.strip('\n')
-
-            if not line: continue
-            if line.startswith('#'): continue
-
-            if re.search("REMARK", line[0:6]):
-                self.remarks.append(line)
-
-            elif (re.search("END", line[0:6]) or re.search("TER", line[0:6])):
-                # We ignore END and TER for now.
-                pass
-
-            elif (re.search("ATOM", line[0:6]) or re.search("HETATM", line[0:6])):
-
-                self.pdb_map.append(defaultdict())
-
-                self.pdb_map[i]["id"] = line[0:6].strip()
-                self.pdb_map[i]["atom_number"] = line[6:11].strip();
-                self.pdb_map[i]["atom_name"] = line[12:16]
-                self.pdb_map[i]["alternate_location"] = line[16];
-                self.pdb_map[i]["three_letter_code"] = line[17:21].strip()
-                self.pdb_map[i]["chain"] = line[21];
-                self.pdb_map[i]["residue_number"] = line[22:26].strip()
-                self.pdb_map[i]["i_code"] = line[26];
-                self.pdb_map[i]["x"] = line[27:38].strip()
-                self.pdb_map[i]["y"] = line[38:46].strip();
-                self.pdb_map[i]["z"] = line[46:54].strip()
-                self.pdb_map[i]["occupancy"] = line[54:60].strip();
-                self.pdb_map[i]["b_factor"] = line[60:66].strip()
-                self.pdb_map[i]["element"] = line[66:78].strip();
-                self.pdb_map[i]["charge"] = line[78:79].strip()
-
-                i += 1
-
-            elif (re.search("REMARK", line[0:6])):
-                self.remarks.append(line)
-
-            else:
-                self.header.append(line)
-
+        self._add_parsed(parse_pdb_lines(lines))
 
     def read_pdb_into_map(self, path=None):
         """
-        Reads PDB file path into a basic PDB map.  All data is held as strings.
+        Reads PDB file path (which can be gzipped) into the atom array.
+        Columns are sliced from the whole file at once - see pdb_io.
         """
 
         if path:
             self.pdb_file_path = path
 
-        lines = open_file(self.pdb_file_path, 'r').readlines()
-        self.read_pdb_from_lines(lines)
+        self._add_parsed(read_pdb_file(self.pdb_file_path))
+
+    def _add_parsed(self, parsed):
+        atoms, header, remarks = parsed
+        self.atoms = np.concatenate([self.atoms, atoms]) if len(self.atoms) else atoms
+        self.header.extend(header)
+        self.remarks.extend(remarks)
 
 
     def save_PDB(self, filename: Union[Path, str], output_remarks: bool = True, output_header: bool= True) -> Union[Path, str]:
         """
         Uses a the pdb_map to save the data as a PDB file.
+        Atom lines are formatted a column at a time - see pdb_io.
         Returns the filename
         """
 
-            #global_variables.current_directory = os.path.dirname(filename)
-
-        FILE = open_file(filename, 'w')
-        if output_remarks:
-            for line in self.remarks:
-                FILE.write(line+"\n")
-
-        if output_header:
-            for line in self.header:
-                FILE.write(line+"\n")
-
-        for entry in self.pdb_map:
-            line = self.morph_line_in_pdb_map_to_pdb_line(entry)
-            FILE.write(line+"\n")
-        FILE.close()
+        write_pdb_file(filename, self.atoms,
+                       header = self.header if output_header else None,
+                       remarks = self.remarks if output_remarks else None)
         print("PDB File Written...")
         return filename
 
@@ -314,45 +392,50 @@ class PythonPDB2:
     #
     #
 
+    def transform(self, pipeline):
+        """
+        Apply the edits of a PDBPipeline to the atoms in one pass.
+        """
+        self.atoms = pipeline.apply(self.atoms)
+
+    def keep_atoms(self, mask: np.ndarray):
+        """
+        Keep only the masked atoms
+        """
+        self.atoms = self.atoms[mask]
+
+    def remove_atoms(self, mask: np.ndarray):
+        """
+        Remove the masked atoms
+        """
+        self.atoms = self.atoms[~mask]
+
     def remove_antigen(self):
         """
         Remove Antigen from an LH only PDB
         """
-        temp_pdb_map = copy.deepcopy(self.pdb_map)
-        for dat in temp_pdb_map:
-            if dat["chain"] not in ['L', 'H']:
-                self.pdb_map.remove(dat)
+        self.keep_atoms(np.isin(self.atoms["chain"], ['L', 'H']))
 
     def remove_chain(self, chain: str):
         """
         Removes chain from pdb_map
         """
-        temp_pdb_map = copy.deepcopy(self.pdb_map)
-        for dat in temp_pdb_map:
-            if dat["chain"]==chain:
-                self.pdb_map.remove(dat)
+        self.remove_atoms(self.atoms["chain"] == chain)
 
     def remove_residue_type(self, name3: str):
-        temp_pdb_map = copy.deepcopy(self.pdb_map)
-        for dat in temp_pdb_map:
-            if dat["three_letter_code"]==name3:
-                self.pdb_map.remove(dat)
+        self.remove_atoms(self.atoms["three_letter_code"] == name3)
 
     def remove_hetatm_atoms(self):
-        temp_pdb_map = copy.deepcopy(self.pdb_map)
-        for dat in temp_pdb_map:
-            if dat["id"]=="HETATM":
-                self.pdb_map.remove(dat)
+        self.remove_atoms(self.atoms["id"] == "HETATM")
                 
                 
     def remove_element_column(self):
         """
         Removes the extra stuff in the element column, but not the element itself.
         """
-        for i in range(0, len(self.pdb_map)):
-            ele = self.pdb_map[i]["element"]
-            e = ele[11]
-            self.pdb_map[i]["element"]="           "+e
+        elements, inverse = np.unique(self.atoms["element"], return_inverse=True)
+        elements = np.array([e[-1:].rjust(12) for e in elements], dtype=PDB_DTYPE["element"])
+        self.atoms["element"] = elements[inverse.ravel()]
         print("Extra stuff in Element Columns Removed")
         return self.pdb_map
     
@@ -360,110 +443,29 @@ class PythonPDB2:
         """
         Removes waters from pdb_map
         """
-        #codes = ["HOH","TP3","TP5","TIP3","TIP5"]
-        temp_pdb_map = copy.deepcopy(self.pdb_map) #This is to pop elements
-        for dat in temp_pdb_map:
-            if dat["three_letter_code"] in ["HOH","TP3","TP5","TIP3","TIP5"]:
-                #self.pdb_map.pop(num)
-                self.pdb_map.remove(dat)
+        self.remove_atoms(np.isin(self.atoms["three_letter_code"], WATER_CODES))
                 
     def remove_alternate_residues(self):
         """
         Removes any alternate residue codes and renumbers by renumbering from 1 and integrating any inserts. 
         """
-        
-        def get_residue_num(num): return int(self.pdb_map_copy[num]["residue_number"])
-        def set_residue_num(num, resnum): self.pdb_map[num]["residue_number"]=str(resnum)
-        def get_chain(num):return self.pdb_map_copy[num]["chain"]
-        def get_i_code(num):return self.pdb_map_copy[num]["i_code"]
-        
-        def check_id(num):
-            if self.pdb_map_copy[num]['id']=="ATOM":
-                return True
-            else:
-                return False
-            
-        def check_new_residue(old_num, num, insert_residue=False, pdb_map = False):
-            if insert_residue:
-                if get_i_code(old_num)==get_i_code(num):
-                    return False
-                else:
-                    return True
-            else:
-                if get_residue_num(old_num)==get_residue_num(num):
-                    return False
-                else:
-                    return True
-        
-        def check_new_chain(old_num, num):
-            if get_chain(old_num)==get_chain(num):
-                return False
-            else:
-                return True
-        
-        def check_insertion(num):
-            if not get_i_code(num)==" ":
-                return True
-            else:
-                return False
-        
-        def renumber_from_one(chain_only, start_num):
-            resnum = 1
-            for num in sorted(chain_only):
-                
-                insert = check_insertion(num)
-                
-                #print repr(get_residue_num(num))+":"+repr(insert)
-                
-                #This is so we don't check if it's a new residue with num-1 - Which won't actually be part of the chain!
-                if num==start_num:
-                    set_residue_num(num, resnum)
-
-                    
-                
-                #Iterate resnum if new residue
-                elif check_new_residue(num-1, num, insert):
-                    resnum+=1
-                    set_residue_num(num, resnum)
-
-                else:
-                    set_residue_num(num, resnum)
-            
-            #Set i code at the end, so we can tell if we have new residues or not.
-            for num in sorted(chain_only):
-                self.pdb_map[num]["i_code"]=" "
-                
-        def renumber_from_insert(chain_only, start_num):
-            pass
-        
-        self.pdb_map_copy = copy.deepcopy(self.pdb_map)
-        
-        #Get chains with insertion codes - Now renumbers all chains. Will be an option later.
-        chains_with_inserts = dict(); 
-        for num in range(0, len(self.pdb_map)):
-            #if get_i_code(num)==" ":
-            chains_with_inserts[get_chain(num)]=True
+        #Each ATOM line starts a new residue if its residue number differs from the line before it,
+        # or, for insertions, if its insertion code does.  Renumbers all chains.
+        resnums = self.atoms["residue_number"].copy()
+        icodes = self.atoms["i_code"].copy()
+        is_atom = self.atoms["id"] == "ATOM"
 
-        
-        #Iterate through all lines/atoms
-        #Initialize for scope
-        start_residue=0;
-        new_start=False
-        for chain in chains_with_inserts:
+        for chain in self.get_chains():
             print("Renumbering chain "+chain)
-            chain_only=dict()
-            for num in range(0, len(self.pdb_map)):
-                if chain == get_chain(num) and check_id(num):
-                    chain_only[num]=self.pdb_map[num]
-            lines = sorted(chain_only)
-            res_start = get_residue_num(lines[0])
-            
-            renumber_from_one(chain_only, lines[0])
-                
-            #For now, we only renumber from one.
-            #else:
-                #chain_only = renumber_from_insert(chain_only, lines[0])      
-                    
+            lines = np.flatnonzero((self.atoms["chain"] == chain) & is_atom)
+            if not len(lines): continue
+
+            previous = lines[1:] - 1
+            insert = icodes[lines[1:]] != " "
+            new_residue = np.where(insert, icodes[previous] != icodes[lines[1:]], resnums[previous] != resnums[lines[1:]])
+
+            self.atoms["residue_number"][lines] = 1 + np.concatenate([[0], np.cumsum(new_residue)])
+            self.atoms["i_code"][lines] = " "
 
 
     ####################################################################
@@ -477,13 +479,11 @@ class PythonPDB2:
         Returns PDB Dictionary.
         """
         
-        check = 0
-        for key in range(0, len(self.pdb_map)):
-            if self.pdb_map[key]["occupancy"].rfind("0.00")!=-1:
-                print("Changing occupancy of residue " + self.pdb_map[key]["residue_number"] + "To 1.00")
-                check =1
-            self.pdb_map[key]["occupancy"] = "  1.00"
-        if check ==1:
+        zero = self.atoms["occupancy"] == 0
+        for resnum in pandas.unique(self.atoms["residue_number"][zero]):
+            print("Changing occupancy of residue " + str(resnum) + "To 1.00")
+        self.atoms["occupancy"] = 1.0
+        if np.any(zero):
             print("Occupancy Column OK for PyRosetta...")
 
 
@@ -491,34 +491,27 @@ class PythonPDB2:
         """
         Combines pdb_map from instance of PyPDB to this one.  Does not do any checks.
         """
-        m = py_pdb.get_pdb_map()
-        for dat in m:
-            self.pdb_map.append(dat)
+        self.atoms = np.concatenate([self.atoms, py_pdb.get_atoms()])
 
     def copy_chain_into_pdb_map(self, py_pdb: 'PythonPDB2', chain: str):
         """
         Copies all data from one pdb_map of a py_pdb of a chain into the one held in this class.  Useful for reordering chains.
         """
-        m = py_pdb.get_pdb_map()
-        for dat in m:
-            if dat["chain"] == chain:
-                self.pdb_map.append(dat)
+        atoms = py_pdb.get_atoms()
+        self.atoms = np.concatenate([self.atoms, atoms[atoms["chain"] == chain]])
 
     def copy_all_but_chains_into_pdb_map(self, py_pdb:'PythonPDB2', chains):
         """
         Copies all data from one pdb_map of a py_pdb of all data except the specified chains into this one. Useful for reordering chains.
         """
-        m = py_pdb.get_pdb_map()
-        for dat in m:
-            if not dat["chain"] in chains:
-                self.pdb_map.append(dat)
+        atoms = py_pdb.get_atoms()
+        self.atoms = np.concatenate([self.atoms, atoms[~np.isin(atoms["chain"], list(chains))]])
 
     def combine_pdb_map(self, pdb_map: List[DefaultDict[str, str]]):
         """
         Combines pdb_map passed with the PythonPDBs map
         """
-        for dat in pdb_map:
-            self.pdb_map.append(dat)
+        self.atoms = np.concatenate([self.atoms, pdb_map_to_atoms(pdb_map)])
 
     def pdb_alias(self, pairs: Dict[Any, Any], element: str):
         """
@@ -526,41 +519,36 @@ class PythonPDB2:
         pair is a dictionary. In C++ it would be an array of pairs.  [string old]:[string new]
         For Specific functions, please see below.
         """
-        for num in range(0, len(self.pdb_map)):
-            for old in pairs:
-                if self.pdb_map[num][element] == old:
-                    self.pdb_map[num][element] = pairs[old]
+        values = self.atoms[element]
+        masks = [(values == value_from_string(element, old), new) for old, new in pairs.items()]
+        for mask, new in masks:
+            values[mask] = value_from_string(element, new)
 
     def pdb_atom_alias(self, line_num: int, pair: Dict[Any, Any]):
         """
         Replaces atom_names with ones Rosetta is happy with.
         pair is a dictionary. In C++ it would be an array of pairs.  [string MD atom_name]:[string rosetta atom_name]
         """
+        atom = self.atoms[line_num]
         for start in pair:
-            if self.pdb_map[line_num]["atom_name"] == start:
-                print(self.pdb_map[line_num]["three_letter_code"] + ":" + self.pdb_map[line_num]["atom_name"] + ":" +
-                      pair[start])
-                self.pdb_map[line_num]["atom_name"] = pair[start]
+            if atom["atom_name"] == start:
+                print(atom["three_letter_code"] + ":" + atom["atom_name"] + ":" + pair[start])
+                self.atoms["atom_name"][line_num] = pair[start]
+                return
 
     def pdb_residue_alias(self, pairs: Dict[Any, Any]):
         """
         Replaces ALL occurances of old residue with new residue.
         pair is a dictionary. In C++ it would be an array of pairs.  [string old residue_name]:[string new residue_name]
         """
-        for num in range(0, len(self.pdb_map)):
-            for old in pairs:
-                if self.pdb_map[num]["residue_name"] == old:
-                    self.pdb_map[num]["residue_name"] = pairs[old]
+        self.pdb_alias(pairs, "three_letter_code")
 
     def pdb_chain_alias(self, pairs: Dict[Any, Any]):
         """
         Replaces ALL occurances of old chain with new chain.
         pair is a dictionary. In C++ it would be an array of pairs.  [string old chain]:[string new chain]
         """
-        for num in range(0, len(self.pdb_map)):
-            for old in pairs:
-                if self.pdb_map[num]["chain"] == old:
-                    self.pdb_map[num]["chain"] = pairs[old]
+        self.pdb_alias(pairs, "chain")
 
     def clean_PDB(self):
         """
@@ -572,92 +560,27 @@ class PythonPDB2:
 
         self.RESIDUES_aliased = False; self.WATER_aliased=False; self.IONS_aliased=False; self.DNA_aliased = False
 
-        waters: List[DefaultDict[str, str]] = [] #List of data that have waters
         print("Attempting to change residue names, atom names, and water")
-        for n in range(0, len(self.pdb_map)):
-            dat = self.pdb_map[n]
-
-            #print self.pdb_map[key]["three_letter_code"]
-            def alias_dna():
-                if dat["three_letter_code"]=="DA":
-                    self.DNA_aliased=True
-                    dat["three_letter_code"]="A"
-
-                elif dat["three_letter_code"]=="DT":
-                    self.DNA_aliased=True
-                    dat["three_letter_code"]="T"
-
-                elif dat["three_letter_code"]=="DC":
-                    self.DNA_aliased=True
-                    dat["three_letter_code"]="C"
-
-                elif dat["three_letter_code"]=="DG":
-                    self.DNA_aliased=True
-                    dat["three_letter_code"]="G"
-
-                else:
-                    return
-
-            def alias_water():
-                if dat["three_letter_code"] in ["HOH", "TIP3", "WAT", "TIP5"]:
-                    self.WATER_aliased=True
-                    dat["three_letter_code"]="TP3" #IO_STRING for TP3 is WAT...Buy still reads TP#?
-                    dat["id"]="HETATM"
-                    waters.append(dat)
-
-            #def alias_ions():
-                #if self.pdb_map[key]["chain"]=="I":
-                    #IONS_aliased= True
-                    #self.pdb_map[key]["id"]="HETATM"
-
-            def alias_residues():
-                if dat["three_letter_code"] == "HSD":
-                    self.RESIDUES_aliased = True
-                    dat["three_letter_code"]="HIS"
-
-            def alias_atoms():
-                if dat["three_letter_code"]== "SER ":
-                    atom_pairs = {"  HG1":"  HG "}
-
-                elif dat["three_letter_code"]=="ILE ":
-                    atom_pairs = {"  CD ":"  CD1"}
-                    self.pdb_map = self.pdb_atom_alias(n, atom_pairs)
-
-                elif dat["three_letter_code"]=="LEU ":
-                    atom_pairs = {"  OT1":"  O  ", "  OT2":"  OXT"}
-                    self.pdb_map = self.pdb_atom_alias(n, atom_pairs)
-
-                elif dat["three_letter_code"]=="VAL ":
-                    atom_pairs = {"  OT1":"  O  ", "  OT2":"  OXT"}
-                    self.pdb_map = self.pdb_atom_alias(n, atom_pairs)
-
-                elif dat["three_letter_code"]=="LYS ":
-                    atom_pairs = {"  HZ1":"  1HZ", "  HZ2":"  2HZ", "  HZ3":"  3HZ"}
-                    self.pdb_map = self.pdb_atom_alias(n, atom_pairs)
-
-                elif dat["three_letter_code"]=="ARG ":
-                    atom_pairs = {" HH11":" 1HH1", " HH12":" 2HH1", " HH21":" 1HH2", " HH22":" 2HH2"}
-                    self.pdb_map = self.pdb_atom_alias(n, atom_pairs)
-
-                elif dat["three_letter_code"]=="ASN ":
-                    atom_pairs = {"HD21":"1HD2", "HD22":"2HD2"}
-                    self.pdb_map = self.pdb_atom_alias(n, atom_pairs)
-
-                elif dat["three_letter_code"]=="PRO ":
-                    atom_pairs = {"  OT1":"  O  ", "  OT2":"  OXT", "  HD1":"  1HD", "  HD2":"  2HD", "  HB1":"  1HB", "  HG1":"  1HG", "  HG2":"  2HG"}
-                    self.pdb_map = self.pdb_atom_alias(n, atom_pairs)
-
-
-            #Unnessessary, but organized.
-            alias_water()
-            #alias_ions()
-            #alias_residues()
-            alias_atoms()
-            alias_dna()
-
-        #Removes Waters. Keeps Ions.
-        #for key in waters:
-            #self.pdb_map.pop(key)
+        name3 = self.atoms["three_letter_code"]
+
+        #Waters are kept, as TP3 HETATMs.
+        waters = np.isin(name3, ["HOH", "TIP3", "WAT", "TIP5"])
+        if np.any(waters):
+            self.WATER_aliased = True
+            name3[waters] = "TP3" #IO_STRING for TP3 is WAT...Buy still reads TP#?
+            self.atoms["id"][waters] = "HETATM"
+
+        #HSD is not aliased to HIS.
+        for residue, atom_pairs in ATOM_ALIASES.items():
+            residue_mask = name3 == residue
+            if not np.any(residue_mask): continue
+            for old, new in atom_pairs.items():
+                self.atoms["atom_name"][residue_mask & (self.atoms["atom_name"] == old)] = new
+
+        dna = np.isin(name3, list(DNA_ALIASES))
+        if np.any(dna):
+            self.DNA_aliased = True
+            self.pdb_residue_alias(DNA_ALIASES)
 
         #Outputs what was found:
         if self.RESIDUES_aliased:
@@ -709,38 +632,12 @@ class PythonPDB2:
         Replaces the b factor of each atom in the residue with data.
         Can be all string representations or not.
         """
-        
-        if type(resnum)!=str:
-            resnum = str(resnum)
-        if type(data)!=float:
-            data=float(data) #In case data is an integer.
-        
-        #Need to make sure Bfactor column is adjusted correctly.
-        
-        for line in range(0, len(self.pdb_map)):
-            if ((self.pdb_map[line]['residue_number']==resnum) and (self.pdb_map[line]['chain']==chain)):
-                self.pdb_map[line]['b_factor']="%.2f"%data
-            else:
-                continue
+        self.atoms["b_factor"][self.get_residue_mask(resnum, chain)] = round(float(data), 2)
 
     def replace_atom_b_factor(self, resnum: int, chain: str, atomname: str, data: float):
         """
         Replaces the b factor of an atom.
-        Can be all string representations or not.
+        Atom names are compared without their PDB padding.  Can be all string representations or not.
         """
-        
-        if type(resnum)!=str:
-            resnum = str(resnum)
-        if type(data)!=float:
-            data=float(data)
-        
-        #Need to make sure Bfactor column is adjusted correctly.
-        
-        for line in range(0, len(self.pdb_map)):
-            if ((self.pdb_map[line]['residue_number']==resnum) and (self.pdb_map[line]['chain']==chain) and (self.pdb_map[line]["atom_name"]==atomname)):
-                self.pdb_map[line]['b_factor']="%.2f"%data
-            else:
-                continue
-
-        
-        
\ No newline at end of file
+        mask = self.get_residue_mask(resnum, chain) & (self.get_atom_names() == atomname.strip())
+        self.atoms["b_factor"][mask] = round(float(data), 2)
@@ -19,6 +19,10 @@ try:
 except ImportError:
     print("Please reinstall python with sqlite3 support. ")
     exit()
+
+from jade2.basic.path import get_decoy_name
+from jade2.basic.structure.pdb_io import read_pdb_file, parse_pdb_buffer
+from jade2.basic.sql.pdb_tables import *
     
 
 
@@ -39,6 +43,7 @@ class SQLPose:
             else:
                 path = "test_db.db"
             self.db = sqlite3.connect(path)
+            set_bulk_pragmas(self.db)
             
         self.db_util = PDB_database(self.db)
         self.set_basic_options(pdbID, modelID, structID)
@@ -71,55 +76,52 @@ class SQLPose:
         if filePath == "PDB":
             print("Fetching "+self.pdbID+" from the PDB")
             FILE = urllib.request.urlopen(self.pdb_url+'/'+self.pdbID.lower()+'.pdb')
+            atoms = parse_pdb_buffer(FILE.read())[0]
+            FILE.close()
         else:
-            FILE = open(filePath)
-        line_num = 1
+            atoms = read_pdb_file(filePath)[0]
         with self.db:
             cur = self.db.cursor()
-            
-            l = 1
+
             if read_header:
                 cur.execute("CREATE TABLE IF NOT EXISTS header(id integer PRIMARY KEY, pdbID TEXT, modelID TEXT, method TEXT, resolution REAL, species TEXT, engineered TEXT, protein TEXT)")
             if not header_only:
-                cur.execute("CREATE TABLE IF NOT EXISTS pdb(l integer PRIMARY KEY, pdbID TEXT, modelID TEXT, strucID INT, type TEXT, atomNum INT, atomName TEXT, altLoc TEXT, residue TEXT, chain TEXT, resNum INT, icode TEXT, x REAL, y REAL, z REAL, occupancy REAL, bfactor REAL)")
-            #print "Tables created.  Loading "+self.pdbID+" data into table."
-            for line in FILE:
-                line = line.strip()
-                lineSP = line.split()
-                if not header_only:
-                    if (lineSP[0]=="ATOM" or lineSP[0]=="HETATM"):
-                        
-                        #Only copy a specific chain into the database.
-                        if not specific_chain:
-                            pass
-                        else:
-                            if specific_chain != line[21].strip():
-                                continue
-                            
-                            
-                        cur.execute("INSERT INTO pdb VALUES(NULL, ?, ?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)", \
-                        (self.pdbID, self.modelID, self.structID, lineSP[0], \
-                         
-                        
-                        #atomNum INT             atomName TEXT             altLoc TEXT           residue TEXT
-                        line[6:11].strip(),      line[12:16],               line[16],             line[17:21].strip(), \
-                        #chain TEXT              resNum INT                icode TEXT            x REAL
-                        line[21].strip(),        line[22:26].strip(),      line[26],             line[27:38].strip(), \
-                        #y REAL                  z REAL                    occupancy REAL        bfactor REAL
-                        line[38:46].strip(),     line[46:54].strip(),      line[54:60].strip(),  line[60:66].strip()))
-                        l+=1
-                        
-                        
-                        
-                        #self.stripped_pdb[line_num]["element"]=line[66:78].strip();        self.stripped_pdb[line_num]["charge"]=line[78:79].strip())
-                      
-    
+                create_pdb_tables(cur)
+                #print "Tables created.  Loading "+self.pdbID+" data into table."
+                insert_pdb_rows(cur, get_pdb_rows(atoms, self.pdbID, self.modelID, self.structID, specific_chain))
+                create_pdb_indexes(cur)
+
+    def read_pdbs_into_database(self, paths, modelID=None, specific_chain=False):
+        """
+        Reads many PDBs (such as a whole decoy set) into the database in one transaction.
+        Each is a new structure: pdbID is the decoy name and strucID a new integer, both recorded in the structures table.
+        Indexes are created once at the end.  Returns the strucIDs.
+        """
+        if modelID is None:
+            modelID = self.modelID
+
+        strucIDs = []
+        with self.db:
+            cur = self.db.cursor()
+            create_pdb_tables(cur)
+            strucID = get_next_strucID(cur)
+            for path in paths:
+                path = str(path)
+                rows = get_pdb_rows(read_pdb_file(path)[0], get_decoy_name(path), modelID, strucID, specific_chain)
+
+                insert_pdb_rows(cur, rows)
+                cur.execute("INSERT INTO structures VALUES(?, ?, ?, ?, ?)", (strucID, get_decoy_name(path), modelID, os.path.abspath(path), len(rows)))
+                strucIDs.append(strucID)
+                strucID += 1
+            create_pdb_indexes(cur)
+        return strucIDs
+
     def fetch_and_read_pdb_into_database(self, pdbID, read_header=False, header_only=False):
         """
         Uses the PDB file specified, grabs it from the PDB, and reads the data in.
         """
         self.pdbID = pdbID
-        self.read_pdb_into_database_flat("PDB", read_header, header_only)
+        self.read_pdb_into_database_flat("PDB", read_header=read_header, header_only=header_only)
         
     
 
@@ -198,6 +200,26 @@ class PDB_database:
     def query_piece_pdbID_and_strucID(self, table, pdbID, start, end, chain, strucID):
         self.cur.execute("SELECT * FROM "+table+" WHERE pdbID=? AND chain=? AND strucID=? and resnum BETWEEN ? AND ?", (pdbID, chain, strucID, start, end))
     
+    def query_atoms(self, table, chain, start, end, atom_name):
+        """
+        Query one atom type (such as CA) of a residue range in every structure of the database - such as the CDR H3 CA atoms
+        of a whole decoy set - with one indexed statement.  Rows are ordered by structure, then as read.
+        """
+        self.cur.execute("SELECT * FROM "+table+" WHERE chain=? AND trim(atomName)=? AND resnum BETWEEN ? AND ? ORDER BY strucID, l", (chain, atom_name.strip(), start, end))
+
+    def query_structures(self):
+        """
+        Query the structures read by read_pdbs_into_database (strucID, pdbID, modelID, path, n_atoms).
+        """
+        self.cur.execute("SELECT * FROM structures ORDER BY strucID")
+
+    def create_indexes(self, table="pdb"):
+        """
+        Index a pdb table made before indexes were created automatically.
+        """
+        create_pdb_indexes(self.db, self.scrub(table))
+        self.db.commit()
+
     def scrub(self, table_name):
         """
         This should help protect from sql injection.  Not that it's important now, but...
@@ -298,7 +320,7 @@ class PDB_database:
                str(row['altLoc'])+            (str(row['residue']).rjust(3)).ljust(4)+ str(row['chain'])+             \
                str(row['resNum']).rjust(4)+   str(row['icode']) +                                              \
                ("%.3f"%row['x']).rjust(11)+   ("%.3f"%row['y']).rjust(8)+       ("%.3f"%row['z']).rjust(8) +   \
-               str(occupancy).rjust(6)+str(row['bfactor']).rjust(6)
+               str(blank_null(occupancy)).rjust(6)+str(blank_null(row['bfactor'])).rjust(6)
 
         
         return line
@@ -0,0 +1,421 @@
+import os
+import pickle
+import hashlib
+import logging
+import zipfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Tuple, Union
+
+import numpy as np
+import Bio
+from Bio.PDB.Structure import Structure
+from Bio.PDB.Model import Model
+from Bio.PDB.Chain import Chain
+from Bio.PDB.Residue import Residue, DisorderedResidue
+from Bio.PDB.Atom import Atom, DisorderedAtom
+
+from jade2.basic.ComputationCache import ComputationCache
+from jade2.basic.restype_definitions import RestypeDefinitions
+
+#Cache of parsed structures, keyed by the content of the file.
+# Each structure is kept on disk as one .npz of flat tables (models, chains, residues, atoms) plus the header and the
+# sequence of each chain, and a memory-bounded LRU keeps recently used tables.  A hit rebuilds the Biopython
+# Structure straight from the tables without running PDBParser or MMCIFParser.
+#
+# Only what the parsers set is kept: ANISOU records are kept, SIGUIJ and SIGATM records are not.
+
+#Bump when the layout of a cached structure changes.  Old files are then ignored.
+CACHE_VERSION = 1
+
+#Environment variable giving the directory of the default cache.  BioPose uses the default cache when it is set.
+CACHE_ENV = "JADE_STRUCTURE_CACHE"
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "jade2", "structures")
+
+#Memory bound of the in-memory layer.  A 5000 atom structure takes about 0.5 MB.
+DEFAULT_MAX_BYTES = 256 * 1024 ** 2
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_default_cache(force: bool = False) -> Union["StructureCache", None]:
+    """
+    Get the shared StructureCache of this process, in $JADE_STRUCTURE_CACHE (or ~/.cache/jade2/structures).
+    Returns None if the environment variable is not set, unless force is True.
+
+    :param force: bool
+    :rtype: StructureCache or None
+    """
+    global _default_cache
+    if not force and not os.environ.get(CACHE_ENV):
+        return None
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = StructureCache()
+        return _default_cache
+
+def get_file_hash(path: Union[Path, str]) -> str:
+    """
+    Get the key of a file: the sha1 of its bytes, the cache version and the Biopython version
+    (so a new parser never returns tables of an old one).
+
+    :param path: Path or str
+    :rtype: str
+    """
+    h = hashlib.sha1("{}:{}:".format(CACHE_VERSION, Bio.__version__).encode())
+    with open(str(path), 'rb') as INFILE:
+        for block in iter(lambda: INFILE.read(1024 ** 2), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def get_record_sequences(record: Dict[str, np.ndarray], model_index: int = 0) -> "OrderedDict[str, str]":
+    """
+    Get the sequence of each chain of a model, as util.get_seq_from_biochain:
+    only non-hetero residues are used, and residues without a one letter code are skipped.
+    Chains without non-hetero residues are left out.
+
+    :param record: dict of tables from structure_to_record
+    :param model_index: int
+    :rtype: OrderedDict
+    """
+    d = RestypeDefinitions()
+    codes = {}
+    sequences = OrderedDict()
+    residues_chain = record['residue_chain']
+    keep = (record['residue_hetfield'] == ' ') & record['residue_selected']
+    for c in np.flatnonzero(record['chain_model'] == model_index):
+        resnames = record['residue_resname'][keep & (residues_chain == c)].tolist()
+        if not resnames:
+            continue
+        seq = []
+        for resname in resnames:
+            if resname not in codes:
+                codes[resname] = d.get_one_letter_from_three(resname)
+            if codes[resname]:
+                seq.append(codes[resname])
+        sequences[str(record['chain_id'][c])] = "".join(seq)
+    return sequences
+
+def structure_to_record(structure: Structure, header: Dict) -> Dict[str, np.ndarray]:
+    """
+    Flatten a Biopython structure and its header into tables of arrays.
+
+    Residues of a DisorderedResidue share a slot of their chain, and atoms of a DisorderedAtom share a slot of
+    their residue.  Wrapped residues and atoms are flagged (a wrapper may hold a single one), as is the selected
+    residue or atom of each wrapper.
+
+    :param structure: Bio.PDB.Structure.Structure
+    :param header: dict
+    :rtype: dict
+    """
+    models = []
+    chains = []
+    residues = []
+    atoms = []
+    for m, model in enumerate(structure):
+        models.append((model.id, model.serial_num))
+        for chain in model:
+            c = len(chains)
+            chains.append((chain.id, m))
+            for slot, entry in enumerate(chain):
+                group = entry.disordered_get_list() if entry.is_disordered() == 2 else [entry]
+                for residue in group:
+                    r = len(residues)
+                    residues.append((c, slot, residue.id[0], residue.id[1], residue.id[2], residue.resname,
+                                     residue.segid, residue.disordered, residue is not entry,
+                                     residue is entry or residue is entry.selected_child))
+                    for a, atom_entry in enumerate(residue):
+                        alternates = atom_entry.disordered_get_list() if atom_entry.is_disordered() == 2 else [atom_entry]
+                        for atom in alternates:
+                            atoms.append((atom, r, a, atom is not atom_entry, atom is atom_entry or atom is atom_entry.selected_child))
+
+    def column(rows, i, dtype=None):
+        return np.array([row[i] for row in rows], dtype=dtype)
+
+    anisou = np.full((len(atoms), 6), np.nan, dtype=np.float32)
+    for i, row in enumerate(atoms):
+        atom = row[0]
+        if atom.anisou_array is not None:
+            anisou[i] = atom.anisou_array
+
+    record = {
+        'model_id': column(models, 0, np.int64),
+        'model_serial': column(models, 1, np.int64),
+        'chain_id': column(chains, 0, str),
+        'chain_model': column(chains, 1, np.int64),
+        'residue_chain': column(residues, 0, np.int64),
+        'residue_slot': column(residues, 1, np.int64),
+        'residue_hetfield': column(residues, 2, str),
+        'residue_resseq': column(residues, 3, np.int64),
+        'residue_icode': column(residues, 4, str),
+        'residue_resname': column(residues, 5, str),
+        'residue_segid': column(residues, 6, str),
+        'residue_disordered': column(residues, 7, np.int8),
+        'residue_wrapped': column(residues, 8, bool),
+        'residue_selected': column(residues, 9, bool),
+        'atom_residue': column(atoms, 1, np.int64),
+        'atom_slot': column(atoms, 2, np.int64),
+        'atom_wrapped': column(atoms, 3, bool),
+        'atom_selected': column(atoms, 4, bool),
+        'atom_name': np.array([atom.name for atom, *rest in atoms], dtype=str),
+        'atom_fullname': np.array([atom.fullname for atom, *rest in atoms], dtype=str),
+        'atom_altloc': np.array([atom.altloc for atom, *rest in atoms], dtype=str),
+        'atom_element': np.array([atom.element or "" for atom, *rest in atoms], dtype=str),
+        'atom_serial': np.array([-1 if atom.serial_number is None else atom.serial_number for atom, *rest in atoms], dtype=np.int64),
+        'atom_disordered': np.array([atom.disordered_flag for atom, *rest in atoms], dtype=np.int8),
+        'atom_coord': np.array([atom.coord for atom, *rest in atoms], dtype=np.float32).reshape(-1, 3),
+        'atom_bfactor': np.array([atom.bfactor for atom, *rest in atoms], dtype=np.float64),
+        'atom_occupancy': np.array([np.nan if atom.occupancy is None else atom.occupancy for atom, *rest in atoms], dtype=np.float64),
+        'atom_anisou': anisou,
+        'header': np.frombuffer(pickle.dumps(header, protocol=pickle.HIGHEST_PROTOCOL), dtype=np.uint8),
+    }
+    sequences = get_record_sequences(record) if len(models) else OrderedDict()
+    record['sequence_chain'] = np.array(list(sequences.keys()), dtype=str)
+    record['sequence'] = np.array(list(sequences.values()), dtype=str)
+    return record
+
+def record_to_structure(record: Dict[str, np.ndarray], structure_id: str) -> Tuple[Structure, Dict]:
+    """
+    Rebuild the Biopython structure and header of a record from structure_to_record.
+
+    Entities are added top-down, so Entity.add never resets the full ids of existing children, and atoms are
+    attached directly.  This is what makes a rebuild several times faster than parsing.
+
+    :param record: dict
+    :param structure_id: str
+    :rtype: tuple(bio.PDB.Structure.Structure, dict)
+    """
+    structure = Structure(structure_id)
+    models = [Model(model_id, serial) for model_id, serial in zip(record['model_id'].tolist(), record['model_serial'].tolist())]
+    for model in models:
+        structure.add(model)
+
+    chains = []
+    for chain_id, m in zip(record['chain_id'].tolist(), record['chain_model'].tolist()):
+        chain = Chain(chain_id)
+        models[m].add(chain)
+        chains.append(chain)
+
+    #disordered_add selects each child it adds, so the recorded selections are applied once every group is built.
+    selections = []
+
+    residues = []
+    last_slot = (-1, -1)
+    for c, slot, hetfield, resseq, icode, resname, segid, disordered, wrapped, selected in zip(
+            record['residue_chain'].tolist(), record['residue_slot'].tolist(), record['residue_hetfield'].tolist(),
+            record['residue_resseq'].tolist(), record['residue_icode'].tolist(), record['residue_resname'].tolist(),
+            record['residue_segid'].tolist(), record['residue_disordered'].tolist(), record['residue_wrapped'].tolist(),
+            record['residue_selected'].tolist()):
+
+        residue = Residue((hetfield, resseq, icode), resname, segid)
+        residue.disordered = disordered
+        chain = chains[c]
+        if not wrapped:
+            chain.add(residue)
+        else:
+            #Point mutations: residues of the same id, wrapped in a DisorderedResidue.
+            if (c, slot) != last_slot:
+                chain.add(DisorderedResidue(residue.id))
+            wrapper = chain.child_list[-1]
+            wrapper.disordered_add(residue)
+            if selected:
+                selections.append((wrapper, resname))
+        residues.append(residue)
+        last_slot = (c, slot)
+
+    coords = record['atom_coord'].copy()
+    anisou = record['atom_anisou']
+    has_anisou = ~np.isnan(anisou[:, 0])
+    occupancy = [None if o != o else o for o in record['atom_occupancy'].tolist()]
+    serials = [None if s == -1 else s for s in record['atom_serial'].tolist()]
+
+    last_slot = (-1, -1)
+    for i, (r, slot, name, fullname, altloc, element, bfactor, disordered, wrapped, selected) in enumerate(zip(
+            record['atom_residue'].tolist(), record['atom_slot'].tolist(), record['atom_name'].tolist(),
+            record['atom_fullname'].tolist(), record['atom_altloc'].tolist(), record['atom_element'].tolist(),
+            record['atom_bfactor'].tolist(), record['atom_disordered'].tolist(), record['atom_wrapped'].tolist(),
+            record['atom_selected'].tolist())):
+
+        residue = residues[r]
+        atom = Atom(name, coords[i], bfactor, occupancy[i], altloc, fullname, serials[i], element or None)
+        atom.disordered_flag = disordered
+        if has_anisou[i]:
+            atom.anisou_array = anisou[i].copy()
+
+        if not wrapped:
+            #Attached directly: Residue.add would check for duplicates and recompute the full id of every atom.
+            atom.parent = residue
+            atom.full_id = residue.get_full_id() + ((name, altloc),)
+            residue.child_list.append(atom)
+            residue.child_dict[name] = atom
+        else:
+            #Alternate locations, wrapped in a DisorderedAtom.
+            if (r, slot) != last_slot:
+                wrapper = DisorderedAtom(name)
+                wrapper.parent = residue
+                residue.child_list.append(wrapper)
+                residue.child_dict[name] = wrapper
+            wrapper = residue.child_list[-1]
+            wrapper.disordered_add(atom)
+            if selected:
+                selections.append((wrapper, altloc))
+        last_slot = (r, slot)
+
+    for wrapper, child_id in selections:
+        wrapper.disordered_select(child_id)
+
+    header = pickle.loads(record['header'].tobytes())
+    return structure, header
+
+def save_record(path: str, record: Dict[str, np.ndarray]):
+    """
+    Write a record to an .npz file.  The file is written to a temporary name and moved in place,
+    so other processes never read a partly written file.
+
+    :param path: str
+    :param record: dict
+    """
+    tmp = "{}.{}.{}.tmp".format(path, os.getpid(), threading.get_ident())
+    try:
+        with open(tmp, 'wb') as OUTFILE:
+            np.savez(OUTFILE, **record)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def load_record(path: str) -> Dict[str, np.ndarray]:
+    """
+    Read a record written by save_record.
+
+    :param path: str
+    :rtype: dict
+    """
+    with np.load(path, allow_pickle=False) as data:
+        return {key: data[key] for key in data.files}
+
+class StructureCache(object):
+    """
+    A content-keyed cache of parsed structures, on disk and in memory.
+
+    get_structure returns the (structure, header) of a file, calling parse() only if the content of the file has
+    never been cached.  Each call returns a new Structure, so callers can edit it freely.  Sequences of the first
+    model can be read with get_sequences without building a Structure at all.
+
+    The key of a file is the hash of its content, so renamed or copied files share an entry and edited files never
+    return stale structures.  Hashes are remembered by path, size and modification time.
+
+    Example:
+        cache = StructureCache()
+        pose = BioPose("2j88.pdb", cache=cache)
+        seqs = cache.get_sequences("2j88.pdb", lambda: BioPose.parse_file("2j88.pdb"))
+    """
+    def __init__(self, cache_dir: Union[Path, str] = None, max_bytes: int = DEFAULT_MAX_BYTES, use_disk: bool = True):
+        self.cache_dir = str(cache_dir or os.environ.get(CACHE_ENV) or DEFAULT_CACHE_DIR)
+        self.use_disk = use_disk
+        self.memory = ComputationCache(max_bytes)
+        self.parsed = 0
+
+        self._hashes = {}
+        self._lock = threading.Lock()
+        if self.use_disk:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+            except OSError as e:
+                logging.warning("Structure cache directory is not usable, only caching in memory: "+str(e))
+                self.use_disk = False
+
+    def get_key(self, path: Union[Path, str]) -> str:
+        """
+        Get the content hash of a file, hashing it again only if its size or modification time changed.
+
+        :param path: Path or str
+        :rtype: str
+        """
+        path = os.path.abspath(str(path))
+        stat = os.stat(path)
+        stamp = (stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            known = self._hashes.get(path)
+        if known and known[0] == stamp:
+            return known[1]
+        key = get_file_hash(path)
+        with self._lock:
+            self._hashes[path] = (stamp, key)
+        return key
+
+    def get_cache_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + ".npz")
+
+    def get_record(self, path: Union[Path, str], parse: Callable[[], Tuple[Structure, Dict]]) -> Dict[str, np.ndarray]:
+        """
+        Get the tables of a file, from memory, then disk, then by calling parse().
+
+        :param path: Path or str
+        :param parse: function without arguments returning (structure, header)
+        :rtype: dict
+        """
+        key = self.get_key(path)
+        return self.memory.get(key, lambda: self._load(key, parse))
+
+    def _load(self, key: str, parse: Callable[[], Tuple[Structure, Dict]]) -> Dict[str, np.ndarray]:
+        cache_path = self.get_cache_path(key)
+        if self.use_disk and os.path.exists(cache_path):
+            try:
+                return load_record(cache_path)
+            except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+                logging.warning("Reparsing structure, cached file is unreadable: "+cache_path+" "+str(e))
+
+        structure, header = parse()
+        self.parsed += 1
+        record = structure_to_record(structure, header)
+        if self.use_disk:
+            try:
+                save_record(cache_path, record)
+            except OSError as e:
+                logging.warning("Could not write cached structure "+cache_path+": "+str(e))
+        return record
+
+    def get_structure(self, path: Union[Path, str], parse: Callable[[], Tuple[Structure, Dict]], structure_id: str = None) -> Tuple[Structure, Dict]:
+        """
+        Get a new (structure, header) of a file.
+
+        :param path: Path or str
+        :param parse: function without arguments returning (structure, header)
+        :param structure_id: str.  Default is the file name.
+        :rtype: tuple(bio.PDB.Structure.Structure, dict)
+        """
+        if structure_id is None:
+            structure_id = os.path.basename(str(path))
+        return record_to_structure(self.get_record(path, parse), structure_id)
+
+    def get_sequences(self, path: Union[Path, str], parse: Callable[[], Tuple[Structure, Dict]]) -> "OrderedDict[str, str]":
+        """
+        Get the sequence of each chain of the first model (see get_record_sequences), without building a structure.
+
+        :param path: Path or str
+        :param parse: function without arguments returning (structure, header)
+        :rtype: OrderedDict
+        """
+        record = self.get_record(path, parse)
+        return OrderedDict(zip(record['sequence_chain'].tolist(), record['sequence'].tolist()))
+
+    def clear(self, disk: bool = False):
+        """
+        Empty the memory layer, and the cached files too if disk is True.
+
+        :param disk: bool
+        """
+        self.memory.clear()
+        with self._lock:
+            self._hashes.clear()
+        if disk and self.use_disk:
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".npz"):
+                    os.remove(os.path.join(self.cache_dir, name))
+
+    def get_stats(self) -> str:
+        return "{} parsed, memory: {}".format(self.parsed, self.memory.get_stats())
@@ -62,6 +62,37 @@ def atomic_distance(res1: Residue, res2: Residue, res1_atom_name: str, res2_atom
         logging.debug("Residue does not have the atom name or there is a problem in the vector.  Returning 0")
         raise IndexError
 
+#Backbone atoms a residue needs for its dihedrals to be computed, in the order of get_backbone_coords.
+BACKBONE_ATOMS = ['N', 'CA', 'C', 'O']
+
+#Maximum C-N distance of a peptide bond, as in is_connected_to_next.
+PEPTIDE_BOND_CUTOFF = 1.8
+
+def get_backbone_coords(residues: List[Residue], atom_names: List[str] = BACKBONE_ATOMS) -> numpy.ndarray:
+    """
+    Get the coordinates of the backbone atoms of each residue in one pass, as a (residues x atoms x 3) array.
+    Missing atoms are NaN.
+    :param residues: list[Bio.PDB.Residue.Residue]
+    :param atom_names: list[str]
+    :rtype: numpy.ndarray
+    """
+    coords = numpy.full((len(residues), len(atom_names), 3), numpy.nan)
+    for i, res in enumerate(residues):
+        for j, name in enumerate(atom_names):
+            if name in res:
+                coords[i, j] = res[name].coord
+    return coords
+
+def get_peptide_bond_lengths(coords: numpy.ndarray) -> numpy.ndarray:
+    """
+    Get the C(i) - N(i+1) distance of each pair of consecutive residues from get_backbone_coords (NaN if an atom is missing).
+    :param coords: numpy.ndarray
+    :rtype: numpy.ndarray
+    """
+    n = BACKBONE_ATOMS.index('N')
+    c = BACKBONE_ATOMS.index('C')
+    return numpy.linalg.norm(coords[:-1, c] - coords[1:, n], axis=-1)
+
 ########  OLD Biopython Utility Functions replaced by BIOPose ########
 
 def has_id(model, id) -> bool:
@@ -0,0 +1,458 @@
+import gzip
+import mmap
+from collections import OrderedDict
+from pathlib import Path
+from typing import Union, List, Tuple, Any, Dict
+
+import numpy as np
+
+#Fixed-column PDB reading and writing on whole columns at once.
+# Atom lines are cut out of the file buffer as one (atoms x 80) byte matrix, so every field is
+# a slice of that matrix and converting a field to numbers is a single array conversion.
+# Writing pads or formats each column for all atoms, then joins the columns.
+
+#Typed columns of the atom array.  Names match the keys of the old PythonPDB2 pdb_map dictionaries.
+#String columns hold the PDB columns as read (atom_name keeps its padding).
+PDB_DTYPE = np.dtype([
+    ("id", "U6"),
+    ("atom_number", np.int64),
+    ("atom_name", "U4"),
+    ("alternate_location", "U1"),
+    ("three_letter_code", "U4"),
+    ("chain", "U1"),
+    ("residue_number", np.int64),
+    ("i_code", "U1"),
+    ("x", np.float64),
+    ("y", np.float64),
+    ("z", np.float64),
+    ("occupancy", np.float64),
+    ("b_factor", np.float64),
+    ("element", "U12"),
+    ("charge", "U2")
+])
+
+#String format of float columns when viewed as a pdb_map.  Blank columns are held as NaN.
+FLOAT_FORMATS = OrderedDict([("x", "%.3f"), ("y", "%.3f"), ("z", "%.3f"), ("occupancy", "%.2f"), ("b_factor", "%.2f")])
+
+INT_FIELDS = ("atom_number", "residue_number")
+
+#(start, end, strip) of each field in an atom line.  x starts at 27 rather than 30, as PythonPDB2 always read it.
+PDB_COLUMNS = OrderedDict([
+    ("id", (0, 6, True)),
+    ("atom_number", (6, 11, True)),
+    ("atom_name", (12, 16, False)),
+    ("alternate_location", (16, 17, False)),
+    ("three_letter_code", (17, 21, True)),
+    ("chain", (21, 22, False)),
+    ("residue_number", (22, 26, True)),
+    ("i_code", (26, 27, False)),
+    ("x", (27, 38, True)),
+    ("y", (38, 46, True)),
+    ("z", (46, 54, True)),
+    ("occupancy", (54, 60, True)),
+    ("b_factor", (60, 66, True)),
+    ("element", (66, 78, True)),
+    ("charge", (78, 79, True))
+])
+
+LINE_WIDTH = 80
+
+BACKBONE_ATOMS = ("N", "CA", "C", "O")
+
+def value_from_string(field: str, value: Any) -> Any:
+    """
+    Convert a pdb_map string value to the type of the field in PDB_DTYPE.
+    Blank floats become NaN and blank or unreadable integers (such as overflowed serials) become 0.
+    """
+    if field in FLOAT_FORMATS:
+        value = str(value).strip()
+        return float(value) if value else np.nan
+    elif field in INT_FIELDS:
+        try:
+            return int(str(value).strip() or 0)
+        except ValueError:
+            return 0
+    return value
+
+def value_to_string(field: str, value: Any) -> str:
+    """
+    Convert a typed value to the string held in a pdb_map.
+    """
+    if field in FLOAT_FORMATS:
+        return "" if np.isnan(value) else FLOAT_FORMATS[field] % value
+    return str(value)
+
+def get_string_columns(atoms: np.ndarray) -> Dict[str, List[str]]:
+    """
+    Get every column of an atom array as a list of pdb_map strings.  Float columns are formatted all at once.
+
+    :param atoms: np.ndarray of PDB_DTYPE
+    :rtype: dict
+    """
+    columns = {}
+    for field in PDB_DTYPE.names:
+        values = atoms[field]
+        if field in FLOAT_FORMATS:
+            strings = np.char.mod(FLOAT_FORMATS[field], values)
+            strings[np.isnan(values)] = ""
+            columns[field] = strings.tolist()
+        else:
+            columns[field] = values.astype(str).tolist()
+    return columns
+
+def get_atom_coords(atoms: np.ndarray) -> np.ndarray:
+    """
+    Get the n x 3 coordinates of an atom array.
+
+    :param atoms: np.ndarray of PDB_DTYPE
+    :rtype: np.ndarray
+    """
+    return np.stack([atoms['x'], atoms['y'], atoms['z']], axis=1)
+
+def get_hydrogen_mask(atoms: np.ndarray) -> np.ndarray:
+    """
+    Get the mask of hydrogen atoms.  The element column is often blank in Rosetta output, so fall back on the atom name.
+
+    :param atoms: np.ndarray of PDB_DTYPE
+    :rtype: np.ndarray
+    """
+    elements = np.char.strip(atoms['element'])
+    names = np.char.lstrip(np.char.strip(atoms['atom_name']), '0123456789')
+    return (elements == 'H') | ((elements == '') & np.char.startswith(names, 'H'))
+
+def get_atom_mask(atoms: np.ndarray, chains: Union[str, List[str]] = None, atom_names: Union[str, List[str]] = None,
+                  start: int = None, end: int = None, heavy_atoms: bool = False) -> np.ndarray:
+    """
+    Get a mask of atoms.  Each option that is given narrows it.
+
+    :param atoms: np.ndarray of PDB_DTYPE
+    :param chains: chains, such as 'LH' or ['L', 'H']
+    :param atom_names: atom name or list of atom names (without PDB padding), such as 'CA' or BACKBONE_ATOMS
+    :param start: int.  First residue number
+    :param end: int.  Last residue number
+    :param heavy_atoms: bool.  No hydrogens
+    :rtype: np.ndarray
+    """
+    mask = np.ones(len(atoms), dtype=bool)
+    if chains is not None:
+        mask &= np.isin(atoms['chain'], list(chains))
+    if atom_names is not None:
+        mask &= np.isin(np.char.strip(atoms['atom_name']), [atom_names] if isinstance(atom_names, str) else list(atom_names))
+    if start is not None:
+        mask &= atoms['residue_number'] >= start
+    if end is not None:
+        mask &= atoms['residue_number'] <= end
+    if heavy_atoms:
+        mask &= ~get_hydrogen_mask(atoms)
+    return mask
+
+####################################################################
+# Reading
+#
+#
+
+def _get_line_matrix(buf: np.ndarray, starts: np.ndarray, lengths: np.ndarray, width: int) -> np.ndarray:
+    """
+    Get the first width bytes of each line as a (lines x width) matrix, padded with spaces.
+    """
+    offsets = np.arange(width)
+    index = np.minimum(starts[:, None] + offsets, len(buf) - 1)
+    return np.where(offsets < lengths[:, None], buf[index], np.uint8(ord(" "))).astype(np.uint8)
+
+def _bytes_to_str(values: np.ndarray) -> np.ndarray:
+    """
+    Convert a byte-string array to a str array through its character codes (much faster than astype for ASCII).
+    """
+    width = values.dtype.itemsize
+    codes = np.ascontiguousarray(values).view(np.uint8).reshape(len(values), width).astype(np.uint32)
+    return codes.view("U"+str(width)).ravel()
+
+def _get_field(matrix: np.ndarray, start: int, end: int, strip: bool) -> np.ndarray:
+    values = np.ascontiguousarray(matrix[:, start:end]).view("S"+str(end - start)).ravel()
+    if strip:
+        values = np.char.strip(values)
+    return values
+
+def _to_numbers(field: str, values: np.ndarray) -> np.ndarray:
+    """
+    Convert a byte-string column to numbers.  Blanks become NaN (floats) or 0 (integers), as in value_from_string.
+    """
+    dtype = PDB_DTYPE[field]
+    numbers = np.full(len(values), np.nan if dtype.kind == 'f' else 0, dtype=dtype)
+    present = values != b""
+    try:
+        numbers[present] = values[present].astype(dtype)
+    except ValueError:
+        #Unreadable values, such as '*****' serials.  Rare, so convert one by one.
+        numbers[present] = [value_from_string(field, v.decode("latin-1")) for v in values[present]]
+    return numbers
+
+def parse_atom_matrix(matrix: np.ndarray) -> np.ndarray:
+    """
+    Convert a (atoms x 80) byte matrix of ATOM/HETATM lines into an atom array.
+
+    :param matrix: np.ndarray of uint8
+    :rtype: np.ndarray
+    """
+    atoms = np.zeros(len(matrix), dtype=PDB_DTYPE)
+    for field, (start, end, strip) in PDB_COLUMNS.items():
+        values = _get_field(matrix, start, end, strip)
+        if field in FLOAT_FORMATS or field in INT_FIELDS:
+            atoms[field] = _to_numbers(field, values)
+        else:
+            atoms[field] = _bytes_to_str(values)
+    return atoms
+
+def parse_pdb_buffer(data) -> Tuple[np.ndarray, List[str], List[str]]:
+    """
+    Parse the bytes of a PDB file (bytes, bytearray, mmap, or a uint8 array) into an atom array,
+    header lines and REMARK lines, with the same rules as PythonPDB2.read_pdb_from_lines:
+    END and TER lines, blank lines and # comments are skipped, and everything else goes into the header.
+
+    :param data: bytes-like
+    :rtype: (np.ndarray, list, list)
+    """
+    buf = np.frombuffer(data, dtype=np.uint8)
+    if not len(buf):
+        return np.zeros(0, dtype=PDB_DTYPE), [], []
+
+    ends = np.flatnonzero(buf == ord("\n"))
+    if not len(ends) or ends[-1] != len(buf) - 1:
+        ends = np.append(ends, len(buf))
+    starts = np.concatenate([[0], ends[:-1] + 1])
+    lengths = ends - starts
+    #Windows line endings
+    has_cr = lengths > 0
+    has_cr[has_cr] = buf[ends[has_cr] - 1] == ord("\r")
+    lengths -= has_cr
+
+    record = _get_line_matrix(buf, starts, lengths, 6)
+    is_atom = np.all(record[:, :4] == np.frombuffer(b"ATOM", dtype=np.uint8), axis=1) | \
+              np.all(record == np.frombuffer(b"HETATM", dtype=np.uint8), axis=1)
+
+    atoms = parse_atom_matrix(_get_line_matrix(buf, starts[is_atom], lengths[is_atom], LINE_WIDTH))
+
+    header = []
+    remarks = []
+    for i in np.flatnonzero(~is_atom):
+        line = bytes(buf[starts[i]:starts[i] + lengths[i]]).decode("latin-1").strip()
+        if not line or line.startswith('#'): continue
+        if "REMARK" in line[0:6]:
+            remarks.append(line)
+        elif "END" in line[0:6] or "TER" in line[0:6]:
+            pass
+        else:
+            header.append(line)
+    return atoms, header, remarks
+
+def parse_pdb_lines(lines: List[str]) -> Tuple[np.ndarray, List[str], List[str]]:
+    """
+    Parse PDB lines (str or bytes) into an atom array, header lines and REMARK lines.
+
+    :param lines: list
+    :rtype: (np.ndarray, list, list)
+    """
+    lines = [line if isinstance(line, bytes) else line.encode("latin-1", "replace") for line in lines]
+    lines = [line if line.endswith(b"\n") else line+b"\n" for line in lines]
+    return parse_pdb_buffer(b"".join(lines))
+
+def read_pdb_file(path: Union[str, Path], use_mmap: bool = True) -> Tuple[np.ndarray, List[str], List[str]]:
+    """
+    Read a PDB file (optionally gzipped) into an atom array, header lines and REMARK lines.
+    Plain files are memory-mapped if use_mmap, so the file is not copied into memory first.
+    Gzipped files are decompressed into one buffer.
+
+    :param path: str
+    :param use_mmap: bool
+    :rtype: (np.ndarray, list, list)
+    """
+    path = str(path)
+    if path.endswith(".gz"):
+        with gzip.open(path, 'rb') as INFILE:
+            return parse_pdb_buffer(INFILE.read())
+
+    with open(path, 'rb') as INFILE:
+        if not use_mmap:
+            return parse_pdb_buffer(INFILE.read())
+        try:
+            mapped = mmap.mmap(INFILE.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            #Empty file
+            return parse_pdb_buffer(b"")
+        try:
+            return parse_pdb_buffer(mapped)
+        finally:
+            mapped.close()
+
+####################################################################
+# Writing
+#
+#
+
+#(field, width, decimals or None for strings, justification of strings) of each column of a written atom line.
+PDB_WRITE_COLUMNS = [
+    ("id", 6, None, 'left'),
+    ("atom_number", 5, 0, None),
+    (" ", 1, None, 'left'),
+    ("atom_name", 4, None, 'left'),
+    ("alternate_location", 1, None, 'left'),
+    ("three_letter_code", 4, None, 'residue'),
+    ("chain", 1, None, 'left'),
+    ("residue_number", 4, 0, None),
+    ("i_code", 1, None, 'left'),
+    ("x", 11, 3, None),
+    ("y", 8, 3, None),
+    ("z", 8, 3, None),
+    ("occupancy", 6, 2, None),
+    ("b_factor", 6, 2, None)
+]
+
+def _format_strings(values: np.ndarray, width: int, justify: str) -> np.ndarray:
+    """
+    Format a string column as a (atoms x width) byte matrix.  Longer strings are cut to width.
+    """
+    if justify == 'residue':
+        #Three letter codes are right-justified in 3 columns, so DA is ' DA '
+        values = np.char.ljust(np.char.rjust(values, 3), width)
+    length = values.dtype.itemsize // 4
+    codes = np.zeros((len(values), max(length, width)), dtype=np.uint32)
+    codes[:, :length] = np.ascontiguousarray(values).view(np.uint32).reshape(len(values), length)
+    codes = codes[:, :width]
+    codes[codes == 0] = ord(" ")
+    codes[codes > 127] = ord("?")
+    return codes.astype(np.uint8)
+
+def _format_numbers(values: np.ndarray, width: int, decimals: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Format a numeric column as a (atoms x width) byte matrix, right-justified as '%{width}.{decimals}f' (or '%{width}d').
+    Digits are cut from the scaled integer values, so no per-value string formatting is done.
+
+    Returns the matrix and a mask of values that need printf formatting instead: values too wide for the column,
+    and values within rounding error of a tie, where the scaled float may round differently than printf does.
+    NaN values are blank.
+
+    :rtype: (np.ndarray, np.ndarray)
+    """
+    matrix = np.full((len(values), width), ord(" "), dtype=np.uint8)
+    if values.dtype.kind == 'f':
+        blank = np.isnan(values)
+        negative = np.signbit(values) & ~blank
+        scaled = np.abs(np.where(blank, 0, values)) * 10 ** decimals
+        fallback = ~(scaled < 2 ** 53)
+        scaled[fallback] = 0
+        fallback |= np.abs(scaled % 1 - .5) < 1e-6
+        magnitude = np.rint(np.where(fallback, 0, scaled)).astype(np.int64)
+    else:
+        blank = np.zeros(len(values), dtype=bool)
+        negative = values < 0
+        fallback = values == np.iinfo(np.int64).min
+        magnitude = np.abs(np.where(fallback, 0, values))
+
+    #Number of digits printed, including leading zeros of values below 1 (0.001).
+    n_digits = np.full(len(values), decimals + 1)
+    for power in range(decimals + 1, 19):
+        n_digits += magnitude >= 10 ** power
+    length = n_digits + (decimals > 0) + negative
+    fallback |= length > width
+
+    remaining = magnitude.copy()
+    for digit in range(min(width, int(n_digits.max()))):
+        position = width - 1 - digit - (decimals > 0 and digit >= decimals)
+        if position < 0: break
+        matrix[:, position] = np.where(digit < n_digits, ord("0") + remaining % 10, ord(" "))
+        remaining //= 10
+    if decimals:
+        matrix[:, width - 1 - decimals] = ord(".")
+    rows = np.flatnonzero(negative & ~fallback)
+    matrix[rows, width - length[rows]] = ord("-")
+    matrix[blank] = ord(" ")
+    return matrix, fallback & ~blank
+
+def _format_line(atom: np.void) -> str:
+    """
+    Format one atom with printf-style formatting.  Used for values the column formatter cannot write.
+    """
+    line = ""
+    for field, width, decimals, justify in PDB_WRITE_COLUMNS:
+        if field == " ":
+            line += " "
+        elif decimals is None:
+            value = str(atom[field])
+            line += value.rjust(3).ljust(width) if justify == 'residue' else value.ljust(width)
+        elif atom[field] != atom[field]:
+            line += " " * width
+        elif decimals:
+            line += (("%."+str(decimals)+"f") % atom[field]).rjust(width)
+        else:
+            line += str(atom[field]).rjust(width)
+    return line
+
+def _format_atom_matrix(atoms: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Format an atom array as a (atoms x 66) byte matrix of PDB lines, and a mask of the rows that
+    must be formatted with _format_line instead.
+    """
+    blocks = []
+    fallback = np.zeros(len(atoms), dtype=bool)
+    for field, width, decimals, justify in PDB_WRITE_COLUMNS:
+        if field == " ":
+            blocks.append(np.full((len(atoms), width), ord(" "), dtype=np.uint8))
+        elif decimals is None:
+            blocks.append(_format_strings(atoms[field], width, justify))
+        else:
+            matrix, needs_printf = _format_numbers(atoms[field], width, decimals)
+            blocks.append(matrix)
+            fallback |= needs_printf
+    return np.ascontiguousarray(np.hstack(blocks)), fallback
+
+def format_pdb_atoms(atoms: np.ndarray) -> List[str]:
+    """
+    Format an atom array as PDB lines (through the b-factor column), as PythonPDB2.morph_line_in_pdb_map_to_pdb_line does,
+    one column at a time.
+
+    :param atoms: np.ndarray of PDB_DTYPE
+    :rtype: list
+    """
+    if not len(atoms):
+        return []
+    return _get_lines(atoms, *_format_atom_matrix(atoms))
+
+def _get_lines(atoms: np.ndarray, matrix: np.ndarray, fallback: np.ndarray) -> List[str]:
+    lines = _bytes_to_str(matrix.view("S"+str(matrix.shape[1])).ravel()).tolist()
+    for i in np.flatnonzero(fallback):
+        lines[i] = _format_line(atoms[i])
+    return lines
+
+def format_pdb_block(atoms: np.ndarray) -> bytes:
+    """
+    Format an atom array as the bytes of its PDB lines, each ending in a newline.
+
+    :param atoms: np.ndarray of PDB_DTYPE
+    :rtype: bytes
+    """
+    if not len(atoms):
+        return b""
+    matrix, fallback = _format_atom_matrix(atoms)
+    if np.any(fallback):
+        return "".join(line+"\n" for line in _get_lines(atoms, matrix, fallback)).encode("latin-1", "replace")
+    matrix = np.hstack([matrix, np.full((len(matrix), 1), ord("\n"), dtype=np.uint8)])
+    return matrix.tobytes()
+
+def write_pdb_file(path: Union[str, Path], atoms: np.ndarray, header: List[str] = None, remarks: List[str] = None):
+    """
+    Write remarks, header and atoms as a PDB file (gzipped if path ends in .gz).
+
+    :param path: str
+    :param atoms: np.ndarray of PDB_DTYPE
+    :param header: list
+    :param remarks: list
+    """
+    text = "".join(line+"\n" for line in list(remarks or []) + list(header or []))
+    data = text.encode("latin-1", "replace") + format_pdb_block(atoms)
+    path = str(path)
+    if path.endswith(".gz"):
+        with gzip.open(path, 'wb') as OUTFILE:
+            OUTFILE.write(data)
+    else:
+        with open(path, 'wb') as OUTFILE:
+            OUTFILE.write(data)
@@ -0,0 +1,268 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple, Union
+
+import numpy as np
+
+from jade2.basic.structure.pdb_io import get_atom_coords
+
+#Batched Kabsch superposition and RMSD.
+# Decoys are (n_decoys, n_atoms, 3) arrays, such as from DecoyEnsemble.get_coords or stacked PDB_DTYPE atoms.
+# Superposition is fit on one set of atoms (fit_mask, such as the framework CA) and the RMSD is taken over
+# another (rmsd_mask, such as a CDR), so both are given as atom masks.
+# The 3x3 covariance of every decoy is built with one batched matmul, and rotations come from one batched SVD.
+# When the RMSD is over the fit atoms, no rotation is needed: it comes from the largest eigenvalue of the
+# quaternion matrix (QCP), found for all decoys at once by Newton's method.
+
+#Decoys superimposed per block, to bound memory for large ensembles.
+BLOCK_SIZE = 4096
+
+#Fewer decoys than this are compared in this process.
+PARALLEL_MIN_DECOYS = 500
+
+QCP_PRECISION = 1e-11
+QCP_MAX_ITERATIONS = 50
+
+Coords = Union[np.ndarray, List[np.ndarray]]
+
+
+def get_coords_array(coords: Coords) -> np.ndarray:
+    """
+    Get an (n_decoys, n_atoms, 3) or (n_atoms, 3) float array of coordinates, an atom array (PDB_DTYPE) or a list of either.
+
+    :param coords: np.ndarray or list
+    :rtype: np.ndarray
+    """
+    if isinstance(coords, (list, tuple)):
+        return np.stack([get_coords_array(c) for c in coords])
+    if coords.dtype.names:
+        return get_atom_coords(coords)
+    return coords
+
+def _get_block(coords: np.ndarray, start: int, mask: np.ndarray) -> np.ndarray:
+    block = coords[start:start + BLOCK_SIZE]
+    if mask is not None:
+        block = block[:, mask]
+    return np.asarray(block, dtype=np.float64)
+
+def _kabsch(mobile: np.ndarray, target: np.ndarray, rotations: bool = True) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Superimpose each mobile (n, m, 3) onto target (m, 3) or (n, m, 3).
+    Returns rotations (n, 3, 3) applied as x @ R (None if not rotations), the mobile and target centers (n or 1, 1, 3),
+    and the squared deviation after superposition of each decoy.
+    """
+    n_atoms = mobile.shape[1]
+    ones = np.ones(n_atoms)
+    mobile_center = (ones @ mobile)[:, None] / n_atoms
+    target_center = (ones @ target)[..., None, :] / n_atoms
+    target = target - target_center
+
+    #With the target centered, the mobile coordinates do not need to be.
+    covariance = mobile.transpose(0, 2, 1) @ target
+    mobile_sq = np.einsum('nai,nai->n', mobile, mobile) - n_atoms * np.einsum('nai,nai->n', mobile_center, mobile_center)
+    target_sq = np.sum(target * target, axis=(-2, -1))
+
+    if rotations:
+        #Use a proper rotation (no reflection) by flipping the smallest singular vector if needed.
+        u, s, vt = np.linalg.svd(covariance)
+        d = np.sign(np.linalg.det(u) * np.linalg.det(vt))
+        d[d == 0] = 1
+        u[:, :, 2] *= d[:, None]
+        R = u @ vt
+        s[:, 2] *= d
+        sd = mobile_sq + target_sq - 2 * s.sum(axis=1)
+    else:
+        R = None
+        sd = mobile_sq + target_sq - 2 * _get_qcp_eigenvalue(covariance, (mobile_sq + target_sq) / 2)
+    return R, mobile_center, target_center, np.maximum(sd, 0)
+
+def _get_qcp_eigenvalue(covariance: np.ndarray, start: np.ndarray) -> np.ndarray:
+    """
+    Get the largest eigenvalue of the quaternion matrix of each covariance (Theobald 2005, QCP), which is the
+    sum of the signed singular values used by Kabsch.  Newton's method on the characteristic polynomial
+    is much faster than a batched SVD.  start is the upper bound (sum of squares / 2) it converges down from.
+    """
+    Sxx, Sxy, Sxz = covariance[:, 0, 0], covariance[:, 0, 1], covariance[:, 0, 2]
+    Syx, Syy, Syz = covariance[:, 1, 0], covariance[:, 1, 1], covariance[:, 1, 2]
+    Szx, Szy, Szz = covariance[:, 2, 0], covariance[:, 2, 1], covariance[:, 2, 2]
+    Sxx2, Syy2, Szz2 = Sxx * Sxx, Syy * Syy, Szz * Szz
+    Sxy2, Syz2, Sxz2 = Sxy * Sxy, Syz * Syz, Sxz * Sxz
+    Syx2, Szy2, Szx2 = Syx * Syx, Szy * Szy, Szx * Szx
+
+    SyzSzymSyySzz2 = 2 * (Syz * Szy - Syy * Szz)
+    Sxx2Syy2Szz2Syz2Szy2 = Syy2 + Szz2 - Sxx2 + Syz2 + Szy2
+    c2 = -2 * (Sxx2 + Syy2 + Szz2 + Sxy2 + Syx2 + Sxz2 + Szx2 + Syz2 + Szy2)
+    c1 = 8 * (Sxx * Syz * Szy + Syy * Szx * Sxz + Szz * Sxy * Syx - Sxx * Syy * Szz - Syz * Szx * Sxy - Szy * Syx * Sxz)
+
+    SxzpSzx, SyzpSzy, SxypSyx = Sxz + Szx, Syz + Szy, Sxy + Syx
+    SyzmSzy, SxzmSzx, SxymSyx = Syz - Szy, Sxz - Szx, Sxy - Syx
+    SxxpSyy, SxxmSyy = Sxx + Syy, Sxx - Syy
+    Sxy2Sxz2Syx2Szx2 = Sxy2 + Sxz2 - Syx2 - Szx2
+    c0 = (Sxy2Sxz2Syx2Szx2 * Sxy2Sxz2Syx2Szx2
+          + (Sxx2Syy2Szz2Syz2Szy2 + SyzSzymSyySzz2) * (Sxx2Syy2Szz2Syz2Szy2 - SyzSzymSyySzz2)
+          + (-SxzpSzx * SyzmSzy + SxymSyx * (SxxmSyy - Szz)) * (-SxzmSzx * SyzpSzy + SxymSyx * (SxxmSyy + Szz))
+          + (-SxzpSzx * SyzpSzy - SxypSyx * (SxxpSyy - Szz)) * (-SxzmSzx * SyzmSzy - SxypSyx * (SxxpSyy + Szz))
+          + (SxypSyx * SyzpSzy + SxzpSzx * (SxxmSyy + Szz)) * (-SxymSyx * SyzmSzy + SxzpSzx * (SxxpSyy + Szz))
+          + (SxypSyx * SyzmSzy + SxzmSzx * (SxxmSyy - Szz)) * (-SxymSyx * SyzpSzy + SxzmSzx * (SxxpSyy - Szz)))
+
+    eigenvalue = np.array(start, dtype=np.float64)
+    for i in range(QCP_MAX_ITERATIONS):
+        x2 = eigenvalue * eigenvalue
+        b = (x2 + c2) * eigenvalue
+        a = b + c1
+        with np.errstate(divide='ignore', invalid='ignore'):
+            delta = (a * eigenvalue + c0) / (2 * x2 * eigenvalue + b + a)
+        delta[~np.isfinite(delta)] = 0
+        eigenvalue -= delta
+        if np.all(np.abs(delta) <= QCP_PRECISION * np.abs(eigenvalue)):
+            break
+    return eigenvalue
+
+def get_superposition(mobile: Coords, target: Coords, fit_mask: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Get the rotation and translation superimposing each decoy onto the target, fit on the fit_mask atoms.
+    A decoy is superimposed with x @ rotation + translation.
+
+    :param mobile: (n_decoys, n_atoms, 3) coordinates or list of atom arrays
+    :param target: (n_atoms, 3) coordinates or atom array
+    :param fit_mask: atom mask or indexes.  Default is all atoms
+    :return: rotations (n_decoys, 3, 3), translations (n_decoys, 3)
+    :rtype: (np.ndarray, np.ndarray)
+    """
+    mobile = get_coords_array(mobile)
+    target = np.asarray(get_coords_array(target), dtype=np.float64)
+    if fit_mask is not None:
+        target = target[..., fit_mask, :]
+
+    rotations = np.empty((len(mobile), 3, 3))
+    translations = np.empty((len(mobile), 3))
+    for start in range(0, len(mobile), BLOCK_SIZE):
+        block = _get_block(mobile, start, fit_mask)
+        R, mobile_center, target_center, sd = _kabsch(block, target)
+        rotations[start:start + len(block)] = R
+        translations[start:start + len(block)] = (target_center - mobile_center @ R)[:, 0]
+    return rotations, translations
+
+def superimpose(mobile: Coords, target: Coords, fit_mask: np.ndarray = None) -> np.ndarray:
+    """
+    Get the coordinates of every atom of each decoy after superposition onto the target on the fit_mask atoms.
+
+    :param mobile: (n_decoys, n_atoms, 3) coordinates or list of atom arrays
+    :param target: (n_atoms, 3) coordinates or atom array
+    :param fit_mask: atom mask or indexes.  Default is all atoms
+    :rtype: np.ndarray
+    """
+    mobile = get_coords_array(mobile)
+    rotations, translations = get_superposition(mobile, target, fit_mask)
+    return np.asarray(mobile, dtype=np.float64) @ rotations + translations[:, None]
+
+def get_rmsd(mobile: Coords, target: Coords, fit_mask: np.ndarray = None, rmsd_mask: np.ndarray = None,
+             fit: bool = True) -> np.ndarray:
+    """
+    Get the RMSD of each decoy to the target.
+
+    Decoys are superimposed on the fit_mask atoms, and the RMSD is over the rmsd_mask atoms (the fit atoms if not given).
+    Such as the CDR H3 RMSD after superposition on the framework CA atoms:
+        get_rmsd(coords, native, fit_mask=framework_ca, rmsd_mask=h3_ca)
+
+    :param mobile: (n_decoys, n_atoms, 3) coordinates or list of atom arrays
+    :param target: (n_atoms, 3) coordinates or atom array.  Also (n_decoys, n_atoms, 3) to pair decoys.
+    :param fit_mask: atom mask or indexes.  Default is all atoms
+    :param rmsd_mask: atom mask or indexes.  Default is the fit atoms
+    :param fit: bool.  Superimpose first.  If not, the RMSD is of the coordinates as they are.
+    :rtype: np.ndarray
+    """
+    mobile = get_coords_array(mobile)
+    target = np.asarray(get_coords_array(target), dtype=np.float64)
+    if mobile.ndim == 2:
+        return get_rmsd(mobile[None], target, fit_mask, rmsd_mask, fit)[0]
+
+    rmsds = np.empty(len(mobile))
+    for start in range(0, len(mobile), BLOCK_SIZE):
+        stop = min(start + BLOCK_SIZE, len(mobile))
+        pair_target = target[start:stop] if target.ndim == 3 else target
+        if not fit:
+            mask = rmsd_mask if rmsd_mask is not None else fit_mask
+            block = _get_block(mobile, start, mask)
+            diff = block - (pair_target if mask is None else pair_target[..., mask, :])
+            rmsds[start:stop] = np.sqrt(np.einsum('nai,nai->n', diff, diff) / block.shape[1])
+            continue
+
+        block = _get_block(mobile, start, fit_mask)
+        fit_target = pair_target if fit_mask is None else pair_target[..., fit_mask, :]
+        R, mobile_center, target_center, sd = _kabsch(block, fit_target, rotations=rmsd_mask is not None)
+        if rmsd_mask is None:
+            rmsds[start:stop] = np.sqrt(sd / block.shape[1])
+        else:
+            #Only the RMSD atoms are moved.
+            block = _get_block(mobile, start, rmsd_mask)
+            aligned = (block - mobile_center) @ R + target_center
+            diff = aligned - pair_target[..., rmsd_mask, :]
+            rmsds[start:stop] = np.sqrt(np.einsum('nai,nai->n', diff, diff) / block.shape[1])
+    return rmsds
+
+def get_pairwise_rmsd(coords: Coords, fit_mask: np.ndarray = None, rmsd_mask: np.ndarray = None,
+                      fit: bool = True, processes: int = 1) -> np.ndarray:
+    """
+    Get the symmetric (n_decoys, n_decoys) RMSD matrix of every pair of decoys (see get_rmsd).
+    Each row is computed against the decoys after it in one batch.  With processes, rows are split among workers.
+
+    :param coords: (n_decoys, n_atoms, 3) coordinates or list of atom arrays
+    :param fit_mask: atom mask or indexes.  Default is all atoms
+    :param rmsd_mask: atom mask or indexes.  Default is the fit atoms
+    :param fit: bool
+    :param processes: int.  None is every core.
+    :rtype: np.ndarray
+    """
+    coords, fit_mask, rmsd_mask = _get_used_atoms(get_coords_array(coords), fit_mask, rmsd_mask)
+    n = len(coords)
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    n_tasks = min(4 * processes, n - 1) if processes > 1 and n >= PARALLEL_MIN_DECOYS else 1
+
+    matrix = np.zeros((n, n))
+    #Rows are dealt out round-robin, as early rows have the most pairs.
+    tasks = [range(k, n - 1, n_tasks) for k in range(n_tasks)]
+    if n_tasks == 1:
+        _set_pairwise_data(coords, fit_mask, rmsd_mask, fit)
+        results = map(_get_pairwise_rows, tasks)
+    else:
+        executor = ProcessPoolExecutor(processes, initializer=_set_pairwise_data, initargs=(coords, fit_mask, rmsd_mask, fit))
+        results = executor.map(_get_pairwise_rows, tasks)
+    try:
+        for rows in results:
+            for i, rmsds in rows:
+                matrix[i, i + 1:] = rmsds
+    finally:
+        if n_tasks > 1:
+            executor.shutdown()
+        _set_pairwise_data(None, None, None, True)
+    return matrix + matrix.T
+
+def _get_used_atoms(coords: np.ndarray, fit_mask: np.ndarray, rmsd_mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Keep only the fit and RMSD atoms (as float64), for coordinates that are read many times.  Returns the coordinates and masks.
+    """
+    used = np.zeros(coords.shape[1], dtype=bool)
+    used[slice(None) if fit_mask is None else fit_mask] = True
+    if rmsd_mask is not None:
+        used[rmsd_mask] = True
+    fit_mask = None if fit_mask is None else _remap_mask(fit_mask, used)
+    rmsd_mask = None if rmsd_mask is None else _remap_mask(rmsd_mask, used)
+    return np.asarray(coords[:, used], dtype=np.float64), fit_mask, rmsd_mask
+
+def _remap_mask(mask: np.ndarray, used: np.ndarray) -> np.ndarray:
+    full = np.zeros(len(used), dtype=bool)
+    full[mask] = True
+    return full[used]
+
+#Set in each worker by the initializer.  Forked workers share the coordinates instead of receiving a copy per task.
+_pairwise_data = None
+
+def _set_pairwise_data(coords: np.ndarray, fit_mask: np.ndarray, rmsd_mask: np.ndarray, fit: bool):
+    global _pairwise_data
+    _pairwise_data = (coords, fit_mask, rmsd_mask, fit)
+
+def _get_pairwise_rows(rows: range) -> List[Tuple[int, np.ndarray]]:
+    coords, fit_mask, rmsd_mask, fit = _pairwise_data
+    return [(i, get_rmsd(coords[i + 1:], coords[i], fit_mask, rmsd_mask, fit)) for i in rows]
@@ -0,0 +1,153 @@
+import os
+import shutil
+import threading
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple, Callable
+
+#Number of files copied at once.  Copies are I/O bound (often network file systems), so threads are used.
+DEFAULT_COPY_WORKERS = 16
+
+
+def copy_or_link(src: str, dst: str, link: bool = True) -> str:
+    """
+    Copy a file, hard-linking it instead if link is True and both paths are on the same file system.
+    Returns 'link' or 'copy'.
+
+    Note that a hard link shares its data with the original, so editing one in place edits both.
+
+    :param src: str
+    :param dst: str
+    :param link: bool
+    :rtype: str
+    """
+    if link:
+        try:
+            if os.path.exists(dst):
+                os.remove(dst)
+            os.link(src, dst)
+            return 'link'
+        except OSError:
+            #Different file systems, or links are not supported.
+            pass
+    shutil.copyfile(src, dst)
+    return 'copy'
+
+class CopyJob(object):
+    """
+    A batch of file copies submitted to a CopyQueue.  on_done(job) is called once every copy has finished.
+    """
+    def __init__(self, job_id: int, pairs: List[Tuple[str, str]], on_done: Callable = None, name: str = ""):
+        self.id = job_id
+        self.name = name
+        self.pairs = pairs
+        self.on_done = on_done
+
+        self.n_done = 0
+        self.n_linked = 0
+        self.errors = []
+        self.finished = len(pairs) == 0
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def get_copied(self) -> List[str]:
+        """
+        Get the destinations that were copied, in order.  Only complete once the job is finished.
+        """
+        failed = set(src for src, error in self.errors)
+        return [dst for src, dst in self.pairs if src not in failed]
+
+    def get_status(self) -> str:
+        status = "{}: {}/{} copied".format(self.name or "Job "+str(self.id), self.n_done - len(self.errors), len(self))
+        if self.errors:
+            status += ", {} failed".format(len(self.errors))
+        if self.finished:
+            status += ", done"
+        return status
+
+class CopyQueue(object):
+    """
+    Copies batches of files in parallel in background threads, so callers (such as Dash callbacks) return at once.
+
+    Each call to submit creates a CopyJob.  Its files are copied by a shared pool of workers, and its on_done callback
+    runs in a worker thread once the whole batch has finished (for example, to open every copy in one PyMOL session).
+    Progress of every job can be polled with get_status.
+
+    Example:
+        queue = CopyQueue()
+        job = queue.submit([(decoy_path, outdir+"/"+name)], on_done=lambda job: launch_pymol(job.get_copied()))
+    """
+    def __init__(self, workers: int = DEFAULT_COPY_WORKERS, link: bool = True):
+        self.link = link
+        self.jobs = []
+
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(self, pairs: List[Tuple[str, str]], on_done: Callable = None, name: str = "") -> CopyJob:
+        """
+        Copy each (source, destination) pair in the background.
+
+        :param pairs: list of (str, str)
+        :param on_done: function taking the finished CopyJob
+        :param name: str
+        :rtype: CopyJob
+        """
+        job = CopyJob(next(self._ids), list(pairs), on_done, name)
+        with self._lock:
+            self.jobs.append(job)
+
+        if not job.pairs:
+            self._finish(job)
+        for src, dst in job.pairs:
+            self._executor.submit(self._copy, job, src, dst)
+        return job
+
+    def _copy(self, job: CopyJob, src: str, dst: str):
+        try:
+            linked = copy_or_link(src, dst, self.link) == 'link'
+            error = None
+        except OSError as e:
+            linked = False
+            error = str(e)
+
+        with self._lock:
+            job.n_done += 1
+            job.n_linked += linked
+            if error:
+                job.errors.append((src, error))
+            finished = job.n_done == len(job)
+            job.finished = finished
+        if finished:
+            self._finish(job)
+
+    def _finish(self, job: CopyJob):
+        job.finished = True
+        for src, error in job.errors:
+            print("Could not copy "+src+": "+error)
+        if job.on_done:
+            try:
+                job.on_done(job)
+            except Exception as e:
+                #Never let a callback kill the worker.
+                print("Copy job "+str(job.id)+" callback failed: "+repr(e))
+
+    def get_active_jobs(self) -> List[CopyJob]:
+        with self._lock:
+            return [job for job in self.jobs if not job.finished]
+
+    def get_status(self, n_recent: int = 3) -> List[str]:
+        """
+        Get the status of every unfinished job, and of the last n_recent jobs.
+
+        :param n_recent: int
+        :rtype: list
+        """
+        with self._lock:
+            jobs = [job for job in self.jobs[:-n_recent] if not job.finished] + self.jobs[-n_recent:]
+            return [job.get_status() for job in jobs]
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
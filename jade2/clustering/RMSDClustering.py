@@ -0,0 +1,284 @@
+from collections import OrderedDict
+from typing import List, Tuple, Union
+
+import numpy as np
+
+from jade2.basic.structure.superposition import Coords, get_coords_array, get_pairwise_rmsd, get_rmsd
+
+#In-process structural clustering on pairwise RMSD, without the Calibur binary.
+# Each method returns (labels, centers): the cluster index of each decoy and the decoy index of each cluster center,
+# with clusters ordered largest first.
+# Above max_decoys, a random subset is clustered and every decoy is then assigned to its nearest center,
+# so the RMSD matrix stays max_decoys x max_decoys.
+
+#Above this many decoys, cluster a random subset of this size.
+DEFAULT_MAX_DECOYS = 4000
+
+#Without a threshold, threshold clustering uses this percentile of the pairwise RMSDs.
+DEFAULT_THRESHOLD_PERCENTILE = 10
+
+METHODS = ('threshold', 'hierarchical', 'kmedoids')
+
+
+def get_medoid(matrix: np.ndarray, members: np.ndarray) -> int:
+    """
+    Get the member with the lowest summed RMSD to the other members.
+
+    :param matrix: (n, n) RMSD matrix
+    :param members: np.ndarray of decoy indexes
+    :rtype: int
+    """
+    return int(members[np.argmin(matrix[np.ix_(members, members)].sum(axis=1))])
+
+def _order_clusters(labels: np.ndarray, centers: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Renumber clusters largest first (ties by center index).
+    """
+    sizes = np.bincount(labels, minlength=len(centers))
+    order = np.lexsort((np.asarray(centers), -sizes))
+    new_labels = np.empty(len(centers), dtype=np.int64)
+    new_labels[order] = np.arange(len(centers))
+    return new_labels[labels], np.asarray(centers, dtype=np.int64)[order]
+
+def get_threshold(matrix: np.ndarray, percentile: float = DEFAULT_THRESHOLD_PERCENTILE) -> float:
+    """
+    Get a percentile of the pairwise RMSDs, as a default clustering threshold.
+
+    :param matrix: (n, n) RMSD matrix
+    :param percentile: float
+    :rtype: float
+    """
+    if len(matrix) < 2:
+        return 0.0
+    return float(np.percentile(matrix[np.triu_indices(len(matrix), 1)], percentile))
+
+def cluster_threshold(matrix: np.ndarray, threshold: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Calibur-style threshold clustering: the decoy with the most neighbors within threshold is a center, and it
+    and its neighbors are a cluster.  They are removed, and this repeats until every decoy is in a cluster.
+
+    :param matrix: (n, n) RMSD matrix
+    :param threshold: float
+    :return: labels, centers
+    :rtype: (np.ndarray, np.ndarray)
+    """
+    neighbors = matrix <= threshold
+    counts = neighbors.sum(axis=1)
+    remaining = np.ones(len(matrix), dtype=bool)
+    labels = np.empty(len(matrix), dtype=np.int64)
+    centers = []
+    while remaining.any():
+        center = int(np.argmax(np.where(remaining, counts, -1)))
+        members = np.flatnonzero(neighbors[center] & remaining)
+        labels[members] = len(centers)
+        centers.append(center)
+        remaining[members] = False
+        #Members no longer count as neighbors of the rest.
+        counts -= neighbors[:, members].sum(axis=1)
+    return _order_clusters(labels, centers)
+
+def cluster_hierarchical(matrix: np.ndarray, threshold: float = None, n_clusters: int = None,
+                         method: str = 'average') -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Agglomerative clustering, cut at an RMSD threshold or into n_clusters.  Centers are the cluster medoids.
+    Requires scipy.
+
+    :param matrix: (n, n) RMSD matrix
+    :param threshold: float
+    :param n_clusters: int
+    :param method: str.  Linkage: 'average', 'complete' or 'single'
+    :return: labels, centers
+    :rtype: (np.ndarray, np.ndarray)
+    """
+    if (threshold is None) == (n_clusters is None):
+        raise ValueError("Give either a threshold or n_clusters")
+    if len(matrix) < 2:
+        return np.zeros(len(matrix), dtype=np.int64), np.arange(len(matrix))
+
+    #scipy is not a declared dependency, so it is only needed for this method.
+    from scipy.cluster.hierarchy import linkage, fcluster
+    from scipy.spatial.distance import squareform
+
+    tree = linkage(squareform(matrix, checks=False), method=method)
+    if threshold is not None:
+        labels = fcluster(tree, threshold, criterion='distance') - 1
+    else:
+        labels = fcluster(tree, n_clusters, criterion='maxclust') - 1
+    labels = np.unique(labels, return_inverse=True)[1]
+    centers = [get_medoid(matrix, np.flatnonzero(labels == i)) for i in range(labels.max() + 1)]
+    return _order_clusters(labels, centers)
+
+def cluster_kmedoids(matrix: np.ndarray, n_clusters: int, max_iterations: int = 100,
+                     seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    k-medoids clustering.  Medoids start from a k-means++ style pick, then decoys are assigned to their nearest medoid
+    and each medoid is moved to the center of its cluster until nothing changes.
+
+    :param matrix: (n, n) RMSD matrix
+    :param n_clusters: int
+    :param max_iterations: int
+    :param seed: int
+    :return: labels, centers
+    :rtype: (np.ndarray, np.ndarray)
+    """
+    n_clusters = min(n_clusters, len(matrix))
+    rng = np.random.RandomState(seed)
+    medoids = [int(rng.randint(len(matrix)))]
+    for i in range(1, n_clusters):
+        weights = matrix[medoids].min(axis=0) ** 2
+        if weights.sum() == 0:
+            medoids.append(int(np.setdiff1d(np.arange(len(matrix)), medoids)[0]))
+        else:
+            medoids.append(int(rng.choice(len(matrix), p=weights / weights.sum())))
+
+    medoids = np.array(medoids)
+    for iteration in range(max_iterations):
+        labels = np.argmin(matrix[medoids], axis=0)
+        labels[medoids] = np.arange(n_clusters)
+        new_medoids = np.array([get_medoid(matrix, np.flatnonzero(labels == i)) for i in range(n_clusters)])
+        if np.array_equal(new_medoids, medoids):
+            break
+        medoids = new_medoids
+    labels = np.argmin(matrix[medoids], axis=0)
+    labels[medoids] = np.arange(n_clusters)
+    return _order_clusters(labels, medoids.tolist())
+
+class RMSDClusterer(object):
+    """
+    Clusters decoys by pairwise RMSD in this process, as an alternative to the Calibur binary (CaliburRunner).
+
+    Example:
+        ensemble = DecoyEnsemble("design.ensemble")
+        clusterer = RMSDClusterer(ensemble.coords, ensemble.metadata['path'], fit_mask=framework_ca, rmsd_mask=h3_ca)
+        clusterer.run_threshold()
+        paths, sizes = clusterer.ret_centers()
+    """
+    def __init__(self, coords: Coords, names: List[str] = None, fit_mask: np.ndarray = None,
+                 rmsd_mask: np.ndarray = None, max_decoys: int = DEFAULT_MAX_DECOYS, processes: int = None,
+                 seed: int = 0):
+        """
+        :param coords: (n_decoys, n_atoms, 3) coordinates (such as DecoyEnsemble.coords) or list of atom arrays
+        :param names: list.  Name or path of each decoy, used by ret_centers and get_clusters.  Default is the index.
+        :param fit_mask: atom mask or indexes to superimpose on.  Default is all atoms
+        :param rmsd_mask: atom mask or indexes for the RMSD.  Default is the fit atoms
+        :param max_decoys: int.  Cluster a random subset of this many decoys if there are more.
+        :param processes: int.  Processes for the RMSD matrix.  None is every core.
+        :param seed: int.  For the subset and k-medoids.
+        """
+        self.coords = get_coords_array(coords)
+        self.names = [str(i) for i in range(len(self.coords))] if names is None else [str(n) for n in names]
+        if len(self.names) != len(self.coords):
+            raise ValueError("Got "+str(len(self.names))+" names for "+str(len(self.coords))+" decoys")
+
+        self.fit_mask = fit_mask
+        self.rmsd_mask = rmsd_mask
+        self.processes = processes
+        self.seed = seed
+
+        if len(self.coords) > max_decoys:
+            self.subset = np.sort(np.random.RandomState(seed).choice(len(self.coords), max_decoys, replace=False))
+        else:
+            self.subset = np.arange(len(self.coords))
+
+        self.matrix = None
+        self.threshold = None
+        self.labels = None
+        self.centers = None
+
+    def get_matrix(self) -> np.ndarray:
+        """
+        Get the pairwise RMSD matrix of the clustered decoys (the subset, if there are more than max_decoys).
+
+        :rtype: np.ndarray
+        """
+        if self.matrix is None:
+            self.matrix = get_pairwise_rmsd(self.coords[self.subset], self.fit_mask, self.rmsd_mask,
+                                            processes=self.processes)
+        return self.matrix
+
+    def run_threshold(self, threshold: float = None, percentile: float = DEFAULT_THRESHOLD_PERCENTILE):
+        """
+        Calibur-style threshold clustering (see cluster_threshold).
+
+        :param threshold: float.  RMSD.  Default is the percentile of the pairwise RMSDs.
+        :param percentile: float
+        """
+        matrix = self.get_matrix()
+        self.threshold = get_threshold(matrix, percentile) if threshold is None else threshold
+        self._set_clusters(*cluster_threshold(matrix, self.threshold))
+
+    def run_hierarchical(self, threshold: float = None, n_clusters: int = None, method: str = 'average'):
+        """
+        Agglomerative clustering (see cluster_hierarchical).
+        """
+        self.threshold = threshold
+        self._set_clusters(*cluster_hierarchical(self.get_matrix(), threshold, n_clusters, method))
+
+    def run_kmedoids(self, n_clusters: int, max_iterations: int = 100):
+        """
+        k-medoids clustering (see cluster_kmedoids).
+        """
+        self.threshold = None
+        self._set_clusters(*cluster_kmedoids(self.get_matrix(), n_clusters, max_iterations, self.seed))
+
+    def run(self, method: str = 'threshold', **kwargs):
+        """
+        Run one of METHODS, with the arguments of its run_ function.
+        """
+        if method not in METHODS:
+            raise KeyError("Unknown method "+method+".  Options: "+", ".join(METHODS))
+        getattr(self, "run_"+method)(**kwargs)
+
+    def _set_clusters(self, labels: np.ndarray, centers: np.ndarray):
+        centers = self.subset[centers]
+        if len(self.subset) == len(self.coords):
+            self.labels, self.centers = labels, centers
+            return
+
+        #Assign every decoy to its nearest center.  Centers keep their own clusters.
+        distances = np.stack([get_rmsd(self.coords, self.coords[c], self.fit_mask, self.rmsd_mask) for c in centers])
+        labels = np.argmin(distances, axis=0)
+        labels[centers] = np.arange(len(centers))
+        self.labels, self.centers = _order_clusters(labels, centers.tolist())
+
+    def _check_run(self):
+        if self.labels is None:
+            raise RuntimeError("Run a clustering method first")
+
+    def get_sizes(self) -> np.ndarray:
+        self._check_run()
+        return np.bincount(self.labels, minlength=len(self.centers))
+
+    def ret_centers(self, n: int = 2) -> Tuple[List[str], List[int]]:
+        """
+        Get the names of the centers of the n largest clusters, and the size of each, as CaliburWrapper.ret_centers.
+        n of -1 returns every cluster.
+
+        :rtype: (list, list)
+        """
+        self._check_run()
+        n = len(self.centers) if n == -1 else n
+        return [self.names[c] for c in self.centers[:n]], self.get_sizes()[:n].tolist()
+
+    def ret_threshold(self) -> str:
+        """
+        Get the threshold used, as a string (as CaliburWrapper.ret_threshold).  None for k-medoids or n_clusters.
+        """
+        return None if self.threshold is None else str(self.threshold)
+
+    def get_clusters(self) -> "OrderedDict[str, List[str]]":
+        """
+        Get center name: member names (center included) of each cluster, largest first.
+
+        :rtype: OrderedDict
+        """
+        self._check_run()
+        return OrderedDict((self.names[c], [self.names[i] for i in np.flatnonzero(self.labels == k)])
+                           for k, c in enumerate(self.centers))
+
+    def get_labels(self) -> np.ndarray:
+        """
+        Get the cluster of each decoy (0 is the largest).
+        """
+        self._check_run()
+        return self.labels
@@ -1 +1,2 @@
-from .CaliburRunner import *
\ No newline at end of file
+from .CaliburRunner import *
+from .RMSDClustering import *
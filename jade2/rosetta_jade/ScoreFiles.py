@@ -1,129 +1,250 @@
 import json
+import time
+import multiprocessing
 
 from collections import OrderedDict
 
+import numpy
 import pandas
 
 from jade2.pymol_jade.PyMolScriptWriter import *
 from jade2.basic.dataframe.util import *
+from jade2.basic.dataframe.compact import compact_dataframe
 from jade2.basic.figure.creation import *
 from jade2.basic.path import *
 from jade2.basic.string_util import *
+from jade2.rosetta_jade.score_parser import parse_scorefile, parse_new_records, records_to_columns, merge_columns
+from jade2.rosetta_jade.score_parser import get_complete_size, detect_scorefile_format, get_table_header, get_chunk_offsets
+from jade2.rosetta_jade.score_parser import parse_scorefile_range, TABLE, CHUNK_BYTES
+from jade2.basic.StreamingStats import StreamingStats, StatsTable
+from jade2.rosetta_jade.score_cache import load_columns_to_end
+from jade2.rosetta_jade.score_selection import is_ascending, get_top_n, get_percentile_mask
 
 ##Original Author: Luki Goldschmidt <lugo@uw.edu>
 ##Forked by Jared Adolf-Bryfogle.
 ##Has been completely refactored to work with Dataframes, still needs more refactoring
 
-def get_dataframe(filename, match="", order_by="total_score", set_index=True):
+def get_dataframe(filename, match="", order_by="total_score", set_index=True, use_cache=True, compact=False):
     """
     Convert a Rosetta Score file directly to a dataframe.
     
     :param filename: path to file
+    :param use_cache: Load through the binary sidecar cache (ignored if match is given)
+    :param compact: Make the dataframe memory-compact (see compact_dataframe).  Path columns are split.
     :return: dataframe.DataFrame
     """
-    sc = ScoreFile(filename, match)
+    sc = ScoreFile(filename, match, use_cache=use_cache)
     df = sc.get_Dataframe(order_by=order_by)
     if set_index:
         df = df.set_index('decoy')
     df = df.reindex(sorted(df.columns), axis=1)
+    if compact:
+        df = compact_dataframe(df)
     return df
 
 class ScoreFile:
-  def __init__(self, filename, match="", strip_last_inc=False, strip_prefix=False):
+  def __init__(self, filename, match="", strip_last_inc=False, strip_prefix=False, processes=None, use_cache=True):
     self.filename = filename
     self.strip_inc = strip_last_inc
     self.strip_prefix = strip_prefix
 
     self.name = os.path.basename(self.filename)
 
-    self.decoys = [] #Main holder of data.  Array of dict of scoreterms and 'decoy']
-
     self.decoy_field_name = "decoy"
     self.decoy_dir = os.path.dirname(filename) #Assume filename is in decoy dir.  This is not nessessarily the case...
 
 
-    lines = open(filename, 'r').readlines()
-    #print(lines)
-
-    headerSP = ""
-    if len(lines) > 1:
-        headerSP = lines[1].split()
-
-    #print repr(headerSP)
-    for line in lines:
-
-        if (match):
-            if re.search(match, line):
-                pass
-            else:
-                continue
-        try:
-            local_line = line.replace("nan", "NaN")
-            o = json.loads(local_line)
-            # print o[self.decoy_field_name]
-            # print repr(o)
-            self.decoys.append(o)
-        except Exception as e:
-            ##Store as defaultdict instead of JSON.
-
-            #print "Cannot load as regular JSON file!  Parsing as old-school scorefile instead: "+ str(e)
-            d = defaultdict()
-            values = line.split()
-            if len(values) != len(headerSP):
-                if len(values) == 1 and values[0] =="SEQUENCE:": continue
-                print("Failed to parse JSON object or as regular score file; skipping line:\n", line)
-            elif values[1] == headerSP[1]:
-                continue
-            else:
-                for i in range(0, len(values)):
-                    k = headerSP[ i ]
-                    if  k == "description":
-                        k = "decoy"
-
-                    if values[i] == "SCORE:": continue
-
-                    d[ k ] = deduce_str_type(values[i])
-
-                self.decoys.append(d)
-
-    #Strip _0001 that is added when re-scoring decoys.
+    self.match = match
+
+    #Byte offset of the scorefile consumed so far.  Used by update() to read only new decoys.
+    #The file is parsed once, through the cache if it can be used (the offset is that of the cached or parsed data).
+    if use_cache and not match:
+        n_decoys, columns, self.offset = load_columns_to_end(filename, processes=processes)
+    else:
+        self.offset = get_complete_size(filename)
+        n_decoys, columns = parse_scorefile(filename, match, processes=processes, end=self.offset)
+
+    self._chunks = []
+    self._decoys = None
+    self._index = None
+    self.n_decoys, self.columns = n_decoys, self._strip_names(columns)
+
+  @classmethod
+  def from_columns(cls, filename, n_decoys, columns):
+    """
+    Create a ScoreFile from already-parsed columns, such as those merged by load_scorefiles.
+    filename is used for the name and decoy directory only.
+
+    :param filename: str
+    :param n_decoys: int
+    :param columns: OrderedDict
+    :rtype: ScoreFile
+    """
+    sf = cls.__new__(cls)
+    sf.filename = filename
+    sf.strip_inc = False
+    sf.strip_prefix = False
+    sf.name = os.path.basename(filename)
+    sf.decoy_field_name = "decoy"
+    sf.decoy_dir = os.path.dirname(filename)
+    sf.match = ""
+    sf.offset = None
+    sf._chunks = []
+    sf._decoys = None
+    sf._index = None
+    sf.n_decoys, sf.columns = n_decoys, columns
+    return sf
+
+  def _strip_names(self, columns):
+    """
+    Strip _0001 that is added when re-scoring decoys and/or the prefix of the decoy names, if set.
+    """
+    if self.decoy_field_name not in columns:
+      return columns
+
     if self.strip_inc:
-        new_decoys = []
-        for o in self.decoys:
-            nameSP = o[self.decoy_field_name].split('_')
-            if nameSP[-1] == "0001":
-                new_name = "_".join(nameSP[0:-1])
-                o[self.decoy_field_name] = new_name
-                new_decoys.append(o)
-            else:
-                new_decoys.append(o)
-        self.decoys = new_decoys
+      names = columns[self.decoy_field_name]
+      columns[self.decoy_field_name] = numpy.array(
+          ["_".join(n.split('_')[0:-1]) if n.split('_')[-1] == "0001" else n for n in names], dtype=object)
 
     if self.strip_prefix:
-        new_decoys = []
-        for o in self.decoys:
-            nameSP = o[self.decoy_field_name].split('_')
-            new_name = "_".join(nameSP[1:])
-            o[self.decoy_field_name] = new_name
-            new_decoys.append(o)
-        self.decoys = new_decoys
+      names = columns[self.decoy_field_name]
+      columns[self.decoy_field_name] = numpy.array(["_".join(n.split('_')[1:]) for n in names], dtype=object)
+
+    return columns
+
+  @property
+  def columns(self):
+    """
+    Data as an OrderedDict of scoreterm (and 'decoy') to numpy arrays.
+    Decoys added by update() are merged in on first access.
+
+    :rtype: OrderedDict
+    """
+    if self._chunks:
+      self._columns = merge_columns([(self.n_decoys - sum(n for n, c in self._chunks), self._columns)] + self._chunks)[1]
+      self._chunks = []
+    return self._columns
+
+  @columns.setter
+  def columns(self, columns):
+    self._columns = columns
+    self._chunks = []
+    self._index = None
+    self._decoys = None
+
+  def update(self):
+    """
+    Read decoys written to the scorefile since it was last read, such as by a running job.
+    Only the new lines are parsed.  If the file was truncated or replaced by a smaller one, it is re-read.
+
+    Returns (n_new, columns) of the new decoys.
 
-    #print repr(self.decoys)
+    :rtype: tuple
+    """
+    if self.offset is None:
+      return 0, OrderedDict()
+
+    n, new_columns, offset = parse_new_records(self.filename, self.offset, self.match)
+    new_columns = self._strip_names(new_columns)
+    if offset < self.offset:
+      self.n_decoys, self.columns = n, new_columns
+    elif n:
+      if self._index is not None and self.decoy_field_name in new_columns:
+        for i, name in enumerate(new_columns[self.decoy_field_name].tolist()):
+          self._index.setdefault(name, self.n_decoys + i)
+      self._chunks.append((n, new_columns))
+      self.n_decoys += n
+    self.offset = offset
+    if n:
+      self._decoys = None
+    return n, new_columns
+
+  def follow(self, interval=5.0, timeout=None):
+    """
+    Generator yielding a DataFrame of new decoys each time some are written to the scorefile.
+    Stops once no new decoys have been written for timeout seconds (never if timeout is None).
+
+    :param interval: float
+    :param timeout: float
+    :rtype: pandas.DataFrame
+    """
+    idle = 0.0
+    while timeout is None or idle < timeout:
+      n, new_columns = self.update()
+      if n:
+        idle = 0.0
+        yield pandas.DataFrame(new_columns)
+      else:
+        time.sleep(interval)
+        idle += interval
+
+  @property
+  def decoys(self):
+    """
+    Records as a list of dicts of scoreterms and 'decoy'.  Built from the columns on first access.
+
+    :rtype: list[dict]
+    """
+    if self._decoys is None:
+      names = list(self.columns.keys())
+      values = [self.columns[k].tolist() for k in names]
+      self._decoys = [{k: v for k, v in zip(names, row) if v is not None} for row in zip(*values)]
+    return self._decoys
+
+  @decoys.setter
+  def decoys(self, decoys):
+    self.n_decoys, self.columns = records_to_columns(decoys)
 
   def get_decoy_count(self):
-    return len(self.decoys)
+    return self.n_decoys
+
+  def get_decoy_index(self):
+    """
+    Get a dict of decoy name to row in the columns.  If a name is duplicated, the first row is used.
+
+    :rtype: dict
+    """
+    if self._index is None:
+      names = self.columns[self.decoy_field_name].tolist() if self.decoy_field_name in self.columns else []
+      self._index = {}
+      for i, name in enumerate(names):
+        self._index.setdefault(name, i)
+    return self._index
+
+  def get_rows(self, decoy_names=None, basename=False):
+    """
+    Get the rows of the given decoy names, in order.  Names that are not present are skipped.
+    If decoy_names is None, all rows are returned.
+
+    :param decoy_names: list
+    :param basename: Match on the basename of the given names.
+    :rtype: numpy.ndarray
+    """
+    if decoy_names is None:
+      return numpy.arange(self.n_decoys)
+    index = self.get_decoy_index()
+    if basename:
+      decoy_names = [os.path.basename(x) for x in decoy_names]
+    return numpy.array([index[x] for x in decoy_names if x in index], dtype=numpy.int64)
+
+  def select_decoys(self, decoy_names):
+    """
+    Keep only the given decoys, in the given order.  Raises KeyError if a decoy is not present.
+
+    :param decoy_names: list
+    """
+    index = self.get_decoy_index()
+    rows = numpy.array([index[x] for x in decoy_names], dtype=numpy.int64)
+    self.n_decoys, self.columns = len(rows), OrderedDict((k, v[rows]) for k, v in self.columns.items())
 
   def get_decoy_names(self):
-    return [str(r[self.decoy_field_name]) for r in self.decoys]
+    if self.decoy_field_name not in self.columns:
+      return []
+    return [str(x) for x in self.columns[self.decoy_field_name].tolist()]
 
   def get_scoreterm_names(self):
-    r = []
-    for rec in self.decoys:
-      for k in list(rec.keys()):
-        if k != self.decoy_field_name and not k in r:
-          r.append(str(k))
-    r.sort()
-    return r
+    return sorted([str(k) for k in self.columns if k != self.decoy_field_name])
 
   def get_scoreterms(self, scoreterms=""):
     if type(scoreterms) == str:
@@ -132,84 +253,117 @@ class ScoreFile:
         scoreterms.sort()
       else:
         scoreterms = scoreterms.split(",")
+
+    values = [self.columns[t].tolist() if t in self.columns else [None] * self.n_decoys for t in scoreterms]
     r = OrderedDict()
-    for rec in self.decoys:
-      scores = {}
-      for scoreterm in scoreterms:
-        scores[scoreterm] = rec.get(scoreterm)
-      r[str(rec[self.decoy_field_name])] = scores
+    for name, row in zip(self.get_decoy_names(), zip(*values)):
+      r[name] = dict(zip(scoreterms, row))
     return r
 
   def get_scoreterm(self, scoreterm):
-    r = {}
-    for rec in self.decoys:
-      r[str(rec[self.decoy_field_name])] = rec.get(scoreterm)
-    return r
+    if scoreterm not in self.columns:
+      return {name: None for name in self.get_decoy_names()}
+    return dict(zip(self.get_decoy_names(), self.columns[scoreterm].tolist()))
+
+  def _get_numeric(self, scoreterm, rows=None):
+    """
+    Get (values, rows) of a numeric scoreterm, skipping missing (NaN) values.  Values are float64, for sorting and stats.
+    Returns None if the scoreterm is not present or not numeric.
+    """
+    if scoreterm not in self.columns or self.columns[scoreterm].dtype.kind not in 'iuf':
+      return None
+    values = numpy.asarray(self.columns[scoreterm])
+    if rows is None:
+      rows = numpy.arange(self.n_decoys)
+    values = values[rows].astype(numpy.float64)
+    keep = ~numpy.isnan(values)
+    return values[keep], rows[keep]
 
   def get_stats(self, scoreterms="", decoy_names = None):
+    """
+    Get n, mean, median, stddev, min and max of scoreterms for the decoys (all by default).
+    Decoy names are matched by basename.  Missing values are skipped.
+    The values are already in memory, so the median is exact.  See get_scorefile_stats to stream large scorefiles.
 
-    print(repr(len(decoy_names)))
-    scores = self.get_scoreterms(scoreterms)
-    stats = None
-
-    if not decoy_names:
-      decoy_names = self.get_decoy_names()
-
-    #print repr(decoy_names)
-    # Collect data
-    for decoy_name in scores:
-      if not decoy_name in [ os.path.basename(x) for x in decoy_names]:
-        continue
-      decoy = scores[decoy_name]
-      if stats == None:
-        columns = list(decoy.keys())
-        stats = {k: [] for k in columns}
-
-      for term in decoy:
-        score = decoy[term]
-        if not score is None and type(score) == float:
-          stats[term].append(score)
-
-    # Compute Stats
-    calc_stats = OrderedDict()
+    :rtype: OrderedDict
+    """
+    if type(scoreterms) == str:
+      scoreterms = self.get_scoreterm_names() if scoreterms in ["", "*"] else scoreterms.split(",")
 
-    def median(s):
-      s.sort()
-      return s[int(len(s) / 2)]
-
-    def stddev(s):
-      mean = sum(s) / len(s)
-      r = 0.0
-      for x in s:
-        r += pow(x - mean, 2)
-      return pow(r / len(s), 0.5)
-
-    for column in columns:
-      s = stats[column]
-      calc_stats[column] = {
-        'n': len(s),
-        'mean': sum(s) / len(s) if len(s) > 0 else None,
-        'median': median(s) if len(s) > 0 else None,
-        'stddev': stddev(s) if len(s) > 0 else None,
-        'min': min(s) if len(s) > 0 else None,
-        'max': max(s) if len(s) > 0 else None
-      }
+    rows = None if not decoy_names else self.get_rows(decoy_names, basename=True)
+
+    calc_stats = OrderedDict()
+    for column in scoreterms:
+      numeric = self._get_numeric(column, rows)
+      s = numeric[0] if numeric else numpy.array([])
+      stats = StreamingStats(exact_size=len(s))
+      stats.update(s)
+      calc_stats[column] = stats.get_summary()
 
     return calc_stats
 
   def get_ordered_decoy_list(self, scoreterm, decoy_names = None, top_n=-1, reverse=False, ):
     """
     Get an ordered tuple of [[score, decoy_name], ...]
-    Will automatically order some known scoreterms (hbonds_int, dSASA_int)
+    Will automatically order known higher-is-better scoreterms (see score_selection.score_directions)
+    Only the top_n are sorted (partial sort).  top_n of -1 returns all of them.
 
     :rtype: list[list]
     """
 
-    if not decoy_names:
-      decoy_names = self.get_decoy_names()
+    if not is_ascending(scoreterm): reverse = True
+
+    rows = None if not decoy_names else self.get_rows(decoy_names)
+    numeric = self._get_numeric(scoreterm, rows)
+    if numeric is None:
+      if scoreterm not in self.columns: return []
+      rows = numpy.arange(self.n_decoys) if rows is None else rows
+      names = self.columns[self.decoy_field_name]
+      ordered = sorted([[self.columns[scoreterm][i], names[i]] for i in rows if self.columns[scoreterm][i] is not None], reverse=reverse)
+      return ordered if top_n == -1 else ordered[:top_n]
+
+    values, rows = numeric
+    if top_n == 0:
+      return []
+    if top_n != -1 and top_n < len(values):
+      #Keep every value tied with the cutoff, so ties are broken by name as in a full sort.
+      key = -values if reverse else values
+      part = numpy.flatnonzero(key <= numpy.partition(key, top_n - 1)[top_n - 1])
+      values, rows = values[part], rows[part]
+
+    names = numpy.asarray(self.columns[self.decoy_field_name])[rows]
+    order = numpy.lexsort((names.astype(str), values))
+    if reverse:
+      order = order[::-1]
+    if top_n != -1:
+      order = order[:top_n]
+    #Scores keep the type of their column (integer terms such as hbonds_int stay ints).
+    scores = numpy.asarray(self.columns[scoreterm])[rows[order]]
+    return [[v, str(n)] for v, n in zip(scores.tolist(), names[order].tolist())]
+
+  def get_ordered_decoy_list_by_percentile(self, scoreterm, filter_scoreterm="total_score", top_p=.10, decoy_names=None,
+                                           top_n=-1, reverse=False):
+    """
+    Get an ordered tuple of [[score, decoy_name], ...] of scoreterm, using only the decoys
+    in the best top_p fraction of filter_scoreterm.  Such as the top dG_separated of the top 10% by total_score.
 
-    if scoreterm == "hbonds_int" or scoreterm == "dSASA_int": reverse = True
-    return sorted([[x[scoreterm], x[self.decoy_field_name]] for x in self.decoys if x[self.decoy_field_name] in decoy_names and scoreterm in x ], reverse=reverse)[:top_n]
+    :param scoreterm: str
+    :param filter_scoreterm: str
+    :param top_p: float
+    :param decoy_names: list
+    :param top_n: int
+    :param reverse: bool
+    :rtype: list[list]
+    """
+    numeric = self._get_numeric(filter_scoreterm, None if not decoy_names else self.get_rows(decoy_names))
+    if numeric is None:
+      return []
+    values, rows = numeric
+    rows = rows[get_percentile_mask(values, top_p, is_ascending(filter_scoreterm) and not reverse)]
+    names = numpy.asarray(self.columns[self.decoy_field_name])[rows].tolist()
+    if not names:
+      return []
+    return self.get_ordered_decoy_list(scoreterm, decoy_names=names, top_n=top_n, reverse=reverse)
 
   def get_score(self, decoy, scoreterm):
     """
@@ -218,13 +372,14 @@ class ScoreFile:
     :param scoreterm: str
     :rtype: float
     """
-    for o in self.decoys:
-      if o[self.decoy_field_name] == decoy:
-        return o[scoreterm]
+    i = self.get_decoy_index().get(decoy)
+    if i is None or scoreterm not in self.columns:
+      return None
+    value = self.columns[scoreterm][i]
+    return value.item() if isinstance(value, numpy.generic) else value
 
   def get_scores(self, scoreterm, decoy_names=None, top_n=-1, reverse=False):
-    ordered_decoy_names = self.get_ordered_decoy_list(scoreterm, decoy_names, top_n, reverse)
-    return [self.get_score( decoy, scoreterm) for decoy in ordered_decoy_names]
+    return [o[0] for o in self.get_ordered_decoy_list(scoreterm, decoy_names, top_n, reverse)]
 
   def get_Dataframe(self, scoreterms=None, order_by="total_score", top_n=-1, reverse=True):
     """
@@ -238,8 +393,7 @@ class ScoreFile:
     #print(self.name)
     #print(self.decoys)
 
-    df = pandas.DataFrame.from_dict(self.decoys)
-    df = detect_numeric(df)
+    df = pandas.DataFrame(self.columns)
     #df.to_csv("debugging.csv", sep=",")
     #print(df.columns)
     if order_by in df.columns:
@@ -250,10 +404,14 @@ class ScoreFile:
 
     if scoreterms:
       df = get_columns(df, scoreterms)
-    df.name = self.name
-    df.scorefile = self.filename
-    df["name"] = self.name
-    df["scorefile"] = self.filename
+    #Columns merged from several scorefiles (see load_scorefiles) already record the scorefile of each decoy.
+    # Setting df.scorefile or df.name would overwrite such a column, so they are only set with a missing column.
+    if "scorefile" not in df.columns:
+        df.scorefile = self.filename
+        df["scorefile"] = self.filename
+    if "name" not in df.columns:
+        df.name = self.name
+        df["name"] = df["scorefile"].map(os.path.basename)
 
     #Don't overwrite decoy path if it exists.
     if 'decoy_path' in df.columns:
@@ -262,11 +420,9 @@ class ScoreFile:
 
     elif 'decoy' in df.columns:
         if os.path.dirname(self.filename):
-          df["decoy_path"] = os.path.dirname(self.filename)+"/"+df["decoy"]
-          df["decoy_path"] = [get_decoy_path(p) for p in df["decoy_path"]]
+          df["decoy_path"] = get_decoy_paths([os.path.dirname(self.filename)+"/"+d for d in df["decoy"]])
         else:
-          df["decoy_path"] = df["decoy"]
-          df["decoy_path"] = [get_decoy_path(p) for p in df["decoy_path"]]
+          df["decoy_path"] = get_decoy_paths(list(df["decoy"]))
 
     return df
 
@@ -276,15 +432,132 @@ def get_scorefiles(indir = os.getcwd()):
     :param indir: str
     :rtype: list
     """
-    matches = []
-    matches.extend(glob.glob(indir+"/*.sc"))
-    for root, dirnames, filenames in os.walk(indir):
+    return get_scorefiles_recursively(indir, ".sc")
+
+def _load_scorefile_columns(args):
+    """
+    Worker for load_scorefiles.  Returns (n_decoys, columns, error).
+    """
+    filename, strip_last_inc, strip_prefix, use_cache, prefix_decoy_dir = args
+    try:
+        sf = ScoreFile(filename, strip_last_inc=strip_last_inc, strip_prefix=strip_prefix, processes=1, use_cache=use_cache)
+        columns = OrderedDict(sf.columns)
+        if prefix_decoy_dir and sf.decoy_field_name in columns:
+            columns[sf.decoy_field_name] = numpy.array(
+                [os.path.dirname(filename) + "/" + d for d in columns[sf.decoy_field_name]], dtype=object)
+        columns['scorefile'] = numpy.full(sf.n_decoys, filename, dtype=object)
+        return sf.n_decoys, columns, None
+    except Exception as e:
+        return 0, OrderedDict(), repr(e)
+
+def load_scorefiles(scorefiles, processes=None, strip_last_inc=False, strip_prefix=False, use_cache=True,
+                    prefix_decoy_dir=True, verbose=True):
+    """
+    Parse many scorefiles in a process pool and merge them into one set of columns with a shared schema.
+    Columns missing from a scorefile are filled with NaN/None.  A 'scorefile' column records where each decoy came from.
+    If prefix_decoy_dir, decoy names are prefixed with the directory of their scorefile.
+
+    Failures are reported and returned instead of aborting.
+
+    Returns (n_decoys, columns, failures), where failures is a list of [scorefile, error].
+
+    :param scorefiles: list
+    :param processes: int
+    :param strip_last_inc: bool
+    :param strip_prefix: bool
+    :param use_cache: bool
+    :param prefix_decoy_dir: bool
+    :param verbose: bool
+    :rtype: tuple
+    """
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    processes = max(1, min(processes, len(scorefiles)))
+
+    jobs = [(f, strip_last_inc, strip_prefix, use_cache, prefix_decoy_dir) for f in scorefiles]
+    results = [None] * len(jobs)
+    failures = []
+    done = [0]
+
+    def report(i, result):
+        results[i] = result
+        done[0] += 1
+        n, columns, error = result
+        if error:
+            failures.append([scorefiles[i], error])
+            if verbose: print("Failed to load " + scorefiles[i] + ": " + error)
+        elif verbose:
+            print("Loaded " + repr(done[0]) + "/" + repr(len(jobs)) + " " + scorefiles[i] + " (" + repr(n) + " decoys)")
+
+    if processes > 1:
+        with multiprocessing.Pool(processes) as pool:
+            for i, result in pool.imap_unordered(_enumerate_job, list(enumerate(jobs))):
+                report(i, result)
+    else:
+        for i, job in enumerate(jobs):
+            report(i, _load_scorefile_columns(job))
 
-        for dirname in dirnames:
-            matches.extend( glob.glob(root+"/"+dirname+"/*.sc") )
+    if verbose and failures:
+        print(repr(len(failures)) + " of " + repr(len(jobs)) + " scorefiles failed to load.")
 
-    return matches
+    n, columns = merge_columns([(n, c) for n, c, error in results if not error])
+    return n, columns, failures
 
+def _enumerate_job(indexed_job):
+    i, job = indexed_job
+    return i, _load_scorefile_columns(job)
+
+def _get_range_stats(args):
+    """
+    Worker for get_scorefile_stats.  Returns the StatsTable of one byte range of a scorefile.
+    """
+    filename, start, end, fmt, header, match, scoreterms = args
+    table = StatsTable(scoreterms)
+    n, columns = parse_scorefile_range(filename, start, end, fmt, header, match)
+    if n:
+        table.update(columns)
+    return table
+
+def get_scorefile_stats(scorefiles, scoreterms=None, match="", processes=None, chunk_bytes=CHUNK_BYTES):
+    """
+    Get n, mean, median, stddev, min and max of scoreterms (all numeric ones by default) over one or more scorefiles,
+    without loading them.  Each chunk of each scorefile is summarized by a worker and the partial stats are merged,
+    so memory does not grow with the number of decoys.  Medians are exact up to StreamingStats' exact size
+    and approximate (about 1% in rank) beyond it.
+
+    Returns an OrderedDict of scoreterm: stats, as ScoreFile.get_stats.
+
+    :param scorefiles: str or list
+    :param scoreterms: list
+    :param match: str
+    :param processes: int.  Default is all cores.
+    :param chunk_bytes: int
+    :rtype: OrderedDict
+    """
+    if isinstance(scorefiles, str):
+        scorefiles = [scorefiles]
+
+    jobs = []
+    for filename in scorefiles:
+        fmt = detect_scorefile_format(filename)
+        if not fmt: continue
+        header = get_table_header(filename) if fmt == TABLE else None
+        for start, end in get_chunk_offsets(filename, chunk_bytes, 0, get_complete_size(filename)):
+            jobs.append((filename, start, end, fmt, header, match, scoreterms))
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    processes = max(1, min(processes, len(jobs)))
+
+    table = StatsTable(scoreterms)
+    if processes > 1:
+        with multiprocessing.Pool(processes) as pool:
+            for partial in pool.imap(_get_range_stats, jobs):
+                table.merge(partial)
+    else:
+        for job in jobs:
+            table.merge(_get_range_stats(job))
+    return table.get_summary()
 
 def plot_score_vs_rmsd(df, title, outpath, score="total_score", rmsd="looprms", top_p=.95, reverse=True):
   """
@@ -344,10 +617,7 @@ def pymol_session_on_top_df(df, outdir, decoy_dir = None,
     pymol_name  = session_prefix+scoreterm
     #print(pymol_name)
 
-    ascending = True
-    if scoreterm == "hbonds_int" or scoreterm == "dSASA_int": ascending = False
-    df2 = df.sort(scoreterm, ascending = ascending)
-    df2 = df2[0:top_n]
+    df2 = get_top_n(df, scoreterm, int(top_n)).copy()
     #print df2['total_score'].tail()
     if decoy_dir:
         df2['decoy_path'] = decoy_dir+"/"+df2[decoy_column]
@@ -0,0 +1,219 @@
+import os
+import json
+import zlib
+import multiprocessing
+from collections import OrderedDict
+from typing import List, Dict, Any
+
+from jade2.basic.path import get_decoy_name
+
+#Extraction of the scores Rosetta writes at the end of decoy PDB files.
+# The pose energies table and metric lines always come after the coordinates, so only the tail of a file is parsed.
+# Uncompressed files are read backwards in blocks until the start of the energies table (or the last coordinate record).
+# Gzipped files are decompressed in chunks, and only the data after the last coordinate record is kept.
+
+POSE_ENERGIES_BEGIN = "#BEGIN_POSE_ENERGIES_TABLE"
+POSE_ENERGIES_END = "#END_POSE_ENERGIES_TABLE"
+
+#Records that are part of the structure, not scores.
+pdb_record_types = {
+    "ATOM", "HETATM", "HETATOM", "ANISOU", "TER", "END", "ENDMDL", "MODEL", "REMARK", "HELIX", "SHEET",
+    "EXPDTA", "HEADER", "TITLE", "SSBOND", "LINK", "SEQRES", "AUTHOR", "KEYWDS", "SOURCE", "CAVEAT",
+    "COMPND", "CONECT", "CRYST1", "HETNAM", "MASTER"
+}
+
+#Bytes read (or decompressed) at a time.
+TAIL_BLOCK = 256 * 1024
+
+#At least this many decoys are read in a process pool unless processes is given explicitly.
+PARALLEL_MIN_DECOYS = 200
+
+_begin = POSE_ENERGIES_BEGIN.encode()
+_coordinate_records = (b"\nATOM  ", b"\nHETATM", b"\nTER")
+
+
+def _get_last_record_start(buf: bytes, end: int) -> int:
+    """
+    Get the offset of the last coordinate record line starting before end, or -1.
+    """
+    return max(buf.rfind(record, 0, end) for record in _coordinate_records)
+
+def _read_tail(filename: str, block: int) -> bytes:
+    size = os.path.getsize(filename)
+    buf = b""
+    with open(filename, 'rb') as INFILE:
+        pos = size
+        while pos > 0:
+            start = max(0, pos - block)
+            INFILE.seek(start)
+            buf = INFILE.read(pos - start) + buf
+
+            #Only search the new block, plus enough of the old one to catch a marker split between them.
+            searched = min(len(buf), pos - start + len(_begin))
+            pos = start
+            i = buf.rfind(_begin, 0, searched)
+            if i != -1:
+                return buf[i:]
+            i = _get_last_record_start(buf, searched)
+            if i != -1:
+                return buf[i + 1:]
+    return buf
+
+def _read_gz_tail(filename: str, block: int) -> bytes:
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    buf = b""
+    table = []
+    with open(filename, 'rb') as INFILE:
+        while True:
+            data = INFILE.read(block)
+            if not data:
+                break
+            out = decompressor.decompress(data)
+            #Concatenated gzip members.
+            while decompressor.eof and decompressor.unused_data:
+                unused = decompressor.unused_data
+                decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+                out += decompressor.decompress(unused)
+
+            if table:
+                table.append(out)
+                continue
+
+            buf += out
+            i = buf.rfind(_begin)
+            if i != -1:
+                table.append(buf[i:])
+                continue
+            i = _get_last_record_start(buf, len(buf))
+            if i != -1:
+                buf = buf[i + 1:]
+
+    return b"".join(table) if table else buf
+
+def read_decoy_tail(decoy_path: str, block: int = TAIL_BLOCK) -> str:
+    """
+    Read the part of a decoy after its coordinates: the pose energies table (if any) and the metric lines.
+    Works on .pdb and .pdb.gz files.
+
+    :param decoy_path: str
+    :param block: int
+    :rtype: str
+    """
+    if decoy_path.split(".")[-1] == "gz":
+        tail = _read_gz_tail(decoy_path, block)
+    else:
+        tail = _read_tail(decoy_path, block)
+    return tail.decode(errors='replace')
+
+def _to_value(s: str):
+    try:
+        return int(s)
+    except ValueError:
+        try:
+            return float(s)
+        except ValueError:
+            return s
+
+def parse_decoy_tail(text: str, pose_energies: bool = True, metrics: bool = True) -> "OrderedDict[str, Any]":
+    """
+    Parse the tail of a decoy (see read_decoy_tail) into an ordered dict of scores.
+    The 'pose' row of the energies table gives the weighted score terms ('total' becomes 'total_score').
+    Metric lines are 'name value'.  Values are ints or floats where possible.
+
+    :param text: str
+    :param pose_energies: Include the pose energies.
+    :param metrics: Include the metric lines after the table.
+    :rtype: OrderedDict
+    """
+    data = OrderedDict()
+    labels = []
+    in_table = False
+    for line in text.split("\n"):
+        line = line.rstrip()
+        if not line: continue
+        if line.startswith(POSE_ENERGIES_BEGIN):
+            in_table = True
+        elif line.startswith(POSE_ENERGIES_END):
+            in_table = False
+        elif in_table:
+            if not pose_energies: continue
+            if line.startswith("label"):
+                labels = ["total_score" if x == "total" else x for x in line.split()[1:]]
+            elif line.startswith("pose"):
+                for label, value in zip(labels, line.split()[1:]):
+                    data[label] = float(value)
+        elif metrics:
+            lineSP = line.split(None, 1)
+            if lineSP[0] in pdb_record_types or lineSP[0].startswith("#"): continue
+            data[lineSP[0]] = _to_value(lineSP[1].strip()) if len(lineSP) == 2 else None
+    return data
+
+def read_decoy_scores(decoy_path: str, pose_energies: bool = True, metrics: bool = True) -> "OrderedDict[str, Any]":
+    """
+    Read the scores written at the end of a decoy as an ordered dict, with the decoy name as 'decoy'.
+    Returns an empty dict if there are no scores.
+
+    :param decoy_path: str
+    :param pose_energies: bool
+    :param metrics: bool
+    :rtype: OrderedDict
+    """
+    scores = parse_decoy_tail(read_decoy_tail(decoy_path), pose_energies, metrics)
+    if not scores:
+        return scores
+
+    data = OrderedDict([("decoy", get_decoy_name(os.path.basename(decoy_path)))])
+    data.update(scores)
+    return data
+
+def _read_decoy_scores(args):
+    decoy_path, pose_energies, metrics = args
+    try:
+        return read_decoy_scores(decoy_path, pose_energies, metrics)
+    except (OSError, EOFError, zlib.error) as e:
+        print("Could not read scores from "+decoy_path+": "+str(e))
+        return OrderedDict()
+
+def read_all_decoy_scores(decoy_paths: List[str], processes: int = None, pose_energies: bool = True,
+                          metrics: bool = True, verbose: bool = True) -> List[Dict[str, Any]]:
+    """
+    Read the scores of many decoys, in order.  Decoys without scores give an empty dict.
+    If processes is None, PARALLEL_MIN_DECOYS or more decoys are read using all cores.
+
+    :param decoy_paths: list
+    :param processes: int
+    :param pose_energies: bool
+    :param metrics: bool
+    :param verbose: bool
+    :rtype: list
+    """
+    jobs = [(path, pose_energies, metrics) for path in decoy_paths]
+    if processes is None:
+        processes = multiprocessing.cpu_count() if len(jobs) >= PARALLEL_MIN_DECOYS else 1
+    processes = max(1, min(processes, len(jobs)))
+
+    if verbose:
+        print("Reading", len(jobs), "decoys")
+    if processes > 1:
+        with multiprocessing.Pool(processes) as pool:
+            return pool.map(_read_decoy_scores, jobs, chunksize=max(1, len(jobs) // (processes * 8)))
+    else:
+        return [_read_decoy_scores(job) for job in jobs]
+
+def write_json_scorefile(filename: str, records: List[Dict[str, Any]], sort_keys: bool = False) -> int:
+    """
+    Write records as a JSON-lines scorefile, skipping empty records.  Returns the number written.
+    Numbers are written as numbers, so the scorefile loads typed.
+
+    :param filename: str
+    :param records: list
+    :param sort_keys: bool
+    :rtype: int
+    """
+    n = 0
+    with open(filename, 'w') as OUTFILE:
+        for record in records:
+            if not record: continue
+            OUTFILE.write(json.dumps(record, sort_keys=sort_keys) + "\n")
+            n += 1
+    return n
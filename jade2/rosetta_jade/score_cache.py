@@ -0,0 +1,351 @@
+import os
+import json
+import shutil
+import hashlib
+from collections import OrderedDict
+from typing import List, Tuple, Dict, Any, Optional
+
+import numpy
+import pandas
+
+from jade2.rosetta_jade.score_parser import parse_scorefile, parse_new_records, merge_columns, get_complete_size
+
+#Binary sidecar cache for scorefile and CSV data.
+# The first load of a file writes one .npy per column into a hidden directory next to the source.
+# Later loads memory-map only the requested columns.  The cache is rebuilt if the source size or mtime changes.
+# CSV columns are added to the cache on demand, so a subset never requires parsing every column.
+# If a scorefile has only been appended to (a running job), only the new records are parsed, and saved as a chunk
+# of files listed in the manifest after the base columns.  The last two chunks are merged when the newer one is
+# as large as the older one (and the last chunk into the base columns once it is as large), so each row is
+# rewritten about log(n) times over the life of the file instead of on every append.
+
+CACHE_VERSION = 2
+
+#Strings longer than this are pickled instead of being stored as a fixed-width (memory-mappable) array.
+MAX_FIXED_STRING = 256
+
+
+def get_sidecar_path(filename: str) -> str:
+    """
+    Get the path to the sidecar cache directory for a file.
+
+    :param filename: str
+    :rtype: str
+    """
+    filename = os.path.abspath(filename)
+    return os.path.join(os.path.dirname(filename), "." + os.path.basename(filename) + ".jade_cache")
+
+def get_source_stamp(filename: str) -> Dict[str, int]:
+    """
+    Get the size and mtime of a file.  Used to invalidate the cache.
+
+    :param filename: str
+    :rtype: dict
+    """
+    st = os.stat(filename)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+def get_boundary_hashes(filename: str, end: int, n_bytes: int = 4096) -> List[str]:
+    """
+    Hash the first and last n_bytes before end.  Used to check that a file has only been appended to.
+
+    :param filename: str
+    :param end: int
+    :param n_bytes: int
+    :rtype: list
+    """
+    with open(filename, 'rb') as INFILE:
+        head = INFILE.read(min(n_bytes, end))
+        INFILE.seek(max(0, end - n_bytes))
+        tail = INFILE.read(min(n_bytes, end))
+    return [hashlib.md5(head).hexdigest(), hashlib.md5(tail).hexdigest()]
+
+def read_manifest(filename: str, check_source: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    Read the manifest of the sidecar cache.  Returns None if there is no valid cache for the current source.
+
+    :param filename: str
+    :param check_source: Check that the source file has not changed since the cache was written.
+    :rtype: dict
+    """
+    manifest_path = os.path.join(get_sidecar_path(filename), "manifest.json")
+    if not os.path.exists(manifest_path):
+        return None
+    try:
+        with open(manifest_path, 'r') as INFILE:
+            manifest = json.load(INFILE, object_pairs_hook=OrderedDict)
+    except ValueError:
+        return None
+
+    if manifest.get("version") != CACHE_VERSION:
+        return None
+    if check_source and manifest.get("source") != get_source_stamp(filename):
+        return None
+    return manifest
+
+def extend_cache(filename: str) -> Optional[Dict[str, Any]]:
+    """
+    Bring the cache of an appended-to scorefile up to date by parsing only the records after the cached offset.
+    Returns the updated manifest, or None if the file changed in any other way (or is a CSV) and needs a full rebuild.
+
+    :param filename: str
+    :rtype: dict
+    """
+    manifest = read_manifest(filename, check_source=False)
+    if not manifest or manifest.get("parsed_end") is None or manifest.get("all_columns") is None:
+        return None
+
+    offset = manifest["parsed_end"]
+    if os.path.getsize(filename) < offset or get_boundary_hashes(filename, offset) != manifest["boundary_hashes"]:
+        return None
+
+    stamp = get_source_stamp(filename)
+    n_new, new_columns, end = parse_new_records(filename, offset)
+
+    sidecar = get_sidecar_path(filename)
+    removed = []
+    if n_new:
+        manifest["chunks"].append({"n_rows": n_new, "columns": _save_chunk(sidecar, manifest, new_columns)})
+        manifest["n_rows"] += n_new
+        manifest["all_columns"] += [name for name in new_columns if name not in manifest["all_columns"]]
+        removed = _merge_chunks(sidecar, manifest)
+
+    manifest["source"] = stamp
+    manifest["parsed_end"] = end
+    manifest["boundary_hashes"] = get_boundary_hashes(filename, end)
+    _write_manifest(sidecar, manifest)
+    for file_name in removed:
+        os.remove(os.path.join(sidecar, file_name))
+    return manifest
+
+def _save_chunk(sidecar: str, manifest: Dict[str, Any], columns: "OrderedDict[str, numpy.ndarray]") -> Dict[str, Dict[str, str]]:
+    """
+    Save columns under new file names, returning the manifest entry of each column.
+    """
+    chunk_id = manifest["next_chunk"]
+    manifest["next_chunk"] += 1
+    entries = OrderedDict()
+    for i, (name, arr) in enumerate(columns.items()):
+        file_name = "a" + str(chunk_id) + "_" + str(i) + ".npy"
+        entries[name] = {"file": file_name, "kind": _save_column(os.path.join(sidecar, file_name), arr)}
+    return entries
+
+def _get_base_rows(manifest: Dict[str, Any]) -> int:
+    return manifest["n_rows"] - sum(chunk["n_rows"] for chunk in manifest["chunks"])
+
+def _load_entries(sidecar: str, entries: Dict[str, Dict[str, str]], names: List[str] = None, mmap: bool = False)\
+        -> "OrderedDict[str, numpy.ndarray]":
+    names = list(entries.keys()) if names is None else [name for name in names if name in entries]
+    return OrderedDict((name, _load_column(os.path.join(sidecar, entries[name]["file"]), entries[name]["kind"], mmap))
+                       for name in names)
+
+def _merge_chunks(sidecar: str, manifest: Dict[str, Any]) -> List[str]:
+    """
+    Merge the last appended chunk into the one before it (or into the base columns) while it is at least as large.
+    Returns the files no longer used, to remove once the manifest is written.
+    """
+    chunks = manifest["chunks"]
+    removed = []
+    while chunks:
+        last = chunks[-1]
+        if len(chunks) > 1:
+            previous = chunks[-2]
+            if last["n_rows"] < previous["n_rows"]:
+                break
+            n, merged = merge_columns([(previous["n_rows"], _load_entries(sidecar, previous["columns"])),
+                                       (last["n_rows"], _load_entries(sidecar, last["columns"]))])
+            removed += [entry["file"] for chunk in (previous, last) for entry in chunk["columns"].values()]
+            chunks[-2:] = [{"n_rows": n, "columns": _save_chunk(sidecar, manifest, merged)}]
+        else:
+            n_base = _get_base_rows(manifest)
+            if last["n_rows"] < n_base:
+                break
+            n, merged = merge_columns([(n_base, _load_entries(sidecar, manifest["columns"])),
+                                       (last["n_rows"], _load_entries(sidecar, last["columns"]))])
+            removed += [entry["file"] for entry in manifest["columns"].values()]
+            removed += [entry["file"] for entry in last["columns"].values()]
+            manifest["columns"] = _save_chunk(sidecar, manifest, merged)
+            chunks.pop()
+    return removed
+
+def clear_cache(filename: str):
+    """
+    Remove the sidecar cache of a file, if present.
+
+    :param filename: str
+    """
+    sidecar = get_sidecar_path(filename)
+    if os.path.exists(sidecar):
+        shutil.rmtree(sidecar, ignore_errors=True)
+
+def _write_manifest(sidecar: str, manifest: Dict[str, Any]):
+    tmp = os.path.join(sidecar, "manifest.json.tmp")
+    with open(tmp, 'w') as OUTFILE:
+        json.dump(manifest, OUTFILE)
+    os.replace(tmp, os.path.join(sidecar, "manifest.json"))
+
+def _save_column(path: str, arr: numpy.ndarray) -> str:
+    """
+    Save a column, returning how it was stored: 'numeric', 'string' or 'object'.
+    """
+    if arr.dtype.kind in 'biuf':
+        kind = "numeric"
+    elif all(isinstance(v, str) for v in arr) and max((len(v) for v in arr), default=0) <= MAX_FIXED_STRING:
+        kind = "string"
+        arr = arr.astype(str)
+    else:
+        kind = "object"
+
+    tmp = path + ".tmp.npy"
+    numpy.save(tmp, arr, allow_pickle=(kind == "object"))
+    os.replace(tmp, path)
+    return kind
+
+def _load_column(path: str, kind: str, mmap: bool) -> numpy.ndarray:
+    if kind == "numeric":
+        return numpy.load(path, mmap_mode='r' if mmap else None)
+    elif kind == "string":
+        return numpy.load(path, mmap_mode='r' if mmap else None).astype(object)
+    else:
+        return numpy.load(path, allow_pickle=True)
+
+def _parse_csv(filename: str, columns: List[str] = None, processes: int = None) -> Tuple[int, "OrderedDict[str, numpy.ndarray]", List[str], Optional[int]]:
+    all_names = list(pandas.read_csv(filename, nrows=0).columns)
+    df = pandas.read_csv(filename, usecols=columns)
+    parsed = OrderedDict((c, df[c].to_numpy(dtype=object if df[c].dtype.kind not in 'biuf' else None)) for c in df.columns)
+    return len(df), parsed, all_names, None
+
+def _parse_scorefile(filename: str, columns: List[str] = None, processes: int = None) -> Tuple[int, "OrderedDict[str, numpy.ndarray]", List[str], Optional[int]]:
+    end = get_complete_size(filename)
+    n, parsed = parse_scorefile(filename, processes=processes, end=end)
+    return n, parsed, list(parsed.keys()), end
+
+def get_parser(filename: str):
+    """
+    Get the column parser for a file: CSV files are read with pandas, anything else as a scorefile.
+    A parser takes (filename, columns, processes) and returns (n_rows, columns, all_column_names, parsed_end).
+    parsed_end is the byte offset the parse stopped at, or None if the file cannot be extended incrementally.
+    """
+    if filename.split('.')[-1] == "csv":
+        return _parse_csv
+    else:
+        return _parse_scorefile
+
+def load_columns(filename: str, columns: List[str] = None, use_cache: bool = True, mmap: bool = True)\
+        -> Tuple[int, "OrderedDict[str, numpy.ndarray]"]:
+    """
+    Load columns of a scorefile or CSV as (n_rows, OrderedDict of numpy arrays), through the sidecar cache.
+    If columns is None, all columns are loaded.
+    Numeric columns are memory-mapped (read-only) when mmap is True.
+
+    :param filename: str
+    :param columns: list
+    :param use_cache: bool
+    :param mmap: bool
+    :rtype: tuple
+    """
+    n, loaded, end = load_columns_to_end(filename, columns, use_cache, mmap)
+    return n, loaded
+
+def load_columns_to_end(filename: str, columns: List[str] = None, use_cache: bool = True, mmap: bool = True,
+                        processes: int = None) -> Tuple[int, "OrderedDict[str, numpy.ndarray]", Optional[int]]:
+    """
+    Load columns as load_columns, also returning the byte offset of the scorefile the data goes up to (parsed_end),
+    so new records can be read from there.  The offset is None for CSV files.
+    Whether or not the cache could be written, the file is parsed at most once.
+
+    :param filename: str
+    :param columns: list
+    :param use_cache: bool
+    :param mmap: bool
+    :param processes: int.  Parsing processes, if the file has to be parsed (see parse_scorefile)
+    :rtype: tuple
+    """
+    parser = get_parser(filename)
+    if not use_cache:
+        n, parsed, all_names, end = parser(filename, columns, processes)
+        return n, parsed, end
+
+    sidecar = get_sidecar_path(filename)
+    manifest = read_manifest(filename)
+    if manifest is None:
+        try:
+            manifest = extend_cache(filename)
+        except OSError:
+            manifest = None
+    if manifest is None:
+        clear_cache(filename)
+        manifest = {"version": CACHE_VERSION, "source": get_source_stamp(filename), "n_rows": None,
+                    "all_columns": None, "parsed_end": None, "boundary_hashes": None, "columns": OrderedDict(),
+                    "chunks": [], "next_chunk": 0}
+
+    cached = manifest["columns"]
+    all_names = manifest["all_columns"]
+    #Columns first seen in appended records are only in the chunks.
+    present = set(cached).union(*[chunk["columns"] for chunk in manifest["chunks"]])
+
+    if columns is None:
+        missing = None if all_names is None else [c for c in all_names if c not in present]
+    else:
+        if all_names is not None:
+            unknown = [c for c in columns if c not in all_names]
+            if unknown:
+                raise KeyError("Columns not found in " + filename + ": " + ", ".join(unknown))
+        missing = [c for c in columns if c not in present]
+
+    if missing is None or missing:
+        n, parsed, all_names, end = parser(filename, missing, processes)
+        try:
+            os.makedirs(sidecar, exist_ok=True)
+            for name, arr in parsed.items():
+                if name in cached: continue
+                file_name = "c" + str(len(cached)) + ".npy"
+                cached[name] = {"file": file_name, "kind": _save_column(os.path.join(sidecar, file_name), arr)}
+            manifest["n_rows"] = n
+            manifest["all_columns"] = all_names
+            if end is not None:
+                manifest["parsed_end"] = end
+                manifest["boundary_hashes"] = get_boundary_hashes(filename, end)
+            _write_manifest(sidecar, manifest)
+        except OSError as e:
+            print("Could not write score cache for " + filename + ": " + str(e))
+            if columns is None:
+                return n, parsed, end
+            return n, OrderedDict((c, parsed[c]) for c in columns), end
+
+    names = all_names if columns is None else columns
+    loaded = _load_entries(sidecar, cached, names, mmap)
+    if manifest["chunks"]:
+        parts = [(_get_base_rows(manifest), loaded)]
+        parts += [(chunk["n_rows"], _load_entries(sidecar, chunk["columns"], names)) for chunk in manifest["chunks"]]
+        loaded = merge_columns(parts)[1]
+    loaded = OrderedDict((name, loaded[name]) for name in names)
+    return manifest["n_rows"], loaded, manifest["parsed_end"]
+
+def get_column_names(filename: str, use_cache: bool = True) -> List[str]:
+    """
+    Get the column names of a scorefile or CSV.  Uses the cache if present.
+    CSV headers are read without parsing the data.
+
+    :param filename: str
+    :param use_cache: bool
+    :rtype: list
+    """
+    manifest = read_manifest(filename) if use_cache else None
+    if manifest and manifest["all_columns"] is not None:
+        return manifest["all_columns"]
+    if filename.split('.')[-1] == "csv":
+        return list(pandas.read_csv(filename, nrows=0).columns)
+    return list(load_columns(filename, use_cache=use_cache)[1].keys())
+
+def load_cached_dataframe(filename: str, columns: List[str] = None, use_cache: bool = True) -> pandas.DataFrame:
+    """
+    Load a scorefile or CSV as a DataFrame through the sidecar cache, optionally only some columns.
+
+    :param filename: str
+    :param columns: list
+    :param use_cache: bool
+    :rtype: pandas.DataFrame
+    """
+    n, loaded = load_columns(filename, columns, use_cache)
+    return pandas.DataFrame(loaded, index=pandas.RangeIndex(n))
@@ -0,0 +1,335 @@
+import os
+import re
+import json
+import multiprocessing
+from collections import OrderedDict
+from typing import List, Tuple, Dict, Any, Optional
+
+import numpy
+
+from jade2.basic.string_util import deduce_str_type
+
+#Columnar parsing of Rosetta scorefiles.
+# Files are split into newline-aligned byte ranges, each range is parsed straight into typed column arrays,
+# and the ranges are merged with a shared schema.  Large files spread the ranges over a process pool.
+# Parsing stops at the last complete line, so files still being written by a running job can be read
+# incrementally by byte offset (see parse_new_records).
+
+JSON = "json"
+TABLE = "table"
+
+#Read this many bytes per chunk when streaming a file.
+CHUNK_BYTES = 16 * 1024 * 1024
+
+#Files at least this large are parsed in a process pool unless processes is given explicitly.
+PARALLEL_MIN_BYTES = 64 * 1024 * 1024
+
+#Rosetta writes bare nan/inf values, which are not valid JSON.  Only replace them as values, not inside names.
+_json_nan = re.compile(r'(?<=[:\[,\s])(-?)nan(?=\s*[,}\]])')
+_json_inf = re.compile(r'(?<=[:\[,\s])(-?)inf(?=\s*[,}\]])')
+
+
+def detect_scorefile_format(filename: str) -> Optional[str]:
+    """
+    Detect whether a scorefile is JSON-lines or a legacy SCORE: table.
+    Returns None if the file has no data.
+
+    :param filename: str
+    :rtype: str
+    """
+    with open(filename, 'r') as INFILE:
+        for line in INFILE:
+            line = line.strip()
+            if not line: continue
+            if line.startswith("{"):
+                return JSON
+            if line.startswith("SCORE:") or line.startswith("SEQUENCE:"):
+                return TABLE
+            return JSON
+    return None
+
+def get_table_header(filename: str) -> List[str]:
+    """
+    Get the header tokens of a legacy SCORE: table, including the SCORE: token.
+
+    :param filename: str
+    :rtype: list
+    """
+    with open(filename, 'r') as INFILE:
+        for line in INFILE:
+            values = line.split()
+            if len(values) > 1 and values[0] == "SCORE:" and isinstance(deduce_str_type(values[1]), str):
+                return values
+    return []
+
+def get_complete_size(filename: str, size: int = None) -> int:
+    """
+    Get the byte offset just after the last newline of a file (or of its first size bytes).
+    Anything after it is a line that is still being written.
+
+    :param filename: str
+    :param size: int
+    :rtype: int
+    """
+    if size is None:
+        size = os.path.getsize(filename)
+    block = 64 * 1024
+    with open(filename, 'rb') as INFILE:
+        end = size
+        while end > 0:
+            start = max(0, end - block)
+            INFILE.seek(start)
+            i = INFILE.read(end - start).rfind(b"\n")
+            if i != -1:
+                return start + i + 1
+            end = start
+    return 0
+
+def get_chunk_offsets(filename: str, chunk_bytes: int = CHUNK_BYTES, start: int = 0, end: int = None) -> List[Tuple[int, int]]:
+    """
+    Split a file into [start, end) byte ranges that each end on a newline.
+    The last range ends at end, the end of the file by default.
+
+    :param filename: str
+    :param chunk_bytes: int
+    :param start: int
+    :param end: int
+    :rtype: list
+    """
+    size = os.path.getsize(filename) if end is None else end
+    offsets = []
+    with open(filename, 'rb') as INFILE:
+        while start < size:
+            end = start + chunk_bytes
+            if end >= size:
+                offsets.append((start, size))
+                break
+            INFILE.seek(end)
+            INFILE.readline()
+            end = INFILE.tell()
+            offsets.append((start, end))
+            start = end
+    return offsets
+
+def values_to_array(values: List[Any]) -> numpy.ndarray:
+    """
+    Convert a list of parsed python values into the tightest numpy array.
+    Numbers become int64/float64 (None becomes NaN), everything else stays an object array.
+
+    :param values: list
+    :rtype: numpy.ndarray
+    """
+    if len(values) == 0:
+        return numpy.array([], dtype=object)
+
+    if isinstance(values[0], (int, float)):
+        try:
+            arr = numpy.asarray(values)
+            if arr.ndim == 1 and arr.dtype.kind in 'biuf':
+                return arr
+        except ValueError:
+            pass
+
+    if all(v is None or (isinstance(v, (int, float)) and not isinstance(v, bool)) for v in values):
+        return numpy.array([numpy.nan if v is None else v for v in values], dtype=numpy.float64)
+
+    out = numpy.empty(len(values), dtype=object)
+    out[:] = values
+    return out
+
+def tokens_to_array(tokens: List[str]) -> numpy.ndarray:
+    """
+    Convert a column of string tokens from a SCORE: table into a typed numpy array.
+
+    :param tokens: list
+    :rtype: numpy.ndarray
+    """
+    arr = numpy.asarray(tokens)
+    for dtype in (numpy.int64, numpy.float64):
+        try:
+            return arr.astype(dtype)
+        except (ValueError, OverflowError):
+            continue
+    return values_to_array([deduce_str_type(x) for x in tokens])
+
+def records_to_columns(records: List[Dict[str, Any]]) -> Tuple[int, "OrderedDict[str, numpy.ndarray]"]:
+    """
+    Convert a list of dicts into (n_rows, columns).  Missing keys are filled with None.
+
+    :param records: list
+    :rtype: tuple
+    """
+    names = OrderedDict()
+    for rec in records:
+        for k in rec:
+            if k not in names:
+                names[k] = None
+
+    columns = OrderedDict()
+    for k in names:
+        columns[k] = values_to_array([rec.get(k) for rec in records])
+    return len(records), columns
+
+def _parse_json_lines(lines: List[str]) -> List[Dict[str, Any]]:
+    text = ",".join(lines)
+    text = _json_inf.sub(r'\1Infinity', _json_nan.sub('NaN', text))
+    try:
+        return json.loads("[" + text + "]")
+    except ValueError:
+        pass
+
+    records = []
+    for line in lines:
+        try:
+            records.append(json.loads(_json_inf.sub(r'\1Infinity', _json_nan.sub('NaN', line))))
+        except ValueError:
+            print("Failed to parse JSON object; skipping line:\n", line)
+    return records
+
+def _parse_table_lines(lines: List[str], header: List[str]) -> Tuple[int, "OrderedDict[str, numpy.ndarray]"]:
+    rows = []
+    for line in lines:
+        values = line.split()
+        if len(values) != len(header):
+            if len(values) == 1 and values[0] == "SEQUENCE:": continue
+            print("Failed to parse line as regular score file; skipping line:\n", line)
+        elif values[1] == header[1]:
+            continue
+        else:
+            rows.append(values)
+
+    columns = OrderedDict()
+    if not rows:
+        return 0, columns
+
+    for i, tokens in enumerate(zip(*rows)):
+        k = header[i]
+        if k == "SCORE:": continue
+        if k == "description":
+            k = "decoy"
+        columns[k] = tokens_to_array(list(tokens))
+
+    return len(rows), columns
+
+def parse_scorefile_range(filename: str, start: int, end: int, fmt: str, header: List[str] = None, match: str = "")\
+        -> Tuple[int, "OrderedDict[str, numpy.ndarray]"]:
+    """
+    Parse the [start, end) byte range of a scorefile into (n_rows, columns).
+    The range should start and end on line boundaries.
+
+    :param filename: str
+    :param start: int
+    :param end: int
+    :param fmt: str
+    :param header: list
+    :param match: str
+    :rtype: tuple
+    """
+    with open(filename, 'rb') as INFILE:
+        INFILE.seek(start)
+        text = INFILE.read(end - start).decode()
+
+    lines = [line for line in text.split("\n") if line.strip()]
+    if match:
+        lines = [line for line in lines if re.search(match, line)]
+
+    if fmt == TABLE:
+        return _parse_table_lines(lines, header)
+    else:
+        return records_to_columns(_parse_json_lines(lines))
+
+def _parse_scorefile_range(args):
+    return parse_scorefile_range(*args)
+
+def merge_columns(chunks: List[Tuple[int, "OrderedDict[str, numpy.ndarray]"]]) -> Tuple[int, "OrderedDict[str, numpy.ndarray]"]:
+    """
+    Merge parsed (n_rows, columns) chunks into one set of columns, in order.
+    Columns missing from a chunk are filled with NaN (numeric) or None.
+
+    :param chunks: list
+    :rtype: tuple
+    """
+    names = OrderedDict()
+    for n, columns in chunks:
+        for k, arr in columns.items():
+            if k not in names or names[k].kind in 'biuf':
+                names[k] = arr.dtype
+
+    merged = OrderedDict()
+    total = sum(n for n, columns in chunks)
+    for k, dtype in names.items():
+        parts = []
+        for n, columns in chunks:
+            if n == 0: continue
+            if k in columns:
+                parts.append(columns[k])
+            elif dtype.kind in 'biuf':
+                parts.append(numpy.full(n, numpy.nan))
+            else:
+                parts.append(numpy.full(n, None, dtype=object))
+        merged[k] = numpy.concatenate(parts) if parts else numpy.array([], dtype=dtype)
+    return total, merged
+
+def parse_scorefile(filename: str, match: str = "", chunk_bytes: int = CHUNK_BYTES, processes: int = None,
+                    start: int = 0, end: int = None) -> Tuple[int, "OrderedDict[str, numpy.ndarray]"]:
+    """
+    Parse a JSON or legacy SCORE: table scorefile into (n_rows, columns) of numpy arrays.
+    The decoy name column is always 'decoy'.
+
+    Only the [start, end) byte range is parsed.  end defaults to the end of the last complete line,
+    so files that are still being written can be read safely.
+
+    If processes is None, files larger than PARALLEL_MIN_BYTES are parsed using all cores.
+
+    :param filename: str
+    :param match: str
+    :param chunk_bytes: int
+    :param processes: int
+    :param start: int
+    :param end: int
+    :rtype: tuple
+    """
+    fmt = detect_scorefile_format(filename)
+    if not fmt:
+        return 0, OrderedDict()
+
+    if end is None:
+        end = get_complete_size(filename)
+
+    header = get_table_header(filename) if fmt == TABLE else None
+    jobs = [(filename, s, e, fmt, header, match) for s, e in get_chunk_offsets(filename, chunk_bytes, start, end)]
+    if not jobs:
+        return 0, OrderedDict()
+
+    if processes is None:
+        processes = multiprocessing.cpu_count() if end - start >= PARALLEL_MIN_BYTES else 1
+    processes = min(processes, len(jobs))
+
+    if processes > 1:
+        with multiprocessing.Pool(processes) as pool:
+            chunks = pool.map(_parse_scorefile_range, jobs)
+    else:
+        chunks = [_parse_scorefile_range(job) for job in jobs]
+
+    return merge_columns(chunks)
+
+def parse_new_records(filename: str, offset: int = 0, match: str = "") -> Tuple[int, "OrderedDict[str, numpy.ndarray]", int]:
+    """
+    Parse the complete lines written to a scorefile after offset.
+    Returns (n_rows, columns, new_offset).  Pass new_offset back in to read the next records.
+
+    If the file has been truncated or replaced by a smaller one, it is read from the start.
+
+    :param filename: str
+    :param offset: int
+    :param match: str
+    :rtype: tuple
+    """
+    end = get_complete_size(filename)
+    if end < offset:
+        offset = 0
+    if end == offset:
+        return 0, OrderedDict(), offset
+
+    n, columns = parse_scorefile(filename, match, processes=1, start=offset, end=end)
+    return n, columns, end
@@ -0,0 +1,249 @@
+from typing import List, Dict, Union
+
+import numpy
+import pandas
+
+#Top-N, percentile and Pareto-front selection over score columns.
+# Selection works on index arrays: top N uses partial sorts (argpartition) and only the selected rows are ordered,
+# grouped selection partitions each group's slice of one integer sort of the group codes,
+# and the Pareto front is built block by block against the current front.
+
+#Score terms where higher is better.  Anything not listed here is an energy, where lower is better.
+score_directions = {
+    "hbonds_int": False,
+    "dSASA_int": False,
+}
+
+#Number of candidate rows compared against the current front at once in get_pareto_mask.
+PARETO_BLOCK = 512
+
+#Number of rows used to rule out most dominated rows before building the front in get_pareto_mask.
+PARETO_PIVOTS = 32
+
+
+def is_ascending(scoreterm: str, directions: Dict[str, bool] = None) -> bool:
+    """
+    Get if lower values of a score term are better.
+    directions is a dict of scoreterm: ascending that overrides the known score_directions.
+
+    :param scoreterm: str
+    :param directions: dict
+    :rtype: bool
+    """
+    if directions and scoreterm in directions:
+        return directions[scoreterm]
+    return score_directions.get(scoreterm, True)
+
+def _get_key(values, ascending: bool) -> numpy.ndarray:
+    """
+    Get a float array where lower is better.  NaN marks missing values.
+    """
+    key = numpy.asarray(values, dtype=numpy.float64)
+    return key if ascending else -key
+
+def get_top_n_indices(values, top_n: int, ascending: bool = True) -> numpy.ndarray:
+    """
+    Get the positions of the top_n best values, best first.  NaN values are never selected.
+    Only the selected values are sorted.  top_n of -1 returns all of them in order.
+    Ties are broken by position.
+
+    :param values: numpy.ndarray
+    :param top_n: int
+    :param ascending: bool
+    :rtype: numpy.ndarray
+    """
+    key = _get_key(values, ascending)
+    valid = ~numpy.isnan(key)
+    rows = numpy.arange(len(key)) if valid.all() else numpy.flatnonzero(valid)
+
+    if 0 <= top_n < len(rows):
+        if top_n == 0:
+            return numpy.array([], dtype=numpy.int64)
+        rows = rows[numpy.argpartition(key[rows], top_n - 1)[:top_n]]
+
+    return rows[numpy.lexsort((rows, key[rows]))]
+
+def get_group_slices(codes: numpy.ndarray) -> List[numpy.ndarray]:
+    """
+    Get the positions of each group from integer group codes, as one array per group in code order.
+    Negative codes (missing groups) are skipped.
+
+    :param codes: numpy.ndarray
+    :rtype: list
+    """
+    codes = numpy.asarray(codes)
+    order = numpy.argsort(codes, kind='stable')
+    sorted_codes = codes[order]
+    order = order[sorted_codes >= 0]
+    sorted_codes = sorted_codes[sorted_codes >= 0]
+    bounds = numpy.flatnonzero(numpy.diff(sorted_codes)) + 1
+    return numpy.split(order, bounds) if len(order) else []
+
+def get_grouped_top_n_indices(values, codes, top_n: int, ascending: bool = True) -> numpy.ndarray:
+    """
+    Get the positions of the top_n best values of each group.
+    Groups are given as integer codes (see get_group_codes) and are returned in code order, best first within each.
+
+    :param values: numpy.ndarray
+    :param codes: numpy.ndarray
+    :param top_n: int
+    :param ascending: bool
+    :rtype: numpy.ndarray
+    """
+    key = _get_key(values, ascending)
+    selected = []
+    for rows in get_group_slices(codes):
+        selected.append(rows[get_top_n_indices(key[rows], top_n)])
+    return numpy.concatenate(selected) if selected else numpy.array([], dtype=numpy.int64)
+
+def get_group_codes(df: pandas.DataFrame, groupby: Union[str, List[str]]) -> numpy.ndarray:
+    """
+    Get integer group codes of a dataframe, in sorted group order.  Rows with a missing group get -1.
+
+    :param df: pandas.DataFrame
+    :param groupby: str or list
+    :rtype: numpy.ndarray
+    """
+    return df.groupby(groupby, sort=True).ngroup().to_numpy()
+
+def get_top_n(df: pandas.DataFrame, scoreterm: str, top_n: int, groupby: Union[str, List[str]] = None,
+              ascending: bool = None, directions: Dict[str, bool] = None) -> pandas.DataFrame:
+    """
+    Get the top_n rows of a dataframe by a score term, best first.
+    If groupby is given, get the top_n of each group instead (groups in sorted order).
+    If ascending is None, the direction comes from is_ascending(scoreterm, directions).
+
+    :param df: pandas.DataFrame
+    :param scoreterm: str
+    :param top_n: int
+    :param groupby: str or list
+    :param ascending: bool
+    :param directions: dict
+    :rtype: pandas.DataFrame
+    """
+    if ascending is None:
+        ascending = is_ascending(scoreterm, directions)
+
+    if groupby is None:
+        rows = get_top_n_indices(df[scoreterm].to_numpy(), top_n, ascending)
+    else:
+        rows = get_grouped_top_n_indices(df[scoreterm].to_numpy(), get_group_codes(df, groupby), top_n, ascending)
+    return df.iloc[rows]
+
+def get_percentile_mask(values, top_p: float, ascending: bool = True, codes = None) -> numpy.ndarray:
+    """
+    Get a mask of the values in the best top_p fraction (0-1), overall or within each group of codes.
+    NaN values are never included.
+
+    :param values: numpy.ndarray
+    :param top_p: float
+    :param ascending: bool
+    :param codes: numpy.ndarray
+    :rtype: numpy.ndarray
+    """
+    key = _get_key(values, ascending)
+    mask = numpy.zeros(len(key), dtype=bool)
+    if codes is None:
+        groups = [numpy.arange(len(key))]
+    else:
+        groups = get_group_slices(codes)
+
+    for rows in groups:
+        n = int(numpy.count_nonzero(~numpy.isnan(key[rows])) * top_p)
+        if n > 0:
+            cutoff = numpy.partition(numpy.nan_to_num(key[rows], nan=numpy.inf), n - 1)[n - 1]
+            mask[rows] = key[rows] <= cutoff
+    return mask
+
+def filter_by_percentile(df: pandas.DataFrame, scoreterm: str, top_p: float, groupby: Union[str, List[str]] = None,
+                         ascending: bool = None, directions: Dict[str, bool] = None) -> pandas.DataFrame:
+    """
+    Get the rows in the best top_p fraction (0-1) of a score term, overall or within each group.
+    Rows keep their original order.  Rows tied with the cutoff are kept.
+
+    :param df: pandas.DataFrame
+    :param scoreterm: str
+    :param top_p: float
+    :param groupby: str or list
+    :param ascending: bool
+    :param directions: dict
+    :rtype: pandas.DataFrame
+    """
+    if ascending is None:
+        ascending = is_ascending(scoreterm, directions)
+    codes = None if groupby is None else get_group_codes(df, groupby)
+    return df[get_percentile_mask(df[scoreterm].to_numpy(), top_p, ascending, codes)]
+
+def _is_dominated(points: numpy.ndarray, candidates: numpy.ndarray) -> numpy.ndarray:
+    """
+    Get a mask of the candidates dominated by any of the points (lower is better).
+    """
+    le = (points[:, None, :] <= candidates[None, :, :]).all(axis=2)
+    lt = (points[:, None, :] < candidates[None, :, :]).any(axis=2)
+    return (le & lt).any(axis=0)
+
+def get_pareto_mask(values: numpy.ndarray, block: int = PARETO_BLOCK, n_pivots: int = PARETO_PIVOTS) -> numpy.ndarray:
+    """
+    Get a mask of the non-dominated rows of an (n_rows, n_terms) array, where lower is better for every term.
+    A row is dominated if another row is at least as good in every term and better in one.
+    Rows with NaN are never on the front.  Identical rows do not dominate each other.
+
+    Most rows are first dropped by comparing them to the n_pivots rows with the best normalized sum.
+    The rest are visited in lexicographic order, so a row can only be dominated by rows before it,
+    and each block of rows is only compared against the front found so far.
+
+    :param values: numpy.ndarray
+    :param block: int
+    :param n_pivots: int
+    :rtype: numpy.ndarray
+    """
+    values = numpy.asarray(values, dtype=numpy.float64)
+    mask = numpy.zeros(len(values), dtype=bool)
+    rows = numpy.flatnonzero(~numpy.isnan(values).any(axis=1))
+    if len(rows) == 0:
+        return mask
+
+    #Cheap first pass.  Any real row can rule others out, so the pivots do not need to be on the front.
+    low = values[rows].min(axis=0)
+    span = values[rows].max(axis=0) - low
+    span[span == 0] = 1
+    normalized_sum = ((values[rows] - low) / span).sum(axis=1)
+    pivots = values[rows[get_top_n_indices(normalized_sum, n_pivots)]]
+    chunk = max(1, (block * block) // max(1, len(pivots)))
+    keep = numpy.concatenate([~_is_dominated(pivots, values[rows[i:i + chunk]]) for i in range(0, len(rows), chunk)])
+    rows = rows[keep]
+
+    rows = rows[numpy.lexsort(values[rows].T[::-1])]
+    front = numpy.empty((0, values.shape[1]))
+    front_rows = []
+    for start in range(0, len(rows), block):
+        candidate_rows = rows[start:start + block]
+        candidates = values[candidate_rows]
+
+        keep = ~_is_dominated(front, candidates)
+        candidate_rows, candidates = candidate_rows[keep], candidates[keep]
+        keep = ~_is_dominated(candidates, candidates)
+
+        front = numpy.concatenate([front, candidates[keep]])
+        front_rows.append(candidate_rows[keep])
+
+    mask[numpy.concatenate(front_rows)] = True
+    return mask
+
+def get_pareto_front(df: pandas.DataFrame, scoreterms: List[str], directions: Dict[str, bool] = None) -> pandas.DataFrame:
+    """
+    Get the non-dominated (Pareto) rows of a dataframe across several score terms,
+    ordered by the first score term.
+    Directions of each term come from is_ascending(scoreterm, directions).
+
+    Example: get_pareto_front(df, ['dG_separated', 'total_score', 'dSASA_int'])
+
+    :param df: pandas.DataFrame
+    :param scoreterms: list
+    :param directions: dict
+    :rtype: pandas.DataFrame
+    """
+    values = numpy.column_stack([_get_key(df[term].to_numpy(), is_ascending(term, directions)) for term in scoreterms])
+    rows = numpy.flatnonzero(get_pareto_mask(values))
+    rows = rows[numpy.lexsort((rows, values[rows, 0]))]
+    return df.iloc[rows]
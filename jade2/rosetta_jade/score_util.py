@@ -1,35 +1,50 @@
 import os,sys,re
 from collections import defaultdict
+from typing import List, Tuple
 from jade2.basic.path import open_file
-from jade2.basic.path import get_decoy_name, get_decoy_path
+from jade2.basic.path import get_decoy_name, get_decoy_path, get_decoy_paths, DirectoryListingIndex
 import pandas, json
 from jade2.basic.dataframe.util import detect_numeric
+from jade2.basic.dataframe.compact import compact_dataframe
+from jade2.rosetta_jade.score_cache import load_cached_dataframe, get_column_names
+from jade2.rosetta_jade.score_parser import parse_new_records
+from jade2.rosetta_jade.decoy_scores import read_decoy_scores
 
+#Columns always loaded alongside a column subset, so decoy paths can still be attached.
+decoy_id_columns = ['decoy', 'decoy_path']
 
-def get_dataframe_from_json_csv_pkl(filename: str)-> pandas.DataFrame:
+def get_dataframe_from_json_csv_pkl(filename: str, columns: List[str] = None, use_cache = True, compact = False)-> pandas.DataFrame:
     if filename.split('.')[-1] == "pkl":
-        return pandas.read_pickle(filename)
+        df = pandas.read_pickle(filename)
+        df = df[columns] if columns else df
+        return compact_dataframe(df) if compact else df
     else:
-        return get_dataframe_from_json_or_csv(filename)
+        return get_dataframe_from_json_or_csv(filename, columns=columns, use_cache=use_cache, compact=compact)
 
-def get_dataframe_from_csv(filename: str, test = False) -> pandas.DataFrame:
+def get_dataframe_from_csv(filename: str, test = False, columns: List[str] = None, use_cache = True) -> pandas.DataFrame:
     print("Reading CSV")
     if test:
-        df = pandas.read_csv(filename, nrows = 5000)
+        df = pandas.read_csv(filename, nrows = 5000, usecols=_with_id_columns(filename, columns, False))
     else:
-        df = pandas.read_csv(filename)
+        df = load_cached_dataframe(filename, _with_id_columns(filename, columns, use_cache), use_cache)
     df = detect_numeric(df)
     df = create_decoy_path_column(df, filename)
     return df
 
-def get_dataframe_from_json_or_csv(filename: str, test = False)-> pandas.DataFrame:
+def get_dataframe_from_json_or_csv(filename: str, test = False, columns: List[str] = None, use_cache = True,
+                                   compact = False)-> pandas.DataFrame:
+    """
+    Read a JSON scorefile or CSV.  Data is loaded through the binary sidecar cache (see score_cache)
+    unless use_cache is False.  If columns is given, only those (and the decoy columns) are loaded.
+    If compact, the dataframe is made memory-compact (see compact_dataframe), with path columns split.
+    """
     if filename.split('.')[-1] == "csv":
-        df = get_dataframe_from_csv(filename, test)
+        df = get_dataframe_from_csv(filename, test, columns, use_cache)
     else:
-        df = get_dataframe_from_json(filename)
-    return df
+        df = get_dataframe_from_json(filename, columns, use_cache)
+    return compact_dataframe(df) if compact else df
 
-def get_dataframe_from_json(filename: str) -> pandas.DataFrame:
+def get_dataframe_from_json(filename: str, columns: List[str] = None, use_cache = True) -> pandas.DataFrame:
     """
     Parse a json file and return a dataframe. Can work on any json file.
     If a scorefile, adds decoy path.
@@ -37,42 +52,65 @@ def get_dataframe_from_json(filename: str) -> pandas.DataFrame:
     if not os.path.exists(filename):
         sys.exit(filename+" does not exist! Could not parse dataframe!")
 
-    lines = open(filename, 'r').readlines()
-    #print(lines)
-
-    #print repr(headerSP)
-    decoys = []
-    for line in lines:
-        line = line.replace("nan", "NaN")
-        o = json.loads(line)
-            # print o[self.decoy_field_name]
-            # print repr(o)
-        decoys.append(o)
-
-    df = pandas.DataFrame.from_dict(decoys)
-    df = detect_numeric(df)
-    #df.to_csv("debugging.csv", sep=",")
-    #print(df.columns)
+    df = load_cached_dataframe(filename, _with_id_columns(filename, columns, use_cache), use_cache)
 
     df["name"]  = os.path.basename(filename)
     df["scorefile"] = os.path.abspath(filename)
 
     return create_decoy_path_column(df, filename)
 
-def create_decoy_path_column(df: pandas.DataFrame, filename: str) -> pandas.DataFrame:
-    def fix_path(original):
-        v = get_decoy_path(os.path.dirname(os.path.abspath(filename)) + "/" + original)
-        return v
+def _with_id_columns(filename: str, columns: List[str], use_cache: bool) -> List[str]:
+    if not columns:
+        return None
+    all_columns = get_column_names(filename, use_cache)
+    return list(columns) + [c for c in decoy_id_columns if c in all_columns and c not in columns]
+
+def read_new_decoys(filename: str, offset: int = 0) -> Tuple[pandas.DataFrame, int]:
+    """
+    Read decoys written to a scorefile after the byte offset, such as by a running job.
+    Only complete lines are read.  Returns (df, new_offset); pass new_offset back in to read the next decoys.
+    Adds name, scorefile and decoy_path columns like get_dataframe_from_json.
+    """
+    n, columns, offset = parse_new_records(filename, offset)
+    df = pandas.DataFrame(columns)
+    if n:
+        df["name"] = os.path.basename(filename)
+        df["scorefile"] = os.path.abspath(filename)
+        df = create_decoy_path_column(df, filename)
+    return df, offset
+
+def append_new_decoys(df: pandas.DataFrame, filename: str, offset: int) -> Tuple[pandas.DataFrame, int]:
+    """
+    Append decoys written to a scorefile after the byte offset to an existing dataframe of it.
+    Only the new lines are parsed.  Returns (df, new_offset).
+
+    The offset of a dataframe loaded through the cache is in its manifest (score_cache.read_manifest()['parsed_end']).
+    """
+    new_df, new_offset = read_new_decoys(filename, offset)
+    if new_offset < offset:
+        return new_df, new_offset
+    if len(new_df) == 0:
+        return df, new_offset
+    return pandas.concat([df, new_df], ignore_index=True), new_offset
+
+def create_decoy_path_column(df: pandas.DataFrame, filename: str, use_disk_cache = False) -> pandas.DataFrame:
+    """
+    Add (or fix) the decoy_path column, resolving decoys relative to the directory of filename.
+    Paths are resolved in bulk against one listing per directory (see DirectoryListingIndex).
+    If use_disk_cache, directory listings are cached on disk.
+    """
+    index = DirectoryListingIndex(use_disk_cache)
+    base = os.path.dirname(os.path.abspath(filename))
 
     def maybe_fix_path(original):
-        if os.path.exists(original): return original
+        if index.exists(original): return original
         else:
-            v = os.path.dirname(os.path.abspath(filename)) + "/" + original
-            if os.path.exists(v):
+            v = base + "/" + original
+            if index.exists(v):
                 return v
             else:
-                v = get_decoy_path(v)
-                if os.path.exists(v):
+                v = index.find_decoy(v)
+                if v:
                     return v
 
         return original
@@ -89,47 +127,18 @@ def create_decoy_path_column(df: pandas.DataFrame, filename: str) -> pandas.Data
     elif "decoy" in df.columns:
         if os.path.dirname(filename):
 
-            df["decoy_path"] = [fix_path(p) for p in df['decoy']]
-            print(df["decoy_path"])
+            df["decoy_path"] = get_decoy_paths([base + "/" + p for p in df['decoy']], index=index)
             df['decoy_path']= df['decoy_path'].astype(str)
         else:
-            df["decoy_path"] = df["decoy"]
-            df["decoy_path"] = [get_decoy_path(p) for p in df["decoy_path"]]
+            df["decoy_path"] = get_decoy_paths(list(df["decoy"]), index=index)
 
     return df
 
 def parse_decoy_scores(decoy_path):
     """
-    Parse a score from a decoy and return a dictionary. 
+    Parse a score from a decoy and return a dictionary.
+    Only the pose energies table at the end of the decoy is read (see decoy_scores.read_decoy_scores).
     :param decoy_path: 
-    :return: defaultdict
+    :return: OrderedDict
     """
-
-    data = defaultdict()
-    labels = []
-    scores=[]
-    INFILE = open_file(decoy_path)
-    for line in INFILE:
-        if line.startswith("#BEGIN_POSE_ENERGIES_TABLE"):
-            lineSP = line.split()
-            #if len(lineSP) == 1:
-            data['decoy'] = get_decoy_name( os.path.basename(decoy_path) )
-            #else:
-            #    data['decoy'] = get_decoy_name( lineSP[-1] )
-
-        elif line.startswith("label"):
-            labels = line.split()[1:]
-            labels = ["total_score" if x=="total" else x for x in labels ]
-
-        elif line.startswith("pose"):
-            scores = [ float(x) for x in line.split()[1:] ]
-
-        else:
-            continue
-
-    INFILE.close()
-
-    for i in range(0, len(labels)):
-        data[labels[i]] = scores[i]
-
-    return data
\ No newline at end of file
+    return read_decoy_scores(decoy_path, metrics=False)
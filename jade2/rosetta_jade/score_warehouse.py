@@ -0,0 +1,447 @@
+import os
+import json
+import time
+import pathlib
+import sqlite3
+from itertools import repeat
+from collections import OrderedDict
+from typing import List, Dict, Any, Tuple
+
+import numpy
+import pandas
+
+from jade2.basic.path import get_decoy_paths
+from jade2.rosetta_jade.score_parser import parse_scorefile, parse_new_records, get_complete_size
+from jade2.rosetta_jade.score_cache import get_source_stamp, get_boundary_hashes, load_columns
+from jade2.rosetta_jade.score_selection import is_ascending
+
+#Persistent SQLite warehouse of scorefile data, shared across sessions and benchmark runs.
+# Each scorefile is a source with provenance (run dir, scorefile path, subset).  Decoys of all sources
+# go in one wide scores table, with columns added as new score terms appear.
+# Ingestion is incremental: unchanged scorefiles are skipped, appended-to scorefiles only add their new records,
+# and a decoy is stored once per scorefile (re-ingested decoys replace the old row).
+
+#Columns that come from the source of each decoy.  Scorefile columns with these names are not stored.
+provenance_columns = ['scorefile', 'name', 'run_dir', 'subset']
+
+#Score terms that get an index as soon as they appear.
+default_indexed_scoreterms = ['total_score', 'dG_separated', 'dG_cross']
+
+_reserved_columns = set(provenance_columns + ['row_id', 'source_id'])
+
+_aggregates = OrderedDict([("count", "COUNT"), ("mean", "AVG"), ("min", "MIN"), ("max", "MAX"), ("sum", "SUM")])
+
+
+def quote(name: str) -> str:
+    """
+    Quote a column name for SQL.
+
+    :param name: str
+    :rtype: str
+    """
+    return '"' + str(name).replace('"', '""') + '"'
+
+def get_sql_type(arr: numpy.ndarray) -> str:
+    """
+    Get the SQLite column type of a numpy column.
+
+    :param arr: numpy.ndarray
+    :rtype: str
+    """
+    if arr.dtype.kind == 'f':
+        return "REAL"
+    elif arr.dtype.kind in 'biu':
+        return "INTEGER"
+    else:
+        return "TEXT"
+
+def to_sql_values(arr: numpy.ndarray) -> List[Any]:
+    """
+    Convert a numpy column to python values SQLite can store.  NaN becomes NULL and nested values become JSON.
+
+    :param arr: numpy.ndarray
+    :rtype: list
+    """
+    if arr.dtype.kind == 'f':
+        values = arr.astype(object)
+        values[numpy.isnan(arr)] = None
+        return values.tolist()
+    elif arr.dtype.kind in 'biu':
+        return arr.tolist()
+
+    values = arr.tolist()
+    for i, v in enumerate(values):
+        if isinstance(v, (dict, list)):
+            values[i] = json.dumps(v)
+        elif isinstance(v, float) and v != v:
+            values[i] = None
+    return values
+
+def get_default_subset(scorefile: str) -> str:
+    """
+    Get the default subset name of a scorefile: the name of its directory.
+
+    :param scorefile: str
+    :rtype: str
+    """
+    return pathlib.PurePath(os.path.abspath(scorefile)).parent.name
+
+class ScoreWarehouse:
+    """
+    Persistent, indexed store of scorefile data in a SQLite database.
+
+    Example:
+        warehouse = ScoreWarehouse("scores.db")
+        warehouse.ingest("run1/score.sc", subset="run1")
+        df = warehouse.top_n("dG_separated", 10, groupby="subset")
+    """
+
+    def __init__(self, db_path: str, indexed_scoreterms: List[str] = None):
+        self.db_path = db_path
+        self.indexed_scoreterms = list(default_indexed_scoreterms if indexed_scoreterms is None else indexed_scoreterms)
+
+        self.db = sqlite3.connect(db_path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self._create_tables()
+        self._columns = self._get_table_columns()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.db.close()
+
+    def _create_tables(self):
+        with self.db:
+            self.db.executescript("""
+                CREATE TABLE IF NOT EXISTS sources (
+                    source_id INTEGER PRIMARY KEY,
+                    scorefile TEXT UNIQUE NOT NULL,
+                    name TEXT,
+                    run_dir TEXT,
+                    subset TEXT,
+                    size INTEGER,
+                    mtime_ns INTEGER,
+                    parsed_end INTEGER,
+                    boundary_hashes TEXT,
+                    columns TEXT,
+                    n_rows INTEGER,
+                    ingested REAL);
+                CREATE TABLE IF NOT EXISTS scores (
+                    row_id INTEGER PRIMARY KEY,
+                    source_id INTEGER NOT NULL REFERENCES sources(source_id),
+                    decoy TEXT,
+                    decoy_path TEXT,
+                    UNIQUE(source_id, decoy));
+                CREATE INDEX IF NOT EXISTS scores_decoy ON scores(decoy);
+                CREATE INDEX IF NOT EXISTS sources_subset ON sources(subset);
+            """)
+
+    def _get_table_columns(self) -> "OrderedDict[str, str]":
+        return OrderedDict((row[1], row[2]) for row in self.db.execute("PRAGMA table_info(scores)"))
+
+    def _add_columns(self, columns: "OrderedDict[str, numpy.ndarray]"):
+        for name, arr in columns.items():
+            if name in self._columns: continue
+            self.db.execute("ALTER TABLE scores ADD COLUMN " + quote(name) + " " + get_sql_type(arr))
+            self._columns[name] = get_sql_type(arr)
+            if name in self.indexed_scoreterms:
+                self._create_index(name)
+
+    def _create_index(self, scoreterm: str):
+        self.db.execute("CREATE INDEX IF NOT EXISTS " + quote("scores_" + scoreterm) + " ON scores(" + quote(scoreterm) + ")")
+
+    def index_scoreterms(self, scoreterms: List[str]):
+        """
+        Index score terms, now and whenever they appear in later scorefiles.
+
+        :param scoreterms: list
+        """
+        with self.db:
+            for term in scoreterms:
+                if term not in self.indexed_scoreterms:
+                    self.indexed_scoreterms.append(term)
+                if term in self._columns:
+                    self._create_index(term)
+
+    ####################################################################################################################
+    ## Ingestion
+    ####################################################################################################################
+
+    def _get_source(self, scorefile: str):
+        return self.db.execute("SELECT source_id, size, mtime_ns, parsed_end, boundary_hashes, columns, n_rows, subset, run_dir "
+                               "FROM sources WHERE scorefile = ?", (scorefile,)).fetchone()
+
+    def _parse(self, scorefile: str) -> Tuple[int, "OrderedDict[str, numpy.ndarray]", int]:
+        if scorefile.split('.')[-1] == "csv":
+            n, columns = load_columns(scorefile, use_cache=False)
+            return n, columns, None
+        end = get_complete_size(scorefile)
+        n, columns = parse_scorefile(scorefile, end=end)
+        return n, columns, end
+
+    def _insert(self, source_id: int, scorefile: str, n: int, columns: "OrderedDict[str, numpy.ndarray]") -> List[str]:
+        columns = OrderedDict((k, v) for k, v in columns.items() if k not in _reserved_columns)
+        if 'decoy_path' not in columns and 'decoy' in columns:
+            base = os.path.dirname(scorefile)
+            columns['decoy_path'] = numpy.array(get_decoy_paths([base + "/" + d for d in columns['decoy']]), dtype=object)
+
+        self._add_columns(columns)
+        names = list(columns.keys())
+        sql = "INSERT OR REPLACE INTO scores (source_id, " + ", ".join(quote(k) for k in names) + ") VALUES (?" + ", ?" * len(names) + ")"
+        self.db.executemany(sql, zip(repeat(source_id, n), *[to_sql_values(columns[k]) for k in names]))
+        return names
+
+    def ingest(self, scorefile: str, subset: str = None, run_dir: str = None, verbose: bool = False) -> int:
+        """
+        Add a scorefile (JSON, legacy SCORE: table or CSV) to the warehouse.  Returns the number of decoys read.
+
+        An unchanged scorefile is skipped.  If it has only been appended to, only the new records are read.
+        Otherwise all of its decoys are replaced.
+
+        :param scorefile: str
+        :param subset: Name of the subset for analysis.  Default is the current subset, or the name of the scorefile's directory.
+        :param run_dir: Directory of the run.  Default is the current run dir, or the scorefile's directory.
+        :param verbose: bool
+        :rtype: int
+        """
+        scorefile = os.path.abspath(scorefile)
+        run_dir = os.path.abspath(run_dir) if run_dir is not None else None
+        stamp = get_source_stamp(scorefile)
+        source = self._get_source(scorefile)
+
+        with self.db:
+            if source is None:
+                subset = get_default_subset(scorefile) if subset is None else subset
+                run_dir = os.path.dirname(scorefile) if run_dir is None else run_dir
+                source_id = self.db.execute("INSERT INTO sources (scorefile, name, run_dir, subset, columns, n_rows) VALUES (?, ?, ?, ?, ?, 0)",
+                                            (scorefile, os.path.basename(scorefile), run_dir, subset, "[]")).lastrowid
+                known_columns = []
+                appended = False
+            else:
+                source_id, size, mtime_ns, parsed_end, hashes, known_columns, n_rows, old_subset, old_run_dir = source
+                known_columns = json.loads(known_columns)
+                subset = old_subset if subset is None else subset
+                run_dir = old_run_dir if run_dir is None else run_dir
+                if (old_subset, old_run_dir) != (subset, run_dir):
+                    self.db.execute("UPDATE sources SET subset = ?, run_dir = ? WHERE source_id = ?", (subset, run_dir, source_id))
+                if {"size": size, "mtime_ns": mtime_ns} == stamp:
+                    return 0
+                appended = parsed_end is not None and stamp["size"] >= parsed_end and \
+                           get_boundary_hashes(scorefile, parsed_end) == json.loads(hashes)
+
+            if appended:
+                n, columns, end = parse_new_records(scorefile, parsed_end)
+            else:
+                self.db.execute("DELETE FROM scores WHERE source_id = ?", (source_id,))
+                known_columns = []
+                n, columns, end = self._parse(scorefile)
+
+            names = self._insert(source_id, scorefile, n, columns)
+            known_columns += [k for k in names if k not in known_columns]
+            self.db.execute("UPDATE sources SET size = ?, mtime_ns = ?, parsed_end = ?, boundary_hashes = ?, columns = ?, "
+                            "n_rows = (SELECT COUNT(*) FROM scores WHERE source_id = ?), ingested = ? WHERE source_id = ?",
+                            (stamp["size"], stamp["mtime_ns"], end,
+                             json.dumps(get_boundary_hashes(scorefile, end)) if end is not None else None,
+                             json.dumps(known_columns), source_id, time.time(), source_id))
+        if verbose:
+            print(("Appended " if appended else "Ingested ") + repr(n) + " decoys from " + scorefile)
+        return n
+
+    def ingest_all(self, scorefiles: List[str], subsets: List[str] = None, verbose: bool = True) -> int:
+        """
+        Ingest several scorefiles.  Returns the total number of decoys read.
+
+        :param scorefiles: list
+        :param subsets: list of subset names, one per scorefile, or None for the defaults.
+        :param verbose: bool
+        :rtype: int
+        """
+        if subsets is None:
+            subsets = [None] * len(scorefiles)
+        return sum(self.ingest(s, subset, verbose=verbose) for s, subset in zip(scorefiles, subsets))
+
+    def remove(self, scorefile: str):
+        """
+        Remove a scorefile and its decoys from the warehouse.
+
+        :param scorefile: str
+        """
+        source = self._get_source(os.path.abspath(scorefile))
+        if source is None: return
+        with self.db:
+            self.db.execute("DELETE FROM scores WHERE source_id = ?", (source[0],))
+            self.db.execute("DELETE FROM sources WHERE source_id = ?", (source[0],))
+
+    ####################################################################################################################
+    ## Queries
+    ####################################################################################################################
+
+    def get_sources(self) -> pandas.DataFrame:
+        """
+        Get the ingested scorefiles and their provenance.
+
+        :rtype: pandas.DataFrame
+        """
+        return pandas.read_sql_query("SELECT scorefile, name, run_dir, subset, n_rows, ingested FROM sources ORDER BY source_id", self.db)
+
+    def get_scoreterm_names(self) -> List[str]:
+        """
+        Get the names of all stored score columns.
+
+        :rtype: list
+        """
+        return [k for k in self._columns if k not in _reserved_columns]
+
+    def get_common_scoreterm_names(self, subsets: List[str] = None, scorefiles: List[str] = None) -> List[str]:
+        """
+        Get the score columns present in every selected scorefile, in warehouse order.
+
+        :param subsets: list
+        :param scorefiles: list
+        :rtype: list
+        """
+        where, params = self._get_source_where(subsets, scorefiles, "")
+        rows = self.db.execute("SELECT columns FROM sources" + (" WHERE " + where if where else ""), params).fetchall()
+        if not rows:
+            return []
+        common = set(json.loads(rows[0][0])).intersection(*[json.loads(r[0]) for r in rows[1:]])
+        return [k for k in self.get_scoreterm_names() if k in common]
+
+    def _get_source_where(self, subsets: List[str], scorefiles: List[str], prefix: str = "s.") -> Tuple[str, List[Any]]:
+        clauses = []
+        params = []
+        if subsets:
+            clauses.append(prefix + "subset IN (" + ", ".join("?" * len(subsets)) + ")")
+            params += list(subsets)
+        if scorefiles:
+            clauses.append(prefix + "scorefile IN (" + ", ".join("?" * len(scorefiles)) + ")")
+            params += [os.path.abspath(s) for s in scorefiles]
+        return " AND ".join(clauses), params
+
+    def _get_select(self, columns: List[str]) -> str:
+        return ", ".join(("s." if c in provenance_columns else "c.") + quote(c) for c in columns)
+
+    def _get_from_where(self, where: str, params, subsets: List[str], scorefiles: List[str], not_null: List[str] = ()) -> Tuple[str, List[Any]]:
+        source_where, source_params = self._get_source_where(subsets, scorefiles)
+        clauses = ["c." + quote(c) + " IS NOT NULL" for c in not_null]
+        if source_where:
+            clauses.append(source_where)
+        if where:
+            clauses.append("(" + where + ")")
+        sql = " FROM scores c JOIN sources s ON c.source_id = s.source_id"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        return sql, source_params + list(params)
+
+    def _get_columns(self, columns: List[str], subsets: List[str], scorefiles: List[str], common_columns: bool) -> List[str]:
+        if columns is None:
+            if common_columns:
+                scoreterms = self.get_common_scoreterm_names(subsets, scorefiles)
+            else:
+                scoreterms = self.get_scoreterm_names()
+            ids = [c for c in ['decoy', 'decoy_path'] if c not in scoreterms]
+            return ids + scoreterms + provenance_columns
+        unknown = [c for c in columns if c not in self._columns and c not in provenance_columns]
+        if unknown:
+            raise KeyError("Columns not found in warehouse: " + ", ".join(unknown))
+        return list(columns)
+
+    def _get_order(self, column: str, ascending: bool) -> str:
+        c = ("s." if column in provenance_columns else "c.") + quote(column)
+        return c + " IS NULL, " + c + (" ASC" if ascending else " DESC")
+
+    def query(self, columns: List[str] = None, where: str = None, params = (), subsets: List[str] = None,
+              scorefiles: List[str] = None, order_by: str = None, ascending: bool = None, limit: int = None,
+              common_columns: bool = False) -> pandas.DataFrame:
+        """
+        Get decoys as a dataframe.
+
+        :param columns: Columns to get.  Default is all score columns plus the provenance columns.
+        :param where: SQL filter on the columns, such as 'dG_separated < ? AND hbonds_int > 2'.  Quote unusual names.
+        :param params: Parameters of the where clause.
+        :param subsets: Only these subsets.
+        :param scorefiles: Only these scorefiles.
+        :param order_by: Column to order by.  Missing values go last.
+        :param ascending: Default is the direction of the score term (see score_selection.is_ascending).
+        :param limit: Maximum number of rows.
+        :param common_columns: If columns is None, only get the score columns present in every selected scorefile.
+        :rtype: pandas.DataFrame
+        """
+        columns = self._get_columns(columns, subsets, scorefiles, common_columns)
+        from_where, params = self._get_from_where(where, params, subsets, scorefiles)
+        sql = "SELECT " + self._get_select(columns) + from_where
+        if order_by:
+            sql += " ORDER BY " + self._get_order(order_by, is_ascending(order_by) if ascending is None else ascending)
+        if limit is not None and limit >= 0:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return pandas.read_sql_query(sql, self.db, params=params)
+
+    def top_n(self, scoreterm: str, top_n: int, groupby: str = None, columns: List[str] = None, where: str = None,
+              params = (), subsets: List[str] = None, scorefiles: List[str] = None, ascending: bool = None) -> pandas.DataFrame:
+        """
+        Get the top_n decoys by a score term, best first.  Decoys missing the score term are skipped.
+        If groupby is given (such as 'subset'), get the top_n of each group, ordered by group.
+        top_n of -1 returns all of them.
+
+        :param scoreterm: str
+        :param top_n: int
+        :param groupby: str
+        :param columns: list
+        :param where: str
+        :param params: tuple
+        :param subsets: list
+        :param scorefiles: list
+        :param ascending: bool
+        :rtype: pandas.DataFrame
+        """
+        if ascending is None:
+            ascending = is_ascending(scoreterm)
+
+        columns = self._get_columns(columns, subsets, scorefiles, False)
+        from_where, params = self._get_from_where(where, params, subsets, scorefiles, not_null=[scoreterm])
+        order = "c." + quote(scoreterm) + (" ASC" if ascending else " DESC")
+        if groupby is None:
+            #SQLite takes a negative LIMIT as no limit.
+            sql = "SELECT " + self._get_select(columns) + from_where + " ORDER BY " + order + " LIMIT ?"
+            params = params + [top_n]
+        else:
+            #Rank within each group with a window function, so only the top rows of each group are returned.
+            group = ("s." if groupby in provenance_columns else "c.") + quote(groupby)
+            sql = "SELECT " + ", ".join(quote(c) for c in columns) + " FROM (SELECT " + self._get_select(columns) + \
+                  ", " + group + " AS _group, ROW_NUMBER() OVER (PARTITION BY " + group + " ORDER BY " + order + ") AS _rank" + \
+                  from_where + ")"
+            if top_n >= 0:
+                sql += " WHERE _rank <= ?"
+                params = params + [top_n]
+            sql += " ORDER BY _group, _rank"
+        return pandas.read_sql_query(sql, self.db, params=params)
+
+    def group_by(self, groupby: str, scoreterms: List[str], aggregates: List[str] = ("count", "mean", "min", "max"),
+                 where: str = None, params = (), subsets: List[str] = None, scorefiles: List[str] = None) -> pandas.DataFrame:
+        """
+        Get aggregate statistics of score terms per group, with one column per term and aggregate (such as dG_separated_mean).
+        Aggregates are any of count, mean, min, max and sum.
+
+        :param groupby: str
+        :param scoreterms: list
+        :param aggregates: list
+        :param where: str
+        :param params: tuple
+        :param subsets: list
+        :param scorefiles: list
+        :rtype: pandas.DataFrame
+        """
+        group = ("s." if groupby in provenance_columns else "c.") + quote(groupby)
+        select = [group + " AS " + quote(groupby)]
+        for term in scoreterms:
+            for agg in aggregates:
+                select.append(_aggregates[agg] + "(c." + quote(term) + ") AS " + quote(term + "_" + agg))
+        from_where, params = self._get_from_where(where, params, subsets, scorefiles)
+        sql = "SELECT " + ", ".join(select) + from_where + " GROUP BY " + group + " ORDER BY " + group
+        return pandas.read_sql_query(sql, self.db, params=params)
@@ -1,2 +1,22 @@
 from .test_path import *
-from .test_nnmetrics import *
\ No newline at end of file
+from .test_nnmetrics import *
+from .test_score_parser import *
+from .test_score_file import *
+from .test_score_selection import *
+from .test_decoy_scores import *
+from .test_score_warehouse import *
+from .test_compact import *
+from .test_reduction import *
+from .test_computation_cache import *
+from .test_copy_queue import *
+from .test_streaming_stats import *
+from .test_python_pdb import *
+from .test_biopose import *
+from .test_structure_cache import *
+from .test_batch_loader import *
+from .test_neighbor_index import *
+from .test_sql_pose import *
+from .test_decoy_ensemble import *
+from .test_superposition import *
+from .test_rmsd_clustering import *
+from .test_pdb_pipeline import *
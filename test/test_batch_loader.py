@@ -0,0 +1,44 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from jade2.basic.structure.BatchLoader import *
+
+class TestBatchLoader(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        inputs = os.path.join(os.path.dirname(__file__), "inputs")
+        for name in ["6wb3.pdb", "6wcu_A.pdb", "6wbp.pdb"]:
+            shutil.copy(os.path.join(inputs, name), self.tmpdir)
+        self.paths = get_structure_paths(self.tmpdir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_ordered(self):
+        missing = os.path.join(self.tmpdir, "missing.pdb")
+        loader = BatchLoader(self.paths + [missing], 'atoms', processes=2, chunksize=1, verbose=False)
+        atoms = loader.load_all()
+        self.assertEqual(list(atoms), self.paths)
+        self.assertEqual([len(a) for a in atoms.values()], [len(load_pdb(p).atoms) for p in self.paths])
+        self.assertEqual([path for path, error in loader.errors], [missing])
+
+    def test_pdb_only(self):
+        cif = os.path.join(self.tmpdir, "x.cif")
+        with open(cif, 'w') as OUTFILE:
+            OUTFILE.write("data_x\n")
+        self.assertEqual(len(get_structure_paths(self.tmpdir)), 4)
+
+        #Directories given to PDB-only loaders skip mmCIF files, and mmCIF files given directly are errors.
+        loader = BatchLoader(self.tmpdir, 'atoms', processes=1, verbose=False)
+        self.assertEqual(loader.paths, self.paths)
+        loader = BatchLoader([cif, self.paths[0]], 'atoms', processes=1, verbose=False)
+        self.assertEqual(list(loader.load_all()), [self.paths[0]])
+        self.assertEqual([path for path, error in loader.errors], [cif])
+
+    def test_unordered(self):
+        loader = BatchLoader(os.path.join(self.tmpdir, "*.pdb"), 'sequences', processes=2, ordered=False, chunksize=1, cache=False)
+        sequences = dict(loader)
+        self.assertEqual(sorted(sequences), self.paths)
+        self.assertEqual(sequences[os.path.join(self.tmpdir, "6wb3.pdb")]['A'], "ETEKLIREKDEELRRMQEMLHKIQKQMKEN")
@@ -0,0 +1,30 @@
+import os
+import unittest
+import warnings
+
+import numpy as np
+from Bio.PDB import calc_dihedral
+
+from jade2.basic.structure.BioPose import BioPose
+
+class TestBioPose(unittest.TestCase):
+    def setUp(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            self.pose = BioPose(os.path.join(os.path.dirname(__file__), "inputs", "2j88.pdb"))
+
+    def test_backbone_dihedrals(self):
+        residues = self.pose.get_aa_residues('L')
+        dihedrals = self.pose.get_backbone_dihedrals(residues)
+        for i in [5, 50, 100]:
+            prev, res, nxt = residues[i-1:i+2]
+            self.assertAlmostEqual(dihedrals['phi'][i], calc_dihedral(*[a.get_vector() for a in [prev['C'], res['N'], res['CA'], res['C']]]))
+            self.assertAlmostEqual(dihedrals['psi'][i], calc_dihedral(*[a.get_vector() for a in [res['N'], res['CA'], res['C'], nxt['N']]]))
+            self.assertAlmostEqual(dihedrals['omega'][i], self.pose.omega(res, nxt, prev))
+        self.assertEqual((dihedrals['phi'][0], dihedrals['psi'][-1]), (0.0, 0.0))
+
+    def test_chain_breaks(self):
+        breaks = self.pose.find_chain_breaks()
+        #H 138 is missing its N, so only 139 is listed.
+        self.assertEqual(breaks['H'], [121, 139, 155, 163])
+        self.assertEqual(breaks['A'], [65, 71])
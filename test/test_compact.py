@@ -0,0 +1,38 @@
+import unittest
+
+import numpy as np
+import pandas
+
+from jade2.basic.dataframe.compact import *
+
+class TestCompactDataframe(unittest.TestCase):
+    def setUp(self):
+        n = 1000
+        self.df = pandas.DataFrame({
+            "decoy": ["decoy_%04d" % i for i in range(n)],
+            "total_score": np.linspace(-100, 100, n),
+            "nstruct": np.arange(n, dtype=np.int64),
+            "name": ["score.sc"] * n,
+            "decoy_path": ["/runs/%d/decoy_%04d.pdb.gz" % (i % 4, i) for i in range(n)]})
+
+    def test_compact(self):
+        df = compact_dataframe(self.df, precision={"nstruct": "int32"})
+        self.assertEqual(df["total_score"].dtype, np.float32)
+        self.assertEqual(df["nstruct"].dtype, np.int32)
+        self.assertIsInstance(df["name"].dtype, pandas.CategoricalDtype)
+        self.assertFalse(isinstance(df["decoy"].dtype, pandas.CategoricalDtype))
+        self.assertEqual(len(df["decoy_path_dir"].cat.categories), 4)
+
+        report = get_memory_report(df, self.df)
+        self.assertLess(report.loc["total", "ratio"], 1)
+
+    def test_path_round_trip(self):
+        df = expand_path_columns(compact_dataframe(self.df))
+        self.assertEqual(list(df.columns), list(self.df.columns))
+        self.assertEqual(list(df["decoy_path"]), list(self.df["decoy_path"]))
+
+    def test_downcast_overflow(self):
+        s = pandas.Series([1e300, 1.0])
+        self.assertEqual(downcast_numeric(s, "float32").dtype, np.float64)
+        s = pandas.Series([0, 2**40])
+        self.assertEqual(downcast_numeric(s, "int32").dtype, np.int64)
@@ -0,0 +1,38 @@
+import threading
+import time
+import unittest
+
+import numpy as np
+
+from jade2.basic.ComputationCache import ComputationCache
+
+class TestComputationCache(unittest.TestCase):
+    def test_lru_bound(self):
+        cache = ComputationCache(max_bytes=3000)
+        for i in range(3):
+            cache.get(i, lambda: np.zeros(100))
+        cache.get(0, lambda: None)
+        cache.get(3, lambda: np.zeros(100))
+
+        self.assertLessEqual(cache.nbytes, 3000)
+        self.assertIn(0, cache)
+        self.assertNotIn(1, cache)
+        self.assertEqual((cache.hits, cache.misses), (1, 4))
+
+        cache.get("large", lambda: np.zeros(1000))
+        self.assertNotIn("large", cache)
+
+    def test_shared_computation(self):
+        cache = ComputationCache()
+        calls = []
+        def compute():
+            calls.append(1)
+            time.sleep(.05)
+            return 42
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get("key", compute))) for i in range(8)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+        self.assertEqual(results, [42] * 8)
+        self.assertEqual(len(calls), 1)
@@ -0,0 +1,52 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from jade2.basic.threading.CopyQueue import CopyQueue
+
+class TestCopyQueue(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.sources = []
+        for i in range(20):
+            path = os.path.join(self.tmpdir, "decoy_%d.pdb" % i)
+            with open(path, 'w') as OUTFILE:
+                OUTFILE.write("ATOM %d\n" % i)
+            self.sources.append(path)
+        self.outdir = os.path.join(self.tmpdir, "out")
+        os.mkdir(self.outdir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def run_job(self, queue, pairs):
+        done = threading.Event()
+        finished = []
+        job = queue.submit(pairs, lambda j: (finished.append(j), done.set()))
+        self.assertTrue(done.wait(10))
+        self.assertEqual(finished, [job])
+        return job
+
+    def test_copy(self):
+        queue = CopyQueue(workers=4, link=False)
+        pairs = [(src, os.path.join(self.outdir, os.path.basename(src))) for src in self.sources]
+        pairs.append((os.path.join(self.tmpdir, "missing.pdb"), os.path.join(self.outdir, "missing.pdb")))
+
+        job = self.run_job(queue, pairs)
+        self.assertTrue(job.finished)
+        self.assertEqual(len(job.errors), 1)
+        self.assertEqual(job.get_copied(), [dst for src, dst in pairs[:-1]])
+        for src, dst in pairs[:-1]:
+            self.assertEqual(open(src).read(), open(dst).read())
+        self.assertEqual(job.n_linked, 0)
+        self.assertIn("20/21 copied, 1 failed, done", queue.get_status()[-1])
+        queue.shutdown()
+
+    def test_link_and_empty(self):
+        queue = CopyQueue(workers=4)
+        job = self.run_job(queue, [(self.sources[0], os.path.join(self.outdir, "linked.pdb"))])
+        self.assertEqual(job.n_linked, 1)
+        self.assertTrue(self.run_job(queue, []).finished)
+        queue.shutdown()
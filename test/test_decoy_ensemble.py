@@ -0,0 +1,65 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from jade2.basic.structure.pdb_io import read_pdb_file, write_pdb_file, get_atom_coords
+from jade2.basic.structure.DecoyEnsemble import *
+
+class TestDecoyEnsemble(unittest.TestCase):
+    def setUp(self):
+        inputs = os.path.join(os.path.dirname(__file__), "inputs")
+        self.tmp = tempfile.mkdtemp()
+        self.atoms = read_pdb_file(os.path.join(inputs, "2j88.pdb"))[0]
+        rng = np.random.RandomState(0)
+        self.paths = []
+        for i in range(4):
+            atoms = self.atoms.copy()
+            for axis in ("x", "y", "z"):
+                atoms[axis] = np.round(atoms[axis] + rng.normal(0, 1, len(atoms)), 3)
+            path = os.path.join(self.tmp, "decoy_%04d.pdb" % (i + 1))
+            write_pdb_file(path, atoms)
+            self.paths.append(path)
+        #A different structure, which does not match the topology.
+        shutil.copy(os.path.join(inputs, "6wb3.pdb"), os.path.join(self.tmp, "decoy_0005.pdb"))
+        self.paths.append(os.path.join(self.tmp, "decoy_0005.pdb"))
+
+        with open(os.path.join(self.tmp, "score.sc"), 'w') as OUTFILE:
+            for i, score in enumerate([-10.0, -30.0, -20.0, -5.0, -25.0]):
+                OUTFILE.write('{"decoy": "decoy_%04d", "total_score": %s, "nstruct": %d}\n' % (i + 1, score, i + 1))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_create(self):
+        ensemble = create_ensemble(os.path.join(self.tmp, "all.ensemble"), self.tmp, {"rank": [1, 2, 3, 4, 5]},
+                                   processes=1, verbose=False)
+        self.assertEqual(len(ensemble), 4)
+        self.assertEqual(ensemble.get_decoy_names(), ["decoy_0001", "decoy_0002", "decoy_0003", "decoy_0004"])
+        self.assertEqual(ensemble.metadata["rank"].tolist(), [1, 2, 3, 4])
+        self.assertEqual([os.path.basename(path) for path, error in ensemble.errors], ["decoy_0005.pdb"])
+        self.assertIsInstance(ensemble.coords, np.memmap)
+
+        ca = ensemble.get_atom_mask(chains="L", atom_names="CA", start=10, end=20)
+        coords = ensemble.get_coords(["decoy_0003", 0], ca)
+        self.assertEqual(coords.shape, (2, ca.sum(), 3))
+        expected = get_atom_coords(read_pdb_file(self.paths[2])[0])[ca]
+        np.testing.assert_allclose(coords[0], expected, atol=1e-3)
+        np.testing.assert_array_equal(ensemble.get_coords([False, False, True, False], ca), coords[:1])
+
+        atoms = ensemble.get_atoms("decoy_0002")
+        np.testing.assert_array_equal(atoms, read_pdb_file(self.paths[1])[0])
+
+        with self.assertRaises(FileExistsError):
+            create_ensemble(os.path.join(self.tmp, "all.ensemble"), self.paths, verbose=False)
+
+    def test_from_scorefile(self):
+        ensemble = create_ensemble_from_scorefile(os.path.join(self.tmp, "top.ensemble"),
+                                                  os.path.join(self.tmp, "score.sc"), top_n=3, processes=1, verbose=False)
+        #decoy_0005 is in the top 3, but does not match the topology of the best, decoy_0002.
+        self.assertEqual(ensemble.get_decoy_names(), ["decoy_0002", "decoy_0003"])
+        self.assertEqual(ensemble.metadata["total_score"].tolist(), [-30.0, -20.0])
+        self.assertEqual(len(ensemble.errors), 1)
+        self.assertEqual(len(ensemble.get_dataframe()), 2)
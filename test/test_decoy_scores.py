@@ -0,0 +1,41 @@
+import unittest
+import tempfile
+import gzip
+import os
+
+from jade2.rosetta_jade.decoy_scores import *
+
+class TestDecoyScores(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        lines = ["ATOM  %5d  CA  ALA A%4d       0.000   0.000   0.000  1.00  0.00           C" % (i, i) for i in range(1, 500)]
+        lines += ["TER",
+                  "#BEGIN_POSE_ENERGIES_TABLE banana_0001.pdb",
+                  "label fa_atr fa_rep total",
+                  "weights 1 0.55 NA",
+                  "pose -10.5 2.5 -8",
+                  "ALA_1 -1 0.5 -0.5",
+                  "#END_POSE_ENERGIES_TABLE banana_0001.pdb",
+                  "dG_separated -5.25",
+                  "hbonds_int 3",
+                  "rmsd nan"]
+        text = "\n".join(lines) + "\n"
+
+        self.pdb = os.path.join(self.tmp, "banana_0001.pdb")
+        with open(self.pdb, 'w') as OUTFILE:
+            OUTFILE.write(text)
+        self.pdb_gz = os.path.join(self.tmp, "banana_0002.pdb.gz")
+        with gzip.open(self.pdb_gz, 'wt') as OUTFILE:
+            OUTFILE.write(text)
+
+    def test_read_decoy_scores(self):
+        for block in (64, TAIL_BLOCK):
+            for path in (self.pdb, self.pdb_gz):
+                scores = parse_decoy_tail(read_decoy_tail(path, block))
+                self.assertEqual(list(scores.keys()), ["fa_atr", "fa_rep", "total_score", "dG_separated", "hbonds_int", "rmsd"])
+                self.assertEqual(scores["total_score"], -8.0)
+                self.assertEqual(scores["hbonds_int"], 3)
+
+        scores = read_all_decoy_scores([self.pdb, self.pdb_gz], processes=1, metrics=False, verbose=False)
+        self.assertEqual([s["decoy"] for s in scores], ["banana_0001", "banana_0002"])
+        self.assertNotIn("dG_separated", scores[0])
@@ -0,0 +1,53 @@
+import os
+import unittest
+
+import numpy as np
+
+from jade2.basic.structure.PythonPDB2 import PythonPDB2
+from jade2.basic.structure.NeighborIndex import *
+
+class TestNeighborIndex(unittest.TestCase):
+    def setUp(self):
+        self.atoms = PythonPDB2(os.path.join(os.path.dirname(__file__), "inputs", "2j88.pdb")).get_atoms()
+        self.coords = get_atom_coords(self.atoms)[::3]
+        rng = np.random.RandomState(0)
+        self.points = np.vstack([self.coords[::5] + rng.normal(0, 2, (len(self.coords[::5]), 3)), [[500, 500, 500]]])
+        self.distances = np.linalg.norm(self.points[:, None] - self.coords[None], axis=2)
+        self.index = NeighborIndex(self.coords)
+
+    def test_radius(self):
+        for radius in [4.0, 13.0]:
+            query, point, distances = self.index.query_radius(self.points, radius)
+            expected_query, expected_point = np.nonzero(self.distances <= radius)
+            np.testing.assert_array_equal(query, expected_query)
+            np.testing.assert_array_equal(point, expected_point)
+            np.testing.assert_allclose(distances, self.distances[query, point])
+
+        i, j, distances = self.index.query_pairs(4.0)
+        full = np.linalg.norm(self.coords[:, None] - self.coords[None], axis=2)
+        expected_i, expected_j = np.nonzero(np.triu(full <= 4.0, 1))
+        np.testing.assert_array_equal(i, expected_i)
+        np.testing.assert_array_equal(j, expected_j)
+
+    def test_knn(self):
+        indices, distances = self.index.query_knn(self.points, 10)
+        np.testing.assert_allclose(distances, np.sort(self.distances, axis=1)[:, :10])
+        np.testing.assert_allclose(np.take_along_axis(self.distances, indices, axis=1), distances)
+
+        indices, distances = NeighborIndex(self.coords[:3]).query_knn(self.coords[:1], 5)
+        self.assertEqual(indices.tolist(), [[0, 1, 2, -1, -1]])
+
+    def test_contacts(self):
+        rng = np.random.RandomState(1)
+        decoys = np.stack([get_atom_coords(self.atoms) + rng.normal(0, .5, (len(self.atoms), 3)) for i in range(3)])
+        side_a = self.atoms['chain'] == 'A'
+        side_b = np.isin(self.atoms['chain'], ['H', 'L'])
+        decoy, atom_a, atom_b, distances = get_batch_contacts(decoys, side_a, side_b)
+        for d in range(3):
+            i, j, dist = get_contacts(decoys[d][side_a], decoys[d][side_b])
+            np.testing.assert_array_equal(atom_a[decoy == d], np.flatnonzero(side_a)[i])
+            np.testing.assert_array_equal(atom_b[decoy == d], np.flatnonzero(side_b)[j])
+
+        antigen, antibody = get_interface_residues(self.atoms, 'A', 'LH')
+        self.assertIn(('A', 139, ' '), antigen)
+        self.assertTrue(all(chain in 'LH' for chain, resnum, icode in antibody))
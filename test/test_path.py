@@ -1,6 +1,8 @@
 import unittest
 import warnings
 import shutil
+import tempfile
+import os
 
 import jade2.basic.path as jade_path
 
@@ -12,6 +14,16 @@ class TestPath(unittest.TestCase):
         contents = jade_path.parse_contents(jade_path.get_database_testing_path())
         self.assertEqual(contents[0], "TEST_ASSERT")
 
+    def test_decoy_paths(self):
+        tmp = tempfile.mkdtemp()
+        for name in ["a_0001.pdb.gz", "b_0001.pdb", "c_0001.cif"]:
+            open(os.path.join(tmp, name), 'w').close()
+
+        decoys = [tmp+"/a_0001", tmp+"/b_0001.pdb", tmp+"/c_0001", tmp+"/missing"]
+        index = jade_path.DirectoryListingIndex(use_disk_cache=True)
+        self.assertEqual(jade_path.get_decoy_paths(decoys, index=index), [jade_path.get_decoy_path(d) for d in decoys])
+        self.assertTrue(jade_path.DirectoryListingIndex(use_disk_cache=True)._read_disk_cache(tmp))
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
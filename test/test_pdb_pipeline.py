@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from jade2.basic.structure.PythonPDB2 import PythonPDB2
+from jade2.basic.structure.PDBPipeline import PDBPipeline
+
+class TestPDBPipeline(unittest.TestCase):
+    def setUp(self):
+        self.inputs = os.path.join(os.path.dirname(__file__), "inputs")
+        self.pdb = PythonPDB2(os.path.join(self.inputs, "2j88.pdb"))
+
+    def test_matches_methods(self):
+        expected = PythonPDB2(os.path.join(self.inputs, "2j88.pdb"))
+        expected.remove_waters()
+        expected.remove_hetatm_atoms()
+        expected.pdb_chain_alias({"A": "X"})
+        expected.pdb_chain_alias({"X": "B", "H": "X"})
+        expected.pdb_residue_alias({"HIS": "HIE"})
+        expected.change_occupancy()
+        expected.replace_residue_b_factor(100, "L", 5.5)
+        self.assertTrue(len(expected) < len(self.pdb))
+
+        pipeline = PDBPipeline().remove_waters().remove_hetatms().rename_chains({"A": "X"})\
+                                .rename_chains({"X": "B", "H": "X"}).alias_residues({"HIS": "HIE"})\
+                                .set_occupancy(1.0).set_b_factors({("L", 100): 5.5})
+        #The two chain renames are merged into one map.
+        self.assertEqual(len(pipeline.compile()), len(pipeline) - 1)
+        self.pdb.transform(pipeline)
+        np.testing.assert_array_equal(self.pdb.get_atoms(), expected.get_atoms())
+
+    def test_numbering(self):
+        atoms = self.pdb.get_atoms()
+        chain = self.pdb.get_chains()[0]
+        first = atoms["residue_number"][atoms["chain"] == chain][0]
+        n_residues = len(np.unique(atoms["residue_number"][(atoms["chain"] == chain) & (atoms["id"] == "ATOM")]))
+
+        result = PDBPipeline().keep_chains(chain).remove_hetatms().renumber(offset=100).apply(atoms)
+        self.assertEqual(result["residue_number"][0], first + 100)
+
+        numbering = [None] + [str(i) + "A" for i in range(2, n_residues + 1)]
+        result = PDBPipeline().keep_chains(chain).remove_hetatms().renumber(start=1)\
+                              .renumber_by_alignment(chain, numbering).apply(atoms)
+        self.assertEqual(len(np.unique(result["residue_number"])), n_residues - 1)
+        self.assertEqual((result["residue_number"][0], result["i_code"][0]), (2, "A"))
+
+    def test_run(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            pipeline = PDBPipeline().remove_waters().order_chains("L")
+            self.assertEqual(pipeline.errors, [])
+            out_paths = pipeline.run([os.path.join(self.inputs, "2j88.pdb"), os.path.join(self.inputs, "6wbp.pdb")],
+                                     tmp, suffix="_clean", processes=1)
+            self.assertEqual([os.path.basename(p) for p in out_paths], ["2j88_clean.pdb", "6wbp_clean.pdb"])
+            result = PythonPDB2(out_paths[0])
+            self.assertEqual(result.get_chains(), ["L", "A", "H"])
+            self.assertEqual(len(result.get_waters()), 0)
+
+            #mmCIF files are skipped in directories and are errors when given directly.
+            indir = os.path.join(tmp, "in")
+            os.mkdir(indir)
+            shutil.copy(os.path.join(self.inputs, "6wb3.pdb"), indir)
+            with open(os.path.join(indir, "x.cif"), 'w') as OUTFILE:
+                OUTFILE.write("data_x\n")
+            out_paths = pipeline.run(indir, os.path.join(tmp, "out"), processes=1, verbose=False)
+            self.assertEqual([os.path.basename(p) for p in out_paths], ["6wb3.pdb"])
+            self.assertEqual(pipeline.errors, [])
+            out_paths = pipeline.run([os.path.join(indir, "x.cif")], os.path.join(tmp, "out"), processes=1, verbose=False)
+            self.assertEqual(out_paths, [])
+            self.assertEqual([os.path.basename(path) for path, error in pipeline.errors], ["x.cif"])
+        finally:
+            shutil.rmtree(tmp)
@@ -0,0 +1,67 @@
+import os
+import copy
+import tempfile
+import unittest
+
+import numpy as np
+
+from jade2.basic.structure.PythonPDB2 import *
+from jade2.basic.structure.pdb_io import *
+
+class TestPythonPDB2(unittest.TestCase):
+    def setUp(self):
+        self.pdb_path = os.path.join(os.path.dirname(__file__), "inputs", "2j88.pdb")
+        self.pdb = PythonPDB2(self.pdb_path)
+
+    def test_round_trip(self):
+        out = tempfile.NamedTemporaryFile(suffix=".pdb", delete=False).name
+        self.pdb.save_PDB(out)
+        def atom_lines(path, width=None):
+            return [l.rstrip()[:width] for l in open(path) if l.startswith(("ATOM", "HETATM"))]
+        self.assertEqual(atom_lines(out), atom_lines(self.pdb_path, 66))
+        os.remove(out)
+
+    def test_pdb_map_views(self):
+        atom = self.pdb.get_pdb_map()[0]
+        self.assertEqual((atom["residue_number"], atom["x"], atom["atom_name"]), ("10", "-4.740", " N  "))
+        atom["chain"] = "Z"
+        self.assertEqual(self.pdb.get_atoms()["chain"][0], "Z")
+        self.assertIsInstance(copy.deepcopy(atom), dict)
+
+        pdb = PythonPDB2()
+        pdb.set_pdb_map([copy.deepcopy(a) for a in self.pdb.get_chain("H")])
+        self.assertEqual(len(pdb), np.sum(self.pdb.get_atoms()["chain"] == "H"))
+
+    def test_edits(self):
+        n_waters = len(self.pdb.get_waters())
+        n_atoms = len(self.pdb)
+        self.pdb.remove_waters()
+        self.assertEqual(len(self.pdb), n_atoms - n_waters)
+
+        self.pdb.replace_atom_b_factor("11", "A", "CA", 5.123)
+        self.assertEqual([a["b_factor"] for a in self.pdb.get_residue(11, "A") if a["atom_name"] == " CA "], ["5.12"])
+
+        self.pdb.rename_chain("A", "X")
+        self.assertEqual(self.pdb.get_chains(), ["X", "H", "L"])
+
+        self.pdb.remove_alternate_residues()
+        resnums = self.pdb.get_atoms()["residue_number"][self.pdb.get_atoms()["chain"] == "X"]
+        self.assertEqual(resnums[0], 1)
+        self.assertTrue(np.all(np.diff(resnums) >= 0))
+
+    def test_column_io(self):
+        atoms = self.pdb.get_atoms()[:50].copy()
+        atoms["x"][0] = -0.0004
+        atoms["b_factor"][1] = np.nan
+        atoms["atom_number"][2] = 123456
+        atoms["three_letter_code"][3] = "DA"
+        expected = [self.pdb.morph_line_in_pdb_map_to_pdb_line(entry) for entry in atoms_to_pdb_map(atoms)]
+        self.assertEqual(format_pdb_atoms(atoms), expected)
+
+        out = tempfile.NamedTemporaryFile(suffix=".pdb.gz", delete=False).name
+        self.pdb.save_PDB(out)
+        pdb = PythonPDB2(out)
+        self.assertEqual((pdb.header, pdb.remarks), (self.pdb.header, self.pdb.remarks))
+        for field in ["atom_name", "residue_number", "x", "b_factor"]:
+            self.assertTrue(np.array_equal(pdb.get_atoms()[field], self.pdb.get_atoms()[field]))
+        os.remove(out)
@@ -0,0 +1,52 @@
+import unittest
+
+import numpy as np
+import pandas
+
+from jade2.basic.figure.reduction import *
+
+class TestPlotReduction(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(1)
+        n = 50000
+        self.df = pandas.DataFrame({
+            "x": rng.normal(size=n),
+            "y": rng.normal(size=n),
+            "group": rng.choice(["a", "b", "c"], n)})
+        self.df.loc[11, "x"] = 100
+
+    def test_downsample(self):
+        columns = [self.df["x"].to_numpy(), self.df["y"].to_numpy()]
+        rows = downsample_indices(columns, 5000, keep=[3, 4])
+        self.assertLessEqual(len(rows), 5000)
+        self.assertTrue(np.all(np.diff(rows) > 0))
+        for row in [3, 4, 11]:
+            self.assertIn(row, rows)
+        self.assertEqual(len(downsample_indices(columns, len(self.df))), len(self.df))
+
+    def test_quantiles(self):
+        codes = pandas.factorize(self.df["group"], sort=True)[0]
+        rows = get_quantile_indices(self.df["y"].to_numpy(), codes)
+        self.assertEqual(len(rows), 3 * N_QUANTILES)
+
+        full = self.df.groupby("group")["y"].quantile([0, .25, .5, .75, 1])
+        reduced = self.df.iloc[rows].groupby("group")["y"].quantile([0, .25, .5, .75, 1])
+        np.testing.assert_allclose(full.to_numpy(), reduced.to_numpy(), atol=.01)
+
+    def test_histogram(self):
+        binned = aggregate_histogram(self.df, "x", color="group", bins=50)
+        self.assertEqual(binned["count"].sum(), len(self.df))
+
+        binned = aggregate_histogram(self.df, "x", color="group", histnorm="probability density", bins=50)
+        areas = binned.groupby("group")["count"].sum() * binned["width"].iloc[0]
+        np.testing.assert_allclose(areas.to_numpy(), 1)
+
+        binned = aggregate_histogram(self.df, "group", "y", histfunc="avg")
+        np.testing.assert_allclose(binned["avg of y"].to_numpy(), self.df.groupby("group")["y"].mean().to_numpy())
+
+    def test_selection(self):
+        x, y = self.df["x"].to_numpy(), self.df["y"].to_numpy()
+        box = get_selected_rows(x, y, {"range": {"x": [0, 1], "y": [1, 0]}})
+        lasso = get_selected_rows(x, y, {"lassoPoints": {"x": [0, 1, 1, 0], "y": [0, 0, 1, 1]}})
+        self.assertEqual(list(box), list(lasso))
+        self.assertIsNone(get_selected_rows(x, y, {"points": []}))
@@ -0,0 +1,44 @@
+import os
+import unittest
+
+import numpy as np
+
+from jade2.basic.structure.pdb_io import read_pdb_file, get_atom_coords, get_atom_mask
+from jade2.clustering.RMSDClustering import *
+
+class TestRMSDClustering(unittest.TestCase):
+    def setUp(self):
+        atoms = read_pdb_file(os.path.join(os.path.dirname(__file__), "inputs", "2j88.pdb"))[0]
+        native = get_atom_coords(atoms)[get_atom_mask(atoms, chains="L", atom_names="CA")]
+        rng = np.random.RandomState(0)
+        #Three conformations of different sizes, each with small noise.
+        shifts = [np.zeros_like(native), rng.normal(0, 3, native.shape), rng.normal(0, 3, native.shape)]
+        self.truth = np.repeat([0, 1, 2], [30, 20, 10])
+        self.coords = np.stack([native + shifts[k] + rng.normal(0, 0.3, native.shape) for k in self.truth])
+        self.names = ["decoy_%04d.pdb" % i for i in range(len(self.coords))]
+
+    def check_clusters(self, clusterer):
+        self.assertEqual(clusterer.get_sizes().tolist(), [30, 20, 10])
+        np.testing.assert_array_equal(clusterer.get_labels(), self.truth)
+        paths, sizes = clusterer.ret_centers()
+        self.assertEqual(sizes, [30, 20])
+        self.assertTrue(paths[0] in self.names[:30] and paths[1] in self.names[30:50])
+        clusters = clusterer.get_clusters()
+        self.assertEqual([len(members) for members in clusters.values()], [30, 20, 10])
+
+    def test_methods(self):
+        clusterer = RMSDClusterer(self.coords, self.names, processes=1)
+        clusterer.run_threshold(2.0)
+        self.check_clusters(clusterer)
+        self.assertEqual(clusterer.ret_threshold(), "2.0")
+
+        clusterer.run_hierarchical(n_clusters=3)
+        self.check_clusters(clusterer)
+        clusterer.run('kmedoids', n_clusters=3)
+        self.check_clusters(clusterer)
+
+    def test_subset(self):
+        clusterer = RMSDClusterer(self.coords, self.names, max_decoys=25, processes=1)
+        clusterer.run_hierarchical(threshold=2.0)
+        self.assertEqual(clusterer.get_matrix().shape, (25, 25))
+        self.check_clusters(clusterer)
@@ -0,0 +1,99 @@
+import unittest
+import tempfile
+import os
+
+from jade2.rosetta_jade.ScoreFiles import ScoreFile, load_scorefiles, get_scorefiles
+
+class TestScoreFile(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.json_path = os.path.join(self.tmp, "score.sc")
+        with open(self.json_path, 'w') as OUTFILE:
+            OUTFILE.write('{"decoy": "d0", "total_score": -3.0, "hbonds_int": 2, "dSASA_int": 900.5}\n')
+            OUTFILE.write('{"decoy": "d1", "total_score": -5.0, "hbonds_int": 4, "dSASA_int": 1000.0}\n')
+            OUTFILE.write('{"decoy": "d2", "total_score": -5.0, "hbonds_int": 1}\n')
+            OUTFILE.write('{"decoy": "d3", "total_score": -1.0, "hbonds_int": 4, "dSASA_int": 850.0}\n')
+            OUTFILE.write('{"decoy": "d4", "total_score": 2.0, "hbonds_int": 0, "dSASA_int": 1000.0}\n')
+
+        self.table_path = os.path.join(self.tmp, "score_table.sc")
+        with open(self.table_path, 'w') as OUTFILE:
+            OUTFILE.write("SEQUENCE: \n")
+            OUTFILE.write("SCORE: total_score hbonds_int description\n")
+            for total, hbonds, name in [(-2.5, 3, "m0"), (-7.0, 1, "m1"), (-2.5, 3, "m2"), (4.0, 5, "m3")]:
+                OUTFILE.write("SCORE: %.3f %d %s\n" % (total, hbonds, name))
+
+        self.sf = ScoreFile(self.json_path, use_cache=False)
+        self.table = ScoreFile(self.table_path, use_cache=False)
+
+    def test_ordered_decoy_list(self):
+        ordered = self.sf.get_ordered_decoy_list("total_score")
+        self.assertEqual(ordered, [[-5.0, "d1"], [-5.0, "d2"], [-3.0, "d0"], [-1.0, "d3"], [2.0, "d4"]])
+        self.assertEqual(self.sf.get_ordered_decoy_list("total_score", top_n=1), [[-5.0, "d1"]])
+        self.assertEqual(self.sf.get_ordered_decoy_list("total_score", top_n=3), ordered[:3])
+        self.assertEqual(self.sf.get_ordered_decoy_list("total_score", top_n=0), [])
+        self.assertEqual(self.sf.get_ordered_decoy_list("total_score", reverse=True), ordered[::-1])
+        self.assertEqual(self.sf.get_ordered_decoy_list("total_score", decoy_names=["d3", "d0", "missing"]),
+                         [[-3.0, "d0"], [-1.0, "d3"]])
+
+        #Higher is better, and ties at the top_n cutoff are broken by name as in the full list.
+        ordered = self.sf.get_ordered_decoy_list("hbonds_int")
+        self.assertEqual(ordered, [[4, "d3"], [4, "d1"], [2, "d0"], [1, "d2"], [0, "d4"]])
+        self.assertTrue(all(type(score) == int for score, name in ordered))
+        self.assertEqual(self.sf.get_ordered_decoy_list("dSASA_int"),
+                         [[1000.0, "d4"], [1000.0, "d1"], [900.5, "d0"], [850.0, "d3"]])
+        self.assertEqual(self.sf.get_ordered_decoy_list("dSASA_int", top_n=1), [[1000.0, "d4"]])
+
+        self.assertEqual(self.table.get_ordered_decoy_list("total_score", top_n=2), [[-7.0, "m1"], [-2.5, "m0"]])
+        self.assertEqual(self.table.get_ordered_decoy_list("hbonds_int", top_n=2), [[5, "m3"], [3, "m2"]])
+
+    def test_scores(self):
+        self.assertEqual(self.sf.get_scores("hbonds_int", top_n=2), [4, 4])
+        self.assertEqual(self.sf.get_scores("total_score", decoy_names=["d4", "d0"]), [-3.0, 2.0])
+
+        score = self.sf.get_score("d1", "hbonds_int")
+        self.assertEqual((score, type(score)), (4, int))
+        score = self.sf.get_score("d1", "total_score")
+        self.assertEqual((score, type(score)), (-5.0, float))
+        self.assertEqual(self.sf.get_score("missing", "total_score"), None)
+        self.assertEqual(self.table.get_score("m2", "hbonds_int"), 3)
+
+    def test_percentile(self):
+        #The best 60% by total_score are d1, d2 and d0.
+        self.assertEqual(self.sf.get_ordered_decoy_list_by_percentile("hbonds_int", top_p=.6),
+                         [[4, "d1"], [2, "d0"], [1, "d2"]])
+
+    def test_stats(self):
+        stats = self.sf.get_stats("hbonds_int,dSASA_int")
+        self.assertEqual(stats["hbonds_int"]["n"], 5)
+        self.assertEqual(stats["hbonds_int"]["max"], 4)
+        self.assertAlmostEqual(stats["hbonds_int"]["mean"], 2.2)
+        self.assertEqual(stats["dSASA_int"]["n"], 4)
+        self.assertEqual(stats["dSASA_int"]["median"], 1000.0)
+
+        stats = self.sf.get_stats("total_score", decoy_names=[os.path.join(self.tmp, "d0"), "d3"])
+        self.assertEqual(stats["total_score"]["n"], 2)
+        self.assertEqual(stats["total_score"]["min"], -3.0)
+
+    def test_select_decoys(self):
+        self.table.select_decoys(["m3", "m0"])
+        self.assertEqual(self.table.get_decoy_names(), ["m3", "m0"])
+        self.assertEqual(self.table.get_scores("total_score"), [-2.5, 4.0])
+        self.assertRaises(KeyError, self.table.select_decoys, ["m1"])
+
+    def test_combined_dataframe(self):
+        #Decoys of scorefiles combined from a directory keep the scorefile they came from.
+        scorefiles = get_scorefiles(self.tmp)
+        self.assertEqual([os.path.basename(f) for f in scorefiles], ["score.sc", "score_table.sc"])
+        n, columns, failures = load_scorefiles(scorefiles, processes=1, use_cache=False, verbose=False)
+        df = ScoreFile.from_columns("combined.json", n, columns).get_Dataframe()
+        df = df.sort_values("decoy")
+        self.assertEqual(list(df["scorefile"]), [scorefiles[0]] * 5 + [scorefiles[1]] * 4)
+        self.assertEqual(list(df["name"]), ["score.sc"] * 5 + ["score_table.sc"] * 4)
+
+        df = self.sf.get_Dataframe()
+        self.assertEqual(set(df["scorefile"]), {self.json_path})
+        self.assertEqual(set(df["name"]), {"score.sc"})
+
+
+if __name__ == '__main__':
+    unittest.main()
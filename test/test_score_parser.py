@@ -0,0 +1,149 @@
+import unittest
+import tempfile
+import os
+from unittest import mock
+
+import numpy as np
+
+from jade2.rosetta_jade.score_parser import *
+from jade2.rosetta_jade.ScoreFiles import ScoreFile, load_scorefiles
+from jade2.basic.path import get_scorefiles_recursively
+from jade2.rosetta_jade.score_cache import load_columns, read_manifest, get_sidecar_path
+
+class TestScoreParser(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.json_path = os.path.join(self.tmp, "score.sc")
+        with open(self.json_path, 'w') as OUTFILE:
+            for i in range(100):
+                dG = "nan" if i == 3 else repr(-float(i))
+                extra = ', "extra": "x"' if i % 10 == 0 else ''
+                OUTFILE.write('{"decoy": "banana_%04d", "total_score": %s, "dG_separated": %s, "nstruct": %d%s}\n'
+                              % (i, repr(float(i)), dG, i, extra))
+
+        self.table_path = os.path.join(self.tmp, "score_table.sc")
+        with open(self.table_path, 'w') as OUTFILE:
+            OUTFILE.write("SEQUENCE: \n")
+            OUTFILE.write("SCORE: total_score hbonds_int description\n")
+            for i in range(50):
+                OUTFILE.write("SCORE: %.3f %d model_%04d_0001\n" % (i * .5, i, i))
+
+    def test_detect_format(self):
+        self.assertEqual(detect_scorefile_format(self.json_path), JSON)
+        self.assertEqual(detect_scorefile_format(self.table_path), TABLE)
+
+    def test_json_columns(self):
+        n, columns = parse_scorefile(self.json_path, chunk_bytes=512, processes=1)
+        self.assertEqual(n, 100)
+        self.assertEqual(columns['nstruct'].dtype, np.int64)
+        self.assertTrue(np.isnan(columns['dG_separated'][3]))
+        self.assertEqual(columns['decoy'][1], "banana_0001")
+        self.assertEqual(list(columns['extra'][:2]), ["x", None])
+
+        n2, columns2 = parse_scorefile(self.json_path, chunk_bytes=512, processes=2)
+        self.assertEqual(n2, n)
+        self.assertTrue(np.array_equal(columns2['total_score'], columns['total_score']))
+
+    def test_table_scorefile(self):
+        sf = ScoreFile(self.table_path, strip_last_inc=True)
+        self.assertEqual(sf.get_decoy_count(), 50)
+        df = sf.get_Dataframe()
+        self.assertEqual(df['hbonds_int'].dtype, np.int64)
+        self.assertTrue("model_0000" in list(df['decoy']))
+
+    def test_sidecar_cache(self):
+        n, columns = load_columns(self.json_path, ['total_score'])
+        self.assertEqual(list(columns.keys()), ['total_score'])
+        self.assertTrue(read_manifest(self.json_path))
+
+        with open(self.json_path, 'a') as OUTFILE:
+            OUTFILE.write('{"decoy": "banana_new", "total_score": 1.0}\n')
+        self.assertEqual(read_manifest(self.json_path), None)
+        n2, columns = load_columns(self.json_path, ['total_score'])
+        self.assertEqual(n2, n + 1)
+
+    def test_append_to_cache(self):
+        #Appends are saved as chunks; the base columns (100 rows) are not rewritten until the chunks are as large.
+        load_columns(self.json_path)
+        sidecar = get_sidecar_path(self.json_path)
+        base_files = [os.path.join(sidecar, entry["file"]) for entry in read_manifest(self.json_path)["columns"].values()]
+        base_mtimes = [os.stat(f).st_mtime_ns for f in base_files]
+        sizes = []
+        for i in range(12):
+            with open(self.json_path, 'a') as OUTFILE:
+                for j in range(5):
+                    OUTFILE.write('{"decoy": "new_%d_%d", "total_score": %d.5, "new_term": %d}\n' % (i, j, i, j))
+            n, columns = load_columns(self.json_path, ['total_score', 'new_term', 'extra'])
+            sizes.append([chunk["n_rows"] for chunk in read_manifest(self.json_path)["chunks"]])
+            self.assertEqual(n, 100 + 5 * (i + 1))
+
+        self.assertEqual(sizes[:4], [[5], [10], [10, 5], [20]])
+        self.assertEqual(sizes[-1], [40, 20])
+        self.assertEqual([os.stat(f).st_mtime_ns for f in base_files], base_mtimes)
+
+        n, parsed = parse_scorefile(self.json_path)
+        for name in ['total_score', 'new_term']:
+            self.assertTrue(np.array_equal(columns[name], parsed[name], equal_nan=True))
+        self.assertEqual(list(columns['extra']), list(parsed['extra']))
+
+        #Once the chunks are as large as the base, they are merged into it.
+        with open(self.json_path, 'a') as OUTFILE:
+            for j in range(40):
+                OUTFILE.write('{"decoy": "last_%d", "total_score": -1.0}\n' % j)
+        n, columns = load_columns(self.json_path)
+        self.assertEqual(read_manifest(self.json_path)["chunks"], [])
+        self.assertFalse(any(os.path.exists(f) for f in base_files))
+        self.assertEqual((n, columns['decoy'][-1], columns['decoy'][0]), (200, "last_39", "banana_0000"))
+        self.assertTrue(np.isnan(columns['new_term'][-1]))
+
+    def test_unwritable_cache(self):
+        #If the cache cannot be written, the file is still parsed only once and update() can continue from it.
+        with mock.patch("jade2.rosetta_jade.score_cache._save_column", side_effect=OSError("Read-only")), \
+             mock.patch("jade2.rosetta_jade.ScoreFiles.parse_scorefile", side_effect=AssertionError("Parsed twice")):
+            sf = ScoreFile(self.json_path)
+        self.assertEqual(sf.get_decoy_count(), 100)
+        self.assertEqual(sf.offset, os.path.getsize(self.json_path))
+
+    def test_incremental_update(self):
+        sf = ScoreFile(self.json_path)
+        with open(self.json_path, 'a') as OUTFILE:
+            OUTFILE.write('{"decoy": "banana_new", "total_score": -1000.0}\n{"decoy": "partial", "total')
+        n, columns = sf.update()
+        self.assertEqual(n, 1)
+        self.assertEqual(sf.get_decoy_count(), 101)
+        self.assertEqual(sf.columns['decoy'][-1], "banana_new")
+
+        with open(self.json_path, 'a') as OUTFILE:
+            OUTFILE.write('_score": -1.0}\n')
+        self.assertEqual(sf.update()[0], 1)
+        self.assertEqual(load_columns(self.json_path)[0], 102)
+
+    def test_load_scorefiles(self):
+        root = os.path.join(self.tmp, "runs")
+        for d in ["b_run", "a_run/nested", "a_run/.hidden", ".jade_cache"]:
+            os.makedirs(os.path.join(root, d))
+        for d, n in [("b_run", 3), ("a_run", 2), ("a_run/nested", 4), ("a_run/.hidden", 5), (".jade_cache", 5)]:
+            with open(os.path.join(root, d, "score.sc"), 'w') as OUTFILE:
+                for i in range(n):
+                    OUTFILE.write('{"decoy": "m_%04d", "total_score": %s}\n' % (i, repr(float(i))))
+        with open(os.path.join(root, "a_run", "nested", "corrupt.sc"), 'wb') as OUTFILE:
+            OUTFILE.write(b"\x89PNG\x00\x01 not a scorefile\n")
+
+        scorefiles = get_scorefiles_recursively(root)
+        self.assertEqual([os.path.relpath(f, root) for f in scorefiles],
+                         ["a_run/score.sc", "a_run/nested/corrupt.sc", "a_run/nested/score.sc", "b_run/score.sc"])
+
+        n, columns, failures = load_scorefiles(scorefiles, processes=2, use_cache=False, verbose=False)
+        self.assertEqual(n, 9)
+        self.assertEqual([f for f, error in failures], [scorefiles[1]])
+        self.assertTrue("UnicodeDecodeError" in failures[0][1])
+        self.assertEqual(list(columns['scorefile']), [scorefiles[0]] * 2 + [scorefiles[2]] * 4 + [scorefiles[3]] * 3)
+        self.assertEqual(columns['decoy'][2], os.path.join(root, "a_run", "nested") + "/m_0000")
+
+        n2, columns2, failures2 = load_scorefiles(scorefiles, processes=1, use_cache=False, verbose=False)
+        self.assertEqual(failures2, failures)
+        self.assertEqual(list(columns2['decoy']), list(columns['decoy']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+
+import numpy as np
+import pandas
+
+from jade2.rosetta_jade.score_selection import *
+
+class TestScoreSelection(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(1)
+        self.df = pandas.DataFrame({
+            "total_score": rng.normal(size=500),
+            "dG_separated": rng.normal(size=500),
+            "dSASA_int": rng.normal(size=500),
+            "position": rng.randint(0, 20, size=500)})
+        self.df.loc[7, "total_score"] = np.nan
+
+    def test_top_n(self):
+        top = get_top_n(self.df, "total_score", 10)
+        self.assertEqual(list(top.index), list(self.df.sort_values("total_score").head(10).index))
+
+        top = get_top_n(self.df, "dSASA_int", 3, groupby="position")
+        expected = self.df.sort_values("dSASA_int", ascending=False).groupby("position").head(3)
+        self.assertEqual(sorted(top.index), sorted(expected.index))
+        self.assertEqual(list(top["position"].unique()), sorted(self.df["position"].unique()))
+
+    def test_percentile(self):
+        top = filter_by_percentile(self.df, "total_score", .10)
+        self.assertEqual(len(top), 49)
+        self.assertTrue(top["total_score"].max() <= self.df["total_score"].quantile(.10))
+
+    def test_pareto_front(self):
+        terms = ["dG_separated", "total_score", "dSASA_int"]
+        front = get_pareto_front(self.df, terms)
+
+        values = np.column_stack([self.df["dG_separated"], self.df["total_score"], -self.df["dSASA_int"]])
+        expected = []
+        for i, v in enumerate(values):
+            if np.isnan(v).any(): continue
+            if not ((values <= v).all(axis=1) & (values < v).any(axis=1)).any():
+                expected.append(self.df.index[i])
+        self.assertEqual(sorted(front.index), sorted(expected))
+        self.assertTrue(front["dG_separated"].is_monotonic_increasing)
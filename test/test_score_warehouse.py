@@ -0,0 +1,57 @@
+import unittest
+import tempfile
+import os
+
+from jade2.rosetta_jade.score_warehouse import ScoreWarehouse
+
+class TestScoreWarehouse(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.scorefiles = []
+        for run in ["run1", "run2"]:
+            os.mkdir(os.path.join(self.tmp, run))
+            path = os.path.join(self.tmp, run, "score.sc")
+            with open(path, 'w') as OUTFILE:
+                for i in range(20):
+                    OUTFILE.write('{"decoy": "%s_%04d", "total_score": %s, "dG_separated": %s, "hbonds_int": %d}\n'
+                                  % (run, i, repr(float(i)), repr(-float(i)), i % 3))
+            self.scorefiles.append(path)
+        self.warehouse = ScoreWarehouse(os.path.join(self.tmp, "scores.db"))
+
+    def tearDown(self):
+        self.warehouse.close()
+
+    def test_ingest(self):
+        self.assertEqual(self.warehouse.ingest_all(self.scorefiles, verbose=False), 40)
+        self.assertEqual(self.warehouse.ingest(self.scorefiles[0]), 0)
+
+        #Appended decoys are added, re-written decoys are not duplicated.
+        with open(self.scorefiles[0], 'a') as OUTFILE:
+            OUTFILE.write('{"decoy": "run1_0020", "total_score": -1.0, "dG_separated": -30.0, "hbonds_int": 5}\n')
+            OUTFILE.write('{"decoy": "run1_0000", "total_score": 0.5, "dG_separated": 0.0, "hbonds_int": 0}\n')
+        self.assertEqual(self.warehouse.ingest(self.scorefiles[0]), 2)
+
+        sources = self.warehouse.get_sources()
+        self.assertEqual(list(sources["subset"]), ["run1", "run2"])
+        self.assertEqual(list(sources["n_rows"]), [21, 20])
+
+    def test_query(self):
+        self.warehouse.ingest_all(self.scorefiles, verbose=False)
+
+        df = self.warehouse.query(where="hbonds_int = ?", params=(2,), subsets=["run2"], order_by="total_score")
+        self.assertEqual(list(df["decoy"]), ["run2_0002", "run2_0005", "run2_0008", "run2_0011", "run2_0014", "run2_0017"])
+
+        df = self.warehouse.top_n("dG_separated", 2, groupby="subset")
+        self.assertEqual(list(df["decoy"]), ["run1_0019", "run1_0018", "run2_0019", "run2_0018"])
+
+        df = self.warehouse.top_n("dG_separated", -1, groupby="subset")
+        self.assertEqual(len(df), 40)
+        self.assertEqual(list(df["decoy"][:2]), ["run1_0019", "run1_0018"])
+        self.assertEqual(list(df["decoy"][20:22]), ["run2_0019", "run2_0018"])
+
+        df = self.warehouse.top_n("hbonds_int", 1)
+        self.assertEqual(df["hbonds_int"][0], 2)
+
+        df = self.warehouse.group_by("subset", ["total_score"], ["count", "max"])
+        self.assertEqual(list(df["total_score_count"]), [20, 20])
+        self.assertEqual(list(df["total_score_max"]), [19.0, 19.0])
@@ -0,0 +1,45 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from jade2.basic.structure.SQLPose import SQLPose
+from jade2.basic.structure.PythonPDB2 import PythonPDB2
+
+class TestSQLPose(unittest.TestCase):
+    def setUp(self):
+        self.inputs = os.path.join(os.path.dirname(__file__), "inputs")
+        self.dir = tempfile.mkdtemp()
+        self.paths = []
+        for i in range(3):
+            path = os.path.join(self.dir, "decoy_"+str(i)+".pdb")
+            shutil.copy(os.path.join(self.inputs, "2j88.pdb"), path)
+            self.paths.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_bulk_load(self):
+        pose = SQLPose("2j88", "test", 1, path=os.path.join(self.dir, "db", "decoys.db"))
+        strucIDs = pose.read_pdbs_into_database(self.paths)
+        self.assertEqual(strucIDs, [1, 2, 3])
+        self.assertEqual(pose.read_pdbs_into_database(self.paths[:1]), [4])
+
+        pose.db_util.query_structures()
+        structures = pose.db_util.cur.fetchall()
+        self.assertEqual([s['pdbID'] for s in structures], ['decoy_0', 'decoy_1', 'decoy_2', 'decoy_0'])
+
+        atoms = PythonPDB2(self.paths[0]).get_atoms()
+        expected = atoms[(atoms['chain'] == 'L') & (atoms['atom_name'] == ' CA ') &
+                         (atoms['residue_number'] >= 10) & (atoms['residue_number'] <= 20)]
+        pose.db_util.query_atoms("pdb", "L", 10, 20, "CA")
+        rows = pose.db_util.cur.fetchall()
+        self.assertEqual(len(rows), 4 * len(expected))
+        self.assertEqual([r['resNum'] for r in rows[:len(expected)]], expected['residue_number'].tolist())
+        self.assertAlmostEqual(rows[0]['x'], float(expected['x'][0]), 3)
+
+        plan = " ".join(str(tuple(r)) for r in pose.db.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM pdb WHERE chain=? AND trim(atomName)=? AND resNum BETWEEN ? AND ?",
+            ("L", "CA", 10, 20)))
+        self.assertIn("pdb_atom", plan)
+        pose.db.close()
@@ -0,0 +1,48 @@
+import unittest
+
+import numpy as np
+
+from jade2.basic.StreamingStats import *
+
+class TestStreamingStats(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(1)
+        self.values = rng.normal(5, 2, size=400000)
+        self.values[::1000] = np.nan
+        self.finite = self.values[~np.isnan(self.values)]
+
+    def test_merge(self):
+        parts = []
+        for chunk in np.array_split(self.values, 17):
+            stats = StreamingStats()
+            stats.update(chunk)
+            parts.append(stats)
+        merged = parts[0]
+        for stats in parts[1:]:
+            merged.merge(stats)
+
+        self.assertEqual(merged.n, len(self.finite))
+        self.assertAlmostEqual(merged.mean, self.finite.mean(), places=10)
+        self.assertAlmostEqual(merged.get_stddev(), self.finite.std(), places=10)
+        self.assertAlmostEqual(merged.get_stddev(ddof=1), self.finite.std(ddof=1), places=10)
+        self.assertEqual((merged.min, merged.max), (self.finite.min(), self.finite.max()))
+
+        for q in [.01, .25, .5, .75, .99]:
+            rank = np.mean(self.finite < merged.sketch.get_quantile(q))
+            self.assertLess(abs(rank - q), .01)
+
+    def test_exact(self):
+        stats = StreamingStats()
+        stats.update(self.finite[:1000])
+        self.assertTrue(stats.sketch.is_exact())
+        self.assertEqual(stats.get_median(), np.partition(self.finite[:1000], 500)[500])
+        self.assertEqual(StreamingStats().get_summary()['median'], None)
+
+    def test_table(self):
+        table = StatsTable()
+        table.update({"total_score": np.array([1.0, 2.0]), "decoy": np.array(["a", "b"], dtype=object)})
+        table.update({"total_score": np.array([3.0]), "dG": np.array([-1.0])})
+        summary = table.get_summary()
+        self.assertEqual(list(summary), ["total_score", "dG"])
+        self.assertEqual(summary["total_score"]["n"], 3)
+        self.assertEqual(summary["total_score"]["median"], 2.0)
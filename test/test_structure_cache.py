@@ -0,0 +1,81 @@
+import os
+import shutil
+import tempfile
+import unittest
+import warnings
+
+import numpy as np
+
+from jade2.basic.structure.BioPose import BioPose
+from jade2.basic.structure.StructureCache import *
+
+def get_atom_line(serial, name, altloc, resname, resnum, x, occupancy):
+    return "ATOM  {:5d} {:<4s}{:1s}{:3s} A{:4d}    {:8.3f}{:8.3f}{:8.3f}{:6.2f}{:6.2f}          {:>2s}\n".format(
+        serial, name, altloc, resname, resnum, x, 1.0, 2.0, occupancy, 20.0, name[0])
+
+#Alternate locations, an ANISOU record, a point mutation (SER/ALA 2) and two models.
+DISORDERED_PDB = "".join(
+    ["MODEL        1\n",
+     get_atom_line(1, " N", "", "GLY", 1, 1.0, 1.0),
+     get_atom_line(2, " CA", "A", "GLY", 1, 2.0, 0.4),
+     get_atom_line(3, " CA", "B", "GLY", 1, 2.5, 0.6),
+     "ANISOU    3  CA BGLY A   1     1000   2000   3000    400    500    600       C\n",
+     get_atom_line(4, " CA", "A", "SER", 2, 3.0, 0.7),
+     get_atom_line(5, " CA", "B", "ALA", 2, 3.5, 0.3),
+     "ENDMDL\nMODEL        2\n",
+     get_atom_line(1, " N", "", "GLY", 1, 9.0, 1.0),
+     "ENDMDL\nEND\n"])
+
+def get_atom_info(structure):
+    info = []
+    for residue in structure.get_residues():
+        info.append((residue.full_id, residue.resname, residue.is_disordered()))
+        for atom in residue.get_unpacked_list():
+            info.append((atom.full_id, atom.serial_number, atom.element, atom.coord.tolist(), atom.occupancy,
+                         atom.is_disordered(), None if atom.anisou_array is None else atom.anisou_array.tolist()))
+    return info
+
+class TestStructureCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(os.path.dirname(__file__), "inputs", "2j88.pdb")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def parse(self, path):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            return BioPose.parse_file(path)
+
+    def test_cached_pose(self):
+        cache = StructureCache(os.path.join(self.tmpdir, "cache"))
+        pose = BioPose(self.path, cache=cache)
+        self.assertEqual(cache.parsed, 1)
+
+        #A new cache on the same directory reads the file written by the first.
+        cached = BioPose(self.path, cache=StructureCache(cache.cache_dir))
+        structure, header = self.parse(self.path)
+        self.assertEqual(get_atom_info(cached.struct), get_atom_info(structure))
+        self.assertEqual(cached.header, header)
+        self.assertEqual(cached.find_chain_breaks(), pose.find_chain_breaks())
+        self.assertIsNot(BioPose(self.path, cache=cache).struct, pose.struct)
+        self.assertEqual(cache.parsed, 1)
+
+        sequences = cache.get_sequences(self.path, None)
+        self.assertEqual(list(sequences), ['A', 'H', 'L'])
+        self.assertTrue(sequences['L'].startswith("DIQMTQSPASLSASVGETVTITC"))
+
+    def test_disordered(self):
+        path = os.path.join(self.tmpdir, "disordered.pdb")
+        with open(path, 'w') as OUTFILE:
+            OUTFILE.write(DISORDERED_PDB)
+        structure, header = self.parse(path)
+        rebuilt, rebuilt_header = record_to_structure(structure_to_record(structure, header), structure.id)
+
+        self.assertEqual(get_atom_info(rebuilt), get_atom_info(structure))
+        self.assertEqual(rebuilt[0]['A'][1]['CA'].altloc, 'B')
+        self.assertEqual([r.resname for r in rebuilt[0]['A'][2].disordered_get_list()], ['SER', 'ALA'])
+        self.assertEqual(rebuilt[0]['A'][2].resname, structure[0]['A'][2].resname)
+        self.assertEqual(len(rebuilt), 2)
+        np.testing.assert_allclose(rebuilt[0]['A'][1]['CA'].anisou_array, [.1, .2, .3, .04, .05, .06], rtol=1e-6)
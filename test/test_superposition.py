@@ -0,0 +1,47 @@
+import os
+import unittest
+
+import numpy as np
+
+from jade2.basic.structure.pdb_io import read_pdb_file, get_atom_mask, BACKBONE_ATOMS
+from jade2.basic.structure.superposition import *
+
+def get_random_rotations(n, rng):
+    q, r = np.linalg.qr(rng.normal(size=(n, 3, 3)))
+    q *= np.sign(np.linalg.det(q))[:, None, None]
+    return q
+
+class TestSuperposition(unittest.TestCase):
+    def setUp(self):
+        self.atoms = read_pdb_file(os.path.join(os.path.dirname(__file__), "inputs", "2j88.pdb"))[0]
+        self.bb = get_atom_mask(self.atoms, atom_names=BACKBONE_ATOMS)
+        self.native = get_atom_coords(self.atoms)[self.bb]
+        rng = np.random.RandomState(0)
+        self.noise = rng.normal(0, 0.5, (20, len(self.native), 3))
+        self.decoys = (self.native + self.noise) @ get_random_rotations(20, rng) + rng.normal(0, 10, (20, 1, 3))
+
+    def test_rmsd(self):
+        #Rotated and translated copies superimpose exactly.
+        rng = np.random.RandomState(1)
+        moved = self.native @ get_random_rotations(5, rng) + rng.normal(0, 10, (5, 1, 3))
+        np.testing.assert_allclose(get_rmsd(moved, self.native), 0, atol=1e-4)
+        self.assertTrue(np.all(get_rmsd(moved, self.native, fit=False) > 1))
+
+        #Superposition can only lower the RMSD of the noisy decoys, before they were moved.
+        noisy = self.native + self.noise
+        rmsds = get_rmsd(self.decoys, self.native)
+        self.assertTrue(np.all(rmsds <= get_rmsd(noisy, self.native, fit=False) + 1e-9))
+        aligned = superimpose(self.decoys, self.native)
+        np.testing.assert_allclose(rmsds, np.sqrt(((aligned - self.native) ** 2).sum(axis=2).mean(axis=1)))
+
+    def test_masks(self):
+        chains = self.atoms['chain'][self.bb]
+        fit, loop = chains == 'L', chains == 'H'
+        rmsds = get_rmsd(self.decoys, self.native, fit_mask=fit, rmsd_mask=loop)
+        aligned = superimpose(self.decoys, self.native, fit)
+        np.testing.assert_allclose(rmsds, np.sqrt(((aligned[:, loop] - self.native[loop]) ** 2).sum(axis=2).mean(axis=1)))
+
+        matrix = get_pairwise_rmsd(self.decoys, fit_mask=fit, rmsd_mask=loop)
+        self.assertEqual(matrix.shape, (20, 20))
+        np.testing.assert_allclose(matrix, matrix.T)
+        self.assertAlmostEqual(matrix[3, 7], get_rmsd(self.decoys[7], self.decoys[3], fit, loop))